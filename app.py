@@ -3,6 +3,7 @@
 Головний модуль бота "Котик".
 Мета: мінімалізм, стиль, українська мова та зручність.
 """
+import asyncio
 import logging
 import datetime
 import os
@@ -17,8 +18,8 @@ from telegram.ext import (
     MessageHandler,
     filters,
     ContextTypes,
-    PicklePersistence,
-    ApplicationBuilder
+    ApplicationBuilder,
+    TypeHandler,
 )
 
 # === Імпорти модулів ===
@@ -42,6 +43,38 @@ from bot.core.database import (
     upsert_chat_info,
     ensure_user_data,
 )
+from bot.utils.utils import (
+    TG_GLOBAL_PER_SEC,
+    TG_PRIVATE_PER_SEC,
+    TG_GROUP_PER_MIN,
+    BOT_RUN_MODE,
+    UPDATE_QUEUE_SIZE,
+    UPDATE_CONCURRENCY,
+    ALLOWED_UPDATES_MODE,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_QUEUE_PUT_TIMEOUT_SEC,
+    STATE_GC_INTERVAL_SEC,
+)
+from bot.services.telegram_rate_limiter import OutboundRateLimiter
+from bot.services.broadcast import broadcast_engine
+from bot.services.user_directory import user_directory
+from bot.services.message_deleter import message_deleter
+from bot.services.reminder_engine import reminder_engine
+from bot.services.webhook_ingress import WebhookIngress, serve_webhook
+from bot.services.update_processor import OrderedUpdateProcessor
+from bot.services.request_context import begin_request
+from bot.services.sqlite_persistence import SQLitePersistence
+from bot.services.state_gc import state_gc_job
+from bot.services.allowed_updates import (
+    UpdateTrafficStats,
+    compute_allowed_updates,
+    log_allowed_updates,
+)
 
 # Імпорт обробників (Handlers)
 from bot.handlers.start_help_handlers import register_start_help_handlers
@@ -55,7 +88,7 @@ from bot.handlers.ai_handlers import register_ai_handlers
 from bot.handlers.games_menu_handlers import register_games_menu_handlers
 from bot.handlers.tops_menu_handlers import register_tops_menu_handlers
 from bot.games.tic_tac_toe_game import register_tic_tac_toe_handlers
-from bot.games.mandarin_duel_game import register_mandarin_duel_handlers
+from bot.games.mandarin_duel_game import register_mandarin_duel_handlers, DUELS_KEY as MANDARIN_DUELS_KEY
 from bot.games.mems_integration import register_mems_handlers
 # Нагадування (з функцією відновлення)
 from bot.handlers.reminder_handlers import register_reminder_handlers, load_persistent_reminders
@@ -65,8 +98,9 @@ from bot.core.daily_tasks import nun_of_the_day_job, assign_daily_predictions_jo
 from bot.features.weather.weather_handlers import register_weather_handlers
 
 # Адмін-керування та події
-from bot.handlers.chat_admin_handlers import register_chat_admin_handlers, handle_admin_text_input
+from bot.handlers.chat_admin_handlers import register_chat_admin_handlers
 from bot.handlers.chat_event_handlers import register_chat_event_handlers
+from bot.handlers.text_router_handlers import register_text_router
 
 # === Налаштування логування ===
 logging.basicConfig(
@@ -107,11 +141,11 @@ async def post_init(application: Application):
     except Exception as e:
         logger.warning(f"⚠️ Не вдалося ініціалізувати казино: {e}")
 
-    # 3. Відновлення нагадувань
+    # 3. Двигун нагадувань (диспетчер по БД замість job на кожне нагадування)
     logger.info("🔄 Відновлення нагадувань...")
     await load_persistent_reminders(application)
 
-    # 4. Безпечна очистка завислих ігор, що можуть зберігатися через PicklePersistence
+    # 4. Безпечна очистка завислих ігор, що зберігаються в persistence
     try:
         from bot.games.mandarin_duel_game import cleanup_mandarin_duels_after_restart
 
@@ -119,6 +153,27 @@ async def post_init(application: Application):
     except Exception as e:
         logger.warning(f"⚠️ Не вдалося очистити мандаринкові дуелі після рестарту: {e}")
 
+    # 5. Продовження розсилок, перерваних рестартом
+    try:
+        resumed = await broadcast_engine.resume(application.bot)
+        if resumed:
+            logger.info(f"📢 Продовжено розсилок: {resumed}")
+    except Exception as e:
+        logger.warning(f"⚠️ Не вдалося продовжити розсилки: {e}")
+
+    # 6. Колесо автовидалення: підхоплюємо розклад, збережений до рестарту
+    try:
+        pending = await message_deleter.start(application.bot)
+        logger.info(f"🧹 Автовидалення запущено, у розкладі: {pending}")
+    except Exception as e:
+        logger.warning(f"⚠️ Не вдалося запустити автовидалення: {e}")
+
+
+async def post_shutdown(application: Application):
+    """Зупиняє фонові сервіси і дописує їхній стан у БД."""
+    await message_deleter.stop()
+    await reminder_engine.stop()
+
 
 async def update_chat_and_user_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -128,6 +183,7 @@ async def update_chat_and_user_info(update: Update, context: ContextTypes.DEFAUL
     chat = update.effective_chat
 
     if user:
+        user_directory.observe(user)
         await ensure_user_data(
             user_id=user.id,
             username=user.username,
@@ -143,6 +199,8 @@ async def update_chat_and_user_info(update: Update, context: ContextTypes.DEFAUL
             chat_title=chat.title,
             chat_username=chat.username,
         )
+        # Чат знову пише боту — повертаємо його в розсилки
+        await broadcast_engine.revive(chat.id)
 
 
 async def handle_bot_join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -199,10 +257,9 @@ def main() -> None:
         logger.critical("❌ TELEGRAM_BOT_TOKEN не знайдено! Перевірте config.py або змінні середовища.")
         return
 
-    # === ВИПРАВЛЕННЯ: Налаштування Persistence для старої версії PTB ===
-    # Замінюємо 'directory' на 'filepath', щоб бути сумісним зі старими версіями
-    # python-telegram-bot (до v20.0). Вказуємо шлях до одного з файлів (bot_state.pkl).
-    # Бібліотека автоматично визначить, що це шлях до файлів persistence.
+    # === Persistence ===
+    # Стан PTB живе в SQLite (рядок на чат/користувача); старий pickle-файл
+    # переноситься туди один раз при першому старті.
     persistence_dir = "data"
     persistence_filepath = os.path.join(persistence_dir, "bot_data.pkl")
     
@@ -214,20 +271,45 @@ def main() -> None:
         except OSError as e:
             logger.error(f"❌ Не вдалося створити директорію {persistence_dir}: {e}")
             return
+
+    if BOT_RUN_MODE == "webhook" and not WEBHOOK_SECRET_TOKEN:
+        logger.critical("❌ BOT_RUN_MODE=webhook потребує WEBHOOK_SECRET_TOKEN.")
+        return
             
-    # Створюємо об'єкт persistence, використовуючи filepath
-    persistence = PicklePersistence(filepath=persistence_filepath)
+    persistence = SQLitePersistence(
+        # Дуелі чистяться одразу після рестарту — ці чати читаємо на старті, решту ліниво
+        eager_chat_keys=(MANDARIN_DUELS_KEY,),
+        migrate_from=persistence_filepath,
+    )
 
     application = (
         ApplicationBuilder()
         .token(TELEGRAM_BOT_TOKEN)
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .persistence(persistence)
+        # Обмежена черга: при перевантаженні приймання оновлень пригальмовує, а не росте пам'ять
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        # Різні чати обробляються паралельно, оновлення одного чату/користувача — по черзі
+        .concurrent_updates(OrderedUpdateProcessor(UPDATE_CONCURRENCY))
+        .rate_limiter(
+            OutboundRateLimiter(
+                global_per_sec=TG_GLOBAL_PER_SEC,
+                private_per_sec=TG_PRIVATE_PER_SEC,
+                group_per_min=TG_GROUP_PER_MIN,
+            )
+        )
         .build()
     )
 
     # === РЕЄСТРАЦІЯ ОБРОБНИКІВ ===
     
+    # 0. Контекст оновлення: спільні налаштування/профіль/права на всі хендлери
+    async def open_request_context(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        begin_request(update)
+
+    application.add_handler(TypeHandler(Update, open_request_context), group=-100)
+
     # 1. Системні (найвищий пріоритет)
     register_system_handlers(application)
     application.add_error_handler(error_handler)
@@ -241,10 +323,6 @@ def main() -> None:
         ),
         group=1,
     )
-    application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, handle_admin_text_input),
-        group=2
-    )
 
     # 3. Модулі (Функціонал)
     register_start_help_handlers(application)
@@ -269,6 +347,7 @@ def main() -> None:
     register_casino_handlers(application)
     register_chat_admin_handlers(application)
     register_chat_event_handlers(application)
+    register_text_router(application)        # Текстові тригери (group=-2)
 
     # 4. Події чату
     application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_bot_join))
@@ -291,8 +370,60 @@ def main() -> None:
         name="assign_daily_predictions_job",
     )
 
+    # === ТИПИ ОНОВЛЕНЬ ===
+    # Просимо в Telegram лише те, що обробляють зареєстровані хендлери
+    needed_updates = compute_allowed_updates(application)
+    log_allowed_updates(needed_updates)
+    if ALLOWED_UPDATES_MODE == "all":
+        logger.info("📮 ALLOWED_UPDATES=all — отримуємо всі типи (лише статистика зайвого трафіку)")
+        allowed_updates = Update.ALL_TYPES
+    else:
+        allowed_updates = needed_updates
+
+    traffic_stats = UpdateTrafficStats(needed_updates)
+
+    async def observe_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        traffic_stats.observe(update)
+
+    application.add_handler(TypeHandler(Update, observe_update), group=-1000)
+
+    async def log_update_traffic(context: ContextTypes.DEFAULT_TYPE) -> None:
+        summary = traffic_stats.summary()
+        if summary["total"]:
+            logger.info(
+                f"📮 Оновлень за годину: {summary['total']}, поза allowed_updates "
+                f"{summary['outside_allowed']} ({summary['outside_share'] * 100:.1f}%): "
+                f"{summary['outside_by_type']}"
+            )
+        traffic_stats.by_type.clear()
+
+    job_queue.run_repeating(log_update_traffic, interval=3600, first=3600, name="update_traffic_log")
+    job_queue.run_repeating(state_gc_job, interval=STATE_GC_INTERVAL_SEC, first=600, name="state_gc")
+
     logger.info("✅ Бот ініціалізований і готовий до роботи.")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+    if BOT_RUN_MODE == "webhook":
+        ingress = WebhookIngress(
+            application.update_queue,
+            application.bot,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            host=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            put_timeout=WEBHOOK_QUEUE_PUT_TIMEOUT_SEC,
+        )
+        asyncio.run(
+            serve_webhook(
+                application,
+                ingress,
+                webhook_url=WEBHOOK_URL,
+                allowed_updates=allowed_updates,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            )
+        )
+    else:
+        application.run_polling(allowed_updates=allowed_updates)
 
 
 if __name__ == "__main__":
@@ -19,6 +19,8 @@ from bot.core.database import (
     get_all_chats, get_users_in_chat, get_all_user_ids, set_daily_prediction
 )
 from bot.services.predictions import load_predictions
+from bot.services.telegram_rate_limiter import bulk_priority
+from bot.services.user_directory import user_directory
 
 logger = logging.getLogger(__name__)
 
@@ -82,50 +84,47 @@ async def nun_of_the_day_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.info("Запускаю щоденне завдання 'Монашка дня'...")
     all_chats = await get_all_chats(page_size=None)
     
-    for chat_info in all_chats:
-        chat_id = chat_info['chat_id']
-        # Пропускаємо приватні чати
-        if chat_id > 0:
-            continue
+    # Розсилка по всіх групах: темп задає спільний rate limiter, інтерактивні відповіді мають пріоритет
+    with bulk_priority():
+        for chat_info in all_chats:
+            chat_id = chat_info['chat_id']
+            # Пропускаємо приватні чати
+            if chat_id > 0:
+                continue
 
-        try:
-            user_ids = await get_users_in_chat(chat_id)
-            bot_id = context.bot.id
-            # Обираємо тільки реальних користувачів, а не бота
-            active_user_ids = [uid for uid in user_ids if uid != bot_id]
+            try:
+                user_ids = await get_users_in_chat(chat_id)
+                bot_id = context.bot.id
+                # Обираємо тільки реальних користувачів, а не бота
+                active_user_ids = [uid for uid in user_ids if uid != bot_id]
 
-            if not active_user_ids:
-                logger.info(f"В чаті {chat_id} немає активних користувачів.")
-                continue
+                if not active_user_ids:
+                    logger.info(f"В чаті {chat_id} немає активних користувачів.")
+                    continue
 
-            # Обираємо щасливчика
-            nun_id = random.choice(active_user_ids)
+                # Обираємо щасливчика
+                nun_id = random.choice(active_user_ids)
             
-            try:
-                nun_member = await context.bot.get_chat(nun_id)
-                nun_mention = nun_member.mention_html()
+                try:
+                    nun_mention = await user_directory.mention_html(nun_id, bot=context.bot)
                 
-                message = (
-                    f"✝️ <b>Монашка сьогоднішнього дня</b> ✝️\n\n"
-                    f"Вітаємо {nun_mention}, зірки пророкують вам "
-                    "цікавий та насичений день! ✨\n\n"
-                    f"<i>Нехай Господь береже вас... або ні.</i> 😏"
-                )
+                    message = (
+                        f"✝️ <b>Монашка сьогоднішнього дня</b> ✝️\n\n"
+                        f"Вітаємо {nun_mention}, зірки пророкують вам "
+                        "цікавий та насичений день! ✨\n\n"
+                        f"<i>Нехай Господь береже вас... або ні.</i> 😏"
+                    )
                 
-                await context.bot.send_message(chat_id, text=message, parse_mode='HTML')
-                logger.info(f"Монашка дня' надіслано в чат {chat_id}. Обрано: {nun_id}")
+                    await context.bot.send_message(chat_id, text=message, parse_mode='HTML')
+                    logger.info(f"Монашка дня' надіслано в чат {chat_id}. Обрано: {nun_id}")
 
-            except (Forbidden, BadRequest) as e:
-                logger.warning(f"Не вдалося надіслати повідомлення / "
-                                f"отримати інфо про {nun_id}: {e}")
+                except (Forbidden, BadRequest) as e:
+                    logger.warning(f"Не вдалося надіслати монашку дня {nun_id} в чат {chat_id}: {e}")
 
-        except (Forbidden, BadRequest) as e:
-            logger.warning(f"Не вдалося обробити чат {chat_id} (можливо, бота видалено): {e}")
-        except Exception as e:
-            logger.error(f"Неочікувана помилка в 'nun_of_the_day_job' "
-                         f"для чату {chat_id}: {e}", exc_info=True)
-        
-        # Чекаємо 1 секунду між відправками, щоб не отримати бан
-        await asyncio.sleep(1)
+            except (Forbidden, BadRequest) as e:
+                logger.warning(f"Не вдалося обробити чат {chat_id} (можливо, бота видалено): {e}")
+            except Exception as e:
+                logger.error(f"Неочікувана помилка в 'nun_of_the_day_job' "
+                             f"для чату {chat_id}: {e}", exc_info=True)
 
     logger.info("Щоденне завдання 'Монашка дня' завершено.")
\ No newline at end of file
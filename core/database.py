@@ -4,7 +4,7 @@ import aiosqlite
 import os
 import json
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from pathlib import Path
 
 # (НОВЕ) Імпортуємо константи модів з utils
@@ -17,6 +17,11 @@ except ImportError:
         DEFAULT = "default"
         WINTER = "winter"
 
+from bot.services.token_estimator import estimate_message_tokens
+from bot.services.memory_index import memory_index
+from bot.services.response_cache import DEFAULT_FAST_REPLIES
+from bot.services import request_context
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +30,13 @@ BASE_DIR = Path(__file__).resolve().parents[2]
 DATA_DIR = BASE_DIR / "data"
 DB_PATH = str(DATA_DIR / "memory.db")  # абсолютний шлях до БД
 
+
+def _connect() -> aiosqlite.Connection:
+    """Підключення до БД (рахується в контекст поточного оновлення)."""
+    request_context.note_db_call()
+    return aiosqlite.connect(DB_PATH)
+
+
 ALLOWED_MODULE_COLUMNS = [
     "ai_enabled",
     "commands_enabled",
@@ -61,7 +73,7 @@ async def init_db() -> None:
             logger.error(f"Не вдалося створити директорію для бази даних {db_dir}: {e}")
             return
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             await db.execute("PRAGMA foreign_keys = ON")
             
             # Таблиця для історії розмов (для ШІ)
@@ -391,7 +403,124 @@ async def init_db() -> None:
                 if not await column_exists(db, "reminders", col_name):
                     logger.info(f"Міграція 'reminders': додаю '{col_name}'...")
                     await db.execute(f"ALTER TABLE reminders ADD COLUMN {col_name} {col_type}")
+            # Двигун нагадувань раз на кілька хвилин бере активні в межах горизонту
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_reminders_status_time ON reminders (status, reminder_time)"
+            )
+
 
+            # Стислі підсумки старої частини діалогу (user, chat)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_summaries (
+                    user_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    summary TEXT NOT NULL,
+                    covered_until_ts TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (user_id, chat_id)
+                )
+                """
+            )
+
+            # Облік токенів AI: денні зведення по чатах
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ai_usage (
+                    day TEXT NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    cached_prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    estimated_prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    latency_ms_total INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, chat_id)
+                )
+                """
+            )
+
+            # Швидкі відповіді без AI: тригер -> варіанти відповіді (по рядку)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fast_replies (
+                    trigger TEXT PRIMARY KEY,
+                    responses TEXT NOT NULL
+                )
+                """
+            )
+            # Початкове наповнення — один раз, щоб видалені власником тригери не поверталися
+            cursor = await db.execute(
+                "SELECT 1 FROM global_settings WHERE setting_name = 'fast_replies_seeded'"
+            )
+            if not await cursor.fetchone():
+                await db.executemany(
+                    "INSERT OR IGNORE INTO fast_replies (trigger, responses) VALUES (?, ?)",
+                    [
+                        (trigger, "\n".join(responses))
+                        for triggers, responses in DEFAULT_FAST_REPLIES.items()
+                        for trigger in triggers
+                    ],
+                )
+                await db.execute(
+                    "INSERT OR REPLACE INTO global_settings (setting_name, setting_value) VALUES ('fast_replies_seeded', '1')"
+                )
+
+            # Розсилки: задача з курсором і статус кожного адресата — переживає рестарт
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    owner_id INTEGER NOT NULL,
+                    from_chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    cursor INTEGER,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    progress_chat_id INTEGER,
+                    progress_message_id INTEGER,
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT
+                )
+                """
+            )
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS broadcast_targets (
+                    job_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    PRIMARY KEY (job_id, chat_id)
+                )
+                """
+            )
+            # Чати/користувачі, куди бот більше не може писати (заблокували, вигнали, видалені)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS unreachable_chats (
+                    chat_id INTEGER PRIMARY KEY,
+                    reason TEXT,
+                    marked_at TEXT NOT NULL
+                )
+                """
+            )
+
+            # Відкладені видалення повідомлень (колесо таймерів message_deleter)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scheduled_deletions (
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    due_at REAL NOT NULL,
+                    fallback_text TEXT,
+                    PRIMARY KEY (chat_id, message_id)
+                )
+                """
+            )
+
+            # Стан PTB (chat_data/user_data/bot_data): рядок на чат/користувача/ключ
+            await db.execute(PERSISTENCE_TABLE_SQL)
 
             # (НОВЕ) Таблиця для підрахунку дрочок
             await db.execute(
@@ -411,7 +540,7 @@ async def init_db() -> None:
 
 # --- (Розділ AI: Збереження, Отримання, Очищення Повідомлень) ---
 async def save_message(user_id: int, chat_id: int, role: str, content: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT INTO conversations (user_id, chat_id, role, content, ts) VALUES (?, ?, ?, ?, ?)",
             (user_id, chat_id, role, content, datetime.now().isoformat()),
@@ -419,12 +548,13 @@ async def save_message(user_id: int, chat_id: int, role: str, content: str):
         await db.commit()
 
 async def get_recent_messages(
-    user_id: int, chat_id: int, max_chars: int = 2000
+    user_id: int, chat_id: int, max_chars: int = 2000, max_tokens: Optional[int] = None
 ) -> List[Dict[str, str]]:
     """
-    Отримує останні повідомлення для ШІ, обмежуючи їх за загальною кількістю символів.
+    Отримує останні повідомлення для ШІ, обмежуючи їх за загальною кількістю символів
+    або, якщо задано max_tokens, за оціночною кількістю токенів.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT role, content FROM conversations WHERE user_id = ? AND chat_id = ? ORDER BY ts DESC",
@@ -433,34 +563,163 @@ async def get_recent_messages(
         rows = await cursor.fetchall()
 
     recent_messages = []
-    current_chars = 0
+    current_size = 0
+    budget = max_tokens if max_tokens is not None else max_chars
 
     for row in rows:
-        message_content = row["content"]
-        message_len = len(message_content)
+        message = {"role": row["role"], "content": row["content"]}
+        if max_tokens is not None:
+            message_size = estimate_message_tokens(message)
+        else:
+            message_size = len(message["content"])
 
-        if current_chars + message_len > max_chars:
+        if current_size + message_size > budget:
             break
         
-        recent_messages.append({"role": row["role"], "content": message_content})
-        current_chars += message_len
+        recent_messages.append(message)
+        current_size += message_size
     
     return list(reversed(recent_messages))
 
+async def record_ai_usage(
+    chat_id: int,
+    prompt_tokens: int,
+    completion_tokens: int,
+    *,
+    cached_prompt_tokens: int = 0,
+    estimated_prompt_tokens: int = 0,
+    latency_ms: int = 0,
+) -> None:
+    """Додає один AI-запит до денного зведення чату."""
+    day = datetime.now().strftime("%Y-%m-%d")
+    async with _connect() as db:
+        await db.execute(
+            """
+            INSERT INTO ai_usage (
+                day, chat_id, requests, prompt_tokens, completion_tokens,
+                cached_prompt_tokens, estimated_prompt_tokens, latency_ms_total
+            )
+            VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+            ON CONFLICT(day, chat_id) DO UPDATE SET
+                requests = requests + 1,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens,
+                cached_prompt_tokens = cached_prompt_tokens + excluded.cached_prompt_tokens,
+                estimated_prompt_tokens = estimated_prompt_tokens + excluded.estimated_prompt_tokens,
+                latency_ms_total = latency_ms_total + excluded.latency_ms_total
+            """,
+            (
+                day, chat_id, prompt_tokens, completion_tokens,
+                cached_prompt_tokens, estimated_prompt_tokens, latency_ms,
+            ),
+        )
+        await db.commit()
+
+async def get_ai_usage_daily(days: int = 7) -> List[Dict[str, Any]]:
+    """Загальні зведення по днях (усі чати разом), від найновішого."""
+    since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """
+            SELECT day,
+                   SUM(requests) AS requests,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens,
+                   SUM(cached_prompt_tokens) AS cached_prompt_tokens,
+                   SUM(estimated_prompt_tokens) AS estimated_prompt_tokens,
+                   SUM(latency_ms_total) AS latency_ms_total
+            FROM ai_usage
+            WHERE day >= ?
+            GROUP BY day
+            ORDER BY day DESC
+            """,
+            (since,),
+        )
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+async def get_ai_usage_top_chats(day: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Чати з найбільшою витратою токенів за день."""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """
+            SELECT u.chat_id, s.chat_title, u.requests, u.prompt_tokens, u.completion_tokens,
+                   u.latency_ms_total
+            FROM ai_usage u
+            LEFT JOIN chat_settings s ON s.chat_id = u.chat_id
+            WHERE u.day = ?
+            ORDER BY (u.prompt_tokens + u.completion_tokens) DESC
+            LIMIT ?
+            """,
+            (day, limit),
+        )
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
 async def clear_conversations(user_id: int = None, chat_id: int = None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         if user_id is not None and chat_id is not None:
             await db.execute(
                 "DELETE FROM conversations WHERE user_id = ? AND chat_id = ?",
                 (user_id, chat_id),
             )
+            await db.execute(
+                "DELETE FROM conversation_summaries WHERE user_id = ? AND chat_id = ?",
+                (user_id, chat_id),
+            )
         else:
             await db.execute("DELETE FROM conversations")
+            await db.execute("DELETE FROM conversation_summaries")
+        await db.commit()
+
+async def get_conversation_summary(user_id: int, chat_id: int) -> Optional[Dict[str, str]]:
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT summary, covered_until_ts FROM conversation_summaries WHERE user_id = ? AND chat_id = ?",
+            (user_id, chat_id),
+        )
+        row = await cursor.fetchone()
+    return dict(row) if row else None
+
+async def get_conversation_messages(user_id: int, chat_id: int) -> List[Dict[str, str]]:
+    """Усі ще не підсумовані повідомлення діалогу, від старих до нових (з ts)."""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT role, content, ts FROM conversations WHERE user_id = ? AND chat_id = ? ORDER BY ts ASC",
+            (user_id, chat_id),
+        )
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+async def save_conversation_summary(
+    user_id: int, chat_id: int, summary: str, covered_until_ts: str
+) -> None:
+    """Зберігає підсумок і видаляє сирі повідомлення, які він покриває (одна транзакція)."""
+    async with _connect() as db:
+        await db.execute(
+            """
+            INSERT INTO conversation_summaries (user_id, chat_id, summary, covered_until_ts, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, chat_id) DO UPDATE SET
+                summary = excluded.summary,
+                covered_until_ts = excluded.covered_until_ts,
+                updated_at = excluded.updated_at
+            """,
+            (user_id, chat_id, summary, covered_until_ts, datetime.now().isoformat()),
+        )
+        await db.execute(
+            "DELETE FROM conversations WHERE user_id = ? AND chat_id = ? AND ts <= ?",
+            (user_id, chat_id, covered_until_ts),
+        )
         await db.commit()
 
 # --- (Розділ Стікерів) ---
 async def save_sticker(keyword: str, file_unique_id: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR REPLACE INTO stickers (keyword, file_unique_id) VALUES (?, ?)",
             (keyword.lower(), file_unique_id),
@@ -468,7 +727,7 @@ async def save_sticker(keyword: str, file_unique_id: str):
         await db.commit()
 
 async def get_sticker(keyword: str) -> Optional[str]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT file_unique_id FROM stickers WHERE keyword = ?", (keyword.lower(),)
         )
@@ -476,17 +735,41 @@ async def get_sticker(keyword: str) -> Optional[str]:
     return row[0] if row else None
 
 async def get_all_stickers() -> List[Dict[str, str]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute("SELECT keyword, file_unique_id FROM stickers")
         rows = await cursor.fetchall()
     return [dict(row) for row in rows]
 
 async def remove_sticker_db(keyword: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute("DELETE FROM stickers WHERE keyword = ?", (keyword.lower(),))
         await db.commit()
 
+# --- (Розділ Швидких Відповідей) ---
+async def get_fast_replies() -> List[Dict[str, str]]:
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("SELECT trigger, responses FROM fast_replies ORDER BY trigger")
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+async def save_fast_reply(trigger: str, responses: List[str]):
+    async with _connect() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO fast_replies (trigger, responses) VALUES (?, ?)",
+            (trigger.strip().lower(), "\n".join(responses)),
+        )
+        await db.commit()
+
+async def remove_fast_reply(trigger: str) -> bool:
+    async with _connect() as db:
+        cursor = await db.execute(
+            "DELETE FROM fast_replies WHERE trigger = ?", (trigger.strip().lower(),)
+        )
+        await db.commit()
+    return cursor.rowcount > 0
+
 # --- (Розділ Пам'яті) ---
 async def save_memory(
     scope_id: int, scope_type: str, key: str, value: str, added_by_user_id: int
@@ -494,7 +777,7 @@ async def save_memory(
     if scope_type not in ["user", "chat"]:
         logger.error(f"Невірний scope_type '{scope_type}' при спробі зберегти пам'ять.")
         return
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             """
             INSERT OR REPLACE INTO memories 
@@ -511,13 +794,14 @@ async def save_memory(
             ),
         )
         await db.commit()
+    memory_index.upsert(scope_type, scope_id, key, value)
 
 async def get_memories_for_scope(
     scope_id: int, scope_type: str
 ) -> List[Dict[str, str]]:
     if scope_type not in ["user", "chat"]:
         return []
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT memory_key, memory_value FROM memories WHERE scope_id = ? AND scope_type = ?",
@@ -529,12 +813,13 @@ async def get_memories_for_scope(
 async def remove_memory(scope_id: int, scope_type: str, key: str):
     if scope_type not in ["user", "chat"]:
         return
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "DELETE FROM memories WHERE scope_id = ? AND scope_type = ? AND memory_key = ?",
             (scope_id, scope_type, key),
         )
         await db.commit()
+    memory_index.remove(scope_type, scope_id, key)
 
 # --- (Розділ Налаштувань Чату) ---
 async def upsert_chat_info(
@@ -544,7 +829,8 @@ async def upsert_chat_info(
     chat_username: Optional[str] = None,
 ):
     """Оновлює інформацію про чат або додає її, якщо чат новий."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    request_context.forget("chat_settings", chat_id)
+    async with _connect() as db:
         # Спочатку перевіримо, чи змінилось щось, щоб не робити зайвий запис
         cursor = await db.execute("SELECT chat_title, chat_username, chat_type FROM chat_settings WHERE chat_id = ?", (chat_id,))
         row = await cursor.fetchone()
@@ -569,8 +855,14 @@ async def upsert_chat_info(
 async def get_chat_settings(chat_id: int) -> Dict[str, Any]:
     """
     Отримує повні налаштування для чату.
+    У межах одного оновлення читається з БД один раз (request_context).
     """
-    defaults = {
+    settings = await request_context.memoized("chat_settings", chat_id, lambda: _load_chat_settings(chat_id))
+    return dict(settings)
+
+
+def _chat_settings_defaults(chat_id: int) -> Dict[str, Any]:
+    return {
         "chat_id": chat_id,
         "chat_title": None,
         "chat_username": None,
@@ -595,7 +887,11 @@ async def get_chat_settings(chat_id: int) -> Dict[str, Any]:
         "mems_win_score": 10,
         "mems_hand_size": 6,
     }
-    async with aiosqlite.connect(DB_PATH) as db:
+
+
+async def _load_chat_settings(chat_id: int) -> Dict[str, Any]:
+    defaults = _chat_settings_defaults(chat_id)
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute("SELECT * FROM chat_settings WHERE chat_id = ?", (chat_id,))
         row = await cursor.fetchone()
@@ -606,6 +902,35 @@ async def get_chat_settings(chat_id: int) -> Dict[str, Any]:
     return defaults
 
 
+async def get_chat_settings_many(chat_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Налаштування кількох чатів одним підключенням (для пакетної фонової роботи)."""
+    result = {chat_id: _chat_settings_defaults(chat_id) for chat_id in chat_ids}
+    if not result:
+        return result
+    ids = list(result)
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            cursor = await db.execute(f"SELECT * FROM chat_settings WHERE chat_id IN ({placeholders})", chunk)
+            for row in await cursor.fetchall():
+                result[row["chat_id"]].update(dict(row))
+    return result
+
+
+async def get_chat_ids_with_module(module_key: str) -> List[int]:
+    """ID груп, у яких увімкнено модуль (напр. 'word_filter_enabled')."""
+    if module_key not in ALLOWED_MODULE_COLUMNS:
+        raise ValueError(f"Невідомий модуль: {module_key}")
+    async with _connect() as db:
+        cursor = await db.execute(
+            f"SELECT chat_id FROM chat_settings WHERE {module_key} = 1 AND chat_id < 0"
+        )
+        rows = await cursor.fetchall()
+    return [row[0] for row in rows]
+
+
 async def set_module_status(chat_id: int, module_key: str, enabled: bool) -> None:
     key_map = {
         "ai": "ai_enabled",
@@ -620,7 +945,7 @@ async def set_module_status(chat_id: int, module_key: str, enabled: bool) -> Non
         logger.error(f"Спроба оновити недійсний стовпець: {module_key}")
         return
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             await db.execute(
                 "INSERT OR IGNORE INTO chat_settings (chat_id) VALUES (?)", (chat_id,)
             )
@@ -629,12 +954,13 @@ async def set_module_status(chat_id: int, module_key: str, enabled: bool) -> Non
                 (int(enabled), chat_id),
             )
             await db.commit()
+        request_context.forget("chat_settings", chat_id)
         logger.info(f"Статус модуля {module_key} для чату {chat_id} змінено на {enabled}.")
     except Exception as e:
         logger.error(f"Помилка при оновленні статусу модуля {module_key} для чату {chat_id}: {e}", exc_info=True)
 
 async def set_chat_welcome_message(chat_id: int, message: Optional[str]):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR IGNORE INTO chat_settings (chat_id) VALUES (?)", (chat_id,)
         )
@@ -643,9 +969,10 @@ async def set_chat_welcome_message(chat_id: int, message: Optional[str]):
             (message, chat_id),
         )
         await db.commit()
+    request_context.forget("chat_settings", chat_id)
 
 async def set_chat_rules(chat_id: int, rules_text: Optional[str]):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR IGNORE INTO chat_settings (chat_id) VALUES (?)", (chat_id,)
         )
@@ -654,9 +981,10 @@ async def set_chat_rules(chat_id: int, rules_text: Optional[str]):
             (rules_text, chat_id),
         )
         await db.commit()
+    request_context.forget("chat_settings", chat_id)
 
 async def set_max_warns(chat_id: int, limit: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR IGNORE INTO chat_settings (chat_id) VALUES (?)", (chat_id,)
         )
@@ -665,6 +993,7 @@ async def set_max_warns(chat_id: int, limit: int):
             (limit, chat_id),
         )
         await db.commit()
+    request_context.forget("chat_settings", chat_id)
 
 
 # =============================================================================
@@ -698,17 +1027,18 @@ async def set_mems_setting_for_chat(chat_id: int, game_key: str, value: int) ->
     if game_key not in MEMS_ALLOWED_SETTINGS:
         return
     col, _default_val = MEMS_ALLOWED_SETTINGS[game_key]
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute("INSERT OR IGNORE INTO chat_settings (chat_id) VALUES (?)", (chat_id,))
         await db.execute(f"UPDATE chat_settings SET {col} = ? WHERE chat_id = ?", (int(value), chat_id))
         await db.commit()
+    request_context.forget("chat_settings", chat_id)
 
 async def set_chat_setting_flag(chat_id: int, column: str, enabled: bool) -> None:
     if column not in CHAT_SETTINGS_BOOL_COLUMNS:
         logger.error(f"Спроба оновити недійсний стовпець налаштувань: {column}")
         return
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             if not await column_exists(db, "chat_settings", column):
                 logger.info(f"Міграція 'chat_settings': додаю '{column}'...")
                 await db.execute(
@@ -722,6 +1052,7 @@ async def set_chat_setting_flag(chat_id: int, column: str, enabled: bool) -> Non
                 (int(enabled), chat_id),
             )
             await db.commit()
+        request_context.forget("chat_settings", chat_id)
     except Exception as e:
         logger.error(
             f"Помилка при оновленні налаштування {column} для чату {chat_id}: {e}",
@@ -733,7 +1064,7 @@ async def set_chat_setting_flag(chat_id: int, column: str, enabled: bool) -> Non
 
 async def mems_get_cards_cache() -> Dict[str, str]:
     """filename -> file_id"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cur = await db.execute("SELECT file_name, file_id FROM mems_cards")
         rows = await cur.fetchall()
@@ -742,7 +1073,7 @@ async def mems_get_cards_cache() -> Dict[str, str]:
 
 async def mems_upsert_card(file_name: str, file_id: str) -> None:
     ts = datetime.utcnow().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             """
             INSERT INTO mems_cards (file_name, file_id, added_ts)
@@ -758,7 +1089,7 @@ async def mems_upsert_card(file_name: str, file_id: str) -> None:
 
 async def mems_load_games_state() -> Dict[str, Any]:
     """Повертає dict як у games_state.json (ключі — chat_id як str)."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cur = await db.execute("SELECT chat_id, state_json FROM mems_games_state")
         rows = await cur.fetchall()
@@ -773,7 +1104,7 @@ async def mems_load_games_state() -> Dict[str, Any]:
 
 async def mems_save_game_state(chat_id: int, state: Dict[str, Any]) -> None:
     ts = datetime.utcnow().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             """
             INSERT INTO mems_games_state (chat_id, state_json, updated_ts)
@@ -788,13 +1119,13 @@ async def mems_save_game_state(chat_id: int, state: Dict[str, Any]) -> None:
 
 
 async def mems_delete_game_state(chat_id: int) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute("DELETE FROM mems_games_state WHERE chat_id = ?", (chat_id,))
         await db.commit()
 
 
 async def mems_get_global_stats() -> Dict[str, Any]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cur = await db.execute(
             """
@@ -816,7 +1147,7 @@ async def mems_get_global_stats() -> Dict[str, Any]:
 
 
 async def mems_get_situations() -> List[str]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cur = await db.execute("SELECT text FROM mems_situations")
         rows = await cur.fetchall()
     return [r[0] for r in rows]
@@ -825,7 +1156,7 @@ async def mems_get_situations() -> List[str]:
 async def mems_insert_situations_if_empty(texts: List[str]) -> None:
     if not texts:
         return
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cur = await db.execute("SELECT COUNT(1) FROM mems_situations")
         (cnt,) = await cur.fetchone()
         if cnt and int(cnt) > 0:
@@ -839,7 +1170,7 @@ async def mems_insert_situations_if_empty(texts: List[str]) -> None:
 
 # --- (Розділ Фільтру Слів) ---
 async def add_filtered_word(chat_id: int, word: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR IGNORE INTO filtered_words (chat_id, word) VALUES (?, ?)",
             (chat_id, word.lower()),
@@ -847,7 +1178,7 @@ async def add_filtered_word(chat_id: int, word: str):
         await db.commit()
 
 async def remove_filtered_word(chat_id: int, word: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "DELETE FROM filtered_words WHERE chat_id = ? AND word = ?",
             (chat_id, word.lower()),
@@ -855,7 +1186,7 @@ async def remove_filtered_word(chat_id: int, word: str):
         await db.commit()
 
 async def get_filtered_words(chat_id: int) -> List[str]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT word FROM filtered_words WHERE chat_id = ?",
             (chat_id,),
@@ -865,7 +1196,7 @@ async def get_filtered_words(chat_id: int) -> List[str]:
 
 # --- (Розділ Попереджень) ---
 async def add_user_warn(chat_id: int, user_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             """
             INSERT INTO chat_warnings (chat_id, user_id, warn_count)
@@ -884,7 +1215,7 @@ async def add_user_warn(chat_id: int, user_id: int) -> int:
         return row[0] if row else 0
 
 async def get_user_warns(chat_id: int, user_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT warn_count FROM chat_warnings WHERE chat_id = ? AND user_id = ?",
             (chat_id, user_id),
@@ -893,7 +1224,7 @@ async def get_user_warns(chat_id: int, user_id: int) -> int:
     return row[0] if row else 0
 
 async def reset_user_warns(chat_id: int, user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "UPDATE chat_warnings SET warn_count = 0 WHERE chat_id = ? AND user_id = ?",
             (chat_id, user_id),
@@ -905,7 +1236,7 @@ async def reset_user_warns(chat_id: int, user_id: int):
 async def get_all_chats(
     page_offset: int = 0, page_size: Optional[int] = None
 ) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         query = "SELECT * FROM chat_settings ORDER BY chat_title"
         params = []
@@ -917,19 +1248,19 @@ async def get_all_chats(
     return [dict(row) for row in rows]
 
 async def get_total_chats_count() -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute("SELECT COUNT(DISTINCT chat_id) FROM chat_settings")
         count = (await cursor.fetchone())[0]
     return count
 
 async def get_total_users() -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute("SELECT COUNT(DISTINCT user_id) FROM user_data")
         count = (await cursor.fetchone())[0]
     return count
 
 async def get_all_user_ids() -> List[int]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute("SELECT user_id FROM user_data")
         rows = await cursor.fetchall()
     return [row[0] for row in rows]
@@ -937,7 +1268,7 @@ async def get_all_user_ids() -> List[int]:
 async def get_all_users_info(
     page_offset: int = 0, page_size: Optional[int] = None
 ) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         query = "SELECT user_id, balance, is_banned, username, first_name, last_name FROM user_data ORDER BY first_name"
         params = []
@@ -949,7 +1280,7 @@ async def get_all_users_info(
     return [dict(row) for row in rows]
 
 async def get_users_in_chat(chat_id: int) -> List[int]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT DISTINCT user_id FROM conversations WHERE chat_id = ?",
             (chat_id,),
@@ -957,8 +1288,220 @@ async def get_users_in_chat(chat_id: int) -> List[int]:
         rows = await cursor.fetchall()
     return [row[0] for row in rows]
 
+
+# --- (Розділ Розсилок) ---
+async def create_broadcast_job(owner_id: int, from_chat_id: int, message_id: int) -> Dict[str, Any]:
+    """Створює задачу розсилки з усіма досяжними чатами та користувачами (крім власника)."""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """
+            INSERT INTO broadcast_jobs (owner_id, from_chat_id, message_id, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (owner_id, from_chat_id, message_id, datetime.now().isoformat()),
+        )
+        job_id = cursor.lastrowid
+        cursor = await db.execute(
+            """
+            INSERT OR IGNORE INTO broadcast_targets (job_id, chat_id)
+            SELECT ?, id FROM (
+                SELECT chat_id AS id FROM chat_settings
+                UNION
+                SELECT user_id FROM user_data
+            )
+            WHERE id != ? AND id NOT IN (SELECT chat_id FROM unreachable_chats)
+            """,
+            (job_id, owner_id),
+        )
+        await db.execute(
+            "UPDATE broadcast_jobs SET total = ? WHERE job_id = ?",
+            (cursor.rowcount, job_id),
+        )
+        await db.commit()
+        cursor = await db.execute("SELECT * FROM broadcast_jobs WHERE job_id = ?", (job_id,))
+        row = await cursor.fetchone()
+    return dict(row)
+
+
+async def get_running_broadcast_jobs() -> List[Dict[str, Any]]:
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY job_id"
+        )
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+
+async def get_broadcast_pending_page(job_id: int, after: Optional[int], limit: int) -> List[int]:
+    """Наступна сторінка адресатів після курсора, яким ще нічого не надіслано."""
+    async with _connect() as db:
+        cursor = await db.execute(
+            """
+            SELECT chat_id FROM broadcast_targets
+            WHERE job_id = ? AND status = 'pending' AND (? IS NULL OR chat_id > ?)
+            ORDER BY chat_id
+            LIMIT ?
+            """,
+            (job_id, after, after, limit),
+        )
+        rows = await cursor.fetchall()
+    return [row[0] for row in rows]
+
+
+async def set_broadcast_target_status(
+    job_id: int, chat_id: int, status: str, error: Optional[str] = None
+) -> None:
+    async with _connect() as db:
+        await db.execute(
+            "UPDATE broadcast_targets SET status = ?, error = ? WHERE job_id = ? AND chat_id = ?",
+            (status, error, job_id, chat_id),
+        )
+        await db.commit()
+
+
+async def update_broadcast_job(job_id: int, **fields: Any) -> None:
+    """Оновлює курсор, статус чи повідомлення прогресу задачі розсилки."""
+    allowed = {"status", "cursor", "progress_chat_id", "progress_message_id", "finished_at"}
+    fields = {k: v for k, v in fields.items() if k in allowed}
+    if not fields:
+        return
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    async with _connect() as db:
+        await db.execute(
+            f"UPDATE broadcast_jobs SET {assignments} WHERE job_id = ?",
+            (*fields.values(), job_id),
+        )
+        await db.commit()
+
+
+async def get_broadcast_counts(job_id: int) -> Dict[str, int]:
+    async with _connect() as db:
+        cursor = await db.execute(
+            "SELECT status, COUNT(*) FROM broadcast_targets WHERE job_id = ? GROUP BY status",
+            (job_id,),
+        )
+        rows = await cursor.fetchall()
+    return {status: count for status, count in rows}
+
+
+async def mark_chat_unreachable(chat_id: int, reason: str) -> None:
+    async with _connect() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO unreachable_chats (chat_id, reason, marked_at) VALUES (?, ?, ?)",
+            (chat_id, reason, datetime.now().isoformat()),
+        )
+        await db.commit()
+
+
+async def unmark_chat_unreachable(chat_id: int) -> None:
+    async with _connect() as db:
+        await db.execute("DELETE FROM unreachable_chats WHERE chat_id = ?", (chat_id,))
+        await db.commit()
+
+
+async def get_unreachable_chat_ids() -> List[int]:
+    async with _connect() as db:
+        cursor = await db.execute("SELECT chat_id FROM unreachable_chats")
+        rows = await cursor.fetchall()
+    return [row[0] for row in rows]
+
+
+# --- (Розділ Автовидалення Повідомлень) ---
+async def get_scheduled_deletions() -> List[Dict[str, Any]]:
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT chat_id, message_id, due_at, fallback_text FROM scheduled_deletions"
+        )
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+async def apply_scheduled_deletions(
+    upserts: List[tuple], removals: List[tuple]
+) -> None:
+    """Одна транзакція: upserts — (chat_id, message_id, due_at, fallback_text), removals — (chat_id, message_id)."""
+    if not upserts and not removals:
+        return
+    async with _connect() as db:
+        if upserts:
+            await db.executemany(
+                "INSERT OR REPLACE INTO scheduled_deletions (chat_id, message_id, due_at, fallback_text) "
+                "VALUES (?, ?, ?, ?)",
+                upserts,
+            )
+        if removals:
+            await db.executemany(
+                "DELETE FROM scheduled_deletions WHERE chat_id = ? AND message_id = ?",
+                removals,
+            )
+        await db.commit()
+
+# --- (Розділ Persistence PTB) ---
+PERSISTENCE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS ptb_persistence (
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        keys TEXT NOT NULL DEFAULT '[]',
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (kind, key)
+    )
+"""
+
+async def ensure_persistence_table() -> None:
+    """Persistence читається в Application.initialize — раніше за init_db у post_init."""
+    async with _connect() as db:
+        await db.execute(PERSISTENCE_TABLE_SQL)
+        await db.commit()
+
+async def get_persistence_index(kind: str) -> List[Dict[str, Any]]:
+    """Ключі, список верхньорівневих ключів і розмір — без самих даних."""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT key, keys, size, updated_at FROM ptb_persistence WHERE kind = ?", (kind,)
+        )
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+async def get_persistence_rows(kind: str, keys: Optional[List[str]] = None) -> Dict[str, bytes]:
+    """Дані рядків kind (усіх або лише keys)."""
+    async with _connect() as db:
+        if keys is None:
+            cursor = await db.execute("SELECT key, value FROM ptb_persistence WHERE kind = ?", (kind,))
+            rows = await cursor.fetchall()
+        else:
+            rows = []
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                cursor = await db.execute(
+                    f"SELECT key, value FROM ptb_persistence WHERE kind = ? AND key IN ({','.join('?' * len(chunk))})",
+                    (kind, *chunk),
+                )
+                rows.extend(await cursor.fetchall())
+    return {row[0]: row[1] for row in rows}
+
+async def apply_persistence_changes(upserts: List[tuple], removals: List[tuple]) -> None:
+    """Одна транзакція: upserts — (kind, key, keys_json, value, size, updated_at), removals — (kind, key)."""
+    if not upserts and not removals:
+        return
+    async with _connect() as db:
+        if upserts:
+            await db.executemany(
+                "INSERT OR REPLACE INTO ptb_persistence (kind, key, keys, value, size, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                upserts,
+            )
+        if removals:
+            await db.executemany("DELETE FROM ptb_persistence WHERE kind = ? AND key = ?", removals)
+        await db.commit()
+
+# --- (Розділ Передбачень) ---
 async def set_daily_prediction(user_id: int, prediction: str, date: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR REPLACE INTO daily_predictions (user_id, prediction_text, date) VALUES (?, ?, ?)",
             (user_id, prediction, date),
@@ -966,7 +1509,7 @@ async def set_daily_prediction(user_id: int, prediction: str, date: str):
         await db.commit()
 
 async def get_daily_prediction(user_id: int, date: str) -> Optional[str]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT prediction_text FROM daily_predictions WHERE user_id = ? AND date = ?",
             (user_id, date),
@@ -976,7 +1519,10 @@ async def get_daily_prediction(user_id: int, date: str) -> Optional[str]:
 
 # --- (Розділ Глобального AI) ---
 async def get_global_ai_status() -> bool:
-    async with aiosqlite.connect(DB_PATH) as db:
+    return await request_context.memoized("global_ai_status", None, _load_global_ai_status)
+
+async def _load_global_ai_status() -> bool:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT setting_value FROM global_settings WHERE setting_name = 'global_ai_enabled'"
         )
@@ -984,16 +1530,45 @@ async def get_global_ai_status() -> bool:
     return bool(int(row[0])) if row and row[0] is not None else True
 
 async def set_global_ai_status(enabled: bool):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR REPLACE INTO global_settings (setting_name, setting_value) VALUES (?, ?)",
             ("global_ai_enabled", str(int(enabled))),
         )
         await db.commit()
+    request_context.forget("global_ai_status")
+
+# --- (Розділ Лімітів AI) ---
+AI_RATE_LIMIT_KEYS = ("user_per_min", "user_burst", "chat_per_min", "chat_burst")
+
+async def get_ai_rate_limits() -> Dict[str, float]:
+    """Ліміти, змінені власником. Відсутні ключі — значення з env за замовчуванням."""
+    names = [f"ai_rl_{key}" for key in AI_RATE_LIMIT_KEYS]
+    async with _connect() as db:
+        cursor = await db.execute(
+            f"SELECT setting_name, setting_value FROM global_settings WHERE setting_name IN ({','.join('?' * len(names))})",
+            names,
+        )
+        rows = await cursor.fetchall()
+    limits = {}
+    for name, value in rows:
+        try:
+            limits[name[len("ai_rl_"):]] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return limits
+
+async def set_ai_rate_limits(limits: Dict[str, float]):
+    async with _connect() as db:
+        await db.executemany(
+            "INSERT OR REPLACE INTO global_settings (setting_name, setting_value) VALUES (?, ?)",
+            [(f"ai_rl_{key}", str(limits[key])) for key in AI_RATE_LIMIT_KEYS if key in limits],
+        )
+        await db.commit()
 
 # --- (Розділ Глобального Моду Бота) ---
 async def get_global_bot_mode() -> str:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT setting_value FROM global_settings WHERE setting_name = 'global_bot_mode'"
         )
@@ -1005,7 +1580,7 @@ async def set_global_bot_mode(mode_name: str):
         logger.warning(f"Спроба встановити неіснуючий мод: {mode_name}")
         return
         
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "INSERT OR REPLACE INTO global_settings (setting_name, setting_value) VALUES (?, ?)",
             ("global_bot_mode", mode_name),
@@ -1043,7 +1618,7 @@ async def update_game_stats(
         vs_column = "wins_vs_bot" if is_vs_bot else "wins_vs_human"
         vs_column_update_sql = f", {vs_column} = {vs_column} + 1"
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             f"""
             INSERT INTO game_stats (user_id, chat_id, game_name, {column_to_update})
@@ -1059,7 +1634,7 @@ async def admin_set_game_stats(
     user_id: int, chat_id: int, game_name: str, wins: int, losses: int, draws: int
 ):
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             """
             INSERT INTO game_stats (user_id, chat_id, game_name, wins, losses, draws, wins_vs_bot, wins_vs_human)
@@ -1083,7 +1658,7 @@ async def get_game_stats(
     if chat_id:
         query += " AND chat_id = ?"
         params.append(chat_id)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(query, tuple(params))
         row = await cursor.fetchone()
@@ -1101,7 +1676,7 @@ async def get_game_stats(
 async def get_chat_game_top(
     chat_id: int, game_name: str, limit: int = 10, offset: int = 0
 ) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
@@ -1117,7 +1692,7 @@ async def get_chat_game_top(
     return [dict(row) for row in rows]
 
 async def get_chat_game_top_count(chat_id: int, game_name: str) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT COUNT(DISTINCT user_id) FROM game_stats WHERE chat_id = ? AND game_name = ?",
             (chat_id, game_name),
@@ -1128,7 +1703,7 @@ async def get_chat_game_top_count(chat_id: int, game_name: str) -> int:
 async def get_global_game_top(
     game_name: str, limit: int = 10
 ) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
@@ -1157,7 +1732,7 @@ async def ensure_user_data(
     Записує користувача в БД.
     Оптимізація: не робить UPDATE, якщо дані не змінилися.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         
         # 1. Спробуємо знайти користувача
@@ -1197,7 +1772,7 @@ async def ensure_user_data(
 
 async def get_user_balance(user_id: int) -> int:
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT balance FROM user_data WHERE user_id = ?", (user_id,)
         )
@@ -1206,12 +1781,13 @@ async def get_user_balance(user_id: int) -> int:
 
 async def update_user_balance(user_id: int, amount: int):
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "UPDATE user_data SET balance = balance + ? WHERE user_id = ?",
             (amount, user_id),
         )
         await db.commit()
+    request_context.forget("user_profile", user_id)
 
 
 async def transfer_user_balance_atomic(from_user_id: int, to_user_id: int, amount: int) -> bool:
@@ -1233,7 +1809,7 @@ async def transfer_user_balance_atomic(from_user_id: int, to_user_id: int, amoun
     await ensure_user_data(from_user_id, None, None, None, update_names=False)
     await ensure_user_data(to_user_id, None, None, None, update_names=False)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         try:
             await db.execute("PRAGMA foreign_keys = ON")
             # IMMEDIATE → одразу беремо write-lock, щоб уникнути гонок
@@ -1255,6 +1831,8 @@ async def transfer_user_balance_atomic(from_user_id: int, to_user_id: int, amoun
             )
 
             await db.commit()
+            request_context.forget("user_profile", from_user_id)
+            request_context.forget("user_profile", to_user_id)
             return True
         except Exception:
             try:
@@ -1282,7 +1860,7 @@ async def add_mandarin_duel_stats(
     if eaten_delta == 0 and wins_delta == 0 and played_delta == 0:
         return
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             """
             UPDATE user_data
@@ -1295,9 +1873,10 @@ async def add_mandarin_duel_stats(
             (int(eaten_delta), int(wins_delta), int(played_delta), user_id),
         )
         await db.commit()
+    request_context.forget("user_profile", user_id)
 
 async def get_top_balances(limit: int = 10) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT user_id, balance, first_name, username FROM user_data ORDER BY balance DESC LIMIT ?",
@@ -1308,7 +1887,7 @@ async def get_top_balances(limit: int = 10) -> List[Dict[str, Any]]:
 
 async def get_user_info(user_id: int) -> Optional[Dict[str, Any]]:
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT user_id, balance, is_banned, username, first_name, last_name FROM user_data WHERE user_id = ?",
@@ -1319,7 +1898,7 @@ async def get_user_info(user_id: int) -> Optional[Dict[str, Any]]:
 
 async def ban_user(user_id: int):
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "UPDATE user_data SET is_banned = 1 WHERE user_id = ?", (user_id,)
         )
@@ -1327,7 +1906,7 @@ async def ban_user(user_id: int):
 
 async def unban_user(user_id: int):
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "UPDATE user_data SET is_banned = 0 WHERE user_id = ?", (user_id,)
         )
@@ -1338,7 +1917,7 @@ async def is_user_banned(user_id: int) -> bool:
     return user_info["is_banned"] == 1 if user_info else False
 
 async def get_banned_users() -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT user_id, first_name, username FROM user_data WHERE is_banned = 1"
@@ -1347,7 +1926,7 @@ async def get_banned_users() -> List[Dict[str, Any]]:
     return [dict(row) for row in rows]
 
 async def get_bot_stats() -> Dict[str, Any]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor_messages = await db.execute("SELECT COUNT(*) FROM conversations")
         total_messages = (await cursor_messages.fetchone())[0]
@@ -1393,7 +1972,7 @@ async def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
     if not username:
         return None
     username_clean = username.replace('@', '')
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT user_id, balance, is_banned, username, first_name, last_name FROM user_data WHERE username = ? COLLATE NOCASE",
@@ -1402,9 +1981,24 @@ async def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
         row = await cursor.fetchone()
     return dict(row) if row else None
 
+async def get_user_names(user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Імена користувачів з `user_data` одним запитом: {user_id: {username, first_name, last_name}}."""
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+    placeholders = ",".join("?" * len(ids))
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"SELECT user_id, username, first_name, last_name FROM user_data WHERE user_id IN ({placeholders})",
+            ids,
+        )
+        rows = await cursor.fetchall()
+    return {row["user_id"]: dict(row) for row in rows}
+
 # --- (Розділ Шлюбів) ---
 async def get_marriage_by_user_id(user_id: int) -> Optional[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM marriages WHERE user1_id = ? OR user2_id = ?",
@@ -1416,7 +2010,7 @@ async def get_marriage_by_user_id(user_id: int) -> Optional[Dict[str, Any]]:
 async def create_marriage(user1_id: int, user2_id: int, date_str: str):
     if user1_id > user2_id:
         user1_id, user2_id = user2_id, user1_id
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         try:
             await db.execute(
                 "INSERT INTO marriages (user1_id, user2_id, marriage_date) VALUES (?, ?, ?)",
@@ -1431,7 +2025,7 @@ async def create_marriage(user1_id: int, user2_id: int, date_str: str):
             raise
 
 async def delete_marriage_by_user_id(user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "DELETE FROM marriages WHERE user1_id = ? OR user2_id = ?",
             (user_id, user_id),
@@ -1450,7 +2044,7 @@ async def add_reminder(
     recur_interval: Optional[str] = None, 
 ) -> Optional[int]:
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             cursor = await db.execute(
                 "INSERT INTO reminders (user_id, chat_id, message_text, reminder_time, job_name, recur_interval, creator_user_id, target_user_id, delivery_chat_id, created_in_chat_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
                 (user_id, chat_id, message_text, reminder_time, job_name, recur_interval, user_id, user_id, chat_id, chat_id, 'ACTIVE'),
@@ -1462,14 +2056,14 @@ async def add_reminder(
         return None
 
 async def set_reminder_job_name(reminder_id: int, job_name: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "UPDATE reminders SET job_name = ? WHERE id = ?", (job_name, reminder_id)
         )
         await db.commit()
 
 async def get_user_reminders_count(user_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT COUNT(*) FROM reminders WHERE user_id = ?", (user_id,)
         )
@@ -1477,7 +2071,7 @@ async def get_user_reminders_count(user_id: int) -> int:
     return count
 
 async def get_user_reminders(user_id: int) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT id, message_text, reminder_time, recur_interval FROM reminders WHERE user_id = ? ORDER BY reminder_time ASC",
@@ -1487,7 +2081,7 @@ async def get_user_reminders(user_id: int) -> List[Dict[str, Any]]:
     return [dict(row) for row in rows]
 
 async def get_reminder(reminder_id: int) -> Optional[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM reminders WHERE id = ?", (reminder_id,)
@@ -1496,25 +2090,82 @@ async def get_reminder(reminder_id: int) -> Optional[Dict[str, Any]]:
     return dict(row) if row else None
 
 async def get_all_reminders() -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute("SELECT * FROM reminders")
         rows = await cursor.fetchall()
     return [dict(row) for row in rows]
 
+async def get_active_reminders_until(until_iso: str) -> List[Dict[str, Any]]:
+    """Активні нагадування з часом до until_iso (UTC ISO) — по індексу (status, reminder_time)."""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT id, reminder_time FROM reminders WHERE status = 'ACTIVE' AND reminder_time <= ? "
+            "ORDER BY reminder_time",
+            (until_iso,),
+        )
+        rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+async def claim_due_reminders(until_iso: str, limit: int = 500) -> List[Dict[str, Any]]:
+    """
+    Забирає настані нагадування одним UPDATE … RETURNING: ACTIVE -> FIRING.
+    Забране не підхопить ні повторний тік, ні доповнення двигуна; результат
+    доставки записує finish_reminders.
+    """
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "UPDATE reminders SET status = 'FIRING' WHERE id IN ("
+            "SELECT id FROM reminders WHERE status = 'ACTIVE' AND reminder_time <= ? "
+            "ORDER BY reminder_time LIMIT ?) RETURNING *",
+            (until_iso, limit),
+        )
+        rows = await cursor.fetchall()
+        await db.commit()
+    return [dict(row) for row in rows]
+
+async def release_claimed_reminders() -> int:
+    """FIRING -> ACTIVE: доставку, перервану рестартом, повторимо."""
+    async with _connect() as db:
+        cursor = await db.execute("UPDATE reminders SET status = 'ACTIVE' WHERE status = 'FIRING'")
+        await db.commit()
+        return cursor.rowcount
+
+async def finish_reminders(
+    removed: List[int],
+    rescheduled: List[Tuple[int, str]],
+    suppressed: List[int],
+) -> None:
+    """Підсумок пакета доставок однією транзакцією."""
+    async with _connect() as db:
+        if removed:
+            await db.executemany("DELETE FROM reminders WHERE id = ?", [(rid,) for rid in removed])
+        if rescheduled:
+            await db.executemany(
+                "UPDATE reminders SET reminder_time = ?, job_name = ?, status = 'ACTIVE' WHERE id = ?",
+                [(when_iso, f"reminder_{rid}", rid) for rid, when_iso in rescheduled],
+            )
+        if suppressed:
+            await db.executemany(
+                "UPDATE reminders SET status = 'SUPPRESSED' WHERE id = ?", [(rid,) for rid in suppressed]
+            )
+        await db.commit()
+
 async def remove_reminder(reminder_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
         await db.commit()
     logger.info(f"Видалено нагадування (ID: {reminder_id}) з БД.")
 
 async def remove_reminder_by_job_name(job_name: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute("DELETE FROM reminders WHERE job_name = ?", (job_name,))
         await db.commit()
 
 async def update_reminder_time_and_job(reminder_id: int, new_time_iso: str, new_job_name: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "UPDATE reminders SET reminder_time = ?, job_name = ? WHERE id = ?",
             (new_time_iso, new_job_name, reminder_id)
@@ -1522,12 +2173,12 @@ async def update_reminder_time_and_job(reminder_id: int, new_time_iso: str, new_
         await db.commit()
 
 async def set_reminder_status(reminder_id: int, status: str) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute("UPDATE reminders SET status = ? WHERE id = ?", (status, reminder_id))
         await db.commit()
 
 async def get_reminders_by_delivery_chat(chat_id: int, statuses: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         if statuses:
             placeholders = ",".join("?" for _ in statuses)
@@ -1544,7 +2195,7 @@ async def get_reminders_by_delivery_chat(chat_id: int, statuses: Optional[List[s
     return [dict(r) for r in rows]
 
 async def set_reminders_status_by_delivery_chat(chat_id: int, status: str, prev_statuses: Optional[List[str]] = None) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         if prev_statuses:
             placeholders = ",".join("?" for _ in prev_statuses)
             await db.execute(
@@ -1561,7 +2212,7 @@ async def set_reminders_status_by_delivery_chat(chat_id: int, status: str, prev_
 
 # --- (Розділ Дрочок) ---
 async def increment_jerk_count(user_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "UPDATE jerk_stats SET total_jerks = total_jerks + 1 WHERE user_id = ?",
             (user_id,)
@@ -1581,7 +2232,7 @@ async def increment_jerk_count(user_id: int) -> int:
         return row[0] if row else 0
 
 async def get_jerk_count(user_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute(
             "SELECT total_jerks FROM jerk_stats WHERE user_id = ?",
             (user_id,)
@@ -1590,7 +2241,7 @@ async def get_jerk_count(user_id: int) -> int:
         return row[0] if row else 0
 
 async def get_top_jerkers(limit: int = 10) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT user_id, total_jerks FROM jerk_stats ORDER BY total_jerks DESC LIMIT ?",
@@ -1605,8 +2256,13 @@ async def get_top_jerkers(limit: int = 10) -> List[Dict[str, Any]]:
 
 async def get_user_profile(user_id: int) -> Dict[str, Any]:
     """Повертає профіль користувача (gender, city, quote, balance + статистика ігор)."""
+    profile = await request_context.memoized("user_profile", user_id, lambda: _load_user_profile(user_id))
+    return dict(profile)
+
+
+async def _load_user_profile(user_id: int) -> Dict[str, Any]:
     await ensure_user_data(user_id, None, None, None, update_names=False)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
@@ -1656,9 +2312,10 @@ async def update_user_profile(
         return
     set_sql = ", ".join([f"{k} = ?" for k in fields.keys()])
     params = list(fields.values()) + [user_id]
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(f"UPDATE user_data SET {set_sql} WHERE user_id = ?", tuple(params))
         await db.commit()
+    request_context.forget("user_profile", user_id)
 
 
 # --- (НОВЕ) Новорічний режим ---
@@ -1667,17 +2324,18 @@ async def set_new_year_mode(chat_id: int, mode: str) -> None:
     mode = (mode or "auto").lower().strip()
     if mode not in ("auto", "on", "off"):
         mode = "auto"
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         # гарантуємо, що рядок існує
         await db.execute("INSERT OR IGNORE INTO chat_settings (chat_id) VALUES (?)", (chat_id,))
         await db.execute("UPDATE chat_settings SET new_year_mode = ? WHERE chat_id = ?", (mode, chat_id))
         await db.commit()
+    request_context.forget("chat_settings", chat_id)
 
 
 
 async def mems_update_global_stats(user_id: int, chat_id: int, name: str, is_win: bool = False, score_add: int = 0, games_played_add: int = 0):
     """Оновлює глобальну статистику для гри 'Мемчики та котики'."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         # Спочатку перевіряємо, чи існує запис
         cursor = await db.execute(
             "SELECT wins, total_score, games_played FROM mems_global_stats WHERE user_id = ? AND chat_id = ?",
@@ -1708,7 +2366,7 @@ async def mems_update_global_stats(user_id: int, chat_id: int, name: str, is_win
 
 async def mems_get_global_stats() -> Dict[str, Dict[str, Any]]:
     """Повертає глобальну статистику у форматі {user_id: stats_dict} для сумісності з raw грою."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
@@ -1745,7 +2403,7 @@ async def mems_get_global_stats() -> Dict[str, Dict[str, Any]]:
 
 
 async def mems_get_top(limit: int = 10, chat_id: Optional[int] = None) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         if chat_id is None:
             # Global top: aggregate across all chats
@@ -1788,7 +2446,7 @@ async def mems_get_top(limit: int = 10, chat_id: Optional[int] = None) -> List[D
 
 async def get_new_year_mode(chat_id: int) -> str:
     """Повертає режим нового року для чату: 'auto' | 'on' | 'off'."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cursor = await db.execute("SELECT new_year_mode FROM chat_settings WHERE chat_id = ?", (chat_id,))
         row = await cursor.fetchone()
     if not row or row[0] is None:
@@ -27,13 +27,13 @@ from telegram.ext import (
     MessageHandler,
 )
 from telegram.constants import ParseMode
-from telegram.error import BadRequest
 
 # Припускаємо, що ці функції існують у вашому модулі database.py
 import bot.core.database as database
 # Додаємо імпорт функції перевірки
 from bot.handlers.chat_admin_handlers import is_chat_module_enabled
 # (НОВЕ) Імпортуємо динамічну функцію для отримання вартості одруження
+from bot.services.user_directory import UserEntry, user_directory
 from bot.utils.utils import get_marriage_cost, get_user_addressing
 
 logger = logging.getLogger(__name__)
@@ -80,7 +80,6 @@ MSG_DIVORCE_CANCEL = "Мур! 💖 Хух, це було близько! Чуд
 MSG_TARGET_NOT_FOUND = "Мяу! Вкажіть @username або дайте відповідь на повідомлення."
 MSG_TARGET_GROUP = "Мяу... Здається, {} - це не котик, а ціла група! 😿"
 MSG_TARGET_DB_NOT_FOUND = "Мяу... Я не можу знайти котика з ніком @{}. 😿"
-MSG_TARGET_API_ERROR = "Мяу... Не можу зв'язатися з @{}. 😿"
 
 # === Допоміжні функції ===
 
@@ -109,29 +108,19 @@ async def get_target_user(
             await update.message.reply_text(MSG_TARGET_NOT_FOUND)
             return None
 
-        # Шукаємо користувача в базі (найнадійніший спосіб)
-        user_data = await database.get_user_by_username(username)
-        if not user_data:
+        # Шукаємо користувача в локальному довіднику (пам'ять + БД), без get_chat
+        entry = await user_directory.find_by_username(username)
+        if not entry:
             await update.message.reply_text(MSG_TARGET_DB_NOT_FOUND.format(username))
             return None
 
-        target_id = user_data["user_id"]
-
-        try:
-            # get_chat() - найнадійніший спосіб отримати об'єкт за ID
-            chat_obj = await context.bot.get_chat(target_id)
-
-            if target_id == context.bot.id:
-                target_user = await context.bot.get_me()
-            elif chat_obj.type == 'private':
-                target_user = chat_obj  # Це користувач
-            else:
-                await update.message.reply_text(MSG_TARGET_GROUP.format(f"@{username}"))
-                return None
-        except BadRequest as e:
-            logger.error(f"Не вдалося отримати chat_obj для @{username} (ID: {target_id}): {e}")
-            await update.message.reply_text(MSG_TARGET_API_ERROR.format(username))
+        if entry.id == context.bot.id:
+            target_user = context.bot.bot
+        elif entry.id < 0:
+            await update.message.reply_text(MSG_TARGET_GROUP.format(f"@{username}"))
             return None
+        else:
+            target_user = entry.to_user()
     else:
         await update.message.reply_text(MSG_TARGET_NOT_FOUND)
         return None
@@ -148,16 +137,9 @@ async def send_marriage_certificate(
         logger.warning(f"Не знайдено шлюб для {user1_id} при відправці свідоцтва")
         return
 
-    try:
-        user1 = await context.bot.get_chat(user1_id)
-        user2 = await context.bot.get_chat(user2_id)
-    except BadRequest as e:
-        logger.error(f"Не вдалося отримати інфо про {user1_id} або {user2_id}: {e}")
-        await update.effective_message.reply_text("Мяу... Не можу отримати інформацію про пару, але вітаю!")
-        return
-
-    user1_mention = get_user_mention(user1)
-    user2_mention = get_user_mention(user2)
+    users = await user_directory.get_many([user1_id, user2_id], bot=context.bot)
+    user1_mention = get_user_mention(users.get(user1_id) or UserEntry(id=user1_id))
+    user2_mention = get_user_mention(users.get(user2_id) or UserEntry(id=user2_id))
 
     try:
         marriage_date = datetime.fromisoformat(marriage["marriage_date"]).strftime("%d.%m.%Y")
@@ -313,12 +295,8 @@ async def marriage_button_callback(update: Update, context: ContextTypes.DEFAULT
     if proposal_id in context.chat_data:
         del context.chat_data[proposal_id]
 
-    try:
-        proposer = await context.bot.get_chat(from_id)
-        target = await context.bot.get_chat(to_id)
-    except BadRequest:
-        await query.edit_message_text("Мяу... Не можу знайти одного з котиків. 😿", reply_markup=None)
-        return
+    proposer = await user_directory.resolve(from_id, bot=context.bot)
+    target = user_who_clicked
 
     if action == "accept":
         # === ПРИЙНЯТИ ===
@@ -424,11 +402,8 @@ async def divorce_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     partner_id = marriage["user2_id"] if marriage["user1_id"] == user.id else marriage["user1_id"]
     
-    try:
-        partner = await context.bot.get_chat(partner_id)
-        partner_name = get_user_mention(partner)
-    except BadRequest:
-        partner_name = f"котиком з ID {partner_id}"
+    partner = await user_directory.get(partner_id, bot=context.bot)
+    partner_name = get_user_mention(partner) if partner else f"котиком з ID {partner_id}"
 
     keyboard = [
         [
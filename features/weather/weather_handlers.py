@@ -11,6 +11,7 @@ import asyncio
 import logging
 import os
 import re
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional, Tuple, List
 
@@ -22,6 +23,9 @@ from telegram.constants import ParseMode
 from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, filters
 
 from bot.core.database import get_user_profile
+from bot.services.chat_actions import chat_actions
+from bot.services.message_deleter import message_deleter
+from bot.services.state_gc import state_collector
 from bot.utils.utils import (
     AddressingContext,
     cancel_auto_close,
@@ -53,6 +57,12 @@ CB_WEATHER_TODAY_PREFIX = "weather:today:"
 
 # Зберігаємо контекст погоди для кнопок (по message_id)
 WEATHER_STATE_KEY = "weather_state"
+# Кнопки під старими екранами погоди після цього вже не оживають
+WEATHER_STATE_TTL_SECONDS = 3 * 24 * 3600
+
+state_collector.register(
+    "chat", WEATHER_STATE_KEY, WEATHER_STATE_TTL_SECONDS, items=True, stamp=lambda entry: entry.get("saved_at")
+)
 
 
 async def _arm_weather_auto_close(context: ContextTypes.DEFAULT_TYPE, message) -> None:
@@ -72,19 +82,6 @@ async def _arm_weather_auto_close(context: ContextTypes.DEFAULT_TYPE, message) -
     if settings.get("auto_delete_actions", 0) == 1:
         start_auto_close(context, WEATHER_AUTO_CLOSE_KEY, timeout=420)  # 7 minutes
 
-async def delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_data = getattr(context.job, "data", {}) if context.job else {}
-    chat_id = job_data.get("chat_id")
-    message_id = job_data.get("message_id")
-    if not chat_id or not message_id:
-        return
-    try:
-        bot = getattr(context, "bot", None) or context.application.bot
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
-
 async def _schedule_weather_auto_delete(
     context: ContextTypes.DEFAULT_TYPE,
     *,
@@ -98,12 +95,7 @@ async def _schedule_weather_auto_delete(
     settings = await get_chat_settings(chat_id)
     if settings.get("auto_delete_actions", 0) != 1:
         return
-    context.job_queue.run_once(
-        delete_message_job,
-        timeout,
-        data={"chat_id": chat_id, "message_id": message_id},
-        name=f"delete_weather_{chat_id}_{message_id}",
-    )
+    message_deleter.schedule(chat_id, message_id, timeout)
 
 
 
@@ -1039,6 +1031,7 @@ def _remember_weather_state(
         "lat": float(geo[0]),
         "lon": float(geo[1]),
         "label": geo[2],
+        "saved_at": time.time(),
     }
 
 
@@ -1098,7 +1091,8 @@ async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await _ask_city(update, ctx_user)
         return
 
-    response = await _build_response(update, context, mode, target_date, city_name, geo)
+    async with chat_actions.action(context.bot, update.effective_message.chat_id):
+        response = await _build_response(update, context, mode, target_date, city_name, geo)
     city_id = _make_city_id(geo[0], geo[1])
     show_nav = mode == "now"
     sent = await update.effective_message.reply_html(
@@ -1134,7 +1128,8 @@ async def weather_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     geo = (lat, lon, city_name)
     ctx_user = await get_user_addressing(update.effective_user.id) if update.effective_user else AddressingContext(None)
     # За UX — одразу показуємо «зараз», а «сьогодні» даємо кнопкою
-    response = await _build_response(update, context, "now", datetime.now(KYIV_TZ).date(), city_name, geo)
+    async with chat_actions.action(context.bot, update.effective_message.chat_id):
+        response = await _build_response(update, context, "now", datetime.now(KYIV_TZ).date(), city_name, geo)
     city_id = _make_city_id(lat, lon)
     sent = await update.effective_message.reply_html(
         response,
@@ -33,6 +33,7 @@ from telegram.helpers import mention_html
 from bot.core.database import get_user_balance, update_user_balance, transfer_user_balance_atomic, add_mandarin_duel_stats
 from bot.handlers.chat_admin_handlers import is_chat_module_enabled
 from bot.features.new_year_mode import is_new_year_mode, apply_new_year_style
+from bot.services.state_gc import state_collector
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +46,8 @@ COOLDOWN = 45        # seconds
 DUELS_KEY = "mandarin_duels"
 COOLDOWN_KEY = "mandarin_duel_cooldowns"
 
+state_collector.register("chat", COOLDOWN_KEY, COOLDOWN, items=True, stamp=lambda last_ts: last_ts)
+
 
 # -------- Тексти (варіативні) --------
 
@@ -530,7 +533,7 @@ async def stop_mandarin_duel_in_chat(chat_id: int, by_user_id: int, context: Con
 
 
 async def cleanup_mandarin_duels_after_restart(application: Application) -> None:
-    """Очищає завислі дуелі після рестарту (через PicklePersistence чат_data зберігається)."""
+    """Очищає завислі дуелі після рестарту (chat_data зберігається в persistence)."""
     try:
         now_ts = _now().timestamp()
         for chat_id, data in list(application.chat_data.items()):
@@ -34,6 +34,8 @@ from bot.core.database import (
     mems_insert_situations_if_empty,
     get_mems_settings_for_chat,
 )
+from bot.services.chat_actions import chat_actions, UPLOAD_PHOTO
+from bot.services.telegram_rate_limiter import bulk_priority
 
 
 logger = logging.getLogger(__name__)
@@ -188,30 +190,30 @@ async def _ensure_cards_cached(bot, chat_id: int, min_count: int = 30, silent: b
         random.shuffle(files)
 
         added = 0
-        for fn in files:
-            if fn in cache:
-                continue
-            path = ASSETS_MEMES_DIR / fn
-            try:
-                data = await asyncio.to_thread(path.read_bytes)
-                m = await bot.send_photo(chat_id, data, disable_notification=True)
-                file_id = m.photo[-1].file_id
-                await mems_upsert_card(fn, file_id)
-                cache[fn] = file_id
-                added += 1
-                # прибираємо технічне повідомлення
-                try:
-                    await m.delete()
-                except Exception:
-                    pass
-            except Exception:
-                continue
-
-            # легкий анти-флуд
-            await asyncio.sleep(1.0)
-
-            if len(cache) >= min_count:
-                break
+        # Один індикатор «надсилає фото» на весь цикл; темп завантаження задає спільний rate limiter
+        with bulk_priority():
+            async with chat_actions.action(bot, chat_id, UPLOAD_PHOTO):
+                for fn in files:
+                    if fn in cache:
+                        continue
+                    path = ASSETS_MEMES_DIR / fn
+                    try:
+                        data = await asyncio.to_thread(path.read_bytes)
+                        m = await bot.send_photo(chat_id, data, disable_notification=True)
+                        file_id = m.photo[-1].file_id
+                        await mems_upsert_card(fn, file_id)
+                        cache[fn] = file_id
+                        added += 1
+                        # прибираємо технічне повідомлення
+                        try:
+                            await m.delete()
+                        except Exception:
+                            pass
+                    except Exception:
+                        continue
+
+                    if len(cache) >= min_count:
+                        break
 
         raw.CACHED_CARDS = cache
         if not silent and added > 0:
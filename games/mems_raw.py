@@ -21,13 +21,15 @@ from bot.core.database import (
     get_mems_settings_for_chat,
     set_mems_setting_for_chat,
 )
+from bot.services.chat_member_cache import chat_member_cache
+from bot.services.message_deleter import message_deleter
+from bot.services.telegram_rate_limiter import bulk_priority
 from telegram import (
     Update,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     InlineQueryResultCachedPhoto,
     InputTextMessageContent,
-    ChatMember,
     InlineQueryResultArticle,
     InputMediaPhoto,
 )
@@ -165,30 +167,26 @@ class BotKickedError(Exception):
     pass
 
 async def safe_send(bot, chat_id, text=None, photo=None, **kwargs):
-    retries = 3
-    while retries > 0:
-        try:
-            if photo:
-                return await bot.send_photo(chat_id, photo=photo, caption=text, **kwargs)
-            else:
-                return await bot.send_message(chat_id, text=text, **kwargs)
-        except RetryAfter as e:
-            wait_time = e.retry_after + 1
-            logger.warning(f"FloodWait hit! Sleeping for {wait_time}s...")
-            await asyncio.sleep(wait_time)
-            retries -= 1
-        except Forbidden:
-            logger.warning(f"Bot kicked from chat {chat_id}.")
+    # FloodWait (RetryAfter) чекає й повторює спільний rate limiter бота
+    try:
+        if photo:
+            return await bot.send_photo(chat_id, photo=photo, caption=text, **kwargs)
+        else:
+            return await bot.send_message(chat_id, text=text, **kwargs)
+    except RetryAfter as e:
+        logger.warning(f"FloodWait to {chat_id} persisted after retries: {e}")
+        return None
+    except Forbidden:
+        logger.warning(f"Bot kicked from chat {chat_id}.")
+        raise BotKickedError()
+    except BadRequest as e:
+        if "chat not found" in str(e).lower():
             raise BotKickedError()
-        except BadRequest as e:
-            if "chat not found" in str(e).lower():
-                raise BotKickedError()
-            logger.warning(f"BadRequest to {chat_id}: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error sending to {chat_id}: {e}")
-            return None
-    return None
+        logger.warning(f"BadRequest to {chat_id}: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error sending to {chat_id}: {e}")
+        return None
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error("Exception while handling an update:", exc_info=context.error)
@@ -438,8 +436,7 @@ async def update_chat_setting(chat_id: int, key: str, value: int):
 async def is_admin_in_chat(user_id: int, chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
     if user_id == OWNER_ID: return True
     try:
-        member = await context.bot.get_chat_member(chat_id, user_id)
-        return member.status in [ChatMember.OWNER, ChatMember.ADMINISTRATOR]
+        return await chat_member_cache.is_admin(context.bot, chat_id, user_id)
     except:
         return False
 
@@ -518,25 +515,21 @@ async def cmd_init_cards(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status = await update.message.reply_text(f"⏳ Скануємо архіви ({len(files)})...")
     
     count = 0
-    for f in files:
-        if f in existing and not force: continue
-        try:
-            path = os.path.join(MEMES_FOLDER, f)
-            with open(path, 'rb') as ph:
-                try:
+    # Масове завантаження: темп і FloodWait веде спільний rate limiter, інтерактив має пріоритет
+    with bulk_priority():
+        for f in files:
+            if f in existing and not force: continue
+            try:
+                path = os.path.join(MEMES_FOLDER, f)
+                with open(path, 'rb') as ph:
                     m = await context.bot.send_photo(update.effective_chat.id, ph, disable_notification=True)
                     file_id = m.photo[-1].file_id
                     existing[f] = file_id
                     await mems_upsert_card(f, file_id)
                     await m.delete()
                     count += 1
-                except RetryAfter as e:
-                    logger.warning(f"Flood limit in init. Sleep {e.retry_after}")
-                    await asyncio.sleep(e.retry_after + 2)
-                
-                await asyncio.sleep(0.5) 
-        except Exception as e:
-            logger.error(f"Err {f}: {e}")
+            except Exception as e:
+                logger.error(f"Err {f}: {e}")
 
     # await save_json(DB_FILE, existing)  # Видалено, тепер зберігається в БД
     CACHED_CARDS = existing
@@ -1188,7 +1181,7 @@ async def cmd_pick_card(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             msg = await safe_send(context.bot, chat_id, f"✅ <b>{safe_name}</b> зробив хід.", parse_mode=ParseMode.HTML)
             if msg:
-                context.job_queue.run_once(lambda ctx: ctx.bot.delete_message(chat_id, msg.message_id), 3)
+                message_deleter.schedule(chat_id, msg.message_id, 3)
         except BotKickedError:
             delete_game(chat_id)
             return
@@ -11,6 +11,7 @@ import random
 import html
 import asyncio
 import math
+import time
 from telegram import CallbackQuery
 from typing import Optional, TYPE_CHECKING
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -18,6 +19,8 @@ from telegram.constants import ParseMode
 from telegram.error import RetryAfter, BadRequest
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 
+from bot.services.state_gc import state_collector
+
 # Уникаємо циклічного імпорту, якщо Application потрібен лише для типізації
 if TYPE_CHECKING:
     from telegram.ext import Application
@@ -32,6 +35,8 @@ try:
     )
     # --- ДОДАНО: Перевірка прав ---
     from bot.handlers.chat_admin_handlers import is_chat_module_enabled
+    from bot.services.chat_member_cache import chat_member_cache
+    from bot.services.user_directory import user_directory
     # --- (НОВЕ) Імпортуємо функції для отримання іконок ---
     from bot.utils.utils import get_icon
     # --- ---
@@ -328,6 +333,14 @@ async def cleanup_invitation(context: ContextTypes.DEFAULT_TYPE) -> None:
 
 # Час на набір 2 гравців у лобі (після цього лобі скасовується і повідомлення видаляється)
 TTT_LOBBY_TIMEOUT_SECONDS = 60
+# Гра без ходів довше за це — покинута (прибирає services/state_gc)
+TTT_GAME_IDLE_TTL_SECONDS = 24 * 3600
+
+state_collector.register(
+    "chat", "games", TTT_GAME_IDLE_TTL_SECONDS, items=True, stamp=lambda game: game.get("updated_at")
+)
+# Таймер лобі вимкнено, тож незібрані лобі інакше лишаються назавжди
+state_collector.register("chat", "ttt_lobbies", 3600, items=True, stamp=lambda lobby: lobby.get("created_at"))
 
 
 def _ttt_lobby_keyboard() -> InlineKeyboardMarkup:
@@ -551,6 +564,7 @@ async def ttt_open_lobby(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.chat_data.setdefault("ttt_lobbies", {})[msg.message_id] = {
         "owner_id": user.id,
         "players": {user.id: user.mention_html()},
+        "created_at": time.time(),
     }
 
     # context.job_queue.run_once(  # ВИМКНЕНО таймер лобі
@@ -882,14 +896,11 @@ async def global_top_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     leaderboard = f"{Style.E_GLOBAL} <b>Світовий рейтинг майстрів 🐾🌿:</b>\n\n"
     medals = Style.E_MEDALS
+    # Імена з локального довідника одним запитом до БД замість get_chat на кожного гравця
+    known = await user_directory.get_many([p['user_id'] for p in top_players], bot=context.bot)
     for i, player in enumerate(top_players):
-        user_mention = f"Гравець (ID: {player['user_id']})"
-        try:
-            # Намагаємося отримати дані користувача для @mention
-            chat_member = await context.bot.get_chat(player['user_id'])
-            user_mention = chat_member.mention_html()
-        except Exception:
-            pass  # Залишаємо ID, якщо не вдалося
+        entry = known.get(player['user_id'])
+        user_mention = entry.mention_html() if entry else f"Гравець (ID: {player['user_id']})"
 
         place = medals[i] if i < len(medals) else f"<b>{i+1}.</b>"
         leaderboard += f"{place} {user_mention}: <b>{player['total_wins']}</b> перемог\n"
@@ -938,7 +949,7 @@ async def send_chat_leaderboard(update: Update, context: ContextTypes.DEFAULT_TY
                 
                 user_mention = f"Гравець (ID: {player['user_id']})"
                 try:
-                    chat_member = await context.bot.get_chat_member(chat_id=chat_id, user_id=player['user_id'])
+                    chat_member = await chat_member_cache.get_member(context.bot, chat_id, player['user_id'])
                     user_mention = chat_member.user.mention_html()
                 except Exception:
                     pass # Залишаємо ID, якщо не вдалося
@@ -1112,6 +1123,7 @@ async def _handle_select_mode(query: CallbackQuery, context: ContextTypes.DEFAUL
             "mode": mode,
             "chat_id": query.message.chat_id,
             "move_count": 0,
+            "updated_at": time.time(),
         }
 
         duel_type = f"{Style.E_BOT_GAME} Гра з ботом!" if p2_id == bot_id else f"{Style.E_DUEL} Дуель!"
@@ -1198,6 +1210,7 @@ async def _handle_rematch(query: CallbackQuery, context: ContextTypes.DEFAULT_TY
             "mode": mode,
             "chat_id": query.message.chat_id,
             "move_count": 0,
+            "updated_at": time.time(),
         }
 
         duel_type = f"{Style.E_BOT_GAME} Гра з ботом!" if p2_new_id == bot_id else f"{Style.E_DUEL} Дуель!"
@@ -1296,6 +1309,7 @@ async def _handle_move(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE,
 
     game["board"][row][col] = current_player["symbol"]
     game["move_count"] += 1
+    game["updated_at"] = time.time()
     logger.info(f"Хід {user.id} в ({row},{col}). Хід №{game['move_count']}.")
 
     # Перевірка перемоги/нічиєї гравця
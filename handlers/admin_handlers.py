@@ -15,6 +15,7 @@ import html
 import functools
 import re
 import os
+from datetime import datetime
 from typing import Callable, Awaitable, Any, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message, InputFile, CallbackQuery
@@ -28,7 +29,7 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
-from telegram.error import TelegramError, Forbidden, BadRequest
+from telegram.error import TelegramError, BadRequest
 
 from bot.core.database import (
     get_total_users,
@@ -39,7 +40,6 @@ from bot.core.database import (
     set_chat_ai_status,
     get_bot_stats,
     is_ai_enabled_for_chat,
-    get_all_user_ids,
     clear_conversations,
     get_user_info,
     update_user_balance,
@@ -56,10 +56,24 @@ from bot.core.database import (
     # --- (НОВЕ) ІМПОРТИ ДЛЯ МОДІВ ---
     get_global_bot_mode,
     set_global_bot_mode,
+    get_ai_usage_daily,
+    get_ai_usage_top_chats,
+    get_fast_replies,
+    save_fast_reply,
+    remove_fast_reply,
+    set_ai_rate_limits,
 )
 # --- (НОВЕ) ІМПОРТИ ДЛЯ МОДІВ ---
 from bot.utils.utils import OWNER_ID, PHOTO_DIR, BotTheme, refresh_theme_cache
 from bot.core.daily_tasks import nun_of_the_day_job, assign_daily_predictions_job
+from bot.services.broadcast import broadcast_engine
+from bot.services.chat_member_cache import chat_member_cache
+from bot.services.user_directory import user_directory
+from bot.services.message_deleter import message_deleter
+from bot.services.reminder_engine import reminder_engine
+from bot.services.text_router import text_router
+from bot.services.request_context import request_stats
+from bot.services.state_gc import state_collector
 
 logger = logging.getLogger(__name__)
 
@@ -131,7 +145,11 @@ def owner_only(func: Callable) -> Callable:
     CONTENT_ADD_STICKER_AWAIT_ALIAS,
     CONTENT_ADD_STICKER_AWAIT_STICKER,
     CONTENT_REMOVE_STICKER_AWAIT_NAME,
-) = range(17)
+    CONTENT_ADD_FAST_REPLY_AWAIT_TEXT,
+    CONTENT_REMOVE_FAST_REPLY_AWAIT_TRIGGER,
+    # Керування AI
+    AI_LIMITS_AWAIT_VALUES,
+) = range(20)
 
 
 # =============================================================================
@@ -959,6 +977,99 @@ async def ai_control_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"<b>🤖 Керування Штучним Інтелектом</b>\n\n"
         f"Поточний глобальний статус: <b>{global_ai_text}</b>\n\n"
     )
+    try:
+        from bot.handlers.ai_handlers import (
+            ai_breaker,
+            ai_queue_manager,
+            ai_rate_limiter,
+            fast_replies,
+            response_cache,
+        )
+
+        br = ai_breaker.snapshot()
+        q = ai_queue_manager.gauges()
+        text += (
+            f"<b>DeepSeek breaker:</b> {br['state']} "
+            f"(помилок {br['window_failures']}/{br['window_requests']}, "
+            f"спрацювань {br['trips']}, відхилено {br['rejected']}, "
+            f"Retry-After {br['retry_after_sec']}s)\n"
+            f"<b>Черги:</b> воркерів {q['workers']}, у черзі {q['queue_depth']} "
+            f"(макс. на чат {q['max_chat_depth']}), відкинуто {q['dropped']}, "
+            f"завершено простоєм {q['reaped']}\n"
+        )
+        rc = response_cache.stats()
+        text += (
+            f"<b>Кеш відповідей:</b> влучань {rc['hits']}/{rc['hits'] + rc['misses']} "
+            f"({rc['hit_rate'] * 100:.0f}%), записів {rc['entries']}; "
+            f"швидких відповідей {fast_replies.hits} (тригерів {len(fast_replies)})\n"
+        )
+        rl = ai_rate_limiter.stats()
+        text += (
+            f"<b>Ліміти:</b> зрізано по юзеру {rl['throttled_user']}, по чату {rl['throttled_chat']} "
+            f"(у сховищі {rl['tracked_users']} юз. / {rl['tracked_chats']} чат.)\n"
+        )
+        outbound = getattr(context.bot, "rate_limiter", None)
+        if outbound is not None and hasattr(outbound, "stats"):
+            tg = outbound.stats()
+            text += (
+                f"<b>Telegram:</b> запитів {tg['requests']}, затримано {tg['delayed']} "
+                f"(~{tg['avg_wait_ms']} мс), RetryAfter {tg['retry_after']}\n"
+            )
+        cm = chat_member_cache.stats()
+        text += (
+            f"<b>Кеш прав:</b> влучань {cm['hits']}, запитів до API {cm['api_calls']} "
+            f"(адмін-списків {cm['admin_lists']}, учасників {cm['members']})\n"
+        )
+        ud = user_directory.stats()
+        text += (
+            f"<b>Довідник імен:</b> {ud['entries']} записів, влучань {ud['hits']}, "
+            f"з БД {ud['db_loads']}, фонових get_chat {ud['refreshes']}\n"
+        )
+        md = message_deleter.stats()
+        text += (
+            f"<b>Автовидалення:</b> у черзі {md['pending']}, видалено {md['deleted']} "
+            f"за {md['batches']} запитів, помилок {md['failed']}\n"
+        )
+        rm = reminder_engine.stats()
+        text += (
+            f"<b>Нагадування:</b> у черзі {rm['queued']} (горизонт {rm['horizon_min']} хв), "
+            f"доставлено {rm['delivered']} за {rm['batches']} пачок, пропущених {rm['missed']}, доповнень {rm['refills']}\n"
+        )
+        tr = text_router.stats()
+        text += (
+            f"<b>Текстовий роутер:</b> {tr['messages']} повідомлень, CPU сер. {tr['avg_cpu_us']} мкс, "
+            f"макс. {tr['max_cpu_us']} мкс, автоматів {tr['dynamic_automata']}\n"
+        )
+        persistence = context.application.persistence
+        if hasattr(persistence, "stats"):
+            ps = persistence.stats()
+            text += (
+                f"<b>Persistence:</b> чатів {ps['loaded_chats']}/{ps['stored_chats']}, "
+                f"користувачів {ps['loaded_users']}/{ps['stored_users']} у пам'яті; "
+                f"записано {ps['rows_written']} рядків ({ps['bytes_written'] // 1024} КБ), "
+                f"без змін {ps['unchanged_skipped']}\n"
+            )
+        gc = state_collector.last_report
+        if gc:
+            text += (
+                f"<b>Прибирання стану:</b> {gc['removed']} записів, {gc['bytes'] // 1024} КБ "
+                f"за {gc['ms']} мс ({(datetime.now().timestamp() - gc['at']) // 60:.0f} хв тому)\n"
+            )
+        rq = request_stats.stats()
+        text += (
+            f"<b>На оновлення:</b> БД {rq['avg_db_calls']} (макс. {rq['max_db_calls']}), "
+            f"API {rq['avg_api_calls']} (макс. {rq['max_api_calls']}), з кешу {rq['memo_hits']}\n"
+        )
+        processor = context.application.update_processor
+        if hasattr(processor, "stats"):
+            up = processor.stats()
+            text += (
+                f"<b>Оновлення:</b> зараз {up['running']}/{up['limit']} (пік {up['max_running']}), "
+                f"чекали своєї черги {up['waited_for_order']} з {up['processed']}\n"
+            )
+        text += "\n"
+    except Exception:
+        logger.debug("Не вдалося отримати стан AI-черг", exc_info=True)
     keyboard = [
         [
             InlineKeyboardButton(
@@ -970,6 +1081,8 @@ async def ai_control_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 "💬 Налаштувати келії (чати)", callback_data="admin_ai_chats_list_0"
             )
         ],
+        [InlineKeyboardButton("📈 Витрата токенів", callback_data="admin_ai_usage")],
+        [InlineKeyboardButton("🚦 Ліміти запитів", callback_data="admin_ai_limits")],
         [InlineKeyboardButton("↩️ Назад", callback_data="admin_menu")],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -978,6 +1091,106 @@ async def ai_control_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     )
 
 
+@owner_only
+async def show_ai_usage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показує витрату токенів AI: по днях і топ чатів за сьогодні."""
+    query = update.callback_query
+    await query.answer()
+    keyboard = [[InlineKeyboardButton("↩️ Назад", callback_data="admin_ai_menu")]]
+    try:
+        daily = await get_ai_usage_daily(days=7)
+        today = datetime.now().strftime("%Y-%m-%d")
+        top_chats = await get_ai_usage_top_chats(today, limit=10)
+    except Exception as e:
+        logger.error(f"Помилка при отриманні usage AI: {e}", exc_info=True)
+        await query.edit_message_text(
+            "❌ Помилка при отриманні даних.", reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return
+
+    text = "<b>📈 Витрата токенів AI (7 днів)</b>\n\n"
+    if not daily:
+        text += "<i>Поки що немає даних.</i>"
+    else:
+        for row in daily:
+            requests = row["requests"] or 0
+            avg_latency = (row["latency_ms_total"] or 0) // max(1, requests)
+            estimated = row["estimated_prompt_tokens"] or 0
+            accuracy = f", оцінка {estimated * 100 // max(1, row['prompt_tokens'] or 0)}%" if estimated else ""
+            text += (
+                f"<code>{row['day']}</code>: {requests} запит., "
+                f"prompt {row['prompt_tokens']} (кеш {row['cached_prompt_tokens']}{accuracy}), "
+                f"completion {row['completion_tokens']}, ~{avg_latency} мс\n"
+            )
+        if top_chats:
+            text += "\n<b>Топ чатів сьогодні:</b>\n"
+            for row in top_chats:
+                title = html.escape(row.get("chat_title") or f"ID: {row['chat_id']}")
+                if len(title) > 25:
+                    title = title[:22] + "..."
+                total = (row["prompt_tokens"] or 0) + (row["completion_tokens"] or 0)
+                text += f"• {title}: {total} ток. / {row['requests']} запит.\n"
+
+    await query.edit_message_text(
+        text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML
+    )
+
+
+@owner_only
+async def ai_limits_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Показує поточні ліміти AI-запитів і просить нові значення."""
+    query = update.callback_query
+    await query.answer()
+    from bot.handlers.ai_handlers import ai_rate_limiter, reload_ai_rate_limits
+
+    if not ai_rate_limiter.configured:
+        await reload_ai_rate_limits()
+    cur = ai_rate_limiter.settings()
+    keyboard = [[InlineKeyboardButton("✖️ Скасувати", callback_data="admin_cancel")]]
+    await query.edit_message_text(
+        "<b>🚦 Ліміти AI-запитів</b>\n\n"
+        f"Користувач: <b>{cur['user_per_min']:g}</b>/хв, сплеск <b>{cur['user_burst']}</b>\n"
+        f"Чат: <b>{cur['chat_per_min']:g}</b>/хв, сплеск <b>{cur['chat_burst']}</b>\n\n"
+        "Надішли 4 числа через пробіл:\n"
+        "<code>юзер_за_хв юзер_сплеск чат_за_хв чат_сплеск</code>\n"
+        "напр. <code>6 3 20 8</code>. 0 за хвилину — без ліміту.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode=ParseMode.HTML,
+    )
+    return AI_LIMITS_AWAIT_VALUES
+
+
+@owner_only
+async def process_ai_limits(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Зберігає нові ліміти і одразу застосовує їх."""
+    if not update.message or not update.message.text:
+        return AI_LIMITS_AWAIT_VALUES
+    try:
+        user_per_min, user_burst, chat_per_min, chat_burst = update.message.text.split()
+        limits = {
+            "user_per_min": float(user_per_min),
+            "user_burst": int(user_burst),
+            "chat_per_min": float(chat_per_min),
+            "chat_burst": int(chat_burst),
+        }
+        if any(v < 0 for v in limits.values()) or limits["user_burst"] < 1 or limits["chat_burst"] < 1:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "Потрібно 4 невід'ємні числа, сплески — цілі від 1. Напр.: 6 3 20 8"
+        )
+        return AI_LIMITS_AWAIT_VALUES
+
+    await set_ai_rate_limits(limits)
+    from bot.handlers.ai_handlers import reload_ai_rate_limits
+
+    await reload_ai_rate_limits()
+    logger.info(f"Власник {OWNER_ID} змінив ліміти AI: {limits}")
+    await update.message.reply_text("✅ Ліміти оновлено.")
+    await admin_command(update, context, from_callback=True)
+    return ConversationHandler.END
+
+
 @owner_only
 async def toggle_global_ai(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Перемикає глобальний статус AI."""
@@ -1093,7 +1306,7 @@ async def toggle_chat_ai(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 async def content_management_menu(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    """(Оновлене) Меню керування контентом (фото, стікери)."""
+    """(Оновлене) Меню керування контентом (фото, стікери, швидкі відповіді)."""
     query = update.callback_query
     await query.answer()
     keyboard = [
@@ -1108,6 +1321,13 @@ async def content_management_menu(
         [
             InlineKeyboardButton("✨ Список Стікерів", callback_data="admin_content_list_stickers"),
         ],
+        [
+            InlineKeyboardButton("⚡ Додати Швидку Відповідь", callback_data="admin_content_add_fast"),
+            InlineKeyboardButton("🗑️ Видалити Швидку Відповідь", callback_data="admin_content_rem_fast"),
+        ],
+        [
+            InlineKeyboardButton("⚡ Список Швидких Відповідей", callback_data="admin_content_list_fast"),
+        ],
         [InlineKeyboardButton("↩️ Назад", callback_data="admin_menu")],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1347,6 +1567,119 @@ async def show_all_stickers(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text("❌ Помилка при отриманні даних.")
 
 
+@owner_only
+async def add_fast_reply_prompt(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """Просить тригери та варіанти швидкої відповіді одним повідомленням."""
+    query = update.callback_query
+    await query.answer()
+    keyboard = [[InlineKeyboardButton("✖️ Скасувати", callback_data="admin_cancel")]]
+    await query.edit_message_text(
+        "Надішли швидку відповідь одним повідомленням:\n"
+        "перший рядок — <b>тригери</b> через <code>|</code>, "
+        "далі — <b>варіанти відповіді</b>, кожен з нового рядка.\n\n"
+        "<code>добраніч | на добраніч\nСолодких снів! 🌙\nМур, до ранку! 😴</code>\n\n"
+        "<i>Звертання (котик, кіт…), регістр і пунктуація ігноруються.</i>",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode=ParseMode.HTML,
+    )
+    return CONTENT_ADD_FAST_REPLY_AWAIT_TEXT
+
+
+@owner_only
+async def process_add_fast_reply(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """Зберігає тригери з відповідями і перебудовує таблицю."""
+    if not update.message or not update.message.text:
+        return CONTENT_ADD_FAST_REPLY_AWAIT_TEXT
+
+    lines = [line.strip() for line in update.message.text.splitlines() if line.strip()]
+    triggers = [t.strip().lower() for t in lines[0].split("|") if t.strip()] if lines else []
+    responses = lines[1:]
+    if not triggers or not responses:
+        await update.message.reply_text(
+            "Потрібен рядок з тригерами і хоча б один рядок з відповіддю."
+        )
+        return CONTENT_ADD_FAST_REPLY_AWAIT_TEXT
+
+    for trigger in triggers:
+        await save_fast_reply(trigger, responses)
+    from bot.handlers.ai_handlers import reload_fast_replies
+
+    await reload_fast_replies()
+    await update.message.reply_html(
+        f"✅ Додано тригерів: <b>{len(triggers)}</b>, варіантів відповіді: <b>{len(responses)}</b>."
+    )
+    await admin_command(update, context, from_callback=True)
+    return ConversationHandler.END
+
+
+@owner_only
+async def remove_fast_reply_prompt(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """Просить тригер швидкої відповіді для видалення."""
+    query = update.callback_query
+    await query.answer()
+    keyboard = [[InlineKeyboardButton("✖️ Скасувати", callback_data="admin_cancel")]]
+    await query.edit_message_text(
+        "Надішли <b>тригер</b> швидкої відповіді, який потрібно <b>видалити</b>.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode=ParseMode.HTML,
+    )
+    return CONTENT_REMOVE_FAST_REPLY_AWAIT_TRIGGER
+
+
+@owner_only
+async def process_remove_fast_reply(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """Видаляє тригер і перебудовує таблицю."""
+    if not update.message or not update.message.text:
+        return CONTENT_REMOVE_FAST_REPLY_AWAIT_TRIGGER
+
+    trigger = update.message.text.strip().lower()
+    removed = await remove_fast_reply(trigger)
+    from bot.handlers.ai_handlers import reload_fast_replies
+
+    await reload_fast_replies()
+    if removed:
+        await update.message.reply_html(f"✅ Тригер «<b>{html.escape(trigger)}</b>» видалено.")
+    else:
+        await update.message.reply_html(f"Тригера «<b>{html.escape(trigger)}</b>» немає.")
+    await admin_command(update, context, from_callback=True)
+    return ConversationHandler.END
+
+
+@owner_only
+async def show_fast_replies(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показує таблицю швидких відповідей."""
+    query = update.callback_query
+    await query.answer()
+    keyboard = [[InlineKeyboardButton("↩️ Назад", callback_data="admin_content_menu")]]
+    try:
+        rows = await get_fast_replies()
+    except Exception as e:
+        logger.error(f"Помилка при отриманні швидких відповідей: {e}", exc_info=True)
+        await query.edit_message_text("❌ Помилка при отриманні даних.")
+        return
+
+    if not rows:
+        text = "<b>⚡ Швидкі відповіді:</b>\n\n<i>Таблиця порожня.</i>"
+    else:
+        text = "<b>⚡ Швидкі відповіді:</b>\n\n"
+        for row in rows:
+            variants = row["responses"].count("\n") + 1
+            text += f"- <code>{html.escape(row['trigger'])}</code> ({variants} вар.)\n"
+    if len(text) > 4000:
+        text = text[:4000] + "\n…"
+    await query.edit_message_text(
+        text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML
+    )
+
+
 # =============================================================================
 # 5. Розсилка
 # =============================================================================
@@ -1402,7 +1735,7 @@ async def receive_broadcast_message(
 
 @owner_only
 async def send_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Виконує розсилку повідомлення."""
+    """Створює задачу розсилки; далі її веде broadcast_engine (переживає рестарт)."""
     user_id = update.effective_user.id
     query = update.callback_query
     await query.answer()
@@ -1422,42 +1755,28 @@ async def send_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await _safe_edit("Помилка: повідомлення не знайдено.")
         return ConversationHandler.END
 
-    await _safe_edit("Починаю розсилку... 💌")
-
-    all_chats_info = await get_all_chats(page_size=None)
-    chat_ids_to_broadcast = {chat["chat_id"] for chat in all_chats_info}
-    all_users_ids = await get_all_user_ids()
-    user_ids_to_broadcast = set(all_users_ids)
-    target_ids = chat_ids_to_broadcast.union(user_ids_to_broadcast)
-
-    if user_id in target_ids:
-        target_ids.remove(user_id)
-
-    success_count, fail_count = 0, 0
-    for target_chat_id in target_ids:
-        try:
-            await context.bot.copy_message(
-                chat_id=target_chat_id,
-                from_chat_id=broadcast_message.chat.id,
-                message_id=broadcast_message.message_id,
-            )
-            success_count += 1
-            await asyncio.sleep(0.05)
-        except (Forbidden, BadRequest, TelegramError) as e:
-            logger.warning(
-                f"Помилка розсилки в чат/користувача {target_chat_id}: {e}"
-            )
-            fail_count += 1
-
-    await context.bot.send_message(
-        chat_id=user_id,
-        text=f"Розсилку завершено! 😼\nУспішно: <b>{success_count}</b>\nПомилки: <b>{fail_count}</b>",
-        parse_mode=ParseMode.HTML,
+    job = await broadcast_engine.start(
+        context.bot,
+        owner_id=user_id,
+        from_chat_id=broadcast_message.chat.id,
+        message_id=broadcast_message.message_id,
     )
+    await _safe_edit(f"Розсилку #{job['job_id']} запущено: {job['total']} адресатів. 💌")
     context.user_data.pop("broadcast_message", None)
     return ConversationHandler.END
 
 
+@owner_only
+async def stop_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Зупиняє розсилку з кнопки в повідомленні прогресу."""
+    query = update.callback_query
+    job_id = int(query.data.rsplit("_", 1)[-1])
+    if broadcast_engine.cancel(job_id):
+        await query.answer("Зупиняю розсилку... ⏹")
+    else:
+        await query.answer("Ця розсилка вже не виконується.", show_alert=True)
+
+
 # =============================================================================
 # 6. Обслуговування
 # =============================================================================
@@ -1740,6 +2059,10 @@ def register_admin_handlers(application: Application):
         conversation_timeout=600,
     )
 
+    application.add_handler(
+        CallbackQueryHandler(stop_broadcast, pattern=r"^admin_broadcast_stop_\d+$")
+    )
+
     # --- Керування Користувачами ---
     user_info_conv = ConversationHandler(
         entry_points=[
@@ -1870,6 +2193,42 @@ def register_admin_handlers(application: Application):
         fallbacks=[cancel_handler],
     )
 
+    add_fast_reply_conv = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(add_fast_reply_prompt, pattern="^admin_content_add_fast$")
+        ],
+        states={
+            CONTENT_ADD_FAST_REPLY_AWAIT_TEXT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, process_add_fast_reply)
+            ]
+        },
+        fallbacks=[cancel_handler],
+    )
+
+    remove_fast_reply_conv = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(remove_fast_reply_prompt, pattern="^admin_content_rem_fast$")
+        ],
+        states={
+            CONTENT_REMOVE_FAST_REPLY_AWAIT_TRIGGER: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, process_remove_fast_reply)
+            ]
+        },
+        fallbacks=[cancel_handler],
+    )
+
+    ai_limits_conv = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(ai_limits_prompt, pattern="^admin_ai_limits$")
+        ],
+        states={
+            AI_LIMITS_AWAIT_VALUES: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, process_ai_limits)
+            ]
+        },
+        fallbacks=[cancel_handler],
+    )
+
     # --- Реєстрація ConversationHandlers ---
     conv_handlers = [
         broadcast_conv,
@@ -1882,6 +2241,9 @@ def register_admin_handlers(application: Application):
         remove_photo_conv,
         add_sticker_conv,
         remove_sticker_conv,
+        add_fast_reply_conv,
+        remove_fast_reply_conv,
+        ai_limits_conv,
     ]
     for handler in conv_handlers:
         application.add_handler(handler)
@@ -1936,6 +2298,9 @@ def register_admin_handlers(application: Application):
     application.add_handler(
         CallbackQueryHandler(toggle_global_ai, pattern="^admin_ai_toggle_global$")
     )
+    application.add_handler(
+        CallbackQueryHandler(show_ai_usage, pattern="^admin_ai_usage$")
+    )
     application.add_handler(
         CallbackQueryHandler(show_ai_chats_list, pattern=r"^admin_ai_chats_list_\d+$")
     )
@@ -1947,6 +2312,9 @@ def register_admin_handlers(application: Application):
     application.add_handler(
         CallbackQueryHandler(show_all_stickers, pattern="^admin_content_list_stickers$")
     )
+    application.add_handler(
+        CallbackQueryHandler(show_fast_replies, pattern="^admin_content_list_fast$")
+    )
 
     # Maintenance-Меню
     application.add_handler(
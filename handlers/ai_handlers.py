@@ -15,6 +15,7 @@ ai_handlers.py
 import logging
 import httpx
 import asyncio
+import contextvars
 import random
 import re
 import json
@@ -22,10 +23,10 @@ import time
 import pytz 
 import os
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 
 # --- Telegram Imports ---
-from telegram.constants import ParseMode, ChatMemberStatus, ChatAction
+from telegram.constants import ParseMode, ChatMemberStatus
 from telegram import (
     Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
 )
@@ -47,7 +48,11 @@ from bot.core.database import (
     is_ai_enabled_for_chat,
     get_user_info,  
     get_chat_settings,
-    clear_conversations
+    clear_conversations,
+    record_ai_usage,
+    get_conversation_summary,
+    get_fast_replies,
+    get_ai_rate_limits,
 )
 from bot.handlers.reminder_handlers import is_reminder_trigger
 from bot.utils.utils import (
@@ -60,14 +65,49 @@ from bot.utils.utils import (
     AI_BACKOFF_BASE_SEC,
     AI_BACKOFF_MAX_SEC,
     AI_MAX_TOKENS,
+    AI_BREAKER_WINDOW_SEC,
+    AI_BREAKER_MIN_REQUESTS,
+    AI_BREAKER_ERROR_RATE,
+    AI_BREAKER_MAX_429,
+    AI_BREAKER_OPEN_SEC,
+    AI_BREAKER_PROBES,
+    AI_BREAKER_MAX_WAIT_SEC,
+    AI_COALESCE_WINDOW_MS,
+    AI_COALESCE_MAX_BATCH,
+    AI_WORKER_IDLE_SEC,
+    AI_MAX_HISTORY_TOKENS,
+    AI_MEMORY_TOP_K,
+    AI_MEMORY_TOKEN_CAP,
+    AI_MEMORY_QUERY_TURNS,
+    AI_SUMMARY_TRIGGER_TOKENS,
+    AI_SUMMARY_KEEP_MESSAGES,
+    AI_SUMMARY_MAX_TOKENS,
+    AI_RESPONSE_CACHE_TTL_SEC,
+    AI_RESPONSE_CACHE_MAX,
+    AI_RESPONSE_CACHE_MAX_WORDS,
+    AI_USER_RATE_PER_MIN,
+    AI_USER_BURST,
+    AI_CHAT_RATE_PER_MIN,
+    AI_CHAT_BURST,
     BOT_MODES,
     DEFAULT_BOT_MODE,
     sanitize_reply,
-    send_typing_periodically,
     get_mode_prompt,
     get_theme_value,
     get_user_addressing,
+    get_current_theme_name,
 )
+from bot.services.ai_circuit_breaker import CircuitBreaker
+from bot.services.chat_actions import chat_actions
+from bot.services.text_router import KeywordAutomaton, normalize_for_routing, text_router
+from bot.services.message_deleter import message_deleter
+from bot.services.state_gc import state_collector
+from bot.services.token_estimator import estimate_messages_tokens
+from bot.services.memory_index import memory_index
+from bot.services.conversation_summarizer import ConversationSummarizer
+from bot.services.outbound_replies import outbound_replies, reply_key
+from bot.services.response_cache import FastReplies, ResponseCache, normalize_prompt
+from bot.services.ai_rate_limiter import AIRateLimiter
 
 # --- Module Constants ---
 
@@ -116,41 +156,50 @@ def _retry_after_seconds(headers: dict) -> Optional[float]:
     except Exception:
         return None
 
+# Спільний для всіх воркерів breaker бекенду DeepSeek
+ai_breaker = CircuitBreaker(
+    window_sec=AI_BREAKER_WINDOW_SEC,
+    min_requests=AI_BREAKER_MIN_REQUESTS,
+    error_rate=AI_BREAKER_ERROR_RATE,
+    max_consecutive_429=AI_BREAKER_MAX_429,
+    open_sec=AI_BREAKER_OPEN_SEC,
+    half_open_probes=AI_BREAKER_PROBES,
+)
+AI_OVERLOADED_REPLY = "Мур... У мене зараз забагато клубочків, спробуй трохи пізніше. 😿"
+
+
+async def _breaker_wait_and_allow() -> bool:
+    """Враховує глобальний Retry-After і стан breaker'а перед зверненням до API."""
+    wait = ai_breaker.retry_after_remaining()
+    if wait > AI_BREAKER_MAX_WAIT_SEC:
+        return False
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return ai_breaker.allow_request()
+
 def _truncate_for_log(s: str, limit: int = 500) -> str:
     if s is None:
         return ""
     s = str(s)
     return s if len(s) <= limit else s[:limit] + "…"
-# Rate Limiting
-USER_RATE_LIMIT = 0.5 
-_user_last_request: Dict[int, float] = {} # Кеш останніх запитів
+# Rate Limiting: token bucket на користувача і на чат (ліміти з env, власник може перевизначити)
+ai_rate_limiter = AIRateLimiter(
+    user_per_min=AI_USER_RATE_PER_MIN,
+    user_burst=AI_USER_BURST,
+    chat_per_min=AI_CHAT_RATE_PER_MIN,
+    chat_burst=AI_CHAT_BURST,
+)
 
 # --- Conversation States ---
 STATE_REMEMBER_SCOPE, STATE_FORGET_SCOPE = range(2)
 
-# Прості відповіді для частих запитань
-SIMPLE_RESPONCES = {
-    ("привіт", "привет", "привіт котик", "привіт мур", "hi", "hello"): [
-        "Привіт! 🐾",
-        "Мур! 😼",
-        "Вітаю! 🌿",
-    ],
-    ("як справи", "как дела", "як себе почуваєш", "як ти", "як дела ты"): [
-        "Зі мною все добре, спасибі! 🐾",
-        "Мур, спасибі за питання! 😸",
-        "Все як завжди - спокійно та з гідністю. 🧘",
-    ],
-    ("спасибі", "спасибо", "дякую", "дякую!", "thanks", "thank you"): [
-        "Будь ласка! 🌿",
-        "Радий допомогти! 😽",
-        "Не за що! 🐾",
-    ],
-    ("пока", "bye", "до свидання", "до побачення", "чао"): [
-        "До зустрічі! 🐾",
-        "Мур! 😼",
-        "Грішити в міру! 😈",
-    ],
-}
+# Швидкі відповіді (таблиця fast_replies, редагується власником) і кеш коротких AI-відповідей
+fast_replies = FastReplies()
+response_cache = ResponseCache(
+    max_entries=AI_RESPONSE_CACHE_MAX,
+    ttl=AI_RESPONSE_CACHE_TTL_SEC,
+    max_words=AI_RESPONSE_CACHE_MAX_WORDS,
+)
 
 # =============================================================================
 # 0. New AI Commands (Нові команди режимів)
@@ -214,14 +263,10 @@ async def aiclear_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("Мур! Ця команда тільки для настоятелів (адмінів). 😾")
         return
 
-    chat_id = chat.id
-    async with ai_queue_manager.lock:
-        if chat_id in ai_queue_manager.queues:
-            # Створюємо нову пусту чергу
-            ai_queue_manager.queues[chat_id] = asyncio.Queue(maxsize=5)
-            await update.message.reply_text("🧹 Черга AI для цього чату примусово очищена.")
-        else:
-            await update.message.reply_text("Черга і так пуста. 🍃")
+    if ai_queue_manager.clear(chat.id):
+        await update.message.reply_text("🧹 Черга AI для цього чату примусово очищена.")
+    else:
+        await update.message.reply_text("Черга і так пуста. 🍃")
 
 
 async def aihelp_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -243,28 +288,45 @@ async def aihelp_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # 1. AI Queue Manager (Менеджер черг ШІ)
 # =============================================================================
 
+class _ChatQueue:
+    """Стан черги одного чату. Кожен чат живе окремо — без спільного lock'а."""
+
+    __slots__ = ("queue", "worker", "dropped")
+
+    def __init__(self, maxsize: int) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.worker: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+
 class AIChatQueueManager:
-    def __init__(self) -> None:
-        self.queues = {}
-        self.workers = {}
-        self.lock = asyncio.Lock()
+    def __init__(self, maxsize: int = 5, idle_timeout: float = AI_WORKER_IDLE_SEC) -> None:
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.chats: Dict[int, _ChatQueue] = {}
+        self.dropped_total = 0
+        self.reaped_total = 0
         logger.info("AIChatQueueManager ініціалізовано. Мур.")
 
-    async def _worker(self, chat_id: int, bot: Bot) -> None:
-        queue = self.queues.get(chat_id)
-        if not queue:
-            async with self.lock:
-                if chat_id in self.workers: del self.workers[chat_id]
-            return
-
+    async def _worker(self, chat_id: int, state: _ChatQueue, bot: Bot) -> None:
+        queue = state.queue
         try:
             while True:
                 try:
-                    task_data = await queue.get()
-                except asyncio.CancelledError:
-                    break
-
+                    task_data = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # Між перевіркою й виходом немає await, тож enqueue не проскочить
+                    if queue.empty():
+                        self.reaped_total += 1
+                        return
+                    continue
+
+                batch = [task_data]
                 try:
+                    if AI_COALESCE_WINDOW_MS > 0:
+                        await self._collect_burst(queue, batch)
+                    if len(batch) > 1:
+                        task_data = _merge_burst(batch)
                     await process_ai_response(
                         user_id=task_data['user_id'],
                         chat_id=chat_id,
@@ -273,49 +335,129 @@ class AIChatQueueManager:
                         application=task_data['application'],
                         mode=task_data['mode'],
                         message_to_reply_id=task_data['message_to_reply_id'],
-                        reply_context=task_data.get('reply_context') 
+                        reply_context=task_data.get('reply_context'),
+                        participants=task_data.get('participants'),
+                        cache_key=task_data.get('cache_key'),
                     )
                 except Exception as e:
                     logger.error(f"Помилка під час виконання process_ai_response: {e}", exc_info=True)
                 finally:
-                    queue.task_done()
-
+                    for _ in batch:
+                        queue.task_done()
+                        chat_actions.release(chat_id)
         except asyncio.CancelledError:
             pass
         finally:
-            async with self.lock:
-                if chat_id in self.workers: del self.workers[chat_id]
-                if chat_id in self.queues: del self.queues[chat_id]
+            if self.chats.get(chat_id) is state and queue.empty():
+                del self.chats[chat_id]
+
+    async def _collect_burst(self, queue: asyncio.Queue, batch: list) -> None:
+        """Добирає з черги повідомлення, що прийшли у вікні коалесценції від першого."""
+        first = batch[0]
+        deadline = first.get('enqueued_at', time.monotonic()) + AI_COALESCE_WINDOW_MS / 1000
+        while len(batch) < AI_COALESCE_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                nxt = await asyncio.wait_for(queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(nxt)
+        if len(batch) > 1:
+            logger.info(f"Чат {first.get('chat_id')}: об'єднано {len(batch)} повідомлень в один AI-запит.")
+
+    def enqueue(self, chat_id: int, bot: Bot, task_data: dict) -> None:
+        """Синхронно ставить задачу в чергу чату і за потреби запускає воркер."""
+        state = self.chats.get(chat_id)
+        if state is None:
+            state = self.chats[chat_id] = _ChatQueue(self.maxsize)
+
+        queue = state.queue
+        if queue.full():
+            try:
+                # Викидаємо найстаріший запит, якщо черга переповнена
+                queue.get_nowait()
+                queue.task_done()
+                chat_actions.release(chat_id)
+                state.dropped += 1
+                self.dropped_total += 1
+                logger.warning(f"Черга для чату {chat_id} переповнена. Старий запит відкинуто.")
+            except asyncio.QueueEmpty:
+                pass
+
+        task_data.setdefault('enqueued_at', time.monotonic())
+        task_data.setdefault('chat_id', chat_id)
+        queue.put_nowait(task_data)
+        # "Друкує…" триває, поки задача в черзі або в обробці — один таймер на чат
+        chat_actions.acquire(bot, chat_id)
+
+        if state.worker is None or state.worker.done():
+            # Воркер живе довше за оновлення, що його запустило: без його request_context
+            state.worker = asyncio.create_task(self._worker(chat_id, state, bot), context=contextvars.Context())
 
     async def add_task(self, chat_id: int, bot: Bot, task_data: dict) -> None:
-        async with self.lock:
-            if chat_id not in self.queues:
-                # Ліміт черги
-                self.queues[chat_id] = asyncio.Queue(maxsize=5) 
-            
-            queue = self.queues[chat_id]
-            
-            if queue.full():
-                try:
-                    # Викидаємо найстаріший запит, якщо черга переповнена
-                    queue.get_nowait()
-                    queue.task_done()
-                    logger.warning(f"Черга для чату {chat_id} переповнена. Старий запит відкинуто.")
-                except asyncio.QueueEmpty:
-                    pass
-
-            await queue.put(task_data)
+        # Індикатор набору веде chat_actions у фоні — тут жодних мережевих викликів
+        self.enqueue(chat_id, bot, task_data)
+
+    def clear(self, chat_id: int) -> int:
+        """Викидає всі задачі чату, що ще чекають. Повертає їх кількість."""
+        state = self.chats.get(chat_id)
+        if state is None:
+            return 0
+        removed = 0
+        while True:
             try:
-                await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
-            except Exception:
-                pass
-            
-            if chat_id not in self.workers or self.workers[chat_id].done():
-                self.workers[chat_id] = asyncio.create_task(self._worker(chat_id, bot))
+                state.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            state.queue.task_done()
+            chat_actions.release(chat_id)
+            removed += 1
+        return removed
+
+    def gauges(self) -> Dict[str, int]:
+        depths = [st.queue.qsize() for st in self.chats.values()]
+        return {
+            "chats": len(self.chats),
+            "workers": sum(1 for st in self.chats.values() if st.worker and not st.worker.done()),
+            "queue_depth": sum(depths),
+            "max_chat_depth": max(depths, default=0),
+            "dropped": self.dropped_total,
+            "reaped": self.reaped_total,
+        }
 
 ai_queue_manager = AIChatQueueManager()
 
 
+def _merge_burst(batch: list) -> dict:
+    """Зливає кілька запитів з одного чату в один з підписом автора кожної репліки."""
+    lines = []
+    participants = []
+    for item in batch:
+        name = item.get('user_name') or f"user {item['user_id']}"
+        lines.append(f"{name}: {item['user_input']}")
+        participants.append({
+            'user_id': item['user_id'],
+            'name': name,
+            'text': item['user_input'],
+            'message_id': item['message_to_reply_id'],
+        })
+
+    last = batch[-1]
+    merged = dict(batch[0])
+    merged.update({
+        'user_input': "\n".join(lines),
+        # Відповідаємо на останнє повідомлення сплеску — воно найближче до відповіді в стрічці
+        'message_to_reply_id': last['message_to_reply_id'],
+        'reply_context': last.get('reply_context') or batch[0].get('reply_context'),
+        'participants': participants,
+        # Відповідь на кількох авторів не підходить для кешу одиночного запиту
+        'cache_key': None,
+    })
+    return merged
+
+
 # =============================================================================
 # 2. Core AI Functions (Ядро ШІ)
 # =============================================================================
@@ -350,8 +492,8 @@ async def safe_send_message(
         )
         last_msg_id = first_msg.message_id
         sent_ids.append(first_msg.message_id)
+        # Темп відправки частин задає спільний rate limiter бота
         for part in parts[1:]:
-            await asyncio.sleep(0.3) 
             next_msg = await bot.send_message(
                 chat_id=chat_id,
                 text=part,
@@ -369,7 +511,9 @@ async def get_ai_response(
     user_input: str,
     bot: Bot,
     mode: str,
-    reply_context: Optional[str] = None 
+    reply_context: Optional[str] = None,
+    participants: Optional[list] = None,
+    cache_key: Optional[tuple] = None,
 ) -> str:
     api_key = _get_api_key()
     if not api_key:
@@ -380,7 +524,7 @@ async def get_ai_response(
     # Розумна температура
     ai_temperature = DEFAULT_TEMP
     
-    ai_max_history_chars = await get_theme_value("ai_max_history_chars", 2500)
+    ai_max_history_tokens = await get_theme_value("ai_max_history_tokens", AI_MAX_HISTORY_TOKENS)
 
     # -------------------------------------------------------------------------
     # 1. КОНТЕКСТ ЧАСУ ТА ДАТИ (УКРАЇНСЬКОЮ)
@@ -408,10 +552,14 @@ async def get_ai_response(
     )
     system_prompt = f"{time_context}\n{system_prompt}"
 
+    # Відповідь для спільного кешу (cache_key) будуємо із загального промпту:
+    # без імені, статі, пам'яті, підсумку й історії — її можна віддати будь-кому
+    shareable = cache_key is not None
+
     # -------------------------------------------------------------------------
     # 2. ПЕРСОНАЛІЗАЦІЯ (Інфо про юзера)
     # -------------------------------------------------------------------------
-    user_info = await get_user_info(user_id)
+    user_info = None if shareable else await get_user_info(user_id)
     user_name_context = ""
     if user_info and user_info.get("first_name"):
         user_name_context = f"\nUser's Name: {user_info.get('first_name')}"
@@ -421,7 +569,7 @@ async def get_ai_response(
     # -------------------------------------------------------------------------
     # 2.1. ЗВЕРНЕННЯ ЗА СТАТТЮ (з профілю)
     # -------------------------------------------------------------------------
-    addr = await get_user_addressing(user_id)
+    addr = None if shareable else await get_user_addressing(user_id)
     gender_contract_rule = (
         "Стать користувача береш тільки з поля gender його профілю. "
         "Не вгадуй стать за ім'ям, ніком, аватаром чи текстом. "
@@ -433,7 +581,7 @@ async def get_ai_response(
     )
 
     # Правило: якщо стать не вказана → звертайся на "Ви" і без форм у роді.
-    if getattr(addr, "you", "") == "Ви":
+    if addr is None or getattr(addr, "you", "") == "Ви":
         addressing_rule = (
             "Стать користувача не визначена. "
             "Звертайся до нього виключно на «Ви». "
@@ -466,12 +614,21 @@ async def get_ai_response(
         f"7. {addressing_rule}\n"
         f"8. {bot_gender_rule}\n"
     )
+    if participants:
+        # Кілька людей написали майже одночасно — одна відповідь для всіх
+        names = ", ".join(p['name'] for p in participants)
+        dialogue_instructions += (
+            f"\n[КІЛЬКА СПІВРОЗМОВНИКІВ]\n"
+            f"Останнє повідомлення містить репліки кількох людей у форматі «Ім'я: текст» ({names}). "
+            "Дай одну відповідь, коротко звертаючись до кожного на ім'я. "
+            "Правила звертання за статтю вище стосуються лише першого з них; до інших звертайся нейтрально.\n"
+        )
     system_prompt += dialogue_instructions
 
     # -------------------------------------------------------------------------
     # 4. ІСТОРІЯ ТА ПАМ'ЯТЬ
     # -------------------------------------------------------------------------
-    history = await get_recent_messages(user_id, chat_id, max_chars=ai_max_history_chars)
+    history = [] if shareable else await get_recent_messages(user_id, chat_id, max_tokens=ai_max_history_tokens)
     
     cleaned_history = []
     for msg in history:
@@ -482,11 +639,24 @@ async def get_ai_response(
         cleaned_history.append(msg)
     history = cleaned_history
     
+    summary = None if shareable else await get_conversation_summary(user_id, chat_id)
+    if summary:
+        # Старша частина діалогу вже стиснута фоновим підсумовувачем
+        history.insert(0, {
+            "role": "system",
+            "content": f"Короткий підсумок попередньої розмови з цим користувачем: {summary['summary']}",
+        })
+
     if reply_context:
         history.append({"role": "system", "content": f"CONTEXT: User replied to this message: '{reply_context}'"})
 
-    user_memories = await get_memories_for_scope(user_id, 'user')
-    chat_memories = await get_memories_for_scope(chat_id, 'chat')
+    # Лише релевантні факти: поточне повідомлення + недавні репліки користувача
+    recent_user_turns = [m["content"] for m in history if m.get("role") == "user"][-AI_MEMORY_QUERY_TURNS:]
+    user_memories, chat_memories = [], []
+    if not shareable:
+        user_memories, chat_memories = await _select_memories(
+            user_id, chat_id, " ".join(recent_user_turns + [user_input])
+        )
 
     memory_parts = []
     if user_memories:
@@ -505,8 +675,11 @@ async def get_ai_response(
     messages_to_send = [{"role": "system", "content": full_system_prompt}]
     messages_to_send.extend(history)
     messages_to_send.append({"role": "user", "content": user_input})
+    estimated_prompt_tokens = estimate_messages_tokens(messages_to_send)
 
-    typing_task = asyncio.create_task(send_typing_periodically(bot, chat_id))
+    # Circuit breaker: якщо бекенд деградував — відповідаємо одразу, не займаючи воркер
+    if not await _breaker_wait_and_allow():
+        return AI_OVERLOADED_REPLY
 
     try:
         timeout = httpx.Timeout(AI_HTTP_TIMEOUT_SEC, connect=AI_HTTP_CONNECT_TIMEOUT_SEC)
@@ -515,6 +688,10 @@ async def get_ai_response(
             last_err: Optional[Exception] = None
 
             for attempt in range(AI_RETRIES):
+                started = time.monotonic()
+                # Перший слот уже взято вище; для ретраїв перевіряємо breaker повторно
+                if attempt > 0 and not await _breaker_wait_and_allow():
+                    return AI_OVERLOADED_REPLY
                 try:
                     response = await client.post(
                         DEEPSEEK_API_URL,
@@ -532,10 +709,11 @@ async def get_ai_response(
 
                     status = response.status_code
 
-                    # 429 / 5xx -> ретраї з backoff (або Retry-After)
+                    # 429 / 5xx -> ретраї з backoff (або глобальним Retry-After)
                     if status == 429 or status >= 500:
                         ra = _retry_after_seconds(response.headers)
-                        delay = ra if ra is not None else _calc_backoff(attempt)
+                        ai_breaker.record_failure(status=status, retry_after=ra)
+                        delay = _calc_backoff(attempt)
 
                         logger.warning(
                             f"DeepSeek тимчасово недоступний (status={status}), ретрай через {delay:.1f}s"
@@ -547,8 +725,9 @@ async def get_ai_response(
                         await asyncio.sleep(delay)
                         continue
 
-                    # Інші 4xx — без ретраю
+                    # Інші 4xx — без ретраю (бекенд живий, breaker не чіпаємо)
                     if 400 <= status < 500:
+                        ai_breaker.record_success()
                         logger.error(
                             f"DeepSeek API error status={status}, body={_truncate_for_log(response.text)}"
                         )
@@ -560,13 +739,30 @@ async def get_ai_response(
                     if not data.get("choices"):
                         raise ValueError("Empty response")
 
+                    ai_breaker.record_success()
+                    await _record_usage(
+                        chat_id,
+                        data.get("usage"),
+                        estimated_prompt_tokens,
+                        int((time.monotonic() - started) * 1000),
+                    )
                     message_response = data["choices"][0]["message"]
 
                     # Фінальна відповідь
                     ai_content = message_response.get("content", "")
-                    return sanitize_reply(_clean_deepseek_thinking(ai_content))
-
-                except (httpx.RequestError, httpx.HTTPStatusError, ValueError, json.JSONDecodeError) as e:
+                    reply = sanitize_reply(_clean_deepseek_thinking(ai_content))
+                    # Стікер-маркери не кешуємо: відповідь з кешу йде простим текстом
+                    if cache_key and reply and not _STICKER_MARKER_RE.search(reply):
+                        response_cache.put(cache_key, reply)
+                    return reply
+
+                except httpx.HTTPStatusError as e:
+                    # Статус уже зарахований у breaker вище
+                    last_err = e
+                    if attempt == AI_RETRIES - 1:
+                        raise
+                except (httpx.RequestError, ValueError, json.JSONDecodeError) as e:
+                    ai_breaker.record_failure()
                     last_err = e
                     if attempt == AI_RETRIES - 1:
                         raise
@@ -579,16 +775,147 @@ async def get_ai_response(
     except Exception as e:
         logger.error(f"Помилка AI: {e}", exc_info=True)
         return "Ой, щось пішло не так. Можливо, в мене заплуталися клубки ниток. 🧶"
-    finally:
-        typing_task.cancel()
-        try:
-            await typing_task
-        except Exception:
-            pass
 
     return "Ой, щось пішло не так. 🧶"
 
 
+async def _summarize_with_deepseek(
+    chat_id: int, previous_summary: Optional[str], messages: list
+) -> Optional[str]:
+    """Стискає старші репліки діалогу (разом із попереднім підсумком) в один короткий підсумок."""
+    if not await _breaker_wait_and_allow():
+        return None
+
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    if previous_summary:
+        transcript = f"Попередній підсумок: {previous_summary}\n\n{transcript}"
+    payload_messages = [
+        {
+            "role": "system",
+            "content": (
+                "Стисни діалог користувача з ботом-котиком у короткий підсумок українською (до 120 слів). "
+                "Збережи факти про користувача, імена, домовленості й відкриті питання. "
+                "Без вступів і без оцінок — тільки зміст."
+            ),
+        },
+        {"role": "user", "content": transcript},
+    ]
+    estimated_prompt_tokens = estimate_messages_tokens(payload_messages)
+    started = time.monotonic()
+    try:
+        timeout = httpx.Timeout(AI_HTTP_TIMEOUT_SEC, connect=AI_HTTP_CONNECT_TIMEOUT_SEC)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.post(
+                DEEPSEEK_API_URL,
+                headers={
+                    "Authorization": f"Bearer {_get_api_key()}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": DEEPSEEK_MODEL,
+                    "messages": payload_messages,
+                    "max_tokens": AI_SUMMARY_MAX_TOKENS,
+                    "temperature": 0.2,
+                },
+            )
+        if response.status_code == 429 or response.status_code >= 500:
+            ai_breaker.record_failure(
+                status=response.status_code,
+                retry_after=_retry_after_seconds(response.headers),
+            )
+            return None
+        ai_breaker.record_success()
+        response.raise_for_status()
+        data = response.json()
+        await _record_usage(
+            chat_id, data.get("usage"), estimated_prompt_tokens,
+            int((time.monotonic() - started) * 1000),
+        )
+        content = data["choices"][0]["message"].get("content", "")
+        return sanitize_reply(_clean_deepseek_thinking(content)) or None
+    except httpx.RequestError as e:
+        ai_breaker.record_failure()
+        logger.warning(f"Підсумовування діалогу не вдалося: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"Підсумовування діалогу не вдалося: {e}")
+        return None
+
+
+def _ai_is_busy() -> bool:
+    """Підсумки мають найнижчий пріоритет: чекаємо порожніх черг і закритого breaker'а."""
+    return ai_queue_manager.gauges()["queue_depth"] > 0 or ai_breaker.state != CircuitBreaker.CLOSED
+
+
+conversation_summarizer = ConversationSummarizer(
+    summarize=_summarize_with_deepseek,
+    is_busy=_ai_is_busy,
+    trigger_tokens=AI_SUMMARY_TRIGGER_TOKENS,
+    keep_messages=AI_SUMMARY_KEEP_MESSAGES,
+)
+
+
+async def _select_memories(user_id: int, chat_id: int, query: str) -> tuple[list, list]:
+    """Top-k фактів користувача й чату з BM25-індексу (індекс скоупу вантажиться ліниво)."""
+    scopes = [('user', user_id), ('chat', chat_id)]
+    for scope_type, scope_id in scopes:
+        if memory_index.is_loaded(scope_type, scope_id):
+            continue
+        memory_index.begin_load(scope_type, scope_id)
+        rows = await get_memories_for_scope(scope_id, scope_type)
+        memory_index.finish_load(scope_type, scope_id, rows)
+
+    picked = memory_index.select(scopes, query, k=AI_MEMORY_TOP_K, token_cap=AI_MEMORY_TOKEN_CAP)
+    return picked.get(('user', user_id), []), picked.get(('chat', chat_id), [])
+
+
+async def _record_usage(
+    chat_id: int, usage: Optional[dict], estimated_prompt_tokens: int, latency_ms: int
+) -> None:
+    """Зберігає usage з відповіді DeepSeek у денне зведення. Облік не має ламати відповідь."""
+    if not isinstance(usage, dict):
+        return
+    try:
+        await record_ai_usage(
+            chat_id,
+            int(usage.get("prompt_tokens") or 0),
+            int(usage.get("completion_tokens") or 0),
+            cached_prompt_tokens=int(usage.get("prompt_cache_hit_tokens") or 0),
+            estimated_prompt_tokens=estimated_prompt_tokens,
+            latency_ms=latency_ms,
+        )
+    except Exception as e:
+        logger.warning(f"Не вдалося записати usage AI: {e}")
+
+
+async def reload_fast_replies() -> None:
+    """Перебудовує таблицю швидких відповідей з БД (після редагування власником)."""
+    try:
+        fast_replies.load(await get_fast_replies())
+    except Exception as e:
+        logger.error(f"Не вдалося завантажити швидкі відповіді: {e}")
+
+
+async def reload_ai_rate_limits() -> None:
+    """Застосовує ліміти з БД поверх значень з env."""
+    limits = {
+        "user_per_min": AI_USER_RATE_PER_MIN,
+        "user_burst": AI_USER_BURST,
+        "chat_per_min": AI_CHAT_RATE_PER_MIN,
+        "chat_burst": AI_CHAT_BURST,
+    }
+    try:
+        limits.update(await get_ai_rate_limits())
+    except Exception as e:
+        logger.error(f"Не вдалося завантажити ліміти AI: {e}")
+    ai_rate_limiter.configure(
+        user_per_min=limits["user_per_min"],
+        user_burst=int(limits["user_burst"]),
+        chat_per_min=limits["chat_per_min"],
+        chat_burst=int(limits["chat_burst"]),
+    )
+
+
 async def _ai_auto_clear_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     data = context.job.data or {}
     chat_id = data.get("chat_id")
@@ -613,39 +940,6 @@ async def _schedule_ai_auto_clear(application: Application, chat_id: int, user_i
     )
 
 
-async def _ai_delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_data = getattr(context.job, "data", {}) if context.job else {}
-    chat_id = job_data.get("chat_id")
-    message_id = job_data.get("message_id")
-    if not chat_id or not message_id:
-        return
-    try:
-        bot = getattr(context, "bot", None) or context.application.bot
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
-
-async def _schedule_ai_auto_delete(
-    application: Application,
-    *,
-    chat_id: int,
-    message_id: int,
-    timeout: int = 420,
-) -> None:
-    if not application or not application.job_queue:
-        return
-    settings = await get_chat_settings(chat_id)
-    if settings.get("auto_delete_actions", 0) != 1:
-        return
-    application.job_queue.run_once(
-        _ai_delete_message_job,
-        timeout,
-        data={"chat_id": chat_id, "message_id": message_id},
-        name=f"delete_ai_{chat_id}_{message_id}",
-    )
-
-
 async def process_ai_response(
     user_id: int,
     chat_id: int,
@@ -655,11 +949,24 @@ async def process_ai_response(
     mode: str,
     message_to_reply_id: int,
     reply_context: str = None,
+    participants: Optional[list] = None,
+    cache_key: Optional[tuple] = None,
 ) -> None:
+    if outbound_replies.was_sent(reply_key(chat_id, message_to_reply_id, "text")):
+        logger.info(f"Чат {chat_id}: відповідь на {message_to_reply_id} уже надіслана, пропускаю.")
+        return
     try:
-        await save_message(user_id, chat_id, "user", user_input)
+        if participants:
+            # Об'єднаний сплеск: кожна репліка лягає в історію свого автора
+            for p in participants:
+                await save_message(p['user_id'], chat_id, "user", p['text'])
+        else:
+            await save_message(user_id, chat_id, "user", user_input)
         
-        response_text = await get_ai_response(user_id, chat_id, user_input, bot, mode, reply_context)
+        response_text = await get_ai_response(
+            user_id, chat_id, user_input, bot, mode, reply_context,
+            participants=participants, cache_key=cache_key,
+        )
         ai_message_ids: list[int] = []
         sticker_message_id: int | None = None
 
@@ -672,15 +979,13 @@ async def process_ai_response(
                 stickers = application.bot_data.get('all_stickers_cache', [])
                 match = next((s for s in stickers if (s.get('keyword') or '').strip().lower() == sticker_keyword), None)
                 if match and match.get('file_unique_id'):
-                    await bot.send_sticker(
-                        chat_id=chat_id,
-                        sticker=match['file_unique_id'],
-                        reply_to_message_id=message_to_reply_id
-                    )
-                    sticker_msg = await bot.send_sticker(
-                        chat_id=chat_id,
-                        sticker=match['file_unique_id'],
-                        reply_to_message_id=message_to_reply_id
+                    sticker_msg = await outbound_replies.send_once(
+                        reply_key(chat_id, message_to_reply_id, "sticker"),
+                        lambda: bot.send_sticker(
+                            chat_id=chat_id,
+                            sticker=match['file_unique_id'],
+                            reply_to_message_id=message_to_reply_id
+                        ),
                     )
                     if sticker_msg:
                         sticker_message_id = sticker_msg.message_id
@@ -690,42 +995,39 @@ async def process_ai_response(
         
         # If only sticker requested and no text left — do not send empty message
         if response_text:
-            await save_message(user_id, chat_id, "assistant", response_text)
-
-            # Використовуємо безпечну відправку
-            await safe_send_message(bot, chat_id, response_text, message_to_reply_id)
-            ai_message_ids = await safe_send_message(
-                bot, chat_id, response_text, message_to_reply_id
+            history_owners = {p['user_id'] for p in participants} if participants else {user_id}
+            for owner_id in history_owners:
+                await save_message(owner_id, chat_id, "assistant", response_text)
+                conversation_summarizer.schedule(owner_id, chat_id)
+
+            # Використовуємо безпечну відправку; повторна обробка того ж ходу не дублює відповідь
+            ai_message_ids = await outbound_replies.send_once(
+                reply_key(chat_id, message_to_reply_id, "text"),
+                lambda: safe_send_message(bot, chat_id, response_text, message_to_reply_id),
             )
 
         settings = await get_chat_settings(chat_id)
         if settings.get("ai_auto_clear_conversations", 0) == 1:
             await _schedule_ai_auto_clear(application, chat_id, user_id)
         if settings.get("auto_delete_actions", 0) == 1:
-            await _schedule_ai_auto_delete(
-                application,
-                chat_id=chat_id,
-                message_id=message_to_reply_id,
-            )
-            for msg_id in ai_message_ids:
-                await _schedule_ai_auto_delete(
-                    application,
-                    chat_id=chat_id,
-                    message_id=msg_id,
-                )
+            user_message_ids = [p['message_id'] for p in participants] if participants else [message_to_reply_id]
+            for msg_id in user_message_ids + ai_message_ids:
+                message_deleter.schedule(chat_id, msg_id, 420)
             if sticker_message_id:
-                await _schedule_ai_auto_delete(
-                    application,
-                    chat_id=chat_id,
-                    message_id=sticker_message_id,
-                )
+                message_deleter.schedule(chat_id, sticker_message_id, 420)
     except Exception as e:
         logger.error(f"Помилка в process_ai_response: {e}")
+        # Якщо відповідь уже пішла, а впало щось після неї — не лякаємо користувача
+        if outbound_replies.was_sent(reply_key(chat_id, message_to_reply_id, "text")):
+            return
         try:
-            await bot.send_message(
-                chat_id=chat_id,
-                text="Мур... Щось пішло не так. 😿",
-                reply_to_message_id=message_to_reply_id
+            await outbound_replies.send_once(
+                reply_key(chat_id, message_to_reply_id, "error"),
+                lambda: bot.send_message(
+                    chat_id=chat_id,
+                    text="Мур... Щось пішло не так. 😿",
+                    reply_to_message_id=message_to_reply_id
+                ),
             )
         except Exception:
             pass
@@ -763,8 +1065,8 @@ async def _is_ai_invocation(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if bot_username and f"@{bot_username}" in text_lower:
         return True
 
-    # 4. Ключове слово
-    if re.search(r"\b(кошеня|котик|кіт|котику|кошенятко|котяра)\b", text_lower):
+    # 4. Ключове слово (текст уже розібрано роутером — без окремого regex)
+    if text_router.route(message).has("ai_keyword"):
         return True
 
     # 5. Відповідь на повідомлення БОТА (покращена перевірка)
@@ -859,6 +1161,9 @@ async def _parse_natural_memory(fact_text: str) -> Optional[dict]:
         {"role": "user", "content": fact_text}
     ]
 
+    if not await _breaker_wait_and_allow():
+        return None
+
     try:
         timeout = httpx.Timeout(20.0, connect=AI_HTTP_CONNECT_TIMEOUT_SEC)
         async with httpx.AsyncClient(timeout=timeout) as client:
@@ -875,6 +1180,13 @@ async def _parse_natural_memory(fact_text: str) -> Optional[dict]:
                     "temperature": 0,
                 },
             )
+            if response.status_code == 429 or response.status_code >= 500:
+                ai_breaker.record_failure(
+                    status=response.status_code,
+                    retry_after=_retry_after_seconds(response.headers),
+                )
+            else:
+                ai_breaker.record_success()
             response.raise_for_status()
             content = response.json()["choices"][0]["message"]["content"]
             # Clean possible markdown
@@ -1109,6 +1421,9 @@ async def refresh_sticker_cache(application: Application):
         application.bot_data['all_stickers_cache'] = all_stickers
     except: pass
 
+# Очікування стікера після /add_sticker: якщо стікер так і не надіслали — прибираємо
+state_collector.register("user", "pending_sticker_", 3600, prefix=True)
+
 async def handle_sticker(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.sticker: return
     user = update.message.from_user
@@ -1120,25 +1435,47 @@ async def handle_sticker(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await refresh_sticker_cache(context.application)
         await update.message.reply_text(f"Стікер збережено для '{alias}'")
 
-async def handle_sticker_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or not update.message.text: return
+# Тригери для текстового роутера (тексти вже нормалізовані: нижній регістр, апостроф ')
+AI_KEYWORDS = ("кошеня", "котик", "кіт", "котику", "кошенятко", "котяра")
+KATYA_WORDS = ("катя", "русня")
+REMEMBER_WORDS = ("запам'ятай",)
+FORGET_WORDS = ("забудь",)
+
+_STICKER_INDEX: Dict[str, object] = {"source": None, "automaton": None, "by_keyword": {}}
+
+
+def _sticker_index(stickers: list) -> Tuple[KeywordAutomaton, Dict[str, str]]:
+    """Автомат ключових слів стікерів; перебудовується лише коли кеш стікерів замінено."""
+    if _STICKER_INDEX["source"] is not stickers:
+        by_keyword: Dict[str, str] = {}
+        for s in stickers:
+            by_keyword.setdefault(normalize_for_routing(s['keyword']).strip(), s['file_unique_id'])
+        _STICKER_INDEX.update(
+            source=stickers, automaton=KeywordAutomaton(by_keyword.keys()), by_keyword=by_keyword
+        )
+    return _STICKER_INDEX["automaton"], _STICKER_INDEX["by_keyword"]
+
+
+async def handle_sticker_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Відповідає стікером на ключове слово. Викликається текстовим роутером."""
+    if not update.message or not update.message.text: return False
     if 'all_stickers_cache' not in context.application.bot_data:
         await refresh_sticker_cache(context.application)
-    
+
     stickers = context.application.bot_data.get('all_stickers_cache', [])
-    text = update.message.text.lower()
-    
-    for s in stickers:
-        if re.search(rf"(^|\W){re.escape(s['keyword'])}(\W|$)", text):
-            try: await update.message.reply_sticker(s['file_unique_id'])
-            except: pass
-            return
+    if not stickers: return False
+    automaton, by_keyword = _sticker_index(stickers)
+    keyword = text_router.match_dynamic(text_router.route(update.message), automaton)
+    if not keyword: return False
+    try: await update.message.reply_sticker(by_keyword[keyword])
+    except: pass
+    return True
 
 async def handle_katya_reaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.message and update.message.text:
-        if re.search(r"\b(катя|русня)\b", update.message.text.lower()):
-            try: await context.bot.set_message_reaction(update.message.chat.id, update.message.message_id, "🤮")
-            except: pass
+    """Реакція на маршрут `katya` текстового роутера."""
+    if update.message:
+        try: await context.bot.set_message_reaction(update.message.chat.id, update.message.message_id, "🤮")
+        except: pass
 
 async def set_emoji_reactions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     args = context.args or []
@@ -1164,39 +1501,54 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not _should_ai_process(update, context):
         return
 
-    if not await is_ai_enabled_for_chat(chat.id):
-        return
-    
     # Визначаємо, чи це звернення до ШІ
     is_invocation = await _is_ai_invocation(update, context)
     if not is_invocation: return
 
-    # Прості відповіді
-    text_lower = message.text.lower()
-    for keys, resps in SIMPLE_RESPONCES.items():
-        if any(k in text_lower for k in keys):
-            await message.reply_text(random.choice(resps))
-            return
-    try:
-        await context.bot.send_chat_action(chat_id=chat.id, action=ChatAction.TYPING)
-    except Exception:
-        pass
-
-
-    # Rate Limit Check
-    # Якщо це пряма відповідь (reply) на повідомлення бота — ігноруємо rate limit
+    # Ліміти — до будь-яких звернень до БД і до слота в черзі.
+    # Пряма відповідь (reply) на повідомлення бота не списує бюджет користувача, але рахується в бюджет чату
     is_direct_reply = False
     if message.reply_to_message:
         bot_id = context.application.bot_data.get('bot_id')
         if bot_id and message.reply_to_message.from_user and message.reply_to_message.from_user.id == bot_id:
             is_direct_reply = True
 
-    if not is_direct_reply:
-        now = time.time()
-        last_req = _user_last_request.get(user.id, 0)
-        if now - last_req < USER_RATE_LIMIT:
-            return 
-        _user_last_request[user.id] = now
+    if not ai_rate_limiter.configured:
+        await reload_ai_rate_limits()
+    throttled = ai_rate_limiter.check(user.id, chat.id, charge_user=not is_direct_reply)
+    if throttled:
+        logger.debug(f"AI rate limit ({throttled}): user {user.id}, chat {chat.id}")
+        return
+
+    if not await is_ai_enabled_for_chat(chat.id):
+        return
+
+    # Швидкі відповіді: один пошук за нормалізованим текстом
+    normalized = normalize_prompt(message.text)
+    if not fast_replies.loaded:
+        await reload_fast_replies()
+    fast_reply = fast_replies.match(normalized)
+    if fast_reply:
+        await message.reply_text(fast_reply)
+        return
+
+    # Короткі запити без контексту відповіді — з кешу, без виклику API
+    mode = context.chat_data.get('user_ai_modes', {}).get(user.id, DEFAULT_BOT_MODE)
+    cache_key = None
+    if not message.reply_to_message:
+        cache_key = response_cache.key_for(normalized, mode, await get_current_theme_name())
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached:
+            await message.reply_text(cached)
+            return
+
+    # Load shedding: поки breaker відкритий, не займаємо слот у черзі
+    if ai_breaker.state == CircuitBreaker.OPEN:
+        try:
+            await message.reply_text(AI_OVERLOADED_REPLY)
+        except Exception:
+            pass
+        return
 
     reply_context = None
     if message.reply_to_message:
@@ -1205,15 +1557,16 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_context = reply_txt
 
     # Черга ШІ
-    mode = context.chat_data.get('user_ai_modes', {}).get(user.id, DEFAULT_BOT_MODE)
     task_data = {
         'user_id': user.id, 'user_input': message.text,
         'mode': mode, 'message_to_reply_id': message.message_id,
-        'reply_context': reply_context 
+        'reply_context': reply_context,
+        'user_name': user.first_name,
+        'cache_key': cache_key,
     }
     # Передаємо application, щоб у воркері був доступ до bot_data (кеш стікерів тощо)
     task_data['application'] = context.application
-    asyncio.create_task(ai_queue_manager.add_task(chat.id, context.bot, task_data))
+    await ai_queue_manager.add_task(chat.id, context.bot, task_data)
 
 
 # =============================================================================
@@ -1237,7 +1590,7 @@ def register_ai_handlers(application: Application):
     remember_conv = ConversationHandler(
         entry_points=[
             CommandHandler("remember", remember_command_entry),
-            MessageHandler(filters.TEXT & filters.Regex(r"(?i).*\b(запам'ятай|запамʼятай)\b.*"), remember_command_entry)
+            MessageHandler(filters.TEXT & text_router.filter("remember"), remember_command_entry)
         ],
         states={
             STATE_REMEMBER_SCOPE: [CallbackQueryHandler(remember_scope_callback, pattern=r"^remember_scope_")]
@@ -1249,7 +1602,7 @@ def register_ai_handlers(application: Application):
     forget_conv = ConversationHandler(
         entry_points=[
             CommandHandler("forget", forget_command_entry),
-            MessageHandler(filters.TEXT & filters.Regex(r"(?i).*\b(забудь)\b.*"), forget_command_entry)
+            MessageHandler(filters.TEXT & text_router.filter("forget"), forget_command_entry)
         ],
         states={
             STATE_FORGET_SCOPE: [CallbackQueryHandler(forget_scope_callback, pattern=r"^forget_scope_")]
@@ -1263,8 +1616,7 @@ def register_ai_handlers(application: Application):
 
     # Стікери та текст
     application.add_handler(MessageHandler(filters.Sticker.ALL, handle_sticker), group=0)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_katya_reaction), group=2)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_sticker_keyword), group=2)
+    # Реакції та стікери на ключові слова викликає текстовий роутер (text_router_handlers)
     
     # Видалено обробник фотографій (handle_photo)
     
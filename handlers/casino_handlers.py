@@ -19,6 +19,8 @@ from telegram.ext import (
 )
 
 from bot.core.database import get_user_balance, update_user_balance
+from bot.services.message_deleter import message_deleter
+from bot.services.state_gc import state_collector
 from bot.utils.utils import mention, get_casino_slots, get_casino_multipliers
 from bot.handlers.chat_admin_handlers import is_chat_module_enabled # (ДОБРЕ) Вже було
 
@@ -29,17 +31,7 @@ MIN_BET = 10
 MAX_BET = 100000
 COOLDOWN_SECONDS = 2  # Cooldown між іграми
 
-async def delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """
-    Job для видалення повідомлення казино через 3 хвилини.
-    """
-    data = context.job.data
-    chat_id = data["chat_id"]
-    message_id = data["message_id"]
-    try:
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception as e:
-        logger.debug(f"Не вдалося видалити повідомлення {message_id} у {chat_id}: {e}")
+state_collector.register("user", "casino_last_played_", COOLDOWN_SECONDS, prefix=True, stamp=lambda played_at: played_at)
 
 # "Слоти" та їх "вага" (шанс випадіння)
 # 🐾 (Кіт), 🌿 (М'ята), 🐟 (Риба), ✝️ (Хрест/Монашка - Джекпот)
@@ -248,18 +240,9 @@ async def casino_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     # (НОВЕ) Автовидалення повідомлення казино через 3 хвилини, якщо увімкнено
     if await is_chat_module_enabled(chat, "auto_delete_actions"):
-        # Видаляємо відповідь бота
-        context.job_queue.run_once(
-            delete_message_job,
-            60,  # 3 хвилини
-            data={"chat_id": chat.id, "message_id": sent.message_id}
-        )
-        # Видаляємо виклики команди користувача
-        context.job_queue.run_once(
-            delete_message_job,
-            60,  # 3 хвилини
-            data={"chat_id": chat.id, "message_id": update.message.message_id}
-        )
+        # Видаляємо відповідь бота та виклик команди користувача
+        message_deleter.schedule(chat.id, sent.message_id, 60)
+        message_deleter.schedule(chat.id, update.message.message_id, 60)
 
 
 async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -22,8 +22,6 @@ from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     ChatMember,
-    ChatMemberAdministrator,
-    ChatMemberOwner,
     User,
     CallbackQuery,
 )
@@ -57,6 +55,7 @@ from bot.core.database import (
 )
 
 from bot.features.new_year_mode import is_in_new_year_period, format_new_year_mode
+from bot.services.chat_member_cache import chat_member_cache
 
 
 logger = logging.getLogger(__name__)
@@ -125,19 +124,8 @@ async def _check_admin_rights(
     Якщо needs_ban_right=True, перевіряє право банити.
     """
     try:
-        chat_member = await bot.get_chat_member(chat_id, user_id)
-        
-        if isinstance(chat_member, (ChatMemberAdministrator, ChatMemberOwner)):
-            # Власник чату має всі права
-            if isinstance(chat_member, ChatMemberOwner):
-                return True
-            # Якщо потрібні права на бан (покуту)
-            if needs_ban_right:
-                return chat_member.can_restrict_members
-            # Якщо достатньо бути просто адміном
-            return True
-                
-        return False
+        # Список адмінів кешується; звичайні учасники перевіряються без запитів до API
+        return await chat_member_cache.is_admin(bot, chat_id, user_id, needs_ban_right=needs_ban_right)
     except Exception as e:
         logger.warning(
             f"Не вдалося перевірити права настоятеля для {user_id} в {chat_id}: {e}"
@@ -896,13 +884,6 @@ def register_chat_admin_handlers(application: Application):
         )
     )
     
-    # Обробник текстового вводу для налаштувань
-    application.add_handler(
-        MessageHandler(
-            filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE,
-            handle_admin_text_input
-        ),
-        group=2 # Вищий пріоритет, щоб перехопити ввід
-    )
+    # Текстовий ввід для налаштувань (handle_admin_text_input) викликає текстовий роутер
     
     logger.info("Модуль Настоятеля (chat_admin_handlers.py) завантажено. 🌿")
@@ -11,17 +11,20 @@
 
 import logging
 import html
-import re
 import random
 import asyncio # (НОВЕ) Додано для затримок
+from typing import Any, Dict, Optional
 
 from telegram import Update
 from telegram.ext import Application, ContextTypes, MessageHandler, filters, ChatMemberHandler
 from telegram.constants import ParseMode
 from telegram.error import Forbidden, BadRequest
 # (ВИПРАВЛЕНО) Чистіші імпорти
-from bot.core.database import get_chat_settings, get_filtered_words, add_user_warn, get_user_warns, reset_user_warns
-from bot.handlers.chat_admin_handlers import is_chat_module_enabled, _check_admin_rights
+from bot.core.database import get_chat_settings, get_filtered_words, add_user_warn, get_user_warns, reset_user_warns, get_chat_ids_with_module
+from bot.handlers.chat_admin_handlers import _check_admin_rights
+from bot.services.chat_member_cache import chat_member_cache
+from bot.services.telegram_rate_limiter import bulk_priority
+from bot.services.text_router import text_router
 
 logger = logging.getLogger(__name__)
 
@@ -72,86 +75,111 @@ async def handle_new_members(update: Update, context: ContextTypes.DEFAULT_TYPE)
         except Exception as e:
             logger.error(f"Не вдалося надіслати привітання в чат {chat.id}: {e}")
 
-async def word_filter_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def word_filter_handler(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, settings: Optional[Dict[str, Any]] = None
+) -> bool:
     """
     Перевіряє повідомлення на єресь (заборонені слова).
-    (ПОВНІСТЮ ПЕРЕРОБЛЕНО ЛОГІКУ)
+    Викликається текстовим роутером; повертає True, якщо повідомлення видалено.
     """
     if not update.message or not update.message.text or not update.effective_chat:
-        return
-        
+        return False
+
     chat = update.effective_chat
     user = update.effective_user
+    if settings is None:
+        settings = await get_chat_settings(chat.id)
 
     # Модуль вимкнено?
-    if not await is_chat_module_enabled(chat, "word_filter"):
-        return
-        
-    # Настоятелі (адміни) мають імунітет
-    if await _check_admin_rights(context.bot, user.id, chat.id, needs_ban_right=False):
-        return
+    if settings.get("word_filter_enabled", 0) != 1:
+        return False
 
-    # Отримуємо список слів
+    # Отримуємо список слів (дешевше за перевірку прав — спершу він)
     filtered_words = await get_filtered_words(chat.id)
     if not filtered_words:
-        return
-        
-    message_text = update.message.text.lower()
+        return False
+
+    # Усі слова чату — один автомат, один прохід по вже нормалізованому тексту
+    automaton = text_router.automaton(f"word_filter:{chat.id}", filtered_words)
+    word = text_router.match_dynamic(text_router.route(update.message), automaton)
+    if not word:
+        return False
+
+    # Настоятелі (адміни) мають імунітет; список адмінів кешується
+    if await _check_admin_rights(context.bot, user.id, chat.id, needs_ban_right=False):
+        return False
+
+    logger.info(f"Знайдено єресь '{word}' від {user.id} в чаті {chat.id}.")
     
-    for word in filtered_words:
-        # Використовуємо \b для пошуку цілих слів
-        if re.search(rf'\b{re.escape(word)}\b', message_text, re.IGNORECASE):
-            logger.info(f"Знайдено єресь '{word}' від {user.id} в чаті {chat.id}.")
-            
-            try:
-                # 1. Видаляємо єресь
-                await update.message.delete()
-            except (Forbidden, BadRequest) as e:
-                logger.warning(f"Не вдалося видалити повідомлення (немає прав?): {e}")
-                # Якщо не можемо видалити, не можемо й банити. Просто виходимо.
-                return
-
-            user_mention = f"<a href='tg://user?id={user.id}'>{html.escape(user.first_name)}</a>"
-            
-            # 2. Надсилаємо тимчасове повідомлення про покаяння
+    try:
+        # 1. Видаляємо єресь
+        await update.message.delete()
+    except (Forbidden, BadRequest) as e:
+        logger.warning(f"Не вдалося видалити повідомлення (немає прав?): {e}")
+        # Якщо не можемо видалити, не можемо й банити. Просто виходимо.
+        return False
+
+    user_mention = f"<a href='tg://user?id={user.id}'>{html.escape(user.first_name)}</a>"
+    
+    # 2. Надсилаємо тимчасове повідомлення про покаяння
+    try:
+        warn_msg = await context.bot.send_message(
+            chat.id,
+            f"✝️ {user_mention}, покайся. Не поширюй єресь. 🌿",
+            parse_mode=ParseMode.HTML
+        )
+    except Exception as e:
+        logger.warning(f"Не вдалося надіслати повідомлення про єресь: {e}")
+        return True  # Повідомлення вже видалено
+
+    # 3. Додаємо варн (чиста логіка, без фейкових апдейтів)
+    new_warns = await add_user_warn(chat.id, user.id)
+    max_warns = settings.get('max_warns', 3)
+    
+    # 4. Вирішуємо долю
+    if new_warns >= max_warns:
+        logger.info(f"Користувач {user.id} досяг ліміту ({new_warns}/{max_warns}) в чаті {chat.id}. Покута (бан).")
+        try:
+            await context.bot.ban_chat_member(chat.id, user.id)
+            await reset_user_warns(chat.id, user.id) # Очищуємо
+            await warn_msg.edit_text(
+                 f"✝️ {user_mention} відправляється на покуту (<b>бан</b>) "
+                 f"за досягнення ліміту ({new_warns}/{max_warns}) автоматичних попереджень.",
+                 parse_mode=ParseMode.HTML
+            )
+        except Exception as e:
+            logger.error(f"Не вдалося забанити {user.id}: {e}")
+            await warn_msg.edit_text(f"Хотіла забанити {user_mention}, але не маю прав... 😿", parse_mode=ParseMode.HTML)
+    else:
+        # Оновлюємо тимчасове повідомлення
+        await warn_msg.edit_text(
+             f"✝️ {user_mention}, не поширюй єресь. Повідомлення видалено.\n"
+             f"Це твоє <b>попередження {new_warns}/{max_warns}</b>. Слідкуй за мовою. 🌿",
+             parse_mode=ParseMode.HTML
+        )
+        
+    return True
+
+async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Оновлює кеш учасників/адмінів з ChatMemberUpdated (призначення, зняття, вихід)."""
+    change = update.chat_member or update.my_chat_member
+    if change:
+        chat_member_cache.apply_update(change)
+
+
+async def prewarm_admin_cache_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Наперед підтягує списки адмінів чатів з фільтром слів, щоб модерація не чекала API."""
+    chat_ids = await get_chat_ids_with_module("word_filter_enabled")
+    warmed = 0
+    with bulk_priority():
+        for chat_id in chat_ids:
             try:
-                warn_msg = await context.bot.send_message(
-                    chat.id,
-                    f"✝️ {user_mention}, покайся. Не поширюй єресь. 🌿",
-                    parse_mode=ParseMode.HTML
-                )
+                if await chat_member_cache.prewarm(context.bot, chat_id):
+                    warmed += 1
             except Exception as e:
-                logger.warning(f"Не вдалося надіслати повідомлення про єресь: {e}")
-                return # Не можемо продовжити
+                logger.debug(f"Не вдалося підтягнути адмінів {chat_id}: {e}")
+    logger.info(f"Кеш адмінів: підтягнуто {warmed} з {len(chat_ids)} чатів з фільтром слів.")
 
-            # 3. Додаємо варн (чиста логіка, без фейкових апдейтів)
-            new_warns = await add_user_warn(chat.id, user.id)
-            settings = await get_chat_settings(chat.id)
-            max_warns = settings.get('max_warns', 3)
-            
-            # 4. Вирішуємо долю
-            if new_warns >= max_warns:
-                logger.info(f"Користувач {user.id} досяг ліміту ({new_warns}/{max_warns}) в чаті {chat.id}. Покута (бан).")
-                try:
-                    await context.bot.ban_chat_member(chat.id, user.id)
-                    await reset_user_warns(chat.id, user.id) # Очищуємо
-                    await warn_msg.edit_text(
-                         f"✝️ {user_mention} відправляється на покуту (<b>бан</b>) "
-                         f"за досягнення ліміту ({new_warns}/{max_warns}) автоматичних попереджень.",
-                         parse_mode=ParseMode.HTML
-                    )
-                except Exception as e:
-                    logger.error(f"Не вдалося забанити {user.id}: {e}")
-                    await warn_msg.edit_text(f"Хотіла забанити {user_mention}, але не маю прав... 😿", parse_mode=ParseMode.HTML)
-            else:
-                # Оновлюємо тимчасове повідомлення
-                await warn_msg.edit_text(
-                     f"✝️ {user_mention}, не поширюй єресь. Повідомлення видалено.\n"
-                     f"Це твоє <b>попередження {new_warns}/{max_warns}</b>. Слідкуй за мовою. 🌿",
-                     parse_mode=ParseMode.HTML
-                )
-                
-            return # Одне порушення за повідомлення
 
 def register_chat_event_handlers(application: Application):
     """Реєструє обробники для пасивних подій чату."""
@@ -161,13 +189,14 @@ def register_chat_event_handlers(application: Application):
         MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_members)
     )
     
-    # Фільтр слів (високий пріоритет)
+    # Фільтр слів викликає текстовий роутер (text_router_handlers), до реакцій і дій
+
+    # Зміни учасників (адмін призначений/знятий, бота вигнали) — інвалідація кешу прав
     application.add_handler(
-        MessageHandler(
-            filters.TEXT & ~filters.COMMAND & filters.ChatType.GROUPS,
-            word_filter_handler
-        ),
-        group=3
+        ChatMemberHandler(track_chat_member, ChatMemberHandler.ANY_CHAT_MEMBER),
+        group=-1,
     )
+    if application.job_queue:
+        application.job_queue.run_once(prewarm_admin_cache_job, when=15, name="prewarm_admin_cache")
     
     logger.info("Модуль Подій Чату (chat_event_handlers.py) завантажено. Мур... 🐾")
\ No newline at end of file
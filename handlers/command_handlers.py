@@ -12,10 +12,10 @@ command_handlers.py
 
 import logging
 import os
-import re
 import io
 import asyncio
 from datetime import date
+from typing import Any, Dict, Optional
 import html
 
 # --- Telegram Imports ---
@@ -42,14 +42,14 @@ from bot.core.database import (
     set_daily_prediction,
     increment_jerk_count,
     get_jerk_count,
-    get_user_by_username,
     get_chat_settings,
 )
 from bot.services.predictions import get_random_prediction
+from bot.services.message_deleter import message_deleter
+from bot.services.user_directory import user_directory
 from bot.utils.utils import (
     PHOTO_DIR,
     format_target_mention,
-    get_user_from_username,
     mention,
 )
 from bot.handlers.chat_admin_handlers import is_chat_module_enabled # Перевірка прав
@@ -80,18 +80,6 @@ ACTIONS = {
     "дроч": "💦 {sender} дрочить на {target} і йде по горішки"
 }
 
-async def delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """
-    Job для видалення повідомлення дії через 3 хвилини.
-    """
-    data = context.job.data
-    chat_id = data["chat_id"]
-    message_id = data["message_id"]
-    try:
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception as e:
-        logger.debug(f"Не вдалося видалити повідомлення {message_id} у {chat_id}: {e}")
-
 # (НОВЕ) Безпечна відповідь на callback
 async def _query_answer_safe(query: CallbackQuery) -> None:
     """
@@ -107,225 +95,165 @@ async def _query_answer_safe(query: CallbackQuery) -> None:
 # =============================================================================
 
 
-async def handle_action_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_action_commands(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    action: str,
+    settings: Optional[Dict[str, Any]] = None,
+):
     """
     Обробляє команди дій (наприклад, "обійняти @user").
+    Дію (ключ ACTIONS) визначає текстовий роутер; settings — уже завантажені налаштування чату.
     Спеціальна обробка для команди "дроч" з підрахунком.
     """
-    if not update.message or not update.message.text:
-        logger.warning("handle_action_commands: оновлення без тексту.")
+    if not update.message or not update.message.text or action not in ACTIONS:
         return
 
+    if settings is None:
+        settings = await get_chat_settings(update.effective_chat.id)
     # --- ПЕРЕВІРКА ПРАВ ---
-    if not await is_chat_module_enabled(update.effective_chat, "commands_enabled"):
+    if settings.get("commands_enabled", 1) != 1:
         logger.debug(
             f"Module 'commands_enabled' disabled for chat {update.effective_chat.id}. Ignoring action."
         )
         return
     # --- КІНЕЦЬ ПЕРЕВІРКИ ---
 
-    text = update.message.text.strip()
     user = update.message.from_user
     sender = mention(user)
+    action_response_template = ACTIONS[action]
+    target_user_resolved = None
+    target_string_display = None
+    target_user_id = None
+    target_username_mentioned = None
+
+    # 1. Визначення цілі (Target)
+    if update.message.reply_to_message:
+        target_user_resolved = update.message.reply_to_message.from_user
+        target_user_id = getattr(target_user_resolved, "id", None)
+    elif update.message.entities:
+        for entity in update.message.entities:
+            if entity.type == "text_mention" and entity.user:
+                target_user_resolved = entity.user
+                target_user_id = getattr(target_user_resolved, "id", None)
+                break
+            elif entity.type == "mention":
+                username_from_mention = update.message.text[
+                    entity.offset + 1 : entity.offset + entity.length
+                ]
+                target_username_mentioned = username_from_mention
+                # Шукаємо в локальному довіднику (пам'ять + БД), без запитів до API
+                known_user = await user_directory.find_by_username(username_from_mention)
+                if known_user:
+                    target_user_id = known_user.id
+                    target_string_display = known_user.mention_html(known_user.first_name)
+                else:
+                    target_string_display = (
+                        "<a href='https://t.me/{username}'>@{username}</a>".format(
+                            username=html.escape(username_from_mention)
+                        )
+                    )
+                break
 
-    for action_key, action_response_template in ACTIONS.items():
-        pattern = rf"^\s*{re.escape(action_key)}(?:\s.*)?$"
+    if target_user_id is not None and target_user_id == user.id:
+        return
 
-        if re.match(pattern, text, re.IGNORECASE):
-            action = action_key
-            target_user_resolved = None
-            target_string_display = None
-            target_user_id = None
-            target_username_mentioned = None
+    if (
+        target_username_mentioned
+        and user.username
+        and target_username_mentioned.lower() == user.username.lower()
+    ):
+        return
 
-            # 1. Визначення цілі (Target)
-            if update.message.reply_to_message:
-                target_user_resolved = update.message.reply_to_message.from_user
-                target_user_id = getattr(target_user_resolved, "id", None)
-            elif update.message.entities:
-                for entity in update.message.entities:
-                    if entity.type == "text_mention" and entity.user:
-                        target_user_resolved = entity.user
-                        target_user_id = getattr(target_user_resolved, "id", None)
-                        break
-                    elif entity.type == "mention":
-                        username_from_mention = update.message.text[
-                            entity.offset + 1 : entity.offset + entity.length
-                        ]
-                        target_username_mentioned = username_from_mention
-                        # 1) Спробуємо знайти в локальній БД (швидше та приватніше)
-                        try:
-                            db_user = await get_user_by_username(username_from_mention)
-                        except Exception:
-                            db_user = None
-
-                        if db_user:
-                            # Відомий у БД: відображаємо через ID/ім'я
-                            target_user_id = db_user.get("user_id")
-                            target_string_display = (
-                                "<a href='tg://user?id={user_id}'>{label}</a>".format(
-                                    user_id=db_user["user_id"],
-                                    label=html.escape(
-                                        db_user.get("first_name")
-                                        or db_user.get("username")
-                                        or str(db_user["user_id"])
-                                    ),
-                                )
-                            )
-                        else:
-                            # 2) Як запасний варіант — пробуємо отримати через API
-                            potential_user = await get_user_from_username(
-                                context,
-                                username_from_mention,
-                            )
-                            if potential_user and not potential_user.is_bot:
-                                target_user_resolved = potential_user
-                                target_user_id = getattr(target_user_resolved, "id", None)
-                            else:
-                                try:
-                                    chat_obj = await context.bot.get_chat(
-                                        f"@{username_from_mention}"
-                                    )
-                                    if getattr(chat_obj, "first_name", None):
-                                        target_user_id = getattr(chat_obj, "id", None)
-                                        target_string_display = (
-                                            "<a href='tg://user?id={user_id}'>{label}</a>".format(
-                                                user_id=chat_obj.id,
-                                                label=html.escape(chat_obj.first_name),
-                                            )
-                                        )
-                                    else:
-                                        target_string_display = (
-                                            "<a href='https://t.me/{username}'>@{username}</a>".format(
-                                                username=html.escape(username_from_mention)
-                                            )
-                                        )
-                                except Exception:
-                                    target_string_display = (
-                                        "<a href='https://t.me/{username}'>@{username}</a>".format(
-                                            username=html.escape(username_from_mention)
-                                        )
-                                    )
-                        break
-
-            if target_user_id is not None and target_user_id == user.id:
-                return
+    if not target_user_resolved and not target_string_display:
+        return
 
+    # 2. Форматування відповіді
+    if target_user_resolved:
+        # Якщо дія була у відповідь на повідомлення — показуємо клікабельну згадку через ID
+        try:
             if (
-                target_username_mentioned
-                and user.username
-                and target_username_mentioned.lower() == user.username.lower()
+                update.message.reply_to_message
+                and update.message.reply_to_message.from_user
+                and getattr(target_user_resolved, "id", None)
+                == update.message.reply_to_message.from_user.id
             ):
-                return
-
-            if not target_user_resolved and not target_string_display:
-                return
-
-            # 2. Форматування відповіді
-            if target_user_resolved:
-                # Якщо дія була у відповідь на повідомлення — показуємо клікабельну згадку через ID
-                try:
-                    if (
-                        update.message.reply_to_message
-                        and update.message.reply_to_message.from_user
-                        and getattr(target_user_resolved, "id", None)
-                        == update.message.reply_to_message.from_user.id
-                    ):
-                        # clickable mention for reply targets
-                        target_for_response = mention(target_user_resolved)
-                    else:
-                        # Інакше показуємо plain text ім'я (щоб не було посилань)
-                        target_name = (
-                            getattr(target_user_resolved, "first_name", None)
-                            or getattr(target_user_resolved, "username", None)
-                            or str(getattr(target_user_resolved, "id", ""))
-                        )
-                        target_for_response = html.escape(str(target_name))
-                except Exception:
-                    target_for_response = html.escape(
-                        str(
-                            getattr(
-                                target_user_resolved,
-                                "first_name",
-                                getattr(
-                                    target_user_resolved,
-                                    "username",
-                                    getattr(target_user_resolved, "id", ""),
-                                ),
-                            )
-                        )
-                    )
+                # clickable mention for reply targets
+                target_for_response = mention(target_user_resolved)
             else:
-                target_for_response = target_string_display or "себе"
+                # Інакше показуємо plain text ім'я (щоб не було посилань)
+                target_name = (
+                    getattr(target_user_resolved, "first_name", None)
+                    or getattr(target_user_resolved, "username", None)
+                    or str(getattr(target_user_resolved, "id", ""))
+                )
+                target_for_response = html.escape(str(target_name))
+        except Exception:
+            target_for_response = html.escape(
+                str(
+                    getattr(
+                        target_user_resolved,
+                        "first_name",
+                        getattr(
+                            target_user_resolved,
+                            "username",
+                            getattr(target_user_resolved, "id", ""),
+                        ),
+                    )
+                )
+            )
+    else:
+        target_for_response = target_string_display or "себе"
+
+    response = action_response_template.format(
+        sender=sender,
+        target=target_for_response,
+    )
 
-            response = action_response_template.format(
-                sender=sender,
-                target=target_for_response,
+    # (НОВЕ) Спеціальна обробка для дрочок
+    if action == "дроч":
+        # Збільшуємо лічильник дрочок
+        new_count = await increment_jerk_count(user.id)
+        response += f"\nВсього горішків з'їдено: <b>{new_count}</b>👅"
+
+    photo_path = os.path.join(PHOTO_DIR, f"{action}.jpg")
+
+    # 3. Надсилання
+    try:
+        if os.path.exists(photo_path):
+            def _read_bytes(path: str) -> bytes:
+                with open(path, "rb") as f:
+                    return f.read()
+
+            data = await asyncio.to_thread(_read_bytes, photo_path)
+            sent_message = await update.message.reply_photo(
+                photo=InputFile(
+                    io.BytesIO(data),
+                    filename=os.path.basename(photo_path),
+                ),
+                caption=response,
+                parse_mode=ParseMode.HTML,
             )
+        else:
+            sent_message = await update.message.reply_html(response)
 
-            # (НОВЕ) Спеціальна обробка для дрочок
-            if action == "дроч":
-                # Збільшуємо лічильник дрочок
-                new_count = await increment_jerk_count(user.id)
-                response += f"
-Всього горішків з'їдено: <b>{new_count}</b>👅"
-
-            photo_path = os.path.join(PHOTO_DIR, f"{action}.jpg")
-
-            # 3. Надсилання
-            try:
-                if os.path.exists(photo_path):
-                    def _read_bytes(path: str) -> bytes:
-                        with open(path, "rb") as f:
-                            return f.read()
-
-                    data = await asyncio.to_thread(_read_bytes, photo_path)
-                    sent_message = await update.message.reply_photo(
-                        photo=InputFile(
-                            io.BytesIO(data),
-                            filename=os.path.basename(photo_path),
-                        ),
-                        caption=response,
-                        parse_mode=ParseMode.HTML,
-                    )
-                else:
-                    sent_message = await update.message.reply_html(response)
-
-                # Автовидалення через 3 хвилини, якщо ввімкнено
-                settings = await get_chat_settings(update.effective_chat.id)
-                if settings.get("auto_delete_actions", 0) == 1:
-                    # Видаляємо відповідь бота
-                    context.job_queue.run_once(
-                        delete_message_job,
-                        180,  # 3 хвилини
-                        data={
-                            "chat_id": sent_message.chat_id,
-                            "message_id": sent_message.message_id,
-                        },
-                        name=f"delete_action_{sent_message.message_id}",
-                    )
-                    # Видаляємо виклики команди користувача
-                    context.job_queue.run_once(
-                        delete_message_job,
-                        180,  # 3 хвилини
-                        data={
-                            "chat_id": update.effective_chat.id,
-                            "message_id": update.message.message_id,
-                        },
-                        name=f"delete_command_{update.message.message_id}",
-                    )
+        # Автовидалення через 3 хвилини, якщо ввімкнено
+        if settings.get("auto_delete_actions", 0) == 1:
+            # Видаляємо відповідь бота та виклик команди користувача
+            message_deleter.schedule(sent_message.chat_id, sent_message.message_id, 180)
+            message_deleter.schedule(update.effective_chat.id, update.message.message_id, 180)
+
+    except Exception as e:
+        logger.error(
+            f"Помилка виконання дії '{action}' для {user.id}: {e}",
+            exc_info=True,
+        )
+        # (СТИЛІЗОВАНО)
+        await update.message.reply_text(
+            "Ой, мур... 😿 Щось пішло не так. Не можу цього зробити."
+        )
 
-            except Exception as e:
-                logger.error(
-                    f"Помилка виконання дії '{action}' для {user.id}: {e}",
-                    exc_info=True,
-                )
-                # (СТИЛІЗОВАНО)
-                await update.message.reply_text(
-                    "Ой, мур... 😿 Щось пішло не так. Не можу цього зробити."
-                )
 
-            break # Дія виконана, виходимо
 # =============================================================================
 # 2. Prediction Handlers (Обробники Передбачень)
 # =============================================================================
@@ -367,20 +295,9 @@ async def prediction_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Автовидалення через 10 хвилин, якщо ввімкнено
         settings = await get_chat_settings(update.effective_chat.id)
         if settings.get('auto_delete_actions', 0) == 1:
-            # Видаляємо відповідь бота
-            context.job_queue.run_once(
-                delete_message_job,
-                600,  # 10 хвилин
-                data={"chat_id": sent_message.chat_id, "message_id": sent_message.message_id},
-                name=f"delete_prediction_{sent_message.message_id}"
-            )
-            # Видаляємо виклики команди користувача
-            context.job_queue.run_once(
-                delete_message_job,
-                600,  # 10 хвилин
-                data={"chat_id": update.effective_chat.id, "message_id": update.message.message_id},
-                name=f"delete_command_{update.message.message_id}"
-            )
+            # Видаляємо відповідь бота та виклик команди користувача
+            message_deleter.schedule(sent_message.chat_id, sent_message.message_id, 600)
+            message_deleter.schedule(update.effective_chat.id, update.message.message_id, 600)
 
 
 # =============================================================================
@@ -542,16 +459,7 @@ def register_command_handlers(application: Application):
     )
 
     # --- Команди Дій (зі словника ACTIONS) ---
-    for action_key in ACTIONS.keys():
-        application.add_handler(
-            MessageHandler(
-                filters.TEXT
-                & ~filters.COMMAND # (ДОДАНО) Ігноруємо команди /
-                & filters.ChatType.GROUPS # (ДОДАНО) Тільки в групах
-                & filters.Regex(rf"(?i)^\s*{re.escape(action_key)}\b(?:\s.*)?$"),
-                handle_action_commands,
-            )
-        )
+    # Окремих MessageHandler'ів немає: дію знаходить текстовий роутер (text_router_handlers)
 
     # (СТИЛІЗОВАНО)
     logger.info("Обробники Команд Дій (command_handlers.py) завантажено. 📜")
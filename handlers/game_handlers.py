@@ -22,6 +22,7 @@ from bot.core.database import get_user_balance, update_user_balance
 from bot.utils.utils import format_time, cancel_auto_close, set_auto_close_payload, start_auto_close
 # --- ДОДАНО: Перевірка прав ---
 from bot.handlers.chat_admin_handlers import is_chat_module_enabled
+from bot.services.state_gc import state_collector
 # --- ---
 
 logger = logging.getLogger(__name__)
@@ -50,6 +51,12 @@ async def _arm_mini_games_auto_close(context: ContextTypes.DEFAULT_TYPE, message
 # ВИПРАВЛЕННЯ: Встановлюємо реальний кулдаун, а не 0
 COOLDOWN_SECONDS = 10
 
+# user_last_game: {user_id: {гра: datetime}} — після кулдауну запис уже не потрібен
+state_collector.register(
+    "chat", "user_last_game", COOLDOWN_SECONDS, items=True,
+    stamp=lambda per_game: max(per_game.values()) if per_game else None,
+)
+
 # Словник для гри "Інтуїція"
 QUESTIONS = {
     "Коти належать до родини котячих.": True,
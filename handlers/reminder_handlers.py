@@ -10,12 +10,14 @@ import logging
 import re
 import html
 import asyncio
+import functools
 import dateparser
 from dateparser.search import search_dates
 import pytz
+from collections import defaultdict
 from datetime import datetime, timedelta, date, time
 from dateutil.relativedelta import relativedelta
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import (
     Application,
@@ -24,11 +26,9 @@ from telegram.ext import (
     MessageHandler,
     filters,
     CallbackQueryHandler,
-    JobQueue,
     ConversationHandler,
 )
 from telegram.ext._utils.types import HandlerCallback
-from telegram.ext.filters import MessageFilter
 try:
     from telegram.ext import ApplicationHandlerStop
 except ImportError:
@@ -40,15 +40,17 @@ from bot.core.database import (
     add_reminder,
     get_user_reminders_count,
     get_user_reminders,
-    set_reminder_job_name,
     get_reminder,
     remove_reminder,
-    get_all_reminders,
-    update_reminder_time_and_job,
     get_chat_settings,
-    set_reminder_status,
+    get_chat_settings_many,
+    finish_reminders,
     set_module_status,
 )
+from bot.services.chat_member_cache import chat_member_cache
+from bot.services.reminder_engine import reminder_engine
+from bot.services.telegram_rate_limiter import bulk_priority
+from bot.services.state_gc import state_collector
 from bot.utils.utils import (
     cancel_auto_close,
     get_user_addressing,
@@ -114,17 +116,11 @@ def strip_trigger_prefix(text: str) -> tuple[bool, str]:
     cut = lstrip_len + n
     return True, (s_orig[cut:]).strip()
 
-# PTB custom filter: гарантує, що тригери ловляться ДО AI.
-
-class ReminderTriggerFilter(MessageFilter):
-    def filter(self, message) -> bool:  # message is telegram.Message
-        try:
-            return bool(message and message.text and is_reminder_trigger(message.text))
-        except Exception:
-            return False
-
 MIN_REMINDER_TIME_SEC = 30 # Мінімальний час для нагадування
 
+# Незавершене уточнення нагадування живе до expires_at (10 хв)
+state_collector.register("user", "reminder_pending", 60, stamp=lambda pending: pending.get("expires_at"))
+
 # (ОНОВЛЕНО) Розширені патерни, які враховують різні закінчення та помилки
 # Апострофи тут не обов'язкові, бо ми нормалізуємо текст перед перевіркою.
 RECUR_PATTERNS = {
@@ -268,16 +264,6 @@ def _format_target_mention(user) -> str:
     return mention(user)
 
 
-def _dedup_job_by_name(job_queue: JobQueue, job_name: str) -> None:
-    """Запобігає дублю jobʼів на один reminder_id."""
-    try:
-        for j in job_queue.get_jobs_by_name(job_name):
-            j.schedule_removal()
-    except Exception:
-        pass
-
-
-
 def _is_duplicate_update(context: ContextTypes.DEFAULT_TYPE, update: Update) -> bool:
     """Легка страховка від повторних апдейтів (інколи Telegram може надсилати дубль).
     Тримаємо невелике LRU-вікно в bot_data.
@@ -310,7 +296,7 @@ async def _create_and_schedule_reminder(
     recur_interval: str | None,
     delivery_chat_id: int,
 ) -> None:
-    """Єдина точка створення нагадування: БД -> JobQueue -> підтвердження."""
+    """Єдина точка створення нагадування: БД -> двигун нагадувань -> підтвердження."""
     user = update.effective_user
     if not user or not update.message:
         return
@@ -325,17 +311,8 @@ async def _create_and_schedule_reminder(
         recur_interval=recur_interval,
     )
 
-    job_queue = context.application.job_queue
-    if job_queue and reminder_id:
-        job_name = f"reminder_{reminder_id}"
-        _dedup_job_by_name(job_queue, job_name)
-        job_queue.run_once(
-            reminder_job_callback,
-            when=reminder_time_utc,
-            data={"reminder_id": reminder_id},
-            name=job_name,
-        )
-        await set_reminder_job_name(reminder_id, job_name)
+    if reminder_id:
+        reminder_engine.schedule(reminder_id, reminder_time_utc)
 
     when_str = run_at_local.strftime("%d.%m %H:%M")
     extra = ""
@@ -453,7 +430,7 @@ async def _handle_pending_reminder(update: Update, context: ContextTypes.DEFAULT
 
 
 async def _send_reminder_messages(
-    context: ContextTypes.DEFAULT_TYPE,
+    bot: Bot,
     reminder_data: dict,
     missed_at_iso: str | None,
 ):
@@ -492,7 +469,7 @@ async def _send_reminder_messages(
 
     if delivery_chat_id == target_user_id:
         try:
-            await context.bot.send_message(
+            await bot.send_message(
                 chat_id=delivery_chat_id,
                 text=final_text,
                 parse_mode=ParseMode.HTML,
@@ -507,7 +484,7 @@ async def _send_reminder_messages(
             mention_str = None
             name_str = None
             try:
-                cm = await context.bot.get_chat_member(delivery_chat_id, target_user_id)
+                cm = await chat_member_cache.get_member(bot, delivery_chat_id, target_user_id)
                 u = cm.user
                 name_str = getattr(u, "first_name", None) or getattr(u, "full_name", None)
                 mention_str = _format_target_mention(u)
@@ -518,7 +495,7 @@ async def _send_reminder_messages(
                 # Фолбек: без згадки, але з імʼям якщо дістали
                 mention_str = html.escape(name_str) if name_str else "хтось"
 
-            await context.bot.send_message(
+            await bot.send_message(
                 chat_id=delivery_chat_id,
                 text=f"⏰ {mention_str}, <b>нагадую:</b> <i>{html.escape(message_text)}</i>{missed_text}",
                 parse_mode=ParseMode.HTML,
@@ -528,96 +505,85 @@ async def _send_reminder_messages(
             logger.warning(f"Не вдалося надіслати нагадування в чат {delivery_chat_id}: {e}")
 
 
-async def _reschedule_recurring_job(
-    context: ContextTypes.DEFAULT_TYPE, reminder_data: dict
-):
-    """Ізольована логіка перепланування."""
-    reminder_id = reminder_data["id"]
+def _next_occurrence(reminder_data: dict) -> datetime | None:
+    """Наступний час повторюваного нагадування (None — одноразове або невідомий інтервал)."""
     recur_interval = reminder_data.get("recur_interval")
+    if not recur_interval:
+        return None
 
-    try:
-        current_time_utc = datetime.fromisoformat(reminder_data["reminder_time"])
-        if current_time_utc.tzinfo is None:
-            current_time_utc = pytz.utc.localize(current_time_utc)
-
-        next_time_utc = None
-        if recur_interval == "daily":
-            next_time_utc = current_time_utc + timedelta(days=1)
-        elif recur_interval == "weekly":
-            next_time_utc = current_time_utc + timedelta(weeks=1)
-        elif recur_interval == "monthly":
-            next_time_utc = current_time_utc + relativedelta(months=1)
-
-        if next_time_utc:
-            new_job_name = f"reminder_{reminder_id}"
-            _dedup_job_by_name(context.job_queue, new_job_name)
-            context.job_queue.run_once(
-                reminder_job_callback,
-                next_time_utc,
-                data={"reminder_id": reminder_id},
-                name=new_job_name,
-            )
-            await update_reminder_time_and_job(
-                reminder_id, next_time_utc.isoformat(), new_job_name
-            )
-            logger.info(
-                f"Нагадування {reminder_id} переплановано на {next_time_utc.isoformat()}"
-            )
-    except Exception as e:
-        logger.error(
-            f"Помилка при переплануванні нагадування {reminder_id}: {e}", exc_info=True
-        )
+    current_time_utc = datetime.fromisoformat(reminder_data["reminder_time"])
+    if current_time_utc.tzinfo is None:
+        current_time_utc = pytz.utc.localize(current_time_utc)
 
+    if recur_interval == "daily":
+        return current_time_utc + timedelta(days=1)
+    if recur_interval == "weekly":
+        return current_time_utc + timedelta(weeks=1)
+    if recur_interval == "monthly":
+        return current_time_utc + relativedelta(months=1)
+    return None
 
-async def reminder_job_callback(context: ContextTypes.DEFAULT_TYPE):
-    """Виконується, коли настає час нагадування."""
-    job = context.job
-    reminder_id = job.data.get("reminder_id")
-
-    if not reminder_id:
-        logger.error(f"Job {job.name} (ID: {reminder_id}) виконавcя без reminder_id.")
-        return
 
-    reminder_data = None
-    try:
-        reminder_data = await get_reminder(reminder_id)
-        if not reminder_data:
-            logger.warning(
-                f"Job {job.name} (ID: {reminder_id}) ran, але дані в БД не знайдено."
-            )
-            return
+async def _deliver_to_chat(bot: Bot, chat_id: int, reminders: list[dict]) -> None:
+    for reminder_data in reminders:
+        try:
+            await _send_reminder_messages(bot, reminder_data, reminder_data.get("missed_at"))
+        except Exception as e:
+            logger.error(f"Помилка доставки нагадування {reminder_data['id']} у чат {chat_id}: {e}", exc_info=True)
 
-        logger.info(
-            f"Виконую нагадування {reminder_id} (інтервал: {reminder_data.get('recur_interval')}) для user {reminder_data['user_id']}."
-        )
 
+async def deliver_due_reminders(bot: Bot, reminders: list[dict]) -> None:
+    """Пачка настаних нагадувань від reminder_engine (рядки вже забрані зі статусом FIRING).
 
+    Налаштування груп читаються одним запитом, доставка йде через rate limiter
+    по чатах (у межах чату — по черзі), а підсумок — видалення одноразових,
+    перенесення повторюваних, приглушення — пишеться однією транзакцією.
+    """
+    by_chat: dict[int, list[dict]] = defaultdict(list)
+    for reminder_data in reminders:
+        by_chat[reminder_data.get("delivery_chat_id") or reminder_data["chat_id"]].append(reminder_data)
+
+    group_ids = [chat_id for chat_id in by_chat if chat_id < 0]
+    settings_by_chat = await get_chat_settings_many(group_ids) if group_ids else {}
+
+    removed: list[int] = []
+    rescheduled: list[tuple[int, datetime]] = []
+    suppressed: list[int] = []
+    deliveries = []
+    for chat_id, chat_reminders in by_chat.items():
+        settings = settings_by_chat.get(chat_id)
         # Перевірка: чи дозволені нагадування в чаті доставки (для груп/супергруп)
-        delivery_chat_id = reminder_data.get("delivery_chat_id") or reminder_data.get("chat_id")
-        if isinstance(delivery_chat_id, int) and delivery_chat_id < 0:
-            settings = await get_chat_settings(delivery_chat_id)
-            if int(settings.get("reminders_enabled", 1) or 1) == 0:
-                await set_reminder_status(reminder_id, "SUPPRESSED")
-                logger.info(f"Нагадування {reminder_id} приглушено: reminders_enabled=0 для чату {delivery_chat_id}.")
-                return
-
-        await _send_reminder_messages(context, reminder_data, job.data.get("missed_at"))
-
-        if reminder_data.get("recur_interval"):
-            await _reschedule_recurring_job(context, reminder_data)
-        else:
-            await remove_reminder(reminder_id)
-
-    except Exception as e:
-        logger.error(
-            f"Критична помилка під час reminder_job_callback (ID: {reminder_id}): {e}",
-            exc_info=True,
-        )
-        if reminder_data and not reminder_data.get("recur_interval"):
-            logger.warning(
-                f"Видаляю невдале одноразове нагадування {reminder_id}, щоб запобігти циклу помилок."
+        if settings is not None and settings.get("reminders_enabled", 1) == 0:
+            suppressed.extend(r["id"] for r in chat_reminders)
+            logger.info(
+                f"Приглушено нагадувань: {len(chat_reminders)} — reminders_enabled=0 для чату {chat_id}."
             )
-            await remove_reminder(reminder_id)
+            continue
+        deliveries.append(_deliver_to_chat(bot, chat_id, chat_reminders))
+        for reminder_data in chat_reminders:
+            try:
+                next_time_utc = _next_occurrence(reminder_data)
+            except Exception as e:
+                logger.error(f"Помилка при переплануванні нагадування {reminder_data['id']}: {e}", exc_info=True)
+                next_time_utc = None
+            if next_time_utc:
+                rescheduled.append((reminder_data["id"], next_time_utc))
+            else:
+                removed.append(reminder_data["id"])
+
+    # Доставка нагадувань — фонова робота: поступається інтерактивним відповідям у rate limiter
+    with bulk_priority():
+        await asyncio.gather(*deliveries)
+
+    await finish_reminders(
+        removed, [(reminder_id, when.isoformat()) for reminder_id, when in rescheduled], suppressed
+    )
+    for reminder_id, next_time_utc in rescheduled:
+        reminder_engine.schedule(reminder_id, next_time_utc)
+    logger.info(
+        f"Нагадування: доставлено {len(removed) + len(rescheduled)} у {len(deliveries)} чатах "
+        f"(переплановано {len(rescheduled)}), приглушено {len(suppressed)}."
+    )
 
 
 
@@ -1058,13 +1024,8 @@ async def wizard_repeat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         recur_interval=recur_interval,
     )
 
-    # Плануємо job (dedup)
-    job_queue = context.application.job_queue
-    if job_queue and reminder_id:
-        job_name = f"reminder_{reminder_id}"
-        _dedup_job_by_name(job_queue, job_name)
-        job_queue.run_once(reminder_job_callback, when=run_at, data={"reminder_id": reminder_id}, name=job_name)
-        await set_reminder_job_name(reminder_id, job_name)
+    if reminder_id:
+        reminder_engine.schedule(reminder_id, reminder_time_utc)
 
     when_str = run_at.strftime("%d.%m %H:%M")
     extra = ""
@@ -1208,14 +1169,8 @@ async def handle_delete_reminder_callback(update: Update, context: ContextTypes.
         )
         return
 
-    job_name = reminder_data.get("job_name")
-    if job_name:
-        jobs = context.job_queue.get_jobs_by_name(job_name)
-        if jobs:
-            for job in jobs:
-                job.schedule_removal()
-
     await remove_reminder(reminder_id)
+    reminder_engine.cancel(reminder_id)
 
     prefix = f"🗑 Нагадування видалено.\n<i>Про: {html.escape(reminder_data['message_text'])}</i>"
     text, markup = await _build_reminders_view(user_id, prefix=prefix)
@@ -1268,15 +1223,8 @@ async def handle_snooze_callback(update: Update, context: ContextTypes.DEFAULT_T
     )
 
     if reminder_id:
-        job_name = f"reminder_{reminder_id}"
-        context.job_queue.run_once(
-            reminder_job_callback,
-            new_time_utc,
-            data={"reminder_id": reminder_id},
-            name=job_name,
-        )
-        await set_reminder_job_name(reminder_id, job_name)
-        
+        reminder_engine.schedule(reminder_id, new_time_utc)
+
         time_str = new_time_local.strftime('%H:%M')
         await query.edit_message_text(
             text=f"{msg_html}\n\n💤 <i>(Відкладено користувачем {mention(user)} на {minutes} хв — до {time_str})</i>",
@@ -1307,66 +1255,10 @@ async def reminders_close(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             pass
 
 async def load_persistent_reminders(application: Application):
-    """Відновлює активні нагадування з БД при старті бота (без дублів jobs).
-
-    Важливо: job.data містить тільки reminder_id; усе інше дістаємо з БД в callback.
-    """
-    logger.info("Завантаження персистентних нагадувань...")
-    job_queue = application.job_queue
-    if job_queue is None:
-        logger.warning("JobQueue відсутній — не можу відновити нагадування.")
-        return
-
-    all_reminders = await get_all_reminders()
-    if not all_reminders:
-        logger.info("Активних нагадувань для відновлення не знайдено.")
-        return
-
-    now_utc = datetime.now(pytz.utc)
-    tasks = []
-    for rem in all_reminders:
-        tasks.append(_schedule_job_from_db(job_queue, now_utc, rem))
-
-    # не падаємо, якщо одне нагадування криве
-    await asyncio.gather(*tasks, return_exceptions=True)
-    logger.info("Відновлення нагадувань завершено.")
-
-
-async def _schedule_job_from_db(job_queue: JobQueue, now_utc: datetime, rem: dict):
-    """Планує одне нагадування з рядка БД."""
-    try:
-        reminder_id = rem.get("id")
-        if not reminder_id:
-            return "skipped:no_id"
-
-        # статус (якщо міграція вже додала поле)
-        if rem.get("status") and rem.get("status") != "ACTIVE":
-            return f"skipped:{rem.get('status')}"
-
-        job_name = rem.get("job_name") or f"reminder_{reminder_id}"
-        if not rem.get("job_name"):
-            await set_reminder_job_name(reminder_id, job_name)
-
-        # reminder_time зберігається як ISO (UTC або naive)
-        reminder_time_utc = datetime.fromisoformat(rem["reminder_time"])
-        if reminder_time_utc.tzinfo is None:
-            reminder_time_utc = pytz.utc.localize(reminder_time_utc)
-
-        data = {"reminder_id": reminder_id}
-
-        _dedup_job_by_name(job_queue, job_name)
-        if reminder_time_utc > now_utc:
-            job_queue.run_once(reminder_job_callback, reminder_time_utc, data=data, name=job_name)
-            return True
-
-        # Якщо вже в минулому — запускаємо дуже скоро, щоб не "губити" (або щоб recurring сам перескочив)
-        job_queue.run_once(reminder_job_callback, timedelta(seconds=5), data={**data, "missed_at": reminder_time_utc.isoformat()}, name=job_name)
-        return "missed"
-
-    except Exception as e:
-        logger.exception(f"Помилка при відновленні нагадування {rem.get('id')}: {e}")
-        return e
-
+    """Запускає диспетчер нагадувань: у пам'ять іде лише найближчий горизонт з БД."""
+    logger.info("Запуск двигуна нагадувань...")
+    queued = await reminder_engine.start(functools.partial(deliver_due_reminders, application.bot))
+    logger.info(f"Двигун нагадувань запущено, найближчих у черзі: {queued}.")
 
 
 async def pending_reminder_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1388,25 +1280,8 @@ async def pending_reminder_router(update: Update, context: ContextTypes.DEFAULT_
         raise ApplicationHandlerStop
 
 def register_reminder_handlers(application):
-    # КРИТИЧНО: Handler для pending_reminder МАЄ БУТИ ПЕРШИЙ (group=-2)
-    # щоб перехоплювати відповіді до AI та інших handlers
-    application.add_handler(
-        MessageHandler(
-            filters.TEXT & ~filters.COMMAND,
-            pending_reminder_router,
-            block=True,
-        ),
-        group=-2,
-    )
-    
-    application.add_handler(
-        MessageHandler(
-            ReminderTriggerFilter(),
-            remind_command,
-            block=True,
-        ),
-        group=-1,
-    )
+    # pending_reminder_router і тригери «котик, нагадай» викликає текстовий роутер
+    # (text_router_handlers, group=-2) — раніше за AI та інші обробники
 
     application.add_handler(
         CommandHandler(["myreminders", "reminders"], my_reminders_command)
@@ -14,6 +14,8 @@ from telegram import Update
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 
+from bot.services.message_deleter import message_deleter
+
 logger = logging.getLogger(__name__)
 
 
@@ -43,19 +45,6 @@ async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """Раніше відповідав на невідомі команди. Тепер — тиша (за вимогою UX)."""
     return
 
-async def delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_data = getattr(context.job, "data", {}) if context.job else {}
-    chat_id = job_data.get("chat_id")
-    message_id = job_data.get("message_id")
-    if not chat_id or not message_id:
-        return
-    try:
-        bot = getattr(context, "bot", None) or context.application.bot
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
-
 async def auto_delete_command_invocation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = update.effective_message
     chat = update.effective_chat
@@ -66,12 +55,7 @@ async def auto_delete_command_invocation(update: Update, context: ContextTypes.D
     settings = await get_chat_settings(chat.id)
     if settings.get("auto_delete_actions", 0) != 1:
         return
-    context.job_queue.run_once(
-        delete_message_job,
-        420,
-        data={"chat_id": chat.id, "message_id": message.message_id},
-        name=f"delete_command_{chat.id}_{message.message_id}",
-    )
+    message_deleter.schedule(chat.id, message.message_id, 420)
 
 
 def register_system_handlers(application) -> None:
@@ -0,0 +1,94 @@
+# text_router_handlers.py
+# -*- coding: utf-8 -*-
+"""
+Єдиний вхід для текстових тригерів (group=-2).
+
+Замість окремих MessageHandler'ів у різних групах (уточнення нагадувань,
+«котик, нагадай», ввід адміна в ПП, фільтр слів, реакції, стікери, дії)
+повідомлення розбирається текстовим роутером один раз, а далі викликаються
+лише ті обробники, чиї маршрути спрацювали. Налаштування чату читаються
+один раз на повідомлення й передаються далі.
+
+AI та ConversationHandler'и (запам'ятай/забудь) лишаються у своїх групах —
+вони беруть уже готовий розбір через text_router.
+"""
+import logging
+
+from telegram import Update
+from telegram.constants import ChatType
+from telegram.ext import ApplicationHandlerStop, ContextTypes, MessageHandler, filters
+
+from bot.core.database import get_chat_settings
+from bot.handlers.ai_handlers import (
+    AI_KEYWORDS,
+    FORGET_WORDS,
+    KATYA_WORDS,
+    REMEMBER_WORDS,
+    handle_katya_reaction,
+    handle_sticker_keyword,
+)
+from bot.handlers.chat_admin_handlers import handle_admin_text_input
+from bot.handlers.chat_event_handlers import word_filter_handler
+from bot.handlers.command_handlers import ACTIONS, handle_action_commands
+from bot.handlers.reminder_handlers import REMINDER_TRIGGERS, pending_reminder_router, remind_command
+from bot.services.text_router import text_router
+
+logger = logging.getLogger(__name__)
+
+_GROUP_TYPES = (ChatType.GROUP, ChatType.SUPERGROUP)
+
+
+def register_text_routes() -> None:
+    """Маршрути текстового роутера (повторний виклик нічого не змінює).
+    Потрібні й без хендлера group=-2: _is_ai_invocation бере з них ai_keyword."""
+    text_router.add_prefixes("reminder", REMINDER_TRIGGERS)
+    # Дія визначається за тим, який саме префікс спрацював
+    text_router.add_prefixes("action", ACTIONS.keys())
+    text_router.add_keywords("ai_keyword", AI_KEYWORDS)
+    text_router.add_keywords("katya", KATYA_WORDS)
+    text_router.add_keywords("remember", REMEMBER_WORDS)
+    text_router.add_keywords("forget", FORGET_WORDS)
+
+
+async def route_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message = update.message
+    chat = update.effective_chat
+    if not message or not message.text or not chat:
+        return
+
+    routed = text_router.route(message)
+
+    # 1. Уточнення для нагадування — зупиняє обробку, якщо підхоплено
+    await pending_reminder_router(update, context)
+
+    # 2. Адмін у ПП перебуває в «стані вводу» — текст належить йому
+    if chat.type == ChatType.PRIVATE and context.user_data and context.user_data.get("admin_action"):
+        await handle_admin_text_input(update, context)
+        raise ApplicationHandlerStop
+
+    # 3. «котик, нагадай ...»
+    if routed.has("reminder"):
+        await remind_command(update, context)
+
+    is_group = chat.type in _GROUP_TYPES
+    settings = await get_chat_settings(chat.id) if is_group else None
+
+    # 4. Заборонені слова — першими; видалене повідомлення далі не йде
+    if is_group and await word_filter_handler(update, context, settings):
+        raise ApplicationHandlerStop
+
+    # 5. Реакції, стікери, дії (дії — лише в групах)
+    if routed.has("katya"):
+        await handle_katya_reaction(update, context)
+    await handle_sticker_keyword(update, context)
+    if is_group and routed.has("action"):
+        await handle_action_commands(update, context, routed.routes["action"], settings)
+
+
+def register_text_router(application) -> None:
+    register_text_routes()
+    application.add_handler(
+        MessageHandler(filters.TEXT & ~filters.COMMAND, route_text_message, block=True),
+        group=-2,
+    )
+    logger.info("Текстовий роутер зареєстровано. 🧭")
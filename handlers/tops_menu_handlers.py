@@ -31,6 +31,7 @@ from bot.utils.utils import (
 )
 
 from bot.core.database import DB_PATH
+from bot.services.message_deleter import message_deleter
 
 logger = logging.getLogger(__name__)
 
@@ -73,19 +74,6 @@ async def _arm_tops_auto_close(context: ContextTypes.DEFAULT_TYPE, message) -> N
     if settings.get('auto_delete_actions', 0) == 1:
         start_auto_close(context, TOPS_AUTO_CLOSE_KEY, timeout=420)  # 7 minutes
 
-async def delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_data = getattr(context.job, "data", {}) if context.job else {}
-    chat_id = job_data.get("chat_id")
-    message_id = job_data.get("message_id")
-    if not chat_id or not message_id:
-        return
-    try:
-        bot = getattr(context, "bot", None) or context.application.bot
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
-
 async def _schedule_tops_auto_delete(
     context: ContextTypes.DEFAULT_TYPE,
     *,
@@ -99,12 +87,7 @@ async def _schedule_tops_auto_delete(
     settings = await get_chat_settings(chat_id)
     if settings.get('auto_delete_actions', 0) != 1:
         return
-    context.job_queue.run_once(
-        delete_message_job,
-        timeout,
-        data={"chat_id": chat_id, "message_id": message_id},
-        name=f"delete_tops_{chat_id}_{message_id}",
-    )
+    message_deleter.schedule(chat_id, message_id, timeout)
 
 
 
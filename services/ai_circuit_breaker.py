@@ -0,0 +1,162 @@
+# ai_circuit_breaker.py
+# -*- coding: utf-8 -*-
+"""
+Спільний circuit breaker для бекенду DeepSeek.
+
+Стани:
+- closed    — запити йдуть як зазвичай, рахуємо помилки у ковзному вікні;
+- open      — бекенд деградував, нові запити одразу отримують відмову;
+- half_open — після паузи пропускаємо обмежену кількість пробних запитів.
+
+Retry-After від бекенду зберігається глобально, щоб усі воркери чекали
+(або швидко відмовляли) разом, а не кожен окремо.
+"""
+import time
+import logging
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        *,
+        window_sec: float = 60.0,
+        min_requests: int = 8,
+        error_rate: float = 0.5,
+        max_consecutive_429: int = 3,
+        open_sec: float = 30.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window_sec = window_sec
+        self.min_requests = max(1, min_requests)
+        self.error_rate = error_rate
+        self.max_consecutive_429 = max(1, max_consecutive_429)
+        self.open_sec = open_sec
+        self.half_open_probes = max(1, half_open_probes)
+        self._clock = clock
+
+        self._state = self.CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._consecutive_429 = 0
+        self._open_until = 0.0
+        self._blocked_until = 0.0
+        self._probes_in_flight = 0
+        self._probe_deadline = 0.0
+
+        # Лічильники для статистики
+        self.trips = 0
+        self.rejected = 0
+
+    # --- Внутрішнє ---
+
+    def _prune(self, now: float) -> None:
+        border = now - self.window_sec
+        while self._outcomes and self._outcomes[0][0] < border:
+            self._outcomes.popleft()
+
+    def _trip(self, now: float, reason: str) -> None:
+        # Пауза не коротша за глобальний Retry-After
+        self._open_until = max(now + self.open_sec, self._blocked_until)
+        if self._state != self.OPEN:
+            self.trips += 1
+            logger.warning(
+                "DeepSeek circuit breaker відкрито (%s), пауза %.1fs",
+                reason, self._open_until - now,
+            )
+        self._state = self.OPEN
+        self._probes_in_flight = 0
+
+    def _close(self) -> None:
+        if self._state != self.CLOSED:
+            logger.info("DeepSeek circuit breaker закрито, бекенд відновився.")
+        self._state = self.CLOSED
+        self._outcomes.clear()
+        self._consecutive_429 = 0
+        self._probes_in_flight = 0
+
+    # --- Публічне API ---
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() >= self._open_until:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Чи можна зараз звертатися до бекенду. У half_open резервує пробний слот."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            now = self._clock()
+            # Пробний запит, що так і не звітував (виняток, скасування), не блокує breaker назавжди
+            if now >= self._probe_deadline:
+                self._probes_in_flight = 0
+            if self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                self._probe_deadline = now + self.open_sec
+                return True
+        self.rejected += 1
+        return False
+
+    def retry_after_remaining(self) -> float:
+        """Скільки секунд ще діє глобальний Retry-After (0, якщо не діє)."""
+        return max(0.0, self._blocked_until - self._clock())
+
+    def record_success(self) -> None:
+        now = self._clock()
+        if self._state == self.HALF_OPEN:
+            self._close()
+            return
+        self._consecutive_429 = 0
+        self._outcomes.append((now, True))
+        self._prune(now)
+
+    def record_failure(self, status: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        now = self._clock()
+        if retry_after is not None and retry_after > 0:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+
+        if self._state == self.HALF_OPEN:
+            self._trip(now, "пробний запит невдалий")
+            return
+        if self._state == self.OPEN:
+            return
+
+        self._consecutive_429 = self._consecutive_429 + 1 if status == 429 else 0
+        self._outcomes.append((now, False))
+        self._prune(now)
+
+        if self._consecutive_429 >= self.max_consecutive_429:
+            self._trip(now, f"{self._consecutive_429} відповідей 429 поспіль")
+            return
+
+        total = len(self._outcomes)
+        if total >= self.min_requests:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if failures / total >= self.error_rate:
+                self._trip(now, f"частка помилок {failures}/{total}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = self._clock()
+        self._prune(now)
+        total = len(self._outcomes)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_requests": total,
+            "window_failures": failures,
+            "consecutive_429": self._consecutive_429,
+            "retry_after_sec": round(self.retry_after_remaining(), 1),
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
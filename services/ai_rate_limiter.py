@@ -0,0 +1,134 @@
+# ai_rate_limiter.py
+# -*- coding: utf-8 -*-
+"""
+Обмеження частоти AI-запитів: token bucket на користувача і на чат.
+
+Відро зберігається як пара (токени, час) і лише поки воно неповне: повне
+відро нічим не відрізняється від відсутнього, тож записи, що простояли
+довше за час повного поповнення, викидаються без втрати точності. Додатково
+розмір сховища обмежений (LRU), щоб флуд з тисяч акаунтів не роздув пам'ять.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+
+class TokenBucketStore:
+    def __init__(
+        self,
+        rate_per_min: float,
+        burst: int,
+        max_keys: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._clock = clock
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self.configure(rate_per_min, burst)
+
+    def configure(self, rate_per_min: float, burst: int) -> None:
+        self.rate = max(0.0, rate_per_min) / 60.0
+        self.burst = max(1, int(burst))
+        self._buckets.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    @property
+    def idle_ttl(self) -> float:
+        """Час, за який порожнє відро стає повним."""
+        return self.burst / self.rate if self.rate else 0.0
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        entry = self._buckets.get(key)
+        if entry is None:
+            return float(self.burst)
+        tokens, updated = entry
+        return min(float(self.burst), tokens + (now - updated) * self.rate)
+
+    def peek(self, key: Hashable) -> bool:
+        """Чи є в відрі хоча б один токен (без списання)."""
+        if not self.enabled:
+            return True
+        return self._tokens(key, self._clock()) >= 1.0
+
+    def take(self, key: Hashable) -> bool:
+        if not self.enabled:
+            return True
+        now = self._clock()
+        tokens = self._tokens(key, now)
+        if tokens < 1.0:
+            return False
+        self._buckets[key] = (tokens - 1.0, now)
+        self._buckets.move_to_end(key)
+        self._evict(now)
+        return True
+
+    def _evict(self, now: float) -> None:
+        ttl = self.idle_ttl
+        # Найдавніше оновлені — на початку: відра, що встигли наповнитись, не потрібні
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < ttl and len(self._buckets) <= self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AIRateLimiter:
+    USER = "user"
+    CHAT = "chat"
+
+    def __init__(
+        self,
+        user_per_min: float = 6,
+        user_burst: int = 3,
+        chat_per_min: float = 20,
+        chat_burst: int = 8,
+        max_keys: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.users = TokenBucketStore(user_per_min, user_burst, max_keys, clock)
+        self.chats = TokenBucketStore(chat_per_min, chat_burst, max_keys, clock)
+        self.configured = False
+        self.throttled = {self.USER: 0, self.CHAT: 0}
+
+    def configure(self, user_per_min: float, user_burst: int, chat_per_min: float, chat_burst: int) -> None:
+        self.users.configure(user_per_min, user_burst)
+        self.chats.configure(chat_per_min, chat_burst)
+        self.configured = True
+
+    def check(self, user_id: int, chat_id: int, charge_user: bool = True) -> Optional[str]:
+        """Списує по токену з відер користувача і чату. Повертає причину відмови або None.
+
+        Токени списуються лише якщо дозволяють обидва відра, тож запит,
+        зрізаний лімітом чату, не з'їдає бюджет користувача, і навпаки.
+        """
+        if charge_user and not self.users.peek(user_id):
+            self.throttled[self.USER] += 1
+            return self.USER
+        if not self.chats.take(chat_id):
+            self.throttled[self.CHAT] += 1
+            return self.CHAT
+        if charge_user:
+            self.users.take(user_id)
+        return None
+
+    def settings(self) -> Dict[str, float]:
+        return {
+            "user_per_min": self.users.rate * 60,
+            "user_burst": self.users.burst,
+            "chat_per_min": self.chats.rate * 60,
+            "chat_burst": self.chats.burst,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tracked_users": len(self.users),
+            "tracked_chats": len(self.chats),
+            "throttled_user": self.throttled[self.USER],
+            "throttled_chat": self.throttled[self.CHAT],
+        }
@@ -0,0 +1,200 @@
+# allowed_updates.py
+# -*- coding: utf-8 -*-
+"""
+Які типи оновлень просити в Telegram (allowed_updates).
+
+Замість Update.ALL_TYPES набір обчислюється з зареєстрованих хендлерів
+(включно зі станами ConversationHandler):
+
+- CallbackQueryHandler, InlineQueryHandler, ChatMemberHandler тощо дають свій тип;
+- MessageHandler / CommandHandler дають `message`; edited_message, channel_post
+  та бізнес-повідомлення — лише якщо фільтр явно їх вимагає
+  (filters.UpdateType.EDITED_MESSAGE, CHANNEL_POSTS, ...). Хендлери бота
+  читають update.message, тож редагування та пости каналів, які «просто
+  проходять» через filters.ALL, їм не потрібні;
+- TypeHandler — це middleware (статистика, контекст запиту): він бачить
+  те, на що підписані інші, і сам типів не додає.
+
+UpdateTrafficStats рахує отримані оновлення за типами і скільки з них
+було б відкинуто обчисленим набором (має сенс при ALLOWED_UPDATES=all).
+"""
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from telegram import Chat, Message, Update
+from telegram.ext import (
+    BaseHandler,
+    ChatMemberHandler,
+    ConversationHandler,
+    MessageHandler,
+    TypeHandler,
+)
+
+logger = logging.getLogger(__name__)
+
+U = Update
+MESSAGE_TYPES = (
+    U.MESSAGE,
+    U.EDITED_MESSAGE,
+    U.CHANNEL_POST,
+    U.EDITED_CHANNEL_POST,
+    U.BUSINESS_MESSAGE,
+    U.EDITED_BUSINESS_MESSAGE,
+)
+
+# Хендлер -> тип оновлення (за назвою класу, бо не всі класи є в кожній версії PTB)
+_SIMPLE_HANDLERS = {
+    "CallbackQueryHandler": (U.CALLBACK_QUERY,),
+    "InlineQueryHandler": (U.INLINE_QUERY,),
+    "ChosenInlineResultHandler": (U.CHOSEN_INLINE_RESULT,),
+    "ShippingQueryHandler": (U.SHIPPING_QUERY,),
+    "PreCheckoutQueryHandler": (U.PRE_CHECKOUT_QUERY,),
+    "PollHandler": (U.POLL,),
+    "PollAnswerHandler": (U.POLL_ANSWER,),
+    "ChatJoinRequestHandler": (U.CHAT_JOIN_REQUEST,),
+    "BusinessConnectionHandler": (U.BUSINESS_CONNECTION,),
+    "BusinessMessagesDeletedHandler": (U.DELETED_BUSINESS_MESSAGES,),
+    "PaidMediaPurchasedHandler": (U.PURCHASED_PAID_MEDIA,),
+    "ChatBoostHandler": (U.CHAT_BOOST, U.REMOVED_CHAT_BOOST),
+    "MessageReactionHandler": (U.MESSAGE_REACTION, U.MESSAGE_REACTION_COUNT),
+}
+
+# filters.UpdateType.*, які НЕ є явною підпискою на редагування/пости (MESSAGES = message + edited)
+_IMPLICIT_UPDATE_TYPE_FILTERS = ("UpdateType._Message", "UpdateType._Messages")
+
+
+def _sample_update(update_type: str) -> Update:
+    message = Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type=Chat.PRIVATE))
+    return Update(update_id=0, **{update_type: message})
+
+
+_SAMPLES = {t: _sample_update(t) for t in MESSAGE_TYPES}
+
+
+def _walk(f: Any, update_type: str) -> Tuple[Optional[bool], bool]:
+    """Трибічна оцінка фільтра для типу повідомлення: True / False / None (залежить від вмісту)
+    і чи є явна підписка на цей тип через filters.UpdateType."""
+    cls = type(f).__name__
+    if cls == "_InvertedFilter":
+        value, explicit = _walk(f.inv_filter, update_type)
+        return (None if value is None else not value), False
+    if cls == "_MergedFilter":
+        left, left_explicit = _walk(f.base_filter, update_type)
+        if f.and_filter is not None:
+            right, right_explicit = _walk(f.and_filter, update_type)
+            if left is False or right is False:
+                return False, False
+            value = True if (left and right) else None
+        else:
+            right, right_explicit = _walk(f.or_filter, update_type)
+            if left is True or right is True:
+                value = True
+            elif left is False and right is False:
+                value = False
+            else:
+                value = None
+        return value, left_explicit or right_explicit
+    if cls == "_XORFilter":
+        left, _ = _walk(f.base_filter, update_type)
+        right, _ = _walk(f.xor_filter, update_type)
+        if left is None or right is None:
+            return None, False
+        return left != right, False
+    qualname = type(f).__qualname__
+    if qualname.startswith("UpdateType."):
+        value = bool(f.check_update(_SAMPLES[update_type]))
+        return value, value and qualname not in _IMPLICIT_UPDATE_TYPE_FILTERS
+    return None, False
+
+
+def _message_types(handler_filters: Any) -> Set[str]:
+    consumed = set()
+    for update_type in MESSAGE_TYPES:
+        if handler_filters is None:
+            value, explicit = None, False
+        else:
+            value, explicit = _walk(handler_filters, update_type)
+        if value is False:
+            continue
+        if update_type == U.MESSAGE or explicit:
+            consumed.add(update_type)
+    return consumed
+
+
+def _iter_handlers(handlers: Iterable[BaseHandler]) -> Iterable[BaseHandler]:
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            yield from _iter_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                yield from _iter_handlers(state_handlers)
+            yield from _iter_handlers(handler.fallbacks)
+        else:
+            yield handler
+
+
+def handler_update_types(handler: BaseHandler) -> Set[str]:
+    """Типи оновлень, які може обробити один (не-Conversation) хендлер."""
+    if isinstance(handler, TypeHandler):
+        return set()
+    if isinstance(handler, ChatMemberHandler):
+        kinds = {
+            ChatMemberHandler.MY_CHAT_MEMBER: {U.MY_CHAT_MEMBER},
+            ChatMemberHandler.CHAT_MEMBER: {U.CHAT_MEMBER},
+        }
+        return kinds.get(handler.chat_member_types, {U.MY_CHAT_MEMBER, U.CHAT_MEMBER})
+    if isinstance(handler, MessageHandler) or hasattr(handler, "commands"):
+        return _message_types(getattr(handler, "filters", None))
+    simple = _SIMPLE_HANDLERS.get(type(handler).__name__)
+    if simple is not None:
+        return set(simple)
+    # Невідомий хендлер — безпечніше отримувати все
+    logger.warning(f"allowed_updates: невідомий тип хендлера {type(handler).__name__}, вмикаю всі типи")
+    return set(U.ALL_TYPES)
+
+
+def compute_allowed_updates(application: Any) -> List[str]:
+    """Набір типів оновлень, потрібних зареєстрованим хендлерам (у порядку Update.ALL_TYPES)."""
+    consumed: Set[str] = set()
+    for group_handlers in application.handlers.values():
+        for handler in _iter_handlers(group_handlers):
+            consumed |= handler_update_types(handler)
+    return [str(t) for t in U.ALL_TYPES if t in consumed]
+
+
+def update_type_of(update: Update) -> Optional[str]:
+    for update_type in U.ALL_TYPES:
+        if getattr(update, str(update_type), None) is not None:
+            return str(update_type)
+    return None
+
+
+class UpdateTrafficStats:
+    def __init__(self, allowed: Iterable[str]) -> None:
+        self.allowed = set(allowed)
+        self.by_type: Counter = Counter()
+
+    def observe(self, update: object) -> None:
+        if isinstance(update, Update):
+            self.by_type[update_type_of(update) or "unknown"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        total = sum(self.by_type.values())
+        outside = {t: n for t, n in self.by_type.items() if t not in self.allowed}
+        dropped = sum(outside.values())
+        return {
+            "total": total,
+            "outside_allowed": dropped,
+            "outside_share": round(dropped / total, 3) if total else 0.0,
+            "outside_by_type": outside,
+            "by_type": dict(self.by_type),
+        }
+
+
+def log_allowed_updates(allowed: List[str]) -> None:
+    dropped = [str(t) for t in U.ALL_TYPES if str(t) not in allowed]
+    logger.info(
+        f"📮 allowed_updates: {len(allowed)} з {len(U.ALL_TYPES)} типів — {', '.join(allowed)}; "
+        f"не запитуємо: {', '.join(dropped)}"
+    )
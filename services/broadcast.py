@@ -0,0 +1,299 @@
+# broadcast.py
+# -*- coding: utf-8 -*-
+"""
+Рушій розсилок власника.
+
+Задача розсилки живе в SQLite: список адресатів зі статусом кожного
+(pending / sent / failed / dead) і курсор — останній chat_id повністю
+обробленої сторінки. Тому після рестарту розсилка продовжується з місця
+зупинки, а вже доставлені адресати повторно нічого не отримують.
+
+- адресати обробляються сторінками, всередині сторінки — до `concurrency`
+  відправок одночасно; темп задає спільний rate limiter (масовий пріоритет);
+- RetryAfter: limiter ставить усі відправки на паузу й повторює запит,
+  а якщо спроби вичерпано — адресат лишається в черзі на ще одну спробу;
+- Forbidden / «chat not found» позначають чат недосяжним: наступні розсилки
+  його пропускають, доки він знову не напише боту;
+- повідомлення власнику з прогресом оновлюється не частіше за `progress_interval`.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter, TelegramError
+
+from bot.core.database import (
+    create_broadcast_job,
+    get_broadcast_counts,
+    get_broadcast_pending_page,
+    get_running_broadcast_jobs,
+    get_unreachable_chat_ids,
+    mark_chat_unreachable,
+    set_broadcast_target_status,
+    unmark_chat_unreachable,
+    update_broadcast_job,
+)
+from bot.services.telegram_rate_limiter import bulk_priority
+from bot.utils.utils import BROADCAST_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+DEAD = "dead"
+
+# BadRequest, після яких писати в чат немає сенсу
+_DEAD_BAD_REQUESTS = ("chat not found", "user not found", "peer_id_invalid", "have no rights to send")
+
+
+def _retry_seconds(retry_after: Any) -> float:
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class BroadcastEngine:
+    def __init__(
+        self,
+        concurrency: int = 8,
+        page_size: int = 100,
+        progress_interval: float = 3.0,
+        max_retry_after_rounds: int = 3,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.page_size = max(1, page_size)
+        self.progress_interval = progress_interval
+        self.max_retry_after_rounds = max_retry_after_rounds
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._cancel_requested: Set[int] = set()
+        self._unreachable: Optional[Set[int]] = None
+
+    # --- Керування задачами ---
+
+    async def start(self, bot, owner_id: int, from_chat_id: int, message_id: int) -> Dict[str, Any]:
+        """Створює задачу розсилки, надсилає власнику повідомлення прогресу і запускає її."""
+        job = await create_broadcast_job(owner_id, from_chat_id, message_id)
+        try:
+            progress = await bot.send_message(
+                chat_id=owner_id,
+                text=self._progress_text(job, {}),
+                reply_markup=self._cancel_markup(job["job_id"]),
+                parse_mode=ParseMode.HTML,
+            )
+            job["progress_chat_id"] = progress.chat_id
+            job["progress_message_id"] = progress.message_id
+            await update_broadcast_job(
+                job["job_id"],
+                progress_chat_id=progress.chat_id,
+                progress_message_id=progress.message_id,
+            )
+        except TelegramError as e:
+            logger.warning(f"Розсилка #{job['job_id']}: не вдалося надіслати прогрес власнику: {e}")
+        self._spawn(bot, job)
+        return job
+
+    async def resume(self, bot) -> int:
+        """Продовжує розсилки, що не завершились до рестарту. Повертає їх кількість."""
+        resumed = 0
+        for job in await get_running_broadcast_jobs():
+            if job["job_id"] in self._tasks:
+                continue
+            logger.info(f"📢 Продовжую розсилку #{job['job_id']} (курсор {job['cursor']})")
+            self._spawn(bot, job)
+            resumed += 1
+        return resumed
+
+    def cancel(self, job_id: int) -> bool:
+        """Просить задачу зупинитись після поточних відправок."""
+        if job_id not in self._tasks:
+            return False
+        self._cancel_requested.add(job_id)
+        return True
+
+    def is_running(self, job_id: int) -> bool:
+        return job_id in self._tasks
+
+    def _spawn(self, bot, job: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        task = asyncio.create_task(self._run(bot, job), name=f"broadcast-{job_id}", context=contextvars.Context())
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(job_id, None))
+
+    # --- Недосяжні чати ---
+
+    async def is_unreachable(self, chat_id: int) -> bool:
+        if self._unreachable is None:
+            self._unreachable = set(await get_unreachable_chat_ids())
+        return chat_id in self._unreachable
+
+    async def revive(self, chat_id: int) -> None:
+        """Чат знову з нами (написав боту) — повертаємо його в наступні розсилки."""
+        if await self.is_unreachable(chat_id):
+            self._unreachable.discard(chat_id)
+            await unmark_chat_unreachable(chat_id)
+
+    async def _mark_dead(self, chat_id: int, reason: str) -> None:
+        await mark_chat_unreachable(chat_id, reason)
+        if self._unreachable is not None:
+            self._unreachable.add(chat_id)
+
+    # --- Виконання ---
+
+    async def _run(self, bot, job: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_progress = time.monotonic()
+        cursor = job.get("cursor")
+        retry_rounds = 0
+        status = "done"
+
+        async def deliver(chat_id: int) -> None:
+            async with semaphore:
+                if job_id in self._cancel_requested:
+                    return
+                result, error = await self._deliver(bot, job, chat_id)
+                if result == PENDING:
+                    return
+                if result == DEAD:
+                    await self._mark_dead(chat_id, error or "")
+                await set_broadcast_target_status(job_id, chat_id, result, error)
+
+        try:
+            while True:
+                page = await get_broadcast_pending_page(job_id, cursor, self.page_size)
+                if not page:
+                    if cursor is None:
+                        break
+                    # Курсор дійшов до кінця; лишились лише відкладені через RetryAfter
+                    cursor = None
+                    retry_rounds += 1
+                    if retry_rounds > self.max_retry_after_rounds:
+                        break
+                    continue
+
+                with bulk_priority():
+                    await asyncio.gather(*(deliver(chat_id) for chat_id in page))
+
+                if job_id in self._cancel_requested:
+                    status = "cancelled"
+                    break
+                cursor = page[-1]
+                await update_broadcast_job(job_id, cursor=cursor)
+
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    await self._edit_progress(bot, job, await get_broadcast_counts(job_id))
+        except asyncio.CancelledError:
+            # Зупинка бота: задача лишається 'running' і продовжиться після рестарту
+            logger.info(f"Розсилку #{job_id} перервано, продовжиться після рестарту")
+            raise
+        except Exception as e:
+            logger.error(f"Розсилка #{job_id} впала: {e}", exc_info=True)
+            status = "failed"
+        finally:
+            self._cancel_requested.discard(job_id)
+
+        await update_broadcast_job(job_id, status=status, finished_at=datetime.now().isoformat())
+        job["status"] = status
+        counts = await get_broadcast_counts(job_id)
+        logger.info(f"📢 Розсилка #{job_id} завершена ({status}): {counts}")
+        await self._edit_progress(bot, job, counts, final=True)
+
+    async def _deliver(self, bot, job: Dict[str, Any], chat_id: int) -> Tuple[str, Optional[str]]:
+        """Одна відправка. Повертає (статус адресата, текст помилки)."""
+        target = chat_id
+        for _ in range(2):
+            try:
+                await bot.copy_message(
+                    chat_id=target,
+                    from_chat_id=job["from_chat_id"],
+                    message_id=job["message_id"],
+                )
+                return SENT, None
+            except ChatMigrated as e:
+                # Група стала супергрупою — пробуємо новий id
+                target = e.new_chat_id
+            except RetryAfter as e:
+                logger.warning(
+                    f"Розсилка #{job['job_id']}: RetryAfter {_retry_seconds(e.retry_after):.0f}s "
+                    f"для {chat_id}, повторю пізніше"
+                )
+                return PENDING, None
+            except Forbidden as e:
+                return DEAD, str(e)
+            except BadRequest as e:
+                message = str(e).lower()
+                if any(marker in message for marker in _DEAD_BAD_REQUESTS):
+                    return DEAD, str(e)
+                return FAILED, str(e)
+            except TelegramError as e:
+                logger.warning(f"Розсилка #{job['job_id']}: помилка для {chat_id}: {e}")
+                return FAILED, str(e)
+        return FAILED, "chat migrated twice"
+
+    # --- Прогрес для власника ---
+
+    @staticmethod
+    def _cancel_markup(job_id: int) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(
+            [[InlineKeyboardButton("⏹ Зупинити", callback_data=f"admin_broadcast_stop_{job_id}")]]
+        )
+
+    @staticmethod
+    def _progress_text(job: Dict[str, Any], counts: Dict[str, int], final: bool = False) -> str:
+        total = job.get("total") or 0
+        sent = counts.get(SENT, 0)
+        failed = counts.get(FAILED, 0)
+        dead = counts.get(DEAD, 0)
+        done = sent + failed + dead
+        percent = int(done * 100 / total) if total else 100
+        if not final:
+            header = f"Розсилка #{job['job_id']} триває... 💌"
+        elif job.get("status") == "cancelled":
+            header = f"Розсилку #{job['job_id']} зупинено. ⏹"
+        else:
+            header = f"Розсилку #{job['job_id']} завершено! 😼"
+        text = (
+            f"{header}\n"
+            f"Оброблено: <b>{done}</b> з <b>{total}</b> ({percent}%)\n"
+            f"Успішно: <b>{sent}</b>\n"
+            f"Помилки: <b>{failed}</b>\n"
+            f"Недосяжні (більше не отримуватимуть): <b>{dead}</b>"
+        )
+        pending = counts.get(PENDING, 0)
+        if final and pending:
+            text += f"\nНе надіслано: <b>{pending}</b>"
+        return text
+
+    async def _edit_progress(self, bot, job: Dict[str, Any], counts: Dict[str, int], final: bool = False) -> None:
+        if not job.get("progress_message_id"):
+            if final:
+                try:
+                    await bot.send_message(
+                        chat_id=job["owner_id"],
+                        text=self._progress_text(job, counts, final=True),
+                        parse_mode=ParseMode.HTML,
+                    )
+                except TelegramError as e:
+                    logger.warning(f"Розсилка #{job['job_id']}: не вдалося надіслати підсумок: {e}")
+            return
+        try:
+            await bot.edit_message_text(
+                chat_id=job["progress_chat_id"],
+                message_id=job["progress_message_id"],
+                text=self._progress_text(job, counts, final=final),
+                reply_markup=None if final else self._cancel_markup(job["job_id"]),
+                parse_mode=ParseMode.HTML,
+            )
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.warning(f"Розсилка #{job['job_id']}: не вдалося оновити прогрес: {e}")
+        except TelegramError as e:
+            logger.warning(f"Розсилка #{job['job_id']}: не вдалося оновити прогрес: {e}")
+
+
+broadcast_engine = BroadcastEngine(concurrency=BROADCAST_CONCURRENCY)
@@ -0,0 +1,82 @@
+# chat_actions.py
+# -*- coding: utf-8 -*-
+"""
+Єдиний планувальник chat action ("друкує…") з підрахунком посилань.
+
+Поки в чаті триває хоча б одна операція, раз на ~4 с відправляється одна дія
+TYPING. Паралельні AI-запити, погода тощо в одному чаті ділять один таймер,
+тому зайвих викликів Bot API немає. Коли остання операція завершилась —
+таймер зупиняється.
+"""
+import asyncio
+import contextvars
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+TYPING = "typing"
+UPLOAD_PHOTO = "upload_photo"
+
+_Key = Tuple[int, str]
+
+
+class ChatActionScheduler:
+    def __init__(self, interval: float = 4.0) -> None:
+        self.interval = interval
+        self._refs: Dict[_Key, int] = {}
+        self._tasks: Dict[_Key, asyncio.Task] = {}
+        self.sent_total = 0
+
+    async def _loop(self, bot, key: _Key) -> None:
+        chat_id, action = key
+        try:
+            while self._refs.get(key, 0) > 0:
+                try:
+                    await bot.send_chat_action(chat_id=chat_id, action=action)
+                    self.sent_total += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.debug(f"Chat action error ({chat_id}, {action}): {e}")
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+    def acquire(self, bot, chat_id: int, action: str = TYPING) -> None:
+        """Позначає початок операції в чаті. Перша операція запускає таймер."""
+        key = (chat_id, action)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            self._tasks[key] = asyncio.create_task(self._loop(bot, key), context=contextvars.Context())
+
+    def release(self, chat_id: int, action: str = TYPING) -> None:
+        """Позначає завершення операції. Остання операція зупиняє таймер."""
+        key = (chat_id, action)
+        left = self._refs.get(key, 0) - 1
+        if left > 0:
+            self._refs[key] = left
+            return
+        self._refs.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task and not task.done():
+            task.cancel()
+
+    @asynccontextmanager
+    async def action(self, bot, chat_id: int, action: str = TYPING) -> AsyncIterator[None]:
+        self.acquire(bot, chat_id, action)
+        try:
+            yield
+        finally:
+            self.release(chat_id, action)
+
+    def active(self) -> int:
+        return len(self._refs)
+
+
+chat_actions = ChatActionScheduler()
@@ -0,0 +1,195 @@
+# chat_member_cache.py
+# -*- coding: utf-8 -*-
+"""
+Кеш учасників чату та списків адмінів.
+
+Перевірка «чи адмін» раніше робила get_chat_member на кожне текстове
+повідомлення в чатах з фільтром слів. Тепер:
+
+- список адмінів чату береться одним getChatAdministrators і живе `admin_ttl`
+  секунд. Поки він свіжий, будь-хто, кого в ньому немає, — не адмін, тож
+  модерація звичайних повідомлень не робить жодного запиту до Bot API;
+- окремі учасники (для згадок і імен) кешуються за (chat_id, user_id) на `ttl`;
+- ChatMemberUpdated (chat_member / my_chat_member) одразу оновлює обидва кеші,
+  тож підвищення чи зняття адміна видно без очікування TTL;
+- одночасні промахи по тому самому чату чекають один спільний запит.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from telegram import ChatMember, ChatMemberAdministrator, ChatMemberOwner, ChatMemberUpdated
+from telegram.error import BadRequest, Forbidden
+
+from bot.services import request_context
+
+logger = logging.getLogger(__name__)
+
+_ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+_GONE_STATUSES = (ChatMember.LEFT, ChatMember.BANNED)
+
+
+class ChatMemberCache:
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        admin_ttl: float = 600.0,
+        max_members: int = 20000,
+        max_chats: int = 5000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.admin_ttl = admin_ttl
+        self.max_members = max_members
+        self.max_chats = max_chats
+        self._clock = clock
+        self._members: "OrderedDict[Tuple[int, int], Tuple[ChatMember, float]]" = OrderedDict()
+        self._admins: "OrderedDict[int, Tuple[Optional[Dict[int, ChatMember]], float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    # --- Спільні запити ---
+
+    async def _once(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.api_calls += 1
+            result = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # позначаємо як отриману, якщо ніхто не чекав
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    # --- Адміни ---
+
+    async def get_admins(self, bot: Any, chat_id: int) -> Optional[Dict[int, ChatMember]]:
+        """Адміни чату {user_id: ChatMember} або None, якщо список недоступний (приватний чат тощо)."""
+        entry = self._admins.get(chat_id)
+        if entry is not None and entry[1] > self._clock():
+            self.hits += 1
+            self._admins.move_to_end(chat_id)
+            return entry[0]
+        self.misses += 1
+        try:
+            admins = await self._once(("admins", chat_id), lambda: bot.get_chat_administrators(chat_id))
+        except (BadRequest, Forbidden) as e:
+            # Запам'ятовуємо й відмову, щоб не питати щоразу
+            logger.debug(f"getChatAdministrators для {chat_id} недоступний: {e}")
+            return self._store_admins(chat_id, None)
+        return self._store_admins(chat_id, admins)
+
+    def _store_admins(self, chat_id: int, admins: Any) -> Optional[Dict[int, ChatMember]]:
+        now = self._clock()
+        by_user = None if admins is None else {member.user.id: member for member in admins}
+        self._admins[chat_id] = (by_user, now + self.admin_ttl)
+        self._admins.move_to_end(chat_id)
+        while len(self._admins) > self.max_chats:
+            self._admins.popitem(last=False)
+        for user_id, member in (by_user or {}).items():
+            self._put_member(chat_id, user_id, member, now)
+        return by_user
+
+    async def prewarm(self, bot: Any, chat_id: int) -> bool:
+        """Підтягує список адмінів наперед (наприклад, для чатів з фільтром слів)."""
+        self._admins.pop(chat_id, None)
+        return await self.get_admins(bot, chat_id) is not None
+
+    async def get_admin(self, bot: Any, chat_id: int, user_id: int) -> Optional[ChatMember]:
+        """ChatMemberAdministrator/Owner, якщо користувач адмін, інакше None."""
+        admins = await self.get_admins(bot, chat_id)
+        if admins is not None:
+            return admins.get(user_id)
+        member = await self.get_member(bot, chat_id, user_id)
+        return member if member.status in _ADMIN_STATUSES else None
+
+    async def is_admin(self, bot: Any, chat_id: int, user_id: int, needs_ban_right: bool = False) -> bool:
+        # У межах оновлення відповідь та сама, хоч скільки хендлерів питають
+        return await request_context.memoized(
+            "is_admin",
+            (chat_id, user_id, needs_ban_right),
+            lambda: self._is_admin(bot, chat_id, user_id, needs_ban_right),
+        )
+
+    async def _is_admin(self, bot: Any, chat_id: int, user_id: int, needs_ban_right: bool) -> bool:
+        member = await self.get_admin(bot, chat_id, user_id)
+        if member is None:
+            return False
+        if isinstance(member, ChatMemberOwner) or not needs_ban_right:
+            return True
+        return bool(isinstance(member, ChatMemberAdministrator) and member.can_restrict_members)
+
+    # --- Учасники ---
+
+    def _put_member(self, chat_id: int, user_id: int, member: ChatMember, now: float) -> None:
+        key = (chat_id, user_id)
+        self._members[key] = (member, now + self.ttl)
+        self._members.move_to_end(key)
+        while len(self._members) > self.max_members:
+            self._members.popitem(last=False)
+
+    async def get_member(self, bot: Any, chat_id: int, user_id: int) -> ChatMember:
+        """Як bot.get_chat_member, але з кешем. Помилки API не кешуються і пробрасуються."""
+        key = (chat_id, user_id)
+        entry = self._members.get(key)
+        if entry is not None and entry[1] > self._clock():
+            self.hits += 1
+            self._members.move_to_end(key)
+            return entry[0]
+        self.misses += 1
+        member = await self._once(key, lambda: bot.get_chat_member(chat_id, user_id))
+        self._put_member(chat_id, user_id, member, self._clock())
+        return member
+
+    # --- Інвалідація ---
+
+    def apply_update(self, change: ChatMemberUpdated) -> None:
+        """Застосовує ChatMemberUpdated до кешів замість очікування TTL."""
+        chat_id = change.chat.id
+        member = change.new_chat_member
+        user_id = member.user.id
+        self._put_member(chat_id, user_id, member, self._clock())
+
+        entry = self._admins.get(chat_id)
+        if entry is not None and entry[0] is not None:
+            admins = entry[0]
+            if member.status in _ADMIN_STATUSES:
+                admins[user_id] = member
+            else:
+                admins.pop(user_id, None)
+
+        if member.user.is_bot and member.status in _GONE_STATUSES:
+            self.forget_chat(chat_id)
+
+    def forget_chat(self, chat_id: int) -> None:
+        self._admins.pop(chat_id, None)
+        for key in [k for k in self._members if k[0] == chat_id]:
+            del self._members[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "members": len(self._members),
+            "admin_lists": len(self._admins),
+            "hits": self.hits,
+            "misses": self.misses,
+            "api_calls": self.api_calls,
+        }
+
+
+chat_member_cache = ChatMemberCache()
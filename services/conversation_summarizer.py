@@ -0,0 +1,110 @@
+# conversation_summarizer.py
+# -*- coding: utf-8 -*-
+"""
+Фоновий підсумовувач діалогів.
+
+Коли не підсумована частина історії (user, chat) перевищує поріг у токенах,
+старші репліки стискаються в один рядок conversation_summaries, а сирі
+повідомлення, які він покриває, видаляються. Промпт далі будується як
+«підсумок + кілька останніх реплік».
+
+Працює поза гарячим шляхом: одна фонова задача, черга без дублікатів,
+поступається інтерактивним запитам (is_busy) і не чіпає API, поки
+circuit breaker не закритий.
+"""
+import asyncio
+import contextvars
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Tuple, Dict
+
+from bot.core.database import (
+    get_conversation_messages,
+    get_conversation_summary,
+    save_conversation_summary,
+)
+from bot.services.token_estimator import estimate_messages_tokens
+
+logger = logging.getLogger(__name__)
+
+SummarizeFn = Callable[[int, Optional[str], List[Dict[str, str]]], Awaitable[Optional[str]]]
+
+
+class ConversationSummarizer:
+    def __init__(
+        self,
+        *,
+        summarize: SummarizeFn,
+        is_busy: Callable[[], bool],
+        trigger_tokens: int = 900,
+        keep_messages: int = 6,
+        max_pending: int = 1000,
+        busy_poll_sec: float = 1.0,
+    ) -> None:
+        self._summarize = summarize
+        self._is_busy = is_busy
+        self.trigger_tokens = trigger_tokens
+        self.keep_messages = keep_messages
+        self.max_pending = max_pending
+        self.busy_poll_sec = busy_poll_sec
+
+        self._queue: "asyncio.Queue[Tuple[int, int]]" = asyncio.Queue()
+        self._pending: Set[Tuple[int, int]] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self.summarized = 0
+        self.skipped = 0
+
+    def schedule(self, user_id: int, chat_id: int) -> None:
+        """Ставить діалог на перевірку. Дешево: без БД і мережі, дублікати ігноруються."""
+        key = (user_id, chat_id)
+        if key in self._pending or len(self._pending) >= self.max_pending:
+            return
+        self._pending.add(key)
+        self._queue.put_nowait(key)
+        if self._task is None or self._task.done():
+            # Фонова задача не повинна успадкувати request_context оновлення, що її запустило
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                user_id, chat_id = await self._queue.get()
+            except asyncio.CancelledError:
+                return
+            try:
+                # Низький пріоритет: чекаємо, поки інтерактивні AI-запити розійдуться
+                while self._is_busy():
+                    await asyncio.sleep(self.busy_poll_sec)
+                await self.summarize_if_needed(user_id, chat_id)
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logger.warning(f"Не вдалося підсумувати діалог ({user_id}, {chat_id}): {e}")
+            finally:
+                self._pending.discard((user_id, chat_id))
+                self._queue.task_done()
+
+    async def summarize_if_needed(self, user_id: int, chat_id: int) -> bool:
+        messages = await get_conversation_messages(user_id, chat_id)
+        if len(messages) <= self.keep_messages:
+            return False
+        if estimate_messages_tokens(messages) < self.trigger_tokens:
+            return False
+
+        older = messages[: -self.keep_messages]
+        previous = await get_conversation_summary(user_id, chat_id)
+        summary = await self._summarize(
+            chat_id,
+            previous["summary"] if previous else None,
+            [{"role": m["role"], "content": m["content"]} for m in older],
+        )
+        if not summary:
+            self.skipped += 1
+            return False
+
+        await save_conversation_summary(user_id, chat_id, summary, older[-1]["ts"])
+        self.summarized += 1
+        logger.info(
+            f"Діалог ({user_id}, {chat_id}): {len(older)} повідомлень стиснуто в підсумок."
+        )
+        return True
@@ -0,0 +1,195 @@
+# memory_index.py
+# -*- coding: utf-8 -*-
+"""
+Локальний лексичний індекс (BM25) над таблицею memories.
+
+Замість того щоб віддавати в промпт усі факти користувача й чату, обираємо
+лише top-k релевантних до поточного повідомлення та недавньої історії,
+з жорстким лімітом у токенах.
+
+Індекс живе в пам'яті по скоупах (user/chat), завантажується ліниво при
+першому запиті й далі оновлюється інкрементально з save_memory/remove_memory.
+"""
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from bot.services.token_estimator import estimate_tokens
+
+Scope = Tuple[str, int]
+
+_WORD_RE = re.compile(r"[0-9a-zа-яіїєґё]+")
+
+# Найуживаніші закінчення, від довших до коротших — легкий стемінг без словників
+_ENDINGS = (
+    "ами", "ями", "ові", "еві", "ого", "ому", "ими", "іми", "ій", "ою", "ею",
+    "ах", "ях", "ам", "ям", "ий", "ів", "ої", "ом", "ем", "им", "ім",
+    "а", "я", "у", "ю", "і", "и", "о", "е", "ь", "ї", "є",
+)
+_MIN_STEM = 3
+
+_STOPWORDS = frozenset({
+    "і", "й", "та", "а", "але", "в", "у", "на", "з", "із", "зі", "до", "від", "за", "про", "для",
+    "по", "при", "що", "це", "як", "не", "ні", "чи", "так", "я", "ти", "він", "вона", "воно",
+    "ми", "ви", "вони", "мене", "мені", "тебе", "тобі", "його", "її", "їх", "є", "був", "була",
+    "и", "что", "это", "как", "он", "она", "они", "мы", "вы", "меня", "мне", "тебя", "тебе",
+    "котик", "котику", "кіт", "кошеня",
+})
+
+
+def _stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Нормалізує текст (регістр, апострофи) і повертає стеми без стоп-слів."""
+    if not text:
+        return []
+    text = text.lower().replace("ʼ", "").replace("'", "").replace("’", "")
+    return [_stem(w) for w in _WORD_RE.findall(text) if w not in _STOPWORDS]
+
+
+class _ScopeIndex:
+    __slots__ = ("docs", "df", "total_len")
+
+    def __init__(self) -> None:
+        # key -> (value, term frequencies, doc length)
+        self.docs: Dict[str, Tuple[str, Counter, int]] = {}
+        self.df: Counter = Counter()
+        self.total_len = 0
+
+    def upsert(self, key: str, value: str) -> None:
+        self.remove(key)
+        terms = tokenize(f"{key} {value}")
+        tf = Counter(terms)
+        self.docs[key] = (value, tf, len(terms))
+        self.df.update(tf.keys())
+        self.total_len += len(terms)
+
+    def remove(self, key: str) -> None:
+        old = self.docs.pop(key, None)
+        if old is None:
+            return
+        _, tf, length = old
+        for term in tf:
+            self.df[term] -= 1
+            if self.df[term] <= 0:
+                del self.df[term]
+        self.total_len -= length
+
+    def score(self, query_terms: Counter, k1: float, b: float) -> List[Tuple[float, str, str]]:
+        n = len(self.docs)
+        if not n or not query_terms:
+            return []
+        avgdl = self.total_len / n or 1.0
+        idf = {}
+        for term in query_terms:
+            df = self.df.get(term)
+            if df:
+                idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        if not idf:
+            return []
+
+        results = []
+        for key, (value, tf, length) in self.docs.items():
+            s = 0.0
+            for term, term_idf in idf.items():
+                f = tf.get(term)
+                if f:
+                    s += term_idf * f * (k1 + 1) / (f + k1 * (1 - b + b * length / avgdl))
+            if s > 0:
+                results.append((s, key, value))
+        return results
+
+
+class MemoryIndex:
+    def __init__(self, max_scopes: int = 5000, k1: float = 1.2, b: float = 0.75) -> None:
+        self.max_scopes = max_scopes
+        self.k1 = k1
+        self.b = b
+        self._scopes: "OrderedDict[Scope, _ScopeIndex]" = OrderedDict()
+        # Скоупи, що саме завантажуються з БД: True — під час завантаження був запис
+        self._loading: Dict[Scope, bool] = {}
+
+    # --- Завантаження ---
+
+    def is_loaded(self, scope_type: str, scope_id: int) -> bool:
+        return (scope_type, scope_id) in self._scopes
+
+    def begin_load(self, scope_type: str, scope_id: int) -> None:
+        self._loading[(scope_type, scope_id)] = False
+
+    def finish_load(self, scope_type: str, scope_id: int, rows: List[Dict[str, str]]) -> bool:
+        """Будує індекс скоупу з рядків БД. Якщо під час читання був запис — не кешує."""
+        scope = (scope_type, scope_id)
+        stale = self._loading.pop(scope, False)
+        if stale:
+            return False
+        idx = _ScopeIndex()
+        for row in rows:
+            idx.upsert(row["key"], row["value"])
+        self._scopes[scope] = idx
+        self._scopes.move_to_end(scope)
+        while len(self._scopes) > self.max_scopes:
+            self._scopes.popitem(last=False)
+        return True
+
+    # --- Інкрементальні оновлення ---
+
+    def upsert(self, scope_type: str, scope_id: int, key: str, value: str) -> None:
+        scope = (scope_type, scope_id)
+        if scope in self._loading:
+            self._loading[scope] = True
+        idx = self._scopes.get(scope)
+        if idx is not None:
+            idx.upsert(key, value)
+
+    def remove(self, scope_type: str, scope_id: int, key: str) -> None:
+        scope = (scope_type, scope_id)
+        if scope in self._loading:
+            self._loading[scope] = True
+        idx = self._scopes.get(scope)
+        if idx is not None:
+            idx.remove(key)
+
+    # --- Пошук ---
+
+    def select(
+        self,
+        scopes: List[Scope],
+        query: str,
+        k: int = 8,
+        token_cap: Optional[int] = None,
+    ) -> Dict[Scope, List[Dict[str, str]]]:
+        """Повертає top-k релевантних фактів по всіх скоупах разом у межах token_cap."""
+        query_terms = Counter(tokenize(query))
+        ranked: List[Tuple[float, Scope, str, str]] = []
+        for scope in scopes:
+            idx = self._scopes.get(scope)
+            if idx is None:
+                continue
+            self._scopes.move_to_end(scope)
+            for score, key, value in idx.score(query_terms, self.k1, self.b):
+                ranked.append((score, scope, key, value))
+        ranked.sort(key=lambda r: r[0], reverse=True)
+
+        picked: Dict[Scope, List[Dict[str, str]]] = {}
+        used_tokens = 0
+        count = 0
+        for _, scope, key, value in ranked:
+            if count >= k:
+                break
+            cost = estimate_tokens(f"- {key}: {value}")
+            if token_cap is not None and used_tokens + cost > token_cap:
+                continue
+            picked.setdefault(scope, []).append({"key": key, "value": value})
+            used_tokens += cost
+            count += 1
+        return picked
+
+
+memory_index = MemoryIndex()
@@ -0,0 +1,241 @@
+# message_deleter.py
+# -*- coding: utf-8 -*-
+"""
+Автовидалення повідомлень: одне колесо таймерів замість job на кожне повідомлення.
+
+Раніше кожна команда, відповідь AI, екран погоди/топів/казино ставили окремий
+JobQueue.run_once — у жвавих чатах це тисячі задач APScheduler. Тепер:
+
+- хешоване колесо таймерів: `wheel_size` слотів по `tick` секунд, запис лежить
+  у слоті `tick_no % wheel_size` і спрацьовує, коли його tick_no настав
+  (довгі затримки просто чекають потрібного оберту);
+- одна фонова задача раз на тік забирає прострочені записи, групує їх по чату
+  й видаляє пачками через deleteMessages (до 100 id за запит, масовий пріоритет);
+- записи з `fallback_text` (екрани з автозакриттям) видаляються поштучно: якщо
+  видалити не вдалося, повідомлення редагується на запасний текст;
+- розклад зберігається в SQLite (`scheduled_deletions`) і підхоплюється після
+  рестарту. Зміни пишуться пакетом раз на тік, а не на кожне повідомлення.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from telegram.error import TelegramError
+
+import bot.core.database as database
+from bot.services.telegram_rate_limiter import bulk_priority
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[int, int]
+
+
+class _Entry:
+    __slots__ = ("chat_id", "message_id", "due_at", "tick_no", "fallback_text", "cancelled")
+
+    def __init__(self, chat_id: int, message_id: int, due_at: float, tick_no: int, fallback_text: Optional[str]):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.due_at = due_at
+        self.tick_no = tick_no
+        self.fallback_text = fallback_text
+        self.cancelled = False
+
+
+class MessageDeleter:
+    def __init__(
+        self,
+        tick: float = 1.0,
+        wheel_size: int = 512,
+        batch_size: int = 100,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.batch_size = batch_size
+        self._clock = clock
+        self._slots: List[List[_Entry]] = [[] for _ in range(wheel_size)]
+        self._index: Dict[Key, _Entry] = {}
+        self._current = self._tick_of(clock())
+        # Незаписані зміни розкладу: пишуться в БД однією транзакцією раз на тік
+        self._dirty_upserts: Dict[Key, _Entry] = {}
+        self._dirty_removals: Set[Key] = set()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+        self.deleted = 0
+        self.batches = 0
+        self.failed = 0
+
+    def _tick_of(self, moment: float) -> int:
+        return int(moment // self.tick)
+
+    # --- Розклад ---
+
+    def _insert(self, entry: _Entry) -> None:
+        old = self._index.get((entry.chat_id, entry.message_id))
+        if old is not None:
+            old.cancelled = True
+        # Прострочене чи «на зараз» — у найближчий тік, а не в уже пройдений слот
+        entry.tick_no = max(entry.tick_no, self._current + 1)
+        self._index[(entry.chat_id, entry.message_id)] = entry
+        self._slots[entry.tick_no % self.wheel_size].append(entry)
+
+    def schedule(self, chat_id: int, message_id: int, delay: float, fallback_text: Optional[str] = None) -> None:
+        """Видалити повідомлення через `delay` секунд. Повторний виклик переносить час."""
+        if not chat_id or not message_id:
+            return
+        due_at = self._clock() + max(0.0, float(delay))
+        entry = _Entry(chat_id, message_id, due_at, self._tick_of(due_at), fallback_text)
+        self._insert(entry)
+        key = (chat_id, message_id)
+        self._dirty_removals.discard(key)
+        self._dirty_upserts[key] = entry
+
+    def cancel(self, chat_id: int, message_id: int) -> bool:
+        key = (chat_id, message_id)
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        self._forget(key)
+        return True
+
+    def _forget(self, key: Key) -> None:
+        if self._dirty_upserts.pop(key, None) is None:
+            self._dirty_removals.add(key)
+
+    def _pop_due(self, now: float) -> List[_Entry]:
+        target = self._tick_of(now)
+        if target <= self._current:
+            return []
+        if target - self._current >= self.wheel_size:
+            slots = range(self.wheel_size)
+        else:
+            slots = (t % self.wheel_size for t in range(self._current + 1, target + 1))
+        due: List[_Entry] = []
+        for slot_no in slots:
+            keep = []
+            for entry in self._slots[slot_no]:
+                if entry.cancelled:
+                    continue
+                (due if entry.tick_no <= target else keep).append(entry)
+            self._slots[slot_no] = keep
+        self._current = target
+        for entry in due:
+            key = (entry.chat_id, entry.message_id)
+            if self._index.get(key) is entry:
+                del self._index[key]
+            self._forget(key)
+        return due
+
+    # --- Виконання ---
+
+    async def run_due(self, bot: Any, now: Optional[float] = None) -> int:
+        """Видаляє все, що настало до `now`. Повертає кількість оброблених записів."""
+        due = self._pop_due(self._clock() if now is None else now)
+        if due:
+            by_chat: Dict[int, List[_Entry]] = defaultdict(list)
+            for entry in due:
+                by_chat[entry.chat_id].append(entry)
+            with bulk_priority():
+                for chat_id, entries in by_chat.items():
+                    await self._delete_in_chat(bot, chat_id, entries)
+        await self.flush()
+        return len(due)
+
+    async def _delete_in_chat(self, bot: Any, chat_id: int, entries: List[_Entry]) -> None:
+        plain = [e.message_id for e in entries if not e.fallback_text]
+        for start in range(0, len(plain), self.batch_size):
+            chunk = plain[start:start + self.batch_size]
+            self.batches += 1
+            try:
+                if len(chunk) == 1:
+                    await bot.delete_message(chat_id=chat_id, message_id=chunk[0])
+                else:
+                    await bot.delete_messages(chat_id=chat_id, message_ids=chunk)
+                self.deleted += len(chunk)
+            except TelegramError as e:
+                self.failed += len(chunk)
+                logger.debug(f"Не вдалося видалити {len(chunk)} повідомлень у {chat_id}: {e}")
+
+        for entry in entries:
+            if not entry.fallback_text:
+                continue
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=entry.message_id)
+                self.deleted += 1
+            except TelegramError:
+                try:
+                    await bot.edit_message_text(
+                        chat_id=chat_id, message_id=entry.message_id, text=entry.fallback_text
+                    )
+                except TelegramError:
+                    self.failed += 1
+                    logger.debug("Не вдалося автозакрити екран", exc_info=True)
+
+    async def flush(self) -> None:
+        if not self._dirty_upserts and not self._dirty_removals:
+            return
+        upserts = [
+            (e.chat_id, e.message_id, e.due_at, e.fallback_text) for e in self._dirty_upserts.values()
+        ]
+        removals = list(self._dirty_removals)
+        self._dirty_upserts = {}
+        self._dirty_removals = set()
+        try:
+            await database.apply_scheduled_deletions(upserts, removals)
+        except Exception as e:
+            logger.warning(f"Не вдалося зберегти розклад автовидалення: {e}")
+
+    # --- Життєвий цикл ---
+
+    async def load(self) -> int:
+        """Підхоплює розклад з БД (після рестарту). Прострочене спрацює на першому тіку."""
+        rows = await database.get_scheduled_deletions()
+        for row in rows:
+            key = (row["chat_id"], row["message_id"])
+            if key in self._index:
+                continue
+            due_at = row["due_at"]
+            self._insert(_Entry(key[0], key[1], due_at, self._tick_of(due_at), row["fallback_text"]))
+        return len(rows)
+
+    async def start(self, bot: Any) -> int:
+        loaded = await self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop(bot))
+        return loaded
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _loop(self, bot: Any) -> None:
+        while True:
+            now = self._clock()
+            await asyncio.sleep(self.tick - (now % self.tick))
+            try:
+                await self.run_due(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Помилка в циклі автовидалення")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._index),
+            "deleted": self.deleted,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+
+message_deleter = MessageDeleter()
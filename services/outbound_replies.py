@@ -0,0 +1,85 @@
+# outbound_replies.py
+# -*- coding: utf-8 -*-
+"""
+Ідемпотентна відправка відповідей бота.
+
+Кожна логічна відповідь (текст, стікер, повідомлення про помилку) має ключ
+ідемпотентності, зазвичай "<chat_id>:<message_id>:<частина>". Перший виклик
+з ключем реально йде в Bot API, повторні — з того ж ходу, з повторної
+обробки апдейту чи з гонки паралельних викликів — отримують уже збережений
+результат. Невдала відправка ключ не займає, тож її можна повторити.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def reply_key(chat_id: int, message_id: Optional[int], part: str) -> str:
+    return f"{chat_id}:{message_id}:{part}"
+
+
+class OutboundReplies:
+    def __init__(self, max_keys: int = 5000, ttl: float = 600.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (час відправки, результат)
+        self._sent: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.sent_total = 0
+        self.deduplicated = 0
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        entry = self._sent.get(key)
+        if entry is None:
+            return False, None
+        sent_at, result = entry
+        if self._clock() - sent_at > self.ttl:
+            del self._sent[key]
+            return False, None
+        return True, result
+
+    def _remember(self, key: str, result: Any) -> None:
+        self._sent[key] = (self._clock(), result)
+        self._sent.move_to_end(key)
+        while len(self._sent) > self.max_keys:
+            self._sent.popitem(last=False)
+
+    async def send_once(self, key: str, send: Callable[[], Awaitable[Any]]) -> Any:
+        """Виконує send() не більше одного разу для ключа і повертає його результат."""
+        found, result = self._lookup(key)
+        if found:
+            self.deduplicated += 1
+            return result
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await send()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Ніхто міг не чекати на future — не даємо asyncio скаржитися
+            future.exception()
+            raise
+        else:
+            self._remember(key, result)
+            self.sent_total += 1
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def was_sent(self, key: str) -> bool:
+        return self._lookup(key)[0]
+
+
+outbound_replies = OutboundReplies()
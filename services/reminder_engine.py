@@ -0,0 +1,234 @@
+# reminder_engine.py
+# -*- coding: utf-8 -*-
+"""
+Двигун нагадувань: один диспетчер замість JobQueue-job на кожне нагадування.
+
+Раніше на старті бот читав усю таблицю reminders і ставив APScheduler
+run_once на кожен рядок — на сотнях тисяч нагадувань це повільний старт і
+купа пам'яті під задачі, більшість з яких спрацює за тижні. Тепер:
+
+- у пам'яті лише найближчий горизонт (`horizon`, типово година): min-купа
+  (час, id), яку раз на `refill_interval` доповнює запит по індексу
+  (status, reminder_time);
+- нові, відкладені й переплановані нагадування потрапляють у купу одразу,
+  лише якщо вони в межах уже завантаженого горизонту, — решту підхопить
+  наступне доповнення;
+- одна фонова задача спить до найближчого нагадування чи доповнення; коли
+  щось настало, вона одним UPDATE … RETURNING забирає з БД усі настані рядки
+  (ACTIVE -> FIRING, пачками до `batch_limit`) і віддає пачку в
+  `deliver(rows)`, яка сама записує підсумок (finish_reminders);
+- усе, що запізнилось більше ніж на `missed_after` секунд (бот був офлайн),
+  отримує `missed_at`; забране, але не завершене через рестарт, на старті
+  повертається в ACTIVE.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import bot.core.database as database
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+
+def to_timestamp(value: Union[datetime, str, float]) -> float:
+    """datetime / ISO-рядок з БД (naive = UTC) / unix-час -> unix-час."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _utc_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class ReminderEngine:
+    def __init__(
+        self,
+        horizon: float = 3600.0,
+        refill_interval: float = 300.0,
+        missed_after: float = 60.0,
+        batch_limit: int = 500,
+        clock: Callable[[], float] = time.time,
+        deliver: Optional[Deliver] = None,
+    ) -> None:
+        self.horizon = horizon
+        self.refill_interval = min(refill_interval, horizon)
+        self.missed_after = missed_after
+        self.batch_limit = batch_limit
+        self._clock = clock
+        self._heap: List[Tuple[float, int]] = []
+        # id -> актуальний час; записи купи з іншим часом — застарілі (ліниве видалення)
+        self._scheduled: Dict[int, float] = {}
+        self._horizon_end = 0.0
+        self._next_refill = 0.0
+        self._deliver = deliver
+        self._wakeup = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+        self.delivered = 0
+        self.batches = 0
+        self.missed = 0
+        self.refills = 0
+        self.last_refill_rows = 0
+
+    # --- Розклад ---
+
+    def _push(self, reminder_id: int, due_at: float) -> None:
+        self._scheduled[reminder_id] = due_at
+        heapq.heappush(self._heap, (due_at, reminder_id))
+
+    def schedule(self, reminder_id: int, when: Union[datetime, str, float]) -> bool:
+        """Нове/перенесене нагадування. True — потрапило в купу (в межах горизонту)."""
+        due_at = to_timestamp(when)
+        if due_at > self._horizon_end:
+            # Поза горизонтом: старий запис у купі (якщо був) уже не актуальний
+            self._scheduled.pop(reminder_id, None)
+            return False
+        self._push(reminder_id, due_at)
+        self._wakeup.set()
+        return True
+
+    def cancel(self, reminder_id: int) -> bool:
+        return self._scheduled.pop(reminder_id, None) is not None
+
+    async def refill(self, now: Optional[float] = None) -> int:
+        """Довантажує з БД усе активне до now + horizon. Повертає кількість нових у купі."""
+        now = self._clock() if now is None else now
+        # Горизонт зсуваємо ДО запиту: усе, що створять під час запиту, піде через schedule()
+        self._horizon_end = now + self.horizon
+        self._next_refill = now + self.refill_interval
+        rows = await database.get_active_reminders_until(_utc_iso(self._horizon_end))
+        added = 0
+        for row in rows:
+            reminder_id = row["id"]
+            try:
+                due_at = to_timestamp(row["reminder_time"])
+            except (TypeError, ValueError):
+                logger.warning(f"Нагадування {reminder_id}: некоректний час {row['reminder_time']!r}")
+                continue
+            if self._scheduled.get(reminder_id) == due_at:
+                continue
+            self._push(reminder_id, due_at)
+            added += 1
+        self.refills += 1
+        self.last_refill_rows = len(rows)
+        return added
+
+    def _pop_due(self, now: float) -> int:
+        """Знімає з купи настале; самі рядки потім забирає claim_due_reminders."""
+        due = 0
+        while self._heap and self._heap[0][0] <= now:
+            due_at, reminder_id = heapq.heappop(self._heap)
+            if self._scheduled.get(reminder_id) != due_at:
+                continue
+            del self._scheduled[reminder_id]
+            due += 1
+        return due
+
+    def _next_due(self) -> Optional[float]:
+        while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    # --- Виконання ---
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """Забирає з БД і віддає в deliver усе, що настало до `now`. Повертає кількість нагадувань."""
+        now = self._clock() if now is None else now
+        if not self._pop_due(now) or self._deliver is None:
+            return 0
+        total = 0
+        while True:
+            rows = await database.claim_due_reminders(_utc_iso(now), self.batch_limit)
+            if not rows:
+                break
+            for row in rows:
+                row["missed_at"] = None
+                try:
+                    due_at = to_timestamp(row["reminder_time"])
+                except (TypeError, ValueError):
+                    continue
+                if now - due_at > self.missed_after:
+                    row["missed_at"] = _utc_iso(due_at)
+                    self.missed += 1
+            self.batches += 1
+            try:
+                await self._deliver(rows)
+            except Exception:
+                # Рядки лишаються FIRING і повернуться в роботу після рестарту
+                logger.exception(f"Помилка доставки пачки з {len(rows)} нагадувань")
+            total += len(rows)
+            if len(rows) < self.batch_limit:
+                break
+        self.delivered += total
+        return total
+
+    # --- Життєвий цикл ---
+
+    async def start(self, deliver: Optional[Deliver] = None) -> int:
+        """Перше доповнення й запуск диспетчера. Повертає кількість нагадувань у купі."""
+        if deliver is not None:
+            self._deliver = deliver
+        released = await database.release_claimed_reminders()
+        if released:
+            logger.info(f"Повернуто в чергу нагадувань, перерваних рестартом: {released}")
+        await self.refill()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return len(self._scheduled)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if self._clock() >= self._next_refill:
+                    await self.refill()
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Помилка в циклі нагадувань")
+            # Скидаємо прапорець до розрахунку паузи, щоб не проспати schedule() між ними
+            self._wakeup.clear()
+            wake_at = self._next_refill
+            next_due = self._next_due()
+            if next_due is not None:
+                wake_at = min(wake_at, next_due)
+            delay = wake_at - self._clock()
+            if delay <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._scheduled),
+            "horizon_min": round(self.horizon / 60),
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "missed": self.missed,
+            "refills": self.refills,
+            "last_refill_rows": self.last_refill_rows,
+        }
+
+
+reminder_engine = ReminderEngine()
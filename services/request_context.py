@@ -0,0 +1,165 @@
+# request_context.py
+# -*- coding: utf-8 -*-
+"""
+Контекст одного оновлення: спільні результати запитів на час його обробки.
+
+За одне повідомлення кілька хендлерів незалежно тягнули одне й те саме:
+налаштування чату, глобальний статус AI, профіль користувача, права адміна,
+поточну тему. Тепер:
+
+- TypeHandler у group=-100 відкриває RequestContext (ContextVar — його видно
+  з будь-якого хендлера, job'у чи сервісу всередині цього оновлення);
+- get_chat_settings / get_user_profile / get_global_ai_status, перевірка
+  адміна й знімок теми мемоізуються в ньому; записи у ці дані скидають
+  відповідне значення, тож хендлер після зміни бачить нове;
+- підключення до БД і запити до Bot API рахуються, після обробки оновлення
+  підсумок іде в лог (debug) і в агреговану статистику.
+
+Поза оновленням (job'и, старт) контексту немає — усе працює як раніше, без кешу.
+Задачі, створені під час оновлення, успадковують його ContextVar; після
+finish_request() контекст закритий і вони теж працюють без кешу й лічильників.
+Довгоживучі фонові задачі (воркери черг, підсумовувач) варто стартувати з
+порожнім контекстом: create_task(..., context=contextvars.Context()).
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_ANY = object()
+
+
+class RequestContext:
+    def __init__(self, update_id: Optional[int], chat_id: Optional[int], user_id: Optional[int]) -> None:
+        self.update_id = update_id
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.started = time.perf_counter()
+        self.db_calls = 0
+        self.api_calls = 0
+        self.memo_hits = 0
+        self.closed = False
+        self._memo: Dict[Tuple[str, Any], Any] = {}
+
+    async def memoize(self, kind: str, key: Any, loader: Callable[[], Awaitable[T]]) -> T:
+        slot = (kind, key)
+        if slot in self._memo:
+            self.memo_hits += 1
+            return self._memo[slot]
+        value = await loader()
+        self._memo[slot] = value
+        return value
+
+    def forget(self, kind: str, key: Any = _ANY) -> None:
+        if key is not _ANY:
+            self._memo.pop((kind, key), None)
+            return
+        for slot in [s for s in self._memo if s[0] == kind]:
+            del self._memo[slot]
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def current_request() -> Optional[RequestContext]:
+    """Контекст поточного оновлення; закритий (оновлення вже оброблене) не рахується."""
+    request = _current.get()
+    if request is None or request.closed:
+        return None
+    return request
+
+
+def begin_request(update: Any) -> RequestContext:
+    """Відкриває контекст для оновлення (викликається з TypeHandler у group=-100)."""
+    chat = getattr(update, "effective_chat", None)
+    user = getattr(update, "effective_user", None)
+    request = RequestContext(
+        getattr(update, "update_id", None),
+        chat.id if chat else None,
+        user.id if user else None,
+    )
+    _current.set(request)
+    return request
+
+
+def finish_request() -> Optional[RequestContext]:
+    """Закриває контекст поточного оновлення й записує його лічильники."""
+    request = _current.get()
+    if request is None:
+        return None
+    _current.set(None)
+    # Задачі, що скопіювали контекст оновлення, далі працюють без нього
+    request.closed = True
+    request._memo.clear()
+    request_stats.record(request)
+    logger.debug(
+        f"Оновлення {request.update_id} (чат {request.chat_id}): БД {request.db_calls}, "
+        f"API {request.api_calls}, з кешу {request.memo_hits}, {request.elapsed_ms:.1f} мс"
+    )
+    return request
+
+
+async def memoized(kind: str, key: Any, loader: Callable[[], Awaitable[T]]) -> T:
+    """loader() один раз на оновлення; поза оновленням — просто loader()."""
+    request = current_request()
+    if request is None:
+        return await loader()
+    return await request.memoize(kind, key, loader)
+
+
+def forget(kind: str, key: Any = _ANY) -> None:
+    request = current_request()
+    if request is not None:
+        request.forget(kind, key)
+
+
+def note_db_call() -> None:
+    request = current_request()
+    if request is not None:
+        request.db_calls += 1
+
+
+def note_api_call() -> None:
+    request = current_request()
+    if request is not None:
+        request.api_calls += 1
+
+
+class RequestStats:
+    def __init__(self) -> None:
+        self.updates = 0
+        self.db_calls = 0
+        self.api_calls = 0
+        self.memo_hits = 0
+        self.max_db_calls = 0
+        self.max_api_calls = 0
+
+    def record(self, request: RequestContext) -> None:
+        self.updates += 1
+        self.db_calls += request.db_calls
+        self.api_calls += request.api_calls
+        self.memo_hits += request.memo_hits
+        self.max_db_calls = max(self.max_db_calls, request.db_calls)
+        self.max_api_calls = max(self.max_api_calls, request.api_calls)
+
+    def stats(self) -> Dict[str, Any]:
+        per_update = lambda total: round(total / self.updates, 2) if self.updates else 0.0
+        return {
+            "updates": self.updates,
+            "avg_db_calls": per_update(self.db_calls),
+            "avg_api_calls": per_update(self.api_calls),
+            "max_db_calls": self.max_db_calls,
+            "max_api_calls": self.max_api_calls,
+            "memo_hits": self.memo_hits,
+        }
+
+
+request_stats = RequestStats()
@@ -0,0 +1,153 @@
+# response_cache.py
+# -*- coding: utf-8 -*-
+"""
+Кеш AI-відповідей і таблиця швидких відповідей.
+
+Багато звернень — короткі пінги ("котик що робиш", "котик привіт"), які
+щоразу йшли в DeepSeek з повним контекстом. Тепер:
+
+- текст нормалізується (регістр, пунктуація, апострофи, звертання до бота);
+- FastReplies — таблиця тригер -> варіанти відповідей, яку редагує власник.
+  Вона зібрана в один словник за нормалізованим текстом, тож перевірка
+  займає один пошук замість циклу підрядкових перевірок;
+- ResponseCache — TTL + LRU кеш відповідей DeepSeek для коротких запитів
+  з ключем (нормалізований текст, режим, тема). Кешовані відповіді
+  генеруються із загального промпту — без імені, звертання за статтю,
+  пам'яті, підсумку й історії, — тож одну відповідь можна віддати будь-кому.
+"""
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CacheKey = Tuple[str, str, str]
+
+_MENTION_RE = re.compile(r"@\w+")
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+# Звертання до бота не змінюють суті запиту
+INVOCATION_WORDS = frozenset({
+    "котик", "котику", "кіт", "коте", "кошеня", "кошенятко", "котяра",
+})
+
+# Початкове наповнення таблиці швидких відповідей (колишні SIMPLE_RESPONCES)
+DEFAULT_FAST_REPLIES: Dict[Tuple[str, ...], List[str]] = {
+    ("привіт", "привет", "привіт мур", "hi", "hello"): [
+        "Привіт! 🐾",
+        "Мур! 😼",
+        "Вітаю! 🌿",
+    ],
+    ("як справи", "как дела", "як себе почуваєш", "як ти", "як дела ты"): [
+        "Зі мною все добре, спасибі! 🐾",
+        "Мур, спасибі за питання! 😸",
+        "Все як завжди - спокійно та з гідністю. 🧘",
+    ],
+    ("спасибі", "спасибо", "дякую", "thanks", "thank you"): [
+        "Будь ласка! 🌿",
+        "Радий допомогти! 😽",
+        "Не за що! 🐾",
+    ],
+    ("пока", "bye", "до свидання", "до побачення", "чао"): [
+        "До зустрічі! 🐾",
+        "Мур! 😼",
+        "Грішити в міру! 😈",
+    ],
+}
+
+
+def normalize_prompt(text: str) -> str:
+    """Зводить запит до канонічного вигляду: без регістру, пунктуації та звертань."""
+    if not text:
+        return ""
+    text = text.lower().replace("ʼ", "").replace("'", "").replace("’", "")
+    text = _MENTION_RE.sub(" ", text)
+    words = [w for w in _NON_WORD_RE.sub(" ", text).replace("_", " ").split() if w not in INVOCATION_WORDS]
+    return " ".join(words)
+
+
+class FastReplies:
+    def __init__(self) -> None:
+        self._table: Dict[str, List[str]] = {}
+        self.loaded = False
+        self.hits = 0
+
+    def load(self, rows: Iterable[Dict[str, str]]) -> None:
+        """Збирає таблицю з рядків {'trigger', 'responses'} (відповіді — по рядку)."""
+        table: Dict[str, List[str]] = {}
+        for row in rows:
+            trigger = normalize_prompt(row["trigger"])
+            responses = [r.strip() for r in (row["responses"] or "").splitlines() if r.strip()]
+            if trigger and responses:
+                table[trigger] = responses
+        self._table = table
+        self.loaded = True
+
+    def match(self, normalized: str) -> Optional[str]:
+        responses = self._table.get(normalized)
+        if not responses:
+            return None
+        self.hits += 1
+        return random.choice(responses)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: float = 600.0,
+        max_words: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_words = max_words
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, normalized: str, mode: str, theme: str) -> Optional[CacheKey]:
+        """Ключ кешу або None, якщо запит задовгий, щоб відповідь на нього була загальною."""
+        if not normalized or len(normalized.split()) > self.max_words:
+            return None
+        return (normalized, mode or "", theme or "")
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, reply = entry
+            if self._clock() - stored_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return reply
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: CacheKey, reply: str) -> None:
+        if not reply:
+            return
+        self._entries[key] = (self._clock(), reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+        }
@@ -0,0 +1,381 @@
+# sqlite_persistence.py
+# -*- coding: utf-8 -*-
+"""
+Persistence PTB у SQLite: рядок на чат, користувача і ключ bot_data.
+
+PicklePersistence на кожен запис перепіклював і переписував увесь файл
+(bot_data + chat_data + user_data усіх чатів), тож ціна збереження росла
+разом із загальним станом. Тут:
+
+- кожен chat_data / user_data — окремий рядок `ptb_persistence`, bot_data —
+  рядок на верхньорівневий ключ;
+- зміни визначаються за дайджестом піклу: незмінені записи не пишуться, а всі
+  змінені за один прохід update_persistence йдуть однією транзакцією;
+- chat_data / user_data підвантажуються ліниво, в refresh_* (PTB викликає їх
+  перед кожним хендлером і job'ом зі своїм чатом/користувачем). На старті
+  одразу читаються лише рядки з ключами з `eager_chat_keys` — їх чистять
+  обробники після рестарту;
+- старий bot_data.pkl один раз переноситься в таблицю й перейменовується.
+"""
+import asyncio
+import contextvars
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput, PicklePersistence
+
+import bot.core.database as database
+
+logger = logging.getLogger(__name__)
+
+_BOT_ID = "_bot"
+# bot_data з не-рядковими ключами (рідкість) зберігаються одним рядком
+_NON_STR_BOT_KEYS = "\x00non_str_keys"
+
+Row = Tuple[str, str]
+
+
+class _BotPickler(pickle.Pickler):
+    def __init__(self, bot: Any, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._bot = bot
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        return _BOT_ID if self._bot is not None and obj is self._bot else None
+
+
+class _BotUnpickler(pickle.Unpickler):
+    def __init__(self, bot: Any, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._bot = bot
+
+    def persistent_load(self, pid: str) -> Any:
+        if pid == _BOT_ID:
+            return self._bot
+        raise pickle.UnpicklingError(f"Невідомий persistent id: {pid}")
+
+
+def _top_keys(data: Any) -> str:
+    keys = data.keys() if isinstance(data, dict) else ()
+    return json.dumps(sorted(str(k) for k in keys), ensure_ascii=False)
+
+
+class SQLitePersistence(BasePersistence):
+    def __init__(
+        self,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 60,
+        eager_chat_keys: Iterable[str] = (),
+        migrate_from: Optional[str] = None,
+    ) -> None:
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.eager_chat_keys = set(eager_chat_keys)
+        self.migrate_from = migrate_from
+        self._ready = False
+        self._ready_lock = asyncio.Lock()
+        # Що лежить у БД (з індексу на старті) і що вже підвантажено в PTB
+        self._stored: Dict[str, Set[str]] = {"chat": set(), "user": set()}
+        self._loaded: Dict[str, Set[str]] = {"chat": set(), "user": set()}
+        self._digests: Dict[Row, bytes] = {}
+        self._bot_keys: Set[str] = set()
+        # Незаписані зміни: пишуться однією транзакцією
+        self._upserts: Dict[Row, tuple] = {}
+        self._removals: Set[Row] = set()
+        self._writer: Optional["asyncio.Task[None]"] = None
+
+        self.lazy_loads = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.unchanged_skipped = 0
+
+    # --- Серіалізація ---
+
+    def _dumps(self, obj: Any) -> bytes:
+        buffer = io.BytesIO()
+        _BotPickler(getattr(self, "bot", None), buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+        return buffer.getvalue()
+
+    def _loads(self, blob: bytes) -> Any:
+        return _BotUnpickler(getattr(self, "bot", None), io.BytesIO(blob)).load()
+
+    # --- Підготовка ---
+
+    async def _ensure_ready(self) -> None:
+        if self._ready:
+            return
+        async with self._ready_lock:
+            if self._ready:
+                return
+            await database.ensure_persistence_table()
+            for kind in ("chat", "user"):
+                self._stored[kind] = {row["key"] for row in await database.get_persistence_index(kind)}
+            if self.migrate_from and os.path.exists(self.migrate_from):
+                await self._migrate_pickle(self.migrate_from)
+            self._ready = True
+
+    async def _migrate_pickle(self, path: str) -> None:
+        if self._stored["chat"] or self._stored["user"] or await database.get_persistence_index("bot"):
+            logger.warning(f"{path} не перенесено: таблиця persistence вже не порожня")
+            return
+        old = PicklePersistence(filepath=path)
+        if getattr(self, "bot", None) is not None:
+            old.set_bot(self.bot)
+        now = time.time()
+        upserts = []
+        for kind, rows in (("chat", await old.get_chat_data()), ("user", await old.get_user_data())):
+            for key, data in rows.items():
+                blob = self._dumps(data)
+                upserts.append((kind, str(key), _top_keys(data), blob, len(blob), now))
+                self._stored[kind].add(str(key))
+        for key, blob in self._bot_rows(await old.get_bot_data()).items():
+            upserts.append(("bot", key, "[]", blob, len(blob), now))
+        await database.apply_persistence_changes(upserts, [])
+        os.replace(path, f"{path}.migrated")
+        logger.info(f"📦 Перенесено {len(upserts)} записів з {path} у SQLite")
+
+    # --- Читання ---
+
+    async def _load_rows(self, kind: str, keys: Optional[List[str]]) -> Dict[int, Any]:
+        result = {}
+        for key, blob in (await database.get_persistence_rows(kind, keys)).items():
+            try:
+                result[int(key)] = self._loads(blob)
+            except Exception:
+                logger.exception(f"Не вдалося прочитати {kind}_data {key}")
+                continue
+            self._digests[(kind, key)] = hashlib.blake2b(blob, digest_size=16).digest()
+            self._loaded[kind].add(key)
+        return result
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        await self._ensure_ready()
+        if not self.eager_chat_keys:
+            return {}
+        eager = [
+            row["key"]
+            for row in await database.get_persistence_index("chat")
+            if self.eager_chat_keys.intersection(json.loads(row["keys"]))
+        ]
+        return await self._load_rows("chat", eager) if eager else {}
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        await self._ensure_ready()
+        return {}
+
+    async def _refresh(self, kind: str, key: int, data: Dict[Any, Any]) -> None:
+        str_key = str(key)
+        if str_key in self._loaded[kind]:
+            return
+        await self._ensure_ready()
+        if str_key in self._stored[kind]:
+            self.lazy_loads += 1
+            loaded = (await self._load_rows(kind, [str_key])).get(key) or {}
+            for k, v in loaded.items():
+                data.setdefault(k, v)
+        self._loaded[kind].add(str_key)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        await self._refresh("chat", chat_id, chat_data)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        await self._refresh("user", user_id, user_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    def _bot_rows(self, data: Dict[Any, Any]) -> Dict[str, bytes]:
+        rows = {key: self._dumps(value) for key, value in data.items() if isinstance(key, str)}
+        other = {key: value for key, value in data.items() if not isinstance(key, str)}
+        if other:
+            rows[_NON_STR_BOT_KEYS] = self._dumps(other)
+        return rows
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        await self._ensure_ready()
+        data: Dict[Any, Any] = {}
+        for key, blob in (await database.get_persistence_rows("bot")).items():
+            try:
+                value = self._loads(blob)
+            except Exception:
+                logger.exception(f"Не вдалося прочитати bot_data[{key!r}]")
+                continue
+            self._digests[("bot", key)] = hashlib.blake2b(blob, digest_size=16).digest()
+            self._bot_keys.add(key)
+            if key == _NON_STR_BOT_KEYS:
+                data.update(value)
+            else:
+                data[key] = value
+        return data
+
+    async def get_callback_data(self) -> Optional[Any]:
+        await self._ensure_ready()
+        rows = await database.get_persistence_rows("callback", ["data"])
+        return self._loads(rows["data"]) if "data" in rows else None
+
+    async def get_conversations(self, name: str) -> Dict[Any, Any]:
+        await self._ensure_ready()
+        rows = await database.get_persistence_rows(f"conv:{name}")
+        return {tuple(json.loads(key)): self._loads(blob) for key, blob in rows.items()}
+
+    # --- Запис ---
+
+    def _stage(self, kind: str, key: str, blob: bytes, top_keys: str = "[]") -> None:
+        row = (kind, key)
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        if self._digests.get(row) == digest and row not in self._removals:
+            self.unchanged_skipped += 1
+            return
+        self._digests[row] = digest
+        self._removals.discard(row)
+        self._upserts[row] = (kind, key, top_keys, blob, len(blob), time.time())
+
+    def _stage_removal(self, kind: str, key: str) -> None:
+        row = (kind, key)
+        self._digests.pop(row, None)
+        self._upserts.pop(row, None)
+        self._removals.add(row)
+
+    async def _write_soon(self) -> None:
+        # Усі update_* одного проходу update_persistence встигають додати свої
+        # рядки до старту запису — виходить одна транзакція на прохід
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write(), context=contextvars.Context())
+        await asyncio.shield(self._writer)
+
+    async def _write(self) -> None:
+        await asyncio.sleep(0)
+        # Те, що додалось під час запису, піде наступною транзакцією цього ж writer'а
+        while self._upserts or self._removals:
+            upserts, removals = self._upserts, self._removals
+            self._upserts, self._removals = {}, set()
+            try:
+                await database.apply_persistence_changes(list(upserts.values()), list(removals))
+            except Exception:
+                # Повертаємо в чергу (новіші версії рядків мають перевагу)
+                for row, values in upserts.items():
+                    if row not in self._removals:
+                        self._upserts.setdefault(row, values)
+                self._removals |= {row for row in removals if row not in self._upserts}
+                raise
+            self.rows_written += len(upserts)
+            self.bytes_written += sum(values[4] for values in upserts.values())
+
+    async def _update(self, kind: str, key: int, data: Dict[Any, Any]) -> None:
+        str_key = str(key)
+        if str_key not in self._loaded[kind] and str_key in self._stored[kind]:
+            # PTB записує дані, які ще не підвантажувались: не затираємо збережене
+            stored = (await self._load_rows(kind, [str_key])).get(key) or {}
+            self._loaded[kind].discard(str_key)
+            data = {**stored, **data}
+        self._stored[kind].add(str_key)
+        self._stage(kind, str_key, self._dumps(data), _top_keys(data))
+        await self._write_soon()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        await self._update("chat", chat_id, data)
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        await self._update("user", user_id, data)
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        rows = self._bot_rows(data)
+        for key, blob in rows.items():
+            self._stage("bot", key, blob)
+        for key in self._bot_keys - rows.keys():
+            self._stage_removal("bot", key)
+        self._bot_keys = set(rows)
+        await self._write_soon()
+
+    async def update_callback_data(self, data: Any) -> None:
+        self._stage("callback", "data", self._dumps(data))
+        await self._write_soon()
+
+    async def update_conversation(self, name: str, key: Tuple[Any, ...], new_state: Optional[object]) -> None:
+        row_key = json.dumps(list(key))
+        if new_state is None:
+            self._stage_removal(f"conv:{name}", row_key)
+        else:
+            self._stage(f"conv:{name}", row_key, self._dumps(new_state))
+        await self._write_soon()
+
+    async def _drop(self, kind: str, key: int) -> None:
+        str_key = str(key)
+        self._stored[kind].discard(str_key)
+        self._loaded[kind].discard(str_key)
+        self._stage_removal(kind, str_key)
+        await self._write_soon()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._drop("chat", chat_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._drop("user", user_id)
+
+    async def compact_stored(
+        self,
+        kind: str,
+        compact: Callable[[int, Dict[Any, Any]], Tuple[int, int]],
+        wants: Callable[[List[str]], bool],
+    ) -> Tuple[int, int, int]:
+        """
+        Прибирання в ще не завантажених рядках kind без підняття їх у PTB.
+        compact(id, data) чистить data на місці й повертає (видалено записів, байтів);
+        wants(keys) за індексом ключів вирішує, чи варто рядок читати.
+        Повертає (змінених рядків, видалено записів, звільнено байтів у БД).
+        """
+        await self._ensure_ready()
+        candidates = [
+            row for row in await database.get_persistence_index(kind)
+            if row["key"] not in self._loaded[kind] and wants(json.loads(row["keys"]))
+        ]
+        if not candidates:
+            return 0, 0, 0
+        sizes = {row["key"]: row["size"] for row in candidates}
+        rows = removed = reclaimed = 0
+        for key, blob in (await database.get_persistence_rows(kind, list(sizes))).items():
+            if key in self._loaded[kind]:
+                continue  # встиг підвантажитись, поки читали
+            try:
+                data = self._loads(blob)
+            except Exception:
+                logger.exception(f"Не вдалося прочитати {kind}_data {key}")
+                continue
+            dropped, _ = compact(int(key), data)
+            if not dropped:
+                continue
+            rows += 1
+            removed += dropped
+            if data:
+                new_blob = self._dumps(data)
+                self._stage(kind, key, new_blob, _top_keys(data))
+                reclaimed += max(0, sizes[key] - len(new_blob))
+            else:
+                self._stored[kind].discard(key)
+                self._stage_removal(kind, key)
+                reclaimed += sizes[key]
+        if rows:
+            await self._write_soon()
+        return rows, removed, reclaimed
+
+    async def flush(self) -> None:
+        if self._writer is not None and not self._writer.done():
+            await self._writer
+        await self._write()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "stored_chats": len(self._stored["chat"]),
+            "loaded_chats": len(self._loaded["chat"]),
+            "stored_users": len(self._stored["user"]),
+            "loaded_users": len(self._loaded["user"]),
+            "lazy_loads": self.lazy_loads,
+            "rows_written": self.rows_written,
+            "bytes_written": self.bytes_written,
+            "unchanged_skipped": self.unchanged_skipped,
+        }
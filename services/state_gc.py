@@ -0,0 +1,202 @@
+# state_gc.py
+# -*- coding: utf-8 -*-
+"""
+Збирання сміття в chat_data / user_data.
+
+Модулі кладуть у persistence дрібний стан (ігри, кулдауни, очікування вводу,
+контекст погоди), який після використання ніхто не прибирає: завершені й
+покинуті ігри, давно минулі кулдауни, незавершені майстри нагадувань. Тут:
+
+- кожен модуль сам оголошує свої ключі в реєстрі: область (chat/user), ключ
+  або префікс, TTL і звідки брати час (`stamp`); `items=True` — значення є
+  словником записів, і вік рахується для кожного запису окремо;
+- записи без мітки часу (старі дані) старіють від моменту, коли їх уперше
+  побачив збирач, — тобто після рестарту отримують повний TTL;
+- періодичний job проходить завантажені chat_data/user_data і ще не
+  завантажені рядки SQLitePersistence, прибирає прострочене й рахує, скільки
+  байтів (у піклі) звільнено.
+"""
+import logging
+import pickle
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Stamp = Callable[[Any], Any]
+
+
+def as_timestamp(value: Any) -> Optional[float]:
+    """datetime / unix-час / ISO-рядок -> unix-час (None, якщо не схоже на час)."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def _size(value: Any) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+@dataclass(frozen=True)
+class StatePolicy:
+    scope: str  # "chat" | "user"
+    key: str
+    ttl: float
+    prefix: bool = False
+    items: bool = False
+    # Час останньої активності значення/запису; None -> від першого бачення збирачем
+    stamp: Optional[Stamp] = None
+
+
+class StateCollector:
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._policies: List[StatePolicy] = []
+        self._first_seen: Dict[Tuple[Hashable, ...], float] = {}
+        self._seen: Set[Tuple[Hashable, ...]] = set()
+        self.last_report: Dict[str, Any] = {}
+
+    def register(
+        self,
+        scope: str,
+        key: str,
+        ttl: float,
+        *,
+        prefix: bool = False,
+        items: bool = False,
+        stamp: Optional[Stamp] = None,
+    ) -> None:
+        if scope not in ("chat", "user"):
+            raise ValueError(f"Невідома область стану: {scope}")
+        self._policies.append(StatePolicy(scope, key, ttl, prefix, items, stamp))
+
+    def _policy_for(self, scope: str, key: Any) -> Optional[StatePolicy]:
+        if not isinstance(key, str):
+            return None
+        for policy in self._policies:
+            if policy.scope == scope and (key.startswith(policy.key) if policy.prefix else key == policy.key):
+                return policy
+        return None
+
+    def wants(self, scope: str, keys: List[str]) -> bool:
+        """Чи є серед верхньорівневих ключів хоч один зареєстрований."""
+        return any(self._policy_for(scope, key) for key in keys)
+
+    # --- Вік ---
+
+    def _expired(self, policy: StatePolicy, marker: Tuple[Hashable, ...], value: Any, now: float) -> bool:
+        stamped = None
+        if policy.stamp is not None:
+            try:
+                stamped = as_timestamp(policy.stamp(value))
+            except Exception:
+                stamped = None
+        if stamped is None:
+            self._seen.add(marker)
+            stamped = self._first_seen.setdefault(marker, now)
+        return now - stamped > policy.ttl
+
+    # --- Прибирання ---
+
+    def compact(self, scope: str, owner_id: int, data: Dict[Any, Any], now: Optional[float] = None) -> Tuple[int, int]:
+        """Прибирає прострочене в data (на місці). Повертає (видалено записів, звільнено байтів)."""
+        now = self._clock() if now is None else now
+        removed = 0
+        reclaimed = 0
+        for key in list(data.keys()):
+            policy = self._policy_for(scope, key)
+            if policy is None:
+                continue
+            value = data[key]
+            if not policy.items or not isinstance(value, dict):
+                if self._expired(policy, (scope, owner_id, key), value, now):
+                    reclaimed += _size({key: value})
+                    del data[key]
+                    removed += 1
+                continue
+
+            expired = [
+                item_key for item_key, item in value.items()
+                if self._expired(policy, (scope, owner_id, key, item_key), item, now)
+            ]
+            if not expired:
+                continue
+            before = _size({key: value})
+            for item_key in expired:
+                del value[item_key]
+            removed += len(expired)
+            if value:
+                reclaimed += before - _size({key: value})
+            else:
+                del data[key]
+                reclaimed += before
+        return removed, reclaimed
+
+    async def run(self, application: Any) -> Dict[str, Any]:
+        started = time.perf_counter()
+        now = self._clock()
+        self._seen = set()
+        report = {"chats": 0, "users": 0, "stored_rows": 0, "removed": 0, "bytes": 0}
+        touched: Dict[str, Set[int]] = {"chat": set(), "user": set()}
+
+        for scope, mapping in (("chat", application.chat_data), ("user", application.user_data)):
+            for owner_id, data in list(mapping.items()):
+                if not data:
+                    continue
+                removed, reclaimed = self.compact(scope, owner_id, data, now)
+                if removed:
+                    touched[scope].add(owner_id)
+                    report["removed"] += removed
+                    report["bytes"] += reclaimed
+        report["chats"] = len(touched["chat"])
+        report["users"] = len(touched["user"])
+        if touched["chat"] or touched["user"]:
+            application.mark_data_for_update_persistence(chat_ids=touched["chat"], user_ids=touched["user"])
+
+        # Рядки, які persistence ще не підвантажувала в пам'ять
+        persistence = application.persistence
+        if hasattr(persistence, "compact_stored"):
+            for scope in ("chat", "user"):
+                rows, removed, reclaimed = await persistence.compact_stored(
+                    scope,
+                    lambda owner_id, data, scope=scope: self.compact(scope, owner_id, data, now),
+                    lambda keys, scope=scope: self.wants(scope, keys),
+                )
+                report["stored_rows"] += rows
+                report["removed"] += removed
+                report["bytes"] += reclaimed
+
+        # Мітки першого бачення тримаємо лише для того, що ще існує
+        self._first_seen = {marker: ts for marker, ts in self._first_seen.items() if marker in self._seen}
+        report["tracked"] = len(self._first_seen)
+        report["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        report["at"] = now
+        self.last_report = report
+        logger.info(
+            f"🧹 Стан: прибрано {report['removed']} записів у {report['chats']} чатах, "
+            f"{report['users']} користувачах і {report['stored_rows']} рядках БД, "
+            f"звільнено {report['bytes'] / 1024:.1f} КБ за {report['ms']} мс"
+        )
+        return report
+
+
+state_collector = StateCollector()
+
+
+async def state_gc_job(context: Any) -> None:
+    try:
+        await state_collector.run(context.application)
+    except Exception:
+        logger.exception("Помилка прибирання chat_data/user_data")
@@ -0,0 +1,234 @@
+# telegram_rate_limiter.py
+# -*- coding: utf-8 -*-
+"""
+Єдиний планувальник вихідних запитів до Telegram Bot API.
+
+Підключається через ApplicationBuilder().rate_limiter(...), тож через нього
+проходить кожен виклик context.bot / application.bot — розкидані по коду
+asyncio.sleep для анти-флуду більше не потрібні.
+
+- глобальне відро (~30 запитів/с на бота);
+- відро на чат для нових повідомлень: приватні ~1/с, групи ~20/хв
+  (редагування не обмежуються на рівні чату);
+- два пріоритети: інтерактивні відповіді (за замовчуванням) та масові
+  розсилки (`with bulk_priority(): ...`). Масові запити не беруть токени,
+  поки чекає інтерактивний, і лишають частину глобального відра в резерві;
+- RetryAfter від Telegram зупиняє всі відправки на вказаний час, після чого
+  запит повторюється.
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, Dict, Iterator, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from bot.services import request_context
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+_priority: ContextVar[str] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Запити, що додають повідомлення в чат, — на них діють ліміти чату. edit* не
+# додає нових повідомлень (ходи в іграх, навігація меню) і йде лише глобальним відром
+_CHAT_LIMITED_PREFIXES = ("send", "copy", "forward")
+_CHAT_LIMIT_EXEMPT = frozenset({"sendChatAction"})
+
+
+@contextmanager
+def bulk_priority() -> Iterator[None]:
+    """Усі виклики Bot API всередині блоку йдуть з низьким (масовим) пріоритетом."""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _seconds(retry_after: Any) -> float:
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def wait_for(self, need: float) -> float:
+        """Скільки чекати, доки в відрі буде `need` токенів (після refill)."""
+        return max(0.0, (need - self.tokens) / self.rate)
+
+
+class OutboundRateLimiter(BaseRateLimiter):
+    def __init__(
+        self,
+        global_per_sec: float = 30.0,
+        private_per_sec: float = 1.0,
+        private_burst: int = 3,
+        group_per_min: float = 20.0,
+        group_burst: int = 5,
+        bulk_reserve: float = 0.2,
+        max_retries: int = 3,
+        max_chats: int = 20000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._clock = clock
+        self.global_per_sec = global_per_sec
+        self.private_per_sec = private_per_sec
+        self.private_burst = private_burst
+        self.group_per_sec = group_per_min / 60.0
+        self.group_burst = group_burst
+        # Частка глобального відра, яку масові запити не чіпають
+        self.bulk_reserve = max(0.0, min(0.9, bulk_reserve)) * global_per_sec
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+
+        self._global = _Bucket(global_per_sec, global_per_sec, clock())
+        self._chats: Dict[Union[int, str], _Bucket] = {}
+        self._paused_until = 0.0
+        self._interactive_waiting = 0
+
+        self.requests = 0
+        self.retry_after_hits = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    # --- Відра ---
+
+    def _chat_bucket(self, chat_id: Union[int, str], now: float) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                self._prune(now)
+            try:
+                is_group = int(chat_id) < 0
+            except (TypeError, ValueError):
+                is_group = True  # @username каналу чи групи
+            if is_group:
+                bucket = _Bucket(self.group_per_sec, self.group_burst, now)
+            else:
+                bucket = _Bucket(self.private_per_sec, self.private_burst, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        # Повні відра нічим не відрізняються від нових
+        for chat_id in [c for c, b in self._chats.items() if b.refill(now) >= b.burst]:
+            del self._chats[chat_id]
+        if len(self._chats) >= self.max_chats:
+            self._chats.clear()
+
+    def _try_acquire(self, chat_id: Optional[Union[int, str]], priority: str, now: float) -> Tuple[float, bool]:
+        """Бере токени (глобальний і чату) або повертає (скільки чекати, чи впираємось у глобальний ліміт)."""
+        if now < self._paused_until:
+            return self._paused_until - now, True
+
+        self._global.refill(now)
+        need_global = 1.0
+        if priority == BULK:
+            if self._interactive_waiting:
+                return 0.05, True
+            need_global += self.bulk_reserve
+        global_wait = self._global.wait_for(need_global)
+
+        chat_bucket = None
+        chat_wait = 0.0
+        if chat_id is not None:
+            chat_bucket = self._chat_bucket(chat_id, now)
+            chat_bucket.refill(now)
+            chat_wait = chat_bucket.wait_for(1.0)
+
+        if global_wait > 0 or chat_wait > 0:
+            return max(global_wait, chat_wait), global_wait >= chat_wait
+        self._global.tokens -= 1.0
+        if chat_bucket is not None:
+            chat_bucket.tokens -= 1.0
+        return 0.0, False
+
+    async def _acquire(self, chat_id: Optional[Union[int, str]], priority: str) -> None:
+        started = None
+        # Масові запити поступаються лише тим інтерактивним, що чекають глобальний ліміт,
+        # а не ліміт свого чату
+        blocking = False
+        try:
+            while True:
+                wait, global_blocked = self._try_acquire(chat_id, priority, self._clock())
+                if wait <= 0:
+                    break
+                if started is None:
+                    started = self._clock()
+                if priority == INTERACTIVE and global_blocked != blocking:
+                    blocking = global_blocked
+                    self._interactive_waiting += 1 if blocking else -1
+                await asyncio.sleep(wait)
+        finally:
+            if blocking:
+                self._interactive_waiting -= 1
+        if started is not None:
+            self.delayed += 1
+            self.wait_total += self._clock() - started
+
+    # --- BaseRateLimiter ---
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Any:
+        priority = (rate_limit_args or {}).get("priority") or _priority.get()
+        chat_id = None
+        if endpoint.startswith(_CHAT_LIMITED_PREFIXES) and endpoint not in _CHAT_LIMIT_EXEMPT:
+            chat_id = data.get("chat_id")
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            self.requests += 1
+            request_context.note_api_call()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                pause = _seconds(e.retry_after)
+                self.retry_after_hits += 1
+                # Telegram вже сердиться — пауза для всіх відправників, не лише для цього
+                self._paused_until = max(self._paused_until, self._clock() + pause + 0.1)
+                logger.warning(
+                    f"RetryAfter {pause:.0f}s на {endpoint} (chat {chat_id}), "
+                    f"спроба {attempt + 1}/{self.max_retries + 1}"
+                )
+                if attempt == self.max_retries:
+                    raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "avg_wait_ms": int(self.wait_total * 1000 / self.delayed) if self.delayed else 0,
+            "retry_after": self.retry_after_hits,
+            "paused_sec": round(max(0.0, self._paused_until - self._clock()), 1),
+            "tracked_chats": len(self._chats),
+        }
@@ -0,0 +1,211 @@
+# text_router.py
+# -*- coding: utf-8 -*-
+"""
+Однопрохідний розбір тексту для всіх текстових тригерів.
+
+Раніше кожне текстове повідомлення в групі проходило крізь десяток окремих
+MessageHandler'ів: кожен нормалізував текст по-своєму й крутив власний цикл
+regex'ів (по одному на дію, на стікер, на заборонене слово). Тепер:
+
+- текст нормалізується один раз (NFC, без zero-width, NBSP -> пробіл,
+  єдиний апостроф, нижній регістр);
+- статичні тригери (дії, нагадування, ключові слова AI, пам'ять, реакції)
+  зібрані в один скомпільований автомат: один прохід finditer дає всі
+  маршрути разом з тим, яке саме слово спрацювало;
+- динамічні списки (заборонені слова чату, ключові слова стікерів) — окремі
+  KeywordAutomaton, скомпільовані один раз на версію списку;
+- результат розбору живе до кінця обробки оновлення, тож фільтри
+  ConversationHandler'ів і AI беруть його, а не парсять текст заново;
+- час CPU на розбір кожного повідомлення збирається в stats().
+"""
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from telegram.ext.filters import MessageFilter
+
+_ZERO_WIDTH_RE = re.compile(r"[\u200B-\u200D\uFEFF]")
+_APOSTROPHES_RE = re.compile(r"[’`‘ʼ]")
+
+
+def normalize_for_routing(text: str) -> str:
+    """Спільна нормалізація для всіх тригерів."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", text)
+    text = _ZERO_WIDTH_RE.sub("", text.replace("\u00A0", " "))
+    return _APOSTROPHES_RE.sub("'", text).lower()
+
+
+def _alternation(words: Iterable[str]) -> str:
+    # Довші слова першими, щоб «котику» не програвало «котик»
+    return "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+class KeywordAutomaton:
+    """Набір слів, що шукаються цілими словами за один прохід."""
+
+    def __init__(self, keywords: Iterable[str], whole_words: bool = True) -> None:
+        self.keywords = tuple(dict.fromkeys(normalize_for_routing(k).strip() for k in keywords if k and k.strip()))
+        if not self.keywords:
+            self._re = None
+            return
+        body = _alternation(self.keywords)
+        self._re = re.compile(rf"(?<!\w)(?:{body})(?!\w)" if whole_words else f"(?:{body})")
+
+    def first(self, normalized: str) -> Optional[str]:
+        if self._re is None:
+            return None
+        match = self._re.search(normalized)
+        return match.group(0) if match else None
+
+    def find_all(self, normalized: str) -> List[str]:
+        if self._re is None:
+            return []
+        return [m.group(0) for m in self._re.finditer(normalized)]
+
+
+@dataclass
+class RoutedText:
+    key: Tuple[Any, ...]
+    normalized: str
+    # маршрут -> слово/префікс, що спрацювали першими
+    routes: Dict[str, str] = field(default_factory=dict)
+    cpu_ns: int = 0
+
+    def has(self, route: str) -> bool:
+        return route in self.routes
+
+
+_current: ContextVar[Optional[RoutedText]] = ContextVar("routed_text", default=None)
+
+
+class TextRouter:
+    def __init__(self, cache_size: int = 256) -> None:
+        self._keywords: Dict[str, Set[str]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._re: Optional["re.Pattern[str]"] = None
+        self._literal_routes: Dict[str, List[str]] = {}
+        self._prefix_routes: Dict[str, List[str]] = {}
+        self._dynamic: "OrderedDict[Tuple[str, Tuple[str, ...]], KeywordAutomaton]" = OrderedDict()
+        self._dynamic_size = cache_size
+
+        self.messages = 0
+        self.cpu_ns_total = 0
+        self.cpu_ns_max = 0
+
+    # --- Реєстрація ---
+
+    def add_keywords(self, route: str, words: Iterable[str]) -> None:
+        """Маршрут спрацьовує, якщо будь-яке слово зустрічається цілим словом."""
+        self._keywords.setdefault(route, set()).update(normalize_for_routing(w) for w in words)
+        self._re = None
+
+    def add_prefixes(self, route: str, words: Iterable[str]) -> None:
+        """Маршрут спрацьовує, якщо текст починається з префікса (далі — пробіл або кінець)."""
+        self._prefixes.setdefault(route, set()).update(normalize_for_routing(w) for w in words)
+        self._re = None
+
+    def _compile(self) -> "re.Pattern[str]":
+        self._literal_routes = {}
+        for route, words in self._keywords.items():
+            for word in words:
+                self._literal_routes.setdefault(word, []).append(route)
+        self._prefix_routes = {}
+        for route, words in self._prefixes.items():
+            for word in words:
+                self._prefix_routes.setdefault(word, []).append(route)
+        branches = []
+        if self._prefix_routes:
+            # Префікс — порожній збіг-lookahead на початку, тож слово на тій самій позиції теж знайдеться
+            branches.append(rf"(?=\A\s*(?P<prefix>{_alternation(self._prefix_routes)})(?=\s|\Z))")
+        if self._literal_routes:
+            branches.append(rf"(?<!\w)(?P<word>{_alternation(self._literal_routes)})(?!\w)")
+        self._re = re.compile("|".join(branches) or r"(?!)")
+        return self._re
+
+    # --- Розбір ---
+
+    def route(self, message: Any) -> RoutedText:
+        """Розбирає текст повідомлення (один раз на оновлення)."""
+        key = (message.chat_id, message.message_id, message.edit_date)
+        current = _current.get()
+        if current is not None and current.key == key:
+            return current
+
+        started = time.perf_counter_ns()
+        normalized = normalize_for_routing(message.text or message.caption or "")
+        pattern = self._re or self._compile()
+        routes: Dict[str, str] = {}
+        for match in pattern.finditer(normalized):
+            prefix = match.group("prefix") if self._prefix_routes else None
+            if prefix:
+                literal = prefix
+                targets = self._prefix_routes.get(literal, ())
+            else:
+                literal = match.group("word")
+                targets = self._literal_routes.get(literal, ())
+            for route in targets:
+                routes.setdefault(route, literal)
+        routed = RoutedText(key=key, normalized=normalized, routes=routes)
+        self.charge(routed, time.perf_counter_ns() - started)
+        self.messages += 1
+        _current.set(routed)
+        return routed
+
+    def automaton(self, name: str, words: Iterable[str], whole_words: bool = True) -> KeywordAutomaton:
+        """Кешований автомат для динамічного списку (слова фільтру чату, стікери)."""
+        cache_key = (name, tuple(sorted(set(words))))
+        automaton = self._dynamic.get(cache_key)
+        if automaton is None:
+            automaton = KeywordAutomaton(cache_key[1], whole_words=whole_words)
+            self._dynamic[cache_key] = automaton
+            while len(self._dynamic) > self._dynamic_size:
+                self._dynamic.popitem(last=False)
+        else:
+            self._dynamic.move_to_end(cache_key)
+        return automaton
+
+    def match_dynamic(self, routed: RoutedText, automaton: KeywordAutomaton) -> Optional[str]:
+        started = time.perf_counter_ns()
+        hit = automaton.first(routed.normalized)
+        self.charge(routed, time.perf_counter_ns() - started)
+        return hit
+
+    def charge(self, routed: RoutedText, cpu_ns: int) -> None:
+        routed.cpu_ns += cpu_ns
+        self.cpu_ns_total += cpu_ns
+        self.cpu_ns_max = max(self.cpu_ns_max, routed.cpu_ns)
+
+    def filter(self, route: str) -> MessageFilter:
+        """PTB-фільтр «повідомлення має маршрут route» (для entry points ConversationHandler)."""
+        return _RouteFilter(self, route)
+
+    def stats(self) -> Dict[str, Any]:
+        avg_us = self.cpu_ns_total / self.messages / 1000 if self.messages else 0.0
+        return {
+            "messages": self.messages,
+            "avg_cpu_us": round(avg_us, 1),
+            "max_cpu_us": round(self.cpu_ns_max / 1000, 1),
+            "routes": len(self._keywords) + len(self._prefixes),
+            "dynamic_automata": len(self._dynamic),
+        }
+
+
+class _RouteFilter(MessageFilter):
+    def __init__(self, router: TextRouter, route: str) -> None:
+        super().__init__(name=f"TextRoute({route})")
+        self.router = router
+        self.route = route
+
+    def filter(self, message: Any) -> bool:
+        if not (message.text or message.caption):
+            return False
+        return self.router.route(message).has(self.route)
+
+
+text_router = TextRouter()
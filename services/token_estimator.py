@@ -0,0 +1,47 @@
+# token_estimator.py
+# -*- coding: utf-8 -*-
+"""
+Швидка оцінка кількості токенів без токенізатора.
+
+Коефіцієнти підібрані під BPE-токенізатор DeepSeek на українських і російських
+текстах: кирилиця ріжеться значно дрібніше за латиницю, тому ліміт у символах
+для історії систематично недооцінював реальний розмір промпту.
+"""
+import re
+from typing import Dict, Iterable
+
+# Токенів на символ для кожного класу
+_CYRILLIC_RATE = 0.42
+_LATIN_RATE = 0.26
+_DIGIT_RATE = 0.5
+_OTHER_RATE = 0.9  # пунктуація, емодзі, символи — майже завжди окремий токен
+
+# Службові токени на одне повідомлення чату (роль, розділювачі)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CYRILLIC_RE = re.compile(r"[\u0400-\u04FF\u0500-\u052F\u02BC\u2019]")
+_LATIN_RE = re.compile(r"[A-Za-z]")
+_DIGIT_RE = re.compile(r"[0-9]")
+_SPACE_RE = re.compile(r"\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Оцінює кількість токенів у тексті."""
+    if not text:
+        return 0
+    cyr = len(_CYRILLIC_RE.findall(text))
+    lat = len(_LATIN_RE.findall(text))
+    dig = len(_DIGIT_RE.findall(text))
+    spaces = len(_SPACE_RE.findall(text))
+    other = len(text) - cyr - lat - dig - spaces
+    total = cyr * _CYRILLIC_RATE + lat * _LATIN_RATE + dig * _DIGIT_RATE + other * _OTHER_RATE
+    return max(1, int(total + 0.5))
+
+
+def estimate_message_tokens(message: Dict[str, str]) -> int:
+    """Оцінка для одного повідомлення у форматі chat/completions."""
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def estimate_messages_tokens(messages: Iterable[Dict[str, str]]) -> int:
+    return sum(estimate_message_tokens(m) for m in messages)
@@ -0,0 +1,108 @@
+# update_processor.py
+# -*- coding: utf-8 -*-
+"""
+Паралельна обробка оновлень зі збереженням порядку в межах чату й користувача.
+
+Без concurrent_updates PTB обробляє оновлення строго по одному на весь бот:
+повільний хендлер (погода, перевірка прав, раунд мемчиків) гальмує всі чати.
+Цей процесор запускає оновлення різних чатів паралельно (не більше
+`max_concurrent_updates`), але оновлення з тим самим ключем виконуються
+в порядку надходження:
+
+- ключ чату — стан ігор та ConversationHandler'и прив'язані до чату;
+- ключ користувача — колбеки та розмови з per_chat=False (editprofile)
+  ідуть від одного користувача з різних чатів.
+
+Порядок тримається ланцюжком future: кожне оновлення чекає завершення
+попереднього з кожним зі своїх ключів. Ланцюжки будуються синхронно в момент
+надходження, тож порядок точний і взаємних блокувань немає. Слот
+паралельності береться лише після черги свого чату — гарячий чат не займає
+слоти, потрібні іншим чатам.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, List, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from bot.services import request_context
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 1024) -> None:
+        # Семафор базового класу (max_concurrent_updates) обмежує лише кількість прийнятих
+        # і чекаючих оновлень; справжній ліміт одночасного виконання — self._active
+        super().__init__(max(max_pending_updates, max_concurrent_updates, 2))
+        self._limit = max(1, max_concurrent_updates)
+        self._active = asyncio.Semaphore(self._limit)
+        self._tails: Dict[Hashable, "asyncio.Future[None]"] = {}
+        self._running = 0
+
+        self.processed = 0
+        self.waited_for_order = 0
+        self.max_running = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def _keys(update: Any) -> List[Tuple[str, int]]:
+        if not isinstance(update, Update):
+            return []
+        keys = []
+        if update.effective_chat:
+            keys.append(("chat", update.effective_chat.id))
+        if update.effective_user:
+            keys.append(("user", update.effective_user.id))
+        return keys
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        keys = self._keys(update)
+        done: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        previous = []
+        for key in keys:
+            prev = self._tails.get(key)
+            if prev is not None:
+                previous.append(prev)
+            self._tails[key] = done
+
+        started = False
+        try:
+            if previous:
+                self.waited_for_order += 1
+                # asyncio.wait, а не gather: скасування цього оновлення не має скасовувати чужі future
+                await asyncio.wait(previous)
+            async with self._active:
+                started = True
+                self._running += 1
+                self.max_running = max(self.max_running, self._running)
+                try:
+                    await coroutine
+                finally:
+                    # Контекст відкрив TypeHandler у group=-100 цього ж оновлення
+                    request_context.finish_request()
+                    self._running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                coroutine.close()
+            done.set_result(None)
+            for key in keys:
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self._limit,
+            "running": self._running,
+            "max_running": self.max_running,
+            "processed": self.processed,
+            "waited_for_order": self.waited_for_order,
+            "tracked_keys": len(self._tails),
+        }
@@ -0,0 +1,223 @@
+# user_directory.py
+# -*- coding: utf-8 -*-
+"""
+Локальний довідник користувачів: імена та згадки без get_chat.
+
+Монашка дня, свідоцтво про шлюб, дії з @username та рейтинги раніше робили
+get_chat на кожне ім'я — це зайвий запит до Bot API на інтерактивному шляху.
+Усе потрібне вже є в `user_data` (його оновлює кожне вхідне повідомлення),
+тож довідник віддає імена з LRU в пам'яті, а при промаху — з БД.
+
+Bot API викликається лише у фоні (з масовим пріоритетом лімітера), коли
+запис не підтверджувався довше за `stale_after` — наприклад, користувач давно
+не писав і міг змінити ім'я. Відповідь при цьому не чекає на запит.
+"""
+import asyncio
+import html
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from telegram import User
+from telegram.error import TelegramError
+
+import bot.core.database as database
+from bot.services.telegram_rate_limiter import bulk_priority
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAME = "котик"
+
+
+@dataclass
+class UserEntry:
+    """Ім'я користувача з довідника. Має `id` і `full_name`, як telegram.User."""
+    id: int
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    username: Optional[str] = None
+    confirmed_at: float = 0.0  # коли Telegram востаннє підтвердив ім'я (0 — лише з БД)
+
+    @property
+    def full_name(self) -> str:
+        if self.first_name and self.last_name:
+            return f"{self.first_name} {self.last_name}"
+        return self.first_name or (f"@{self.username}" if self.username else DEFAULT_NAME)
+
+    def mention_html(self, name: Optional[str] = None) -> str:
+        return f'<a href="tg://user?id={self.id}">{html.escape(name or self.full_name)}</a>'
+
+    def to_user(self) -> User:
+        return User(
+            id=self.id,
+            first_name=self.first_name or DEFAULT_NAME,
+            is_bot=False,
+            last_name=self.last_name,
+            username=self.username,
+        )
+
+
+class UserDirectory:
+    def __init__(
+        self,
+        max_entries: int = 20000,
+        stale_after: float = 86400.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.stale_after = stale_after
+        self._clock = clock
+        self._entries: "OrderedDict[int, UserEntry]" = OrderedDict()
+        self._by_username: Dict[str, int] = {}
+        # Коли востаннє питали API про користувача (і вдало, і ні) — щоб не повторювати
+        self._attempts: "OrderedDict[int, float]" = OrderedDict()
+        self._refreshing: Set[int] = set()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+        self.hits = 0
+        self.db_loads = 0
+        self.refreshes = 0
+
+    # --- Запис ---
+
+    def _put(self, entry: UserEntry) -> UserEntry:
+        old = self._entries.pop(entry.id, None)
+        if old is not None and old.username:
+            if self._by_username.get(old.username.lower()) == old.id:
+                del self._by_username[old.username.lower()]
+        self._entries[entry.id] = entry
+        if entry.username:
+            self._by_username[entry.username.lower()] = entry.id
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            if evicted.username and self._by_username.get(evicted.username.lower()) == evicted.id:
+                del self._by_username[evicted.username.lower()]
+        return entry
+
+    def observe(self, user: Any) -> None:
+        """Оновлює запис з вхідного оновлення (свіжі дані від Telegram, без запитів)."""
+        if user is None or getattr(user, "is_bot", False):
+            return
+        self._put(
+            UserEntry(
+                id=user.id,
+                first_name=user.first_name,
+                last_name=user.last_name,
+                username=user.username,
+                confirmed_at=self._clock(),
+            )
+        )
+
+    # --- Читання ---
+
+    @staticmethod
+    def _from_row(row: Dict[str, Any]) -> UserEntry:
+        return UserEntry(
+            id=row["user_id"],
+            first_name=row.get("first_name"),
+            last_name=row.get("last_name"),
+            username=row.get("username"),
+        )
+
+    async def get_many(self, user_ids: Iterable[int], bot: Any = None) -> Dict[int, UserEntry]:
+        """Записи для кількох користувачів; промахи добираються з БД одним запитом.
+        Якщо передано `bot`, застарілі й невідомі записи оновлюються у фоні."""
+        ids = list(dict.fromkeys(user_ids))
+        found: Dict[int, UserEntry] = {}
+        missing = []
+        for user_id in ids:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(user_id)
+                found[user_id] = entry
+            else:
+                missing.append(user_id)
+        if missing:
+            self.db_loads += 1
+            rows = await database.get_user_names(missing)
+            for user_id, row in rows.items():
+                found[user_id] = self._put(self._from_row(row))
+        if bot is not None:
+            for user_id in ids:
+                entry = found.get(user_id)
+                if entry is None or not entry.first_name or self._is_stale(entry):
+                    self.refresh_in_background(bot, user_id)
+        return found
+
+    async def get(self, user_id: int, bot: Any = None) -> Optional[UserEntry]:
+        return (await self.get_many([user_id], bot=bot)).get(user_id)
+
+    async def resolve(self, user_id: int, bot: Any = None) -> UserEntry:
+        """Як get, але для невідомого користувача повертає запис-заглушку з DEFAULT_NAME."""
+        return await self.get(user_id, bot=bot) or UserEntry(id=user_id)
+
+    async def mention_html(self, user_id: int, bot: Any = None, name: Optional[str] = None) -> str:
+        return (await self.resolve(user_id, bot=bot)).mention_html(name)
+
+    async def find_by_username(self, username: str) -> Optional[UserEntry]:
+        """Користувач за @username (регістр не важливий) — з пам'яті або з БД, без API."""
+        username = (username or "").lstrip("@").strip()
+        if not username:
+            return None
+        user_id = self._by_username.get(username.lower())
+        if user_id is not None and user_id in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return self._entries[user_id]
+        self.db_loads += 1
+        row = await database.get_user_by_username(username)
+        if not row:
+            return None
+        return self._put(self._from_row(row))
+
+    # --- Фонове оновлення ---
+
+    def _is_stale(self, entry: UserEntry) -> bool:
+        return entry.confirmed_at == 0.0 or self._clock() - entry.confirmed_at > self.stale_after
+
+    def refresh_in_background(self, bot: Any, user_id: int) -> None:
+        """Планує get_chat для користувача, якщо його не питали останні `stale_after` секунд."""
+        if user_id in self._refreshing:
+            return
+        attempted = self._attempts.get(user_id)
+        if attempted is not None and self._clock() - attempted < self.stale_after:
+            return
+        self._refreshing.add(user_id)
+        task = asyncio.get_running_loop().create_task(self._refresh(bot, user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, bot: Any, user_id: int) -> None:
+        try:
+            self._attempts[user_id] = self._clock()
+            self._attempts.move_to_end(user_id)
+            while len(self._attempts) > self.max_entries:
+                self._attempts.popitem(last=False)
+            self.refreshes += 1
+            with bulk_priority():
+                chat = await bot.get_chat(user_id)
+            if chat.type != "private":
+                return
+            self.observe(chat)
+            await database.ensure_user_data(user_id, chat.username, chat.first_name, chat.last_name)
+        except TelegramError as e:
+            logger.debug(f"Не вдалося оновити ім'я користувача {user_id}: {e}")
+        except Exception as e:
+            logger.warning(f"Помилка фонового оновлення користувача {user_id}: {e}")
+        finally:
+            self._refreshing.discard(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "db_loads": self.db_loads,
+            "refreshes": self.refreshes,
+            "refreshing": len(self._refreshing),
+        }
+
+
+user_directory = UserDirectory()
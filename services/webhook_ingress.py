@@ -0,0 +1,268 @@
+# webhook_ingress.py
+# -*- coding: utf-8 -*-
+"""
+Прийом оновлень через webhook замість getUpdates.
+
+Невеликий HTTP-сервер на чистому asyncio (без tornado):
+- приймає лише POST на свій шлях і перевіряє заголовок
+  X-Telegram-Bot-Api-Secret-Token (порівняння за сталий час);
+- тримає не більше `max_connections` одночасних з'єднань (keep-alive);
+- кладе Update у ту саму update_queue, що й polling, тож граф хендлерів
+  не змінюється. Черга обмежена: якщо вона повна довше за `put_timeout`,
+  відповідаємо 503 — Telegram доставить оновлення повторно пізніше;
+- GET /healthz для reverse proxy (перевірка перед перемиканням трафіку).
+
+serve_webhook() повторює життєвий цикл run_polling (initialize, post_init,
+start ... stop, shutdown). Вебхук у Telegram при зупинці не видаляється:
+оновлення чекають на боці Telegram, доки не підніметься новий процес.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class _MalformedRequest(Exception):
+    """Запит, межі якого не визначити (кривий Content-Length): 400 і закриваємо з'єднання."""
+
+
+class WebhookIngress:
+    def __init__(
+        self,
+        update_queue: "asyncio.Queue[Any]",
+        bot: Any,
+        *,
+        secret_token: str,
+        host: str = "127.0.0.1",
+        port: int = 8443,
+        path: str = "/telegram",
+        max_connections: int = 40,
+        put_timeout: float = 5.0,
+        max_body_bytes: int = 1 << 20,
+        idle_timeout: float = 75.0,
+    ) -> None:
+        if not secret_token:
+            raise ValueError("Webhook потребує secret_token")
+        self.update_queue = update_queue
+        self.bot = bot
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = "/" + path.strip("/")
+        self.max_connections = max(1, max_connections)
+        self.put_timeout = put_timeout
+        self.max_body_bytes = max_body_bytes
+        self.idle_timeout = idle_timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = 0
+
+        self.accepted = 0
+        self.rejected_secret = 0
+        self.rejected_busy = 0
+        self.bad_requests = 0
+
+    # --- Життєвий цикл ---
+
+    async def start(self) -> "WebhookIngress":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"🌐 Webhook слухає на http://{self.host}:{self.port}{self.path}")
+        return self
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "rejected_secret": self.rejected_secret,
+            "rejected_busy": self.rejected_busy,
+            "bad_requests": self.bad_requests,
+            "connections": self._connections,
+            "queue_size": self.update_queue.qsize(),
+            "queue_max": self.update_queue.maxsize,
+        }
+
+    # --- HTTP ---
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], Optional[bytes]]]:
+        """Повертає (метод, шлях, заголовки, тіло) або None, якщо клієнт закрив з'єднання.
+        Тіло None означає, що воно завелике і не читалось."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise _MalformedRequest(headers.get("content-length"))
+        if length < 0:
+            raise _MalformedRequest(length)
+        if length > self.max_body_bytes:
+            return method, path, headers, None
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    @staticmethod
+    async def _respond(
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes = b"",
+        extra: Optional[Dict[str, str]] = None,
+        keep_alive: bool = True,
+    ) -> None:
+        headers = {
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        headers.update(extra or {})
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Status')}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self._connections >= self.max_connections:
+            self.rejected_busy += 1
+            try:
+                await self._respond(writer, 503, extra={"Retry-After": "1"}, keep_alive=False)
+            finally:
+                writer.close()
+            return
+        self._connections += 1
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                status, extra = await self._process(*request)
+                keep_alive = status in (200, 403, 404, 405) and request[2].get("connection", "").lower() != "close"
+                await self._respond(writer, status, extra=extra, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except _MalformedRequest as e:
+            self.bad_requests += 1
+            logger.warning(f"Webhook: некоректний Content-Length {e}, 400")
+            try:
+                await self._respond(writer, 400, keep_alive=False)
+            except ConnectionError:
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _process(
+        self, method: str, path: str, headers: Dict[str, str], body: Optional[bytes]
+    ) -> Tuple[int, Optional[Dict[str, str]]]:
+        if method == "GET" and path == "/healthz":
+            return 200, None
+        if path.split("?", 1)[0].rstrip("/") != self.path:
+            return 404, None
+        if method != "POST":
+            return 405, None
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret_token.encode()):
+            self.rejected_secret += 1
+            logger.warning("Webhook: запит з невірним secret token відхилено")
+            return 403, None
+        if body is None:
+            self.bad_requests += 1
+            return 413, None
+
+        try:
+            update = Update.de_json(json.loads(body), self.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            self.bad_requests += 1
+            logger.warning(f"Webhook: не вдалося розібрати оновлення: {e}")
+            return 400, None
+
+        try:
+            await asyncio.wait_for(self.update_queue.put(update), self.put_timeout)
+        except asyncio.TimeoutError:
+            # Черга переповнена: хай Telegram повторить пізніше, ніж ми роздуємо пам'ять
+            self.rejected_busy += 1
+            logger.warning(f"Webhook: черга оновлень повна ({self.update_queue.maxsize}), 503")
+            return 503, {"Retry-After": "1"}
+        self.accepted += 1
+        return 200, None
+
+
+async def serve_webhook(
+    application: Any,
+    ingress: WebhookIngress,
+    *,
+    webhook_url: Optional[str],
+    allowed_updates: Optional[Sequence[str]],
+    max_connections: int,
+) -> None:
+    """Запускає застосунок у режимі webhook і працює до SIGINT/SIGTERM."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await ingress.start()
+        await application.start()
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=ingress.secret_token,
+                max_connections=max_connections,
+                allowed_updates=allowed_updates,
+            )
+            logger.info(f"🌐 Webhook зареєстровано: {webhook_url}")
+        else:
+            logger.info("🌐 WEBHOOK_URL не задано — вважаю, що вебхук уже налаштовано (reverse proxy)")
+
+        await stop_event.wait()
+    finally:
+        logger.info("🛑 Зупиняю webhook...")
+        await ingress.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,274 @@
+# ai_load_harness.py
+# -*- coding: utf-8 -*-
+"""
+Навантажувальний стенд для AI-конвеєра бота.
+
+Ганяє повний шлях handle_message -> черга -> get_ai_response ->
+safe_send_message проти локального моку DeepSeek (tools/ai_mock_server.py)
+і фейкового Bot, що лише рахує виклики Bot API. Справжні мережа й Telegram
+не потрібні; БД — тимчасовий файл.
+
+Звіт: пропускна здатність, p50/p95/p99 затримки ходу (від handle_message
+до завершення відповіді), відкинуті чергою, зрізані breaker'ом, зайві
+спроби API та виклики Bot API за методами.
+
+Приклад:
+    python -m bot.tools.ai_load_harness --scenario degraded --chats 20 --messages 10
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+# Конфіг читається при імпорті модулів бота, тому env виставляємо до імпортів
+os.environ.setdefault("AI_SUMMARY_TRIGGER_TOKENS", "1000000")
+
+from bot.tools.ai_mock_server import MockDeepSeekServer  # noqa: E402
+
+SCENARIOS: Dict[str, Dict] = {
+    "healthy": dict(latency_median_ms=400, latency_sigma=0.4),
+    "slow": dict(latency_median_ms=2500, latency_sigma=0.6),
+    "degraded": dict(latency_median_ms=600, latency_sigma=0.5, error_rate_5xx=0.2, error_rate_429=0.1, retry_after_sec=1),
+    "rate_limited": dict(latency_median_ms=300, latency_sigma=0.3, error_rate_429=0.5, retry_after_sec=2),
+    "outage": dict(latency_median_ms=200, latency_sigma=0.2, error_rate_5xx=1.0, retry_after_sec=5),
+}
+
+PROMPTS = [
+    "котик, розкажи щось цікаве про зорі",
+    "котик, що порадиш почитати на вихідних?",
+    "котику, яка погода буде завтра у Львові?",
+    "кошеня, придумай вірш про каву",
+    "котик, поясни, що таке чорна діра",
+    "котик, чому небо синє?",
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * pct / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+class FakeBot:
+    """Мінімальний двійник telegram.Bot: рахує виклики, імітує затримку Bot API."""
+
+    def __init__(self, api_latency_ms: float = 30.0) -> None:
+        self.api_latency_ms = api_latency_ms
+        self.calls: Counter = Counter()
+        self.texts: Counter = Counter()
+        self._ids = itertools.count(1_000_000)
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] += 1
+        if self.api_latency_ms > 0:
+            await asyncio.sleep(self.api_latency_ms / 1000)
+
+    async def send_message(self, chat_id, text, reply_to_message_id=None, **kwargs):
+        await self._call("sendMessage")
+        self.texts[text] += 1
+        return SimpleNamespace(message_id=next(self._ids), chat_id=chat_id, text=text)
+
+    async def send_sticker(self, chat_id, sticker, reply_to_message_id=None, **kwargs):
+        await self._call("sendSticker")
+        return SimpleNamespace(message_id=next(self._ids), chat_id=chat_id)
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        await self._call("sendChatAction")
+        return True
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        await self._call("deleteMessage")
+        return True
+
+    async def set_message_reaction(self, *args, **kwargs):
+        await self._call("setMessageReaction")
+        return True
+
+    async def get_me(self):
+        await self._call("getMe")
+        return SimpleNamespace(id=1, username="harness_bot", first_name="Harness")
+
+
+def _make_update(bot: FakeBot, chat_id: int, user_id: int, message_id: int, text: str):
+    user = SimpleNamespace(id=user_id, first_name=f"User{user_id}", username=None, is_bot=False)
+    chat = SimpleNamespace(id=chat_id, type="group" if chat_id < 0 else "private")
+
+    async def reply_text(reply, **kwargs):
+        return await bot.send_message(chat_id=chat_id, text=reply, reply_to_message_id=message_id)
+
+    message = SimpleNamespace(
+        message_id=message_id,
+        chat_id=chat_id,
+        edit_date=None,
+        text=text,
+        caption=None,
+        chat=chat,
+        from_user=user,
+        reply_to_message=None,
+        reply_text=reply_text,
+    )
+    return SimpleNamespace(effective_user=user, effective_chat=chat, message=message)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    scenario = dict(SCENARIOS[args.scenario])
+    server = await MockDeepSeekServer(seed=args.seed, **scenario).start()
+    os.environ["DEEPSEEK_API_URL"] = server.url
+
+    import bot.core.database as db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="ai_harness_"), "memory.db")
+    await db.init_db()
+
+    import bot.handlers.ai_handlers as ai
+    from bot.handlers.text_router_handlers import register_text_routes
+    from bot.services.chat_actions import chat_actions
+    ai.DEEPSEEK_API_URL = server.url
+    # Ключові слова звернення до AI розбирає текстовий роутер
+    register_text_routes()
+
+    # Інструментуємо конвеєр обгортками, не змінюючи його логіки
+    turn_done: Dict[int, float] = {}
+    ai_calls = 0
+    enqueued = 0
+    original_get_ai_response = ai.get_ai_response
+    original_process_ai_response = ai.process_ai_response
+
+    async def counted_get_ai_response(*a, **kw):
+        nonlocal ai_calls
+        ai_calls += 1
+        return await original_get_ai_response(*a, **kw)
+
+    async def timed_process_ai_response(*a, **kw):
+        await original_process_ai_response(*a, **kw)
+        done = time.perf_counter()
+        participants = kw.get("participants")
+        ids = [p["message_id"] for p in participants] if participants else [kw.get("message_to_reply_id")]
+        for msg_id in ids:
+            turn_done[msg_id] = done
+
+    original_add_task = ai.ai_queue_manager.add_task
+
+    async def counted_add_task(*a, **kw):
+        nonlocal enqueued
+        enqueued += 1
+        return await original_add_task(*a, **kw)
+
+    ai.get_ai_response = counted_get_ai_response
+    ai.process_ai_response = timed_process_ai_response
+    ai.ai_queue_manager.add_task = counted_add_task
+
+    fake_bot = FakeBot(api_latency_ms=args.bot_latency_ms)
+    application = SimpleNamespace(
+        bot=fake_bot,
+        bot_data={"bot_id": 1, "bot_username": "harness_bot"},
+        job_queue=None,
+    )
+    chat_data: Dict[int, dict] = {}
+    rng = random.Random(args.seed)
+    started: Dict[int, float] = {}
+    msg_ids = itertools.count(1)
+    dropped_before = ai.ai_queue_manager.dropped_total
+
+    async def chat_client(chat_id: int) -> None:
+        users = [chat_id * 1000 + n for n in range(1, args.users_per_chat + 1)]
+        for _ in range(args.messages):
+            msg_id = next(msg_ids)
+            update = _make_update(fake_bot, chat_id, rng.choice(users), msg_id, rng.choice(PROMPTS))
+            context = SimpleNamespace(
+                bot=fake_bot,
+                application=application,
+                chat_data=chat_data.setdefault(chat_id, {}),
+                user_data={},
+            )
+            started[msg_id] = time.perf_counter()
+            await ai.handle_message(update, context)
+            await asyncio.sleep(rng.expovariate(1 / args.think_sec) if args.think_sec > 0 else 0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(chat_client(-(100 + i)) for i in range(args.chats)))
+
+    # Кожен запит тримає chat action від постановки в чергу до завершення
+    deadline = time.monotonic() + args.drain_timeout
+    while chat_actions.active() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - t0
+
+    await server.stop()
+    ai.get_ai_response = original_get_ai_response
+    ai.process_ai_response = original_process_ai_response
+    del ai.ai_queue_manager.add_task
+
+    latencies = [turn_done[m] - started[m] for m in turn_done if m in started]
+    server_stats = server.stats()
+    return {
+        "scenario": args.scenario,
+        "sent": len(started),
+        "completed_turns": len(turn_done),
+        "elapsed_sec": elapsed,
+        "throughput_rps": len(turn_done) / elapsed if elapsed else 0.0,
+        "p50_sec": _percentile(latencies, 50),
+        "p95_sec": _percentile(latencies, 95),
+        "p99_sec": _percentile(latencies, 99),
+        "mean_sec": statistics.fmean(latencies) if latencies else 0.0,
+        "enqueued": enqueued,
+        "filtered_before_queue": len(started) - enqueued - fake_bot.texts[ai.AI_OVERLOADED_REPLY],
+        "response_cache": ai.response_cache.stats(),
+        "fast_reply_hits": ai.fast_replies.hits,
+        "queue_dropped": ai.ai_queue_manager.dropped_total - dropped_before,
+        "shed_by_breaker": fake_bot.texts[ai.AI_OVERLOADED_REPLY],
+        "ai_calls": ai_calls,
+        "api_requests": server_stats["requests"],
+        "extra_api_attempts": max(0, server_stats["requests"] - ai_calls),
+        "api_by_status": server_stats["by_status"],
+        "api_max_in_flight": server_stats["max_in_flight"],
+        "breaker": ai.ai_breaker.snapshot(),
+        "bot_api_calls": dict(fake_bot.calls),
+        "unfinished": chat_actions.active(),
+    }
+
+
+def _print_report(report: Dict) -> None:
+    print(f"=== AI load harness: {report['scenario']} ===")
+    print(f"повідомлень: {report['sent']}, завершених ходів: {report['completed_turns']}, "
+          f"за {report['elapsed_sec']:.1f} с ({report['throughput_rps']:.2f} ходів/с)")
+    print(f"затримка ходу: p50={report['p50_sec']:.2f} с, p95={report['p95_sec']:.2f} с, "
+          f"p99={report['p99_sec']:.2f} с, середня={report['mean_sec']:.2f} с")
+    print(f"у черзі: {report['enqueued']}, відповіли або відсіяли до черги (rate limit, швидкі відповіді, кеш): "
+          f"{report['filtered_before_queue']}")
+    print(f"кеш відповідей: {report['response_cache']}, швидких відповідей: {report['fast_reply_hits']}")
+    print(f"відкинуто чергою: {report['queue_dropped']}, зрізано breaker'ом: {report['shed_by_breaker']}")
+    print(f"виклики AI: {report['ai_calls']}, запитів до API: {report['api_requests']} "
+          f"(зайвих спроб: {report['extra_api_attempts']}), статуси: {report['api_by_status']}, "
+          f"макс. паралельно: {report['api_max_in_flight']}")
+    print(f"breaker: {report['breaker']}")
+    print(f"Bot API: {report['bot_api_calls']}")
+    if report["unfinished"]:
+        print(f"⚠️ не завершено за таймаут: {report['unfinished']} чатів")
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Навантажувальний стенд AI-конвеєра")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="healthy")
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--users-per-chat", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=10, help="повідомлень на чат")
+    parser.add_argument("--think-sec", type=float, default=0.5, help="середня пауза між повідомленнями в чаті")
+    parser.add_argument("--bot-latency-ms", type=float, default=30.0)
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    _print_report(asyncio.run(run(_parse_args())))
@@ -0,0 +1,274 @@
+# ai_mock_server.py
+# -*- coding: utf-8 -*-
+"""
+Локальний мок DeepSeek-сумісного ендпоінту /chat/completions.
+
+Без зовнішніх залежностей (чистий asyncio). Вміє:
+- затримку з логнормальним розподілом (медіана + sigma);
+- стрімінг (SSE) для запитів зі "stream": true;
+- ін'єкцію 429 та 5xx із заданою ймовірністю, Retry-After у відповідях 429/503;
+- поле usage у відповіді, як у справжнього API.
+
+Запуск окремо:
+    python -m bot.tools.ai_mock_server --port 8089 --error-5xx 0.1 --error-429 0.05
+і далі DEEPSEEK_API_URL=http://127.0.0.1:8089/chat/completions
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter
+from typing import Optional, Tuple, Dict, Any
+
+from bot.services.token_estimator import estimate_messages_tokens, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+
+class MockDeepSeekServer:
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_median_ms: float = 300.0,
+        latency_sigma: float = 0.5,
+        error_rate_5xx: float = 0.0,
+        error_rate_429: float = 0.0,
+        retry_after_sec: Optional[float] = None,
+        reply_text: str = "Мур. Я тут, слухаю уважно 😼",
+        stream_chunk_delay_ms: float = 20.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency_median_ms = latency_median_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate_5xx = error_rate_5xx
+        self.error_rate_429 = error_rate_429
+        self.retry_after_sec = retry_after_sec
+        self.reply_text = reply_text
+        self.stream_chunk_delay_ms = stream_chunk_delay_ms
+        self._rng = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        self.requests = 0
+        self.by_status: Counter = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    # --- Життєвий цикл ---
+
+    async def start(self) -> "MockDeepSeekServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Mock DeepSeek слухає на {self.url}")
+        return self
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/chat/completions"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "by_status": dict(self.by_status),
+            "max_in_flight": self.max_in_flight,
+        }
+
+    # --- HTTP ---
+
+    def _latency_sec(self) -> float:
+        if self.latency_median_ms <= 0:
+            return 0.0
+        mu = math.log(self.latency_median_ms / 1000)
+        return self._rng.lognormvariate(mu, self.latency_sigma) if self.latency_sigma > 0 else math.exp(mu)
+
+    def _pick_status(self) -> int:
+        roll = self._rng.random()
+        if roll < self.error_rate_429:
+            return 429
+        if roll < self.error_rate_429 + self.error_rate_5xx:
+            return self._rng.choice((500, 502, 503))
+        return 200
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    @staticmethod
+    def _head(status: int, headers: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Status')}"]
+        headers = {"Connection": "close", **headers}
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], extra: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Content-Length": str(len(body))}
+        headers.update(extra or {})
+        writer.write(self._head(status, headers) + body)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                await self._send_json(writer, 400, {"error": {"message": "bad request line"}})
+                return
+            method, path, _, body = request
+            if method != "POST" or not path.rstrip("/").endswith("/chat/completions"):
+                self.by_status[404] += 1
+                await self._send_json(writer, 404, {"error": {"message": "not found"}})
+                return
+
+            self.requests += 1
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                self.by_status[400] += 1
+                await self._send_json(writer, 400, {"error": {"message": "invalid json"}})
+                return
+
+            await asyncio.sleep(self._latency_sec())
+            status = self._pick_status()
+            self.by_status[status] += 1
+
+            if status != 200:
+                extra = {}
+                if self.retry_after_sec is not None and status in (429, 503):
+                    extra["Retry-After"] = f"{self.retry_after_sec:g}"
+                await self._send_json(writer, status, {"error": {"message": "injected failure"}}, extra)
+                return
+
+            prompt_tokens = estimate_messages_tokens(payload.get("messages") or [])
+            completion_tokens = estimate_tokens(self.reply_text)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            if payload.get("stream"):
+                await self._send_stream(writer, payload.get("model"), usage)
+            else:
+                await self._send_json(writer, 200, {
+                    "id": f"mock-{self.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model") or "deepseek-chat",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": self.reply_text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.warning(f"Mock DeepSeek: помилка обробки запиту: {e}")
+        finally:
+            self.in_flight -= 1
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _send_stream(self, writer: asyncio.StreamWriter, model: Optional[str], usage: Dict[str, int]) -> None:
+        writer.write(self._head(200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}))
+        words = self.reply_text.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": f"mock-{self.requests}",
+                "object": "chat.completion.chunk",
+                "model": model or "deepseek-chat",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else f" {word}"},
+                    "finish_reason": None,
+                }],
+            }
+            writer.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await writer.drain()
+            await asyncio.sleep(self.stream_chunk_delay_ms / 1000)
+        final = {
+            "id": f"mock-{self.requests}",
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+        writer.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await writer.drain()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Локальний мок DeepSeek /chat/completions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="медіана затримки")
+    parser.add_argument("--sigma", type=float, default=0.5, help="sigma логнормального розподілу")
+    parser.add_argument("--error-5xx", type=float, default=0.0)
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+async def _serve_forever(args: argparse.Namespace) -> None:
+    server = await MockDeepSeekServer(
+        host=args.host,
+        port=args.port,
+        latency_median_ms=args.latency_ms,
+        latency_sigma=args.sigma,
+        error_rate_5xx=args.error_5xx,
+        error_rate_429=args.error_429,
+        retry_after_sec=args.retry_after,
+        seed=args.seed,
+    ).start()
+    print(f"Mock DeepSeek: {server.url} (Ctrl+C для зупинки)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve_forever(_parse_args()))
+    except KeyboardInterrupt:
+        pass
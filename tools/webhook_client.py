@@ -0,0 +1,119 @@
+# webhook_client.py
+# -*- coding: utf-8 -*-
+"""
+Тестовий клієнт для webhook-режиму: надсилає записані оновлення на локальний
+сервер так, як це робить Telegram (POST JSON + X-Telegram-Bot-Api-Secret-Token).
+
+Оновлення читаються з JSON-масиву або JSONL (по одному Update на рядок).
+При --repeat > 1 update_id перенумеровуються, щоб не було дублікатів.
+
+Приклад (бот запущено з BOT_RUN_MODE=webhook, WEBHOOK_SECRET_TOKEN=s3cret):
+    python -m bot.tools.webhook_client --url http://127.0.0.1:8443/telegram \\
+        --secret s3cret --file bot/tools/recorded_updates.jsonl --repeat 50
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DEFAULT_FILE = Path(__file__).with_name("recorded_updates.jsonl")
+
+
+def load_updates(path: Path) -> List[Dict[str, Any]]:
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _expand(updates: List[Dict[str, Any]], repeat: int) -> Iterable[Dict[str, Any]]:
+    if repeat <= 1:
+        yield from updates
+        return
+    start = max((u.get("update_id", 0) for u in updates), default=0) + 1
+    ids = itertools.count(start)
+    for _ in range(repeat):
+        for update in updates:
+            yield {**update, "update_id": next(ids)}
+
+
+async def post_updates(
+    url: str,
+    secret: str,
+    updates: List[Dict[str, Any]],
+    *,
+    repeat: int = 1,
+    concurrency: int = 4,
+    timeout: float = 10.0,
+) -> Dict[str, Any]:
+    """Надсилає оновлення до `concurrency` з'єднань паралельно і повертає звіт."""
+    queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    for update in _expand(updates, repeat):
+        queue.put_nowait(update)
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.monotonic()
+            try:
+                response = await client.post(url, json=update, headers={SECRET_HEADER: secret})
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(max(1, concurrency))))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def _pct(p: float) -> int:
+        if not latencies:
+            return 0
+        return int(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000)
+
+    return {
+        "sent": len(latencies),
+        "elapsed_sec": round(elapsed, 2),
+        "per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "statuses": dict(statuses),
+        "p50_ms": int(statistics.median(latencies) * 1000) if latencies else 0,
+        "p95_ms": _pct(0.95),
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Клієнт для перевірки webhook-режиму")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--file", type=Path, default=DEFAULT_FILE)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    report = asyncio.run(
+        post_updates(
+            args.url,
+            args.secret,
+            load_updates(args.file),
+            repeat=args.repeat,
+            concurrency=args.concurrency,
+        )
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
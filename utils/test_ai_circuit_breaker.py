@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from bot.services.ai_circuit_breaker import CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(clock, **kw):
+    params = dict(window_sec=60, min_requests=4, error_rate=0.5, max_consecutive_429=3, open_sec=30, clock=clock)
+    params.update(kw)
+    return CircuitBreaker(**params)
+
+
+def test_trips_on_error_rate_and_half_opens():
+    clock = _Clock()
+    br = _breaker(clock)
+    br.record_success()
+    br.record_success()
+    br.record_failure(status=500)
+    assert br.state == CircuitBreaker.CLOSED
+    br.record_failure(status=502)
+    assert br.state == CircuitBreaker.OPEN
+    assert br.allow_request() is False
+
+    clock.now += 31
+    assert br.state == CircuitBreaker.HALF_OPEN
+    assert br.allow_request() is True   # пробний запит
+    assert br.allow_request() is False  # другий не пускаємо
+    br.record_success()
+    assert br.state == CircuitBreaker.CLOSED
+
+
+def test_consecutive_429_trip_and_failed_probe_reopens():
+    clock = _Clock()
+    br = _breaker(clock, min_requests=100)
+    for _ in range(3):
+        br.record_failure(status=429)
+    assert br.state == CircuitBreaker.OPEN
+
+    clock.now += 31
+    assert br.allow_request() is True
+    br.record_failure(status=503)
+    assert br.state == CircuitBreaker.OPEN
+    assert br.trips == 2
+
+
+def test_retry_after_is_global_and_extends_open_window():
+    clock = _Clock()
+    br = _breaker(clock, max_consecutive_429=1)
+    br.record_failure(status=429, retry_after=90)
+    assert br.retry_after_remaining() == 90
+    clock.now += 31
+    assert br.state == CircuitBreaker.OPEN  # Retry-After довший за open_sec
+    clock.now += 60
+    assert br.state == CircuitBreaker.HALF_OPEN
+    assert br.retry_after_remaining() == 0
+
+
+def test_lost_probe_expires():
+    clock = _Clock()
+    br = _breaker(clock, max_consecutive_429=1)
+    br.record_failure(status=429)
+    clock.now += 31
+    assert br.allow_request() is True
+    assert br.allow_request() is False
+    clock.now += 31
+    assert br.allow_request() is True
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+
+def test_harness_drives_messages_through_the_ai_queue(monkeypatch):
+    """Короткий прогін стенда: фейкові оновлення мають доходити до черги й відповіді."""
+    import bot.core.database as db
+    import bot.handlers.ai_handlers as ai
+    from bot.tools import ai_load_harness
+
+    # Стенд перемикає БД та URL DeepSeek на свої — повертаємо після тесту
+    monkeypatch.setattr(db, "DB_PATH", db.DB_PATH)
+    monkeypatch.setattr(ai, "DEEPSEEK_API_URL", ai.DEEPSEEK_API_URL)
+    monkeypatch.setenv("DEEPSEEK_API_URL", "")
+
+    args = ai_load_harness._parse_args(
+        ["--chats", "2", "--messages", "2", "--think-sec", "0", "--bot-latency-ms", "0", "--drain-timeout", "30"]
+    )
+    report = asyncio.run(ai_load_harness.run(args))
+
+    assert report["sent"] == 4
+    assert report["enqueued"] > 0
+    assert report["completed_turns"] == report["enqueued"]
+    assert report["ai_calls"] == report["api_requests"]
+    assert not report["unfinished"]
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+
+def _task(user_id, message_id, text, **extra):
+    data = {
+        'user_id': user_id,
+        'user_name': f"u{user_id}",
+        'user_input': text,
+        'application': None,
+        'mode': 'charismatic',
+        'message_to_reply_id': message_id,
+        'reply_context': None,
+        'cache_key': (text, 'charismatic', 'default'),
+    }
+    data.update(extra)
+    return data
+
+
+class _RecordingActions:
+    def __init__(self):
+        self.acquired = 0
+        self.released = 0
+
+    def acquire(self, bot, chat_id, action="typing"):
+        self.acquired += 1
+
+    def release(self, chat_id, action="typing"):
+        self.released += 1
+
+
+def _patch_worker(monkeypatch, ai, calls, window_ms=0):
+    monkeypatch.setattr(ai, "AI_COALESCE_WINDOW_MS", window_ms)
+    monkeypatch.setattr(ai, "chat_actions", _RecordingActions())
+
+    async def fake_process(**kwargs):
+        calls.append(kwargs)
+
+    monkeypatch.setattr(ai, "process_ai_response", fake_process)
+
+
+def test_merge_keeps_authors_and_answers_the_last_message():
+    from bot.handlers.ai_handlers import _merge_burst
+
+    merged = _merge_burst([
+        _task(1, 10, "привіт", reply_context="контекст"),
+        _task(2, 11, "як справи"),
+        _task(1, 12, "ау"),
+    ])
+
+    assert merged['user_input'] == "u1: привіт\nu2: як справи\nu1: ау"
+    assert merged['message_to_reply_id'] == 12
+    assert merged['user_id'] == 1
+    assert merged['reply_context'] == "контекст"
+    assert [(p['user_id'], p['message_id'], p['text']) for p in merged['participants']] == [
+        (1, 10, "привіт"), (2, 11, "як справи"), (1, 12, "ау"),
+    ]
+    assert merged['cache_key'] is None
+
+
+def test_collect_burst_stops_at_the_window_of_the_first_message(monkeypatch):
+    import bot.handlers.ai_handlers as ai
+
+    monkeypatch.setattr(ai, "AI_COALESCE_WINDOW_MS", 200)
+    monkeypatch.setattr(ai, "AI_COALESCE_MAX_BATCH", 5)
+
+    async def scenario():
+        manager = ai.AIChatQueueManager()
+        queue = asyncio.Queue()
+
+        # Перше повідомлення чекало довше за вікно — нічого не добираємо
+        late = [_task(1, 1, "давнє", enqueued_at=time.monotonic() - 1)]
+        queue.put_nowait(_task(2, 2, "свіже"))
+        await manager._collect_burst(queue, late)
+
+        fresh = [_task(1, 3, "перше", enqueued_at=time.monotonic())]
+        await manager._collect_burst(queue, fresh)
+        return late, fresh, queue.qsize()
+
+    late, fresh, left = asyncio.run(scenario())
+    assert [t['message_to_reply_id'] for t in late] == [1]
+    assert [t['message_to_reply_id'] for t in fresh] == [3, 2]
+    assert left == 0
+
+
+def test_worker_coalesces_a_burst_into_one_request(monkeypatch):
+    import bot.handlers.ai_handlers as ai
+
+    calls = []
+    _patch_worker(monkeypatch, ai, calls, window_ms=150)
+
+    async def scenario():
+        manager = ai.AIChatQueueManager(idle_timeout=0.05)
+        manager.enqueue(-1, None, _task(1, 10, "раз"))
+        manager.enqueue(-1, None, _task(2, 11, "два"))
+        await asyncio.sleep(0.05)
+        manager.enqueue(-1, None, _task(3, 12, "три"))
+        await asyncio.sleep(0.3)
+        # Поза вікном — окремий запит зі своїм ключем кешу
+        manager.enqueue(-1, None, _task(4, 13, "пізніше"))
+        await asyncio.sleep(0.4)
+        return ai.chat_actions
+
+    actions = asyncio.run(scenario())
+    assert len(calls) == 2
+    burst, single = calls
+    assert burst['message_to_reply_id'] == 12
+    assert [p['user_id'] for p in burst['participants']] == [1, 2, 3]
+    assert burst['cache_key'] is None
+    assert single['message_to_reply_id'] == 13
+    assert single['participants'] is None
+    assert single['cache_key'] == ("пізніше", 'charismatic', 'default')
+    assert actions.acquired == actions.released == 4
+
+
+def test_overflow_drops_the_oldest_and_clear_releases_the_indicator(monkeypatch):
+    import bot.handlers.ai_handlers as ai
+
+    calls = []
+    _patch_worker(monkeypatch, ai, calls)
+
+    async def scenario():
+        manager = ai.AIChatQueueManager(maxsize=2, idle_timeout=5)
+        # Синхронно, в одному кроці циклу — воркер ще не встиг нічого взяти
+        for message_id in (1, 2, 3):
+            manager.enqueue(-1, None, _task(1, message_id, f"№{message_id}"))
+        waiting = [t['message_to_reply_id'] for t in manager.chats[-1].queue._queue]
+        after_drop = (ai.chat_actions.acquired, ai.chat_actions.released)
+        gauges = manager.gauges()
+
+        removed = manager.clear(-1)
+        again = manager.clear(-1)
+        await asyncio.sleep(0.05)
+        manager.chats[-1].worker.cancel()
+        await asyncio.sleep(0)
+        return waiting, after_drop, gauges, removed, again
+
+    waiting, after_drop, gauges, removed, again = asyncio.run(scenario())
+    assert waiting == [2, 3]
+    assert after_drop == (3, 1)
+    assert gauges["dropped"] == 1 and gauges["queue_depth"] == 2 and gauges["max_chat_depth"] == 2
+    assert (removed, again) == (2, 0)
+    assert ai.chat_actions.acquired == ai.chat_actions.released == 3
+    assert calls == []
+
+
+def test_idle_workers_are_reaped_and_restarted_on_demand(monkeypatch):
+    import bot.handlers.ai_handlers as ai
+
+    calls = []
+    _patch_worker(monkeypatch, ai, calls)
+
+    async def scenario():
+        manager = ai.AIChatQueueManager(idle_timeout=0.05)
+        manager.enqueue(-1, None, _task(1, 1, "перше"))
+        manager.enqueue(-2, None, _task(2, 2, "інший чат"))
+        await asyncio.sleep(0.2)
+        idle = manager.gauges()
+
+        manager.enqueue(-1, None, _task(1, 3, "після паузи"))
+        await asyncio.sleep(0.2)
+        return idle, manager.gauges()
+
+    idle, final = asyncio.run(scenario())
+    assert (idle["reaped"], idle["chats"], idle["workers"]) == (2, 0, 0)
+    assert [c['message_to_reply_id'] for c in calls] == [1, 2, 3]
+    assert (final["reaped"], final["chats"]) == (3, 0)
+
+
+def test_a_finished_worker_is_replaced_while_tasks_wait(monkeypatch):
+    import bot.handlers.ai_handlers as ai
+
+    calls = []
+    _patch_worker(monkeypatch, ai, calls)
+    started = []
+
+    async def slow_process(**kwargs):
+        started.append(kwargs['message_to_reply_id'])
+        if len(started) == 1:
+            await asyncio.sleep(10)
+        calls.append(kwargs['message_to_reply_id'])
+
+    monkeypatch.setattr(ai, "process_ai_response", slow_process)
+
+    async def scenario():
+        manager = ai.AIChatQueueManager(idle_timeout=0.05)
+        manager.enqueue(-1, None, _task(1, 1, "зависне"))
+        await asyncio.sleep(0.01)
+        manager.enqueue(-1, None, _task(1, 2, "чекає"))
+
+        # Воркер зупинився, а в черзі лишилась задача — стан чату не видаляється
+        state = manager.chats[-1]
+        first_worker = state.worker
+        first_worker.cancel()
+        await asyncio.sleep(0.01)
+        kept = manager.chats.get(-1) is state and first_worker.done()
+
+        manager.enqueue(-1, None, _task(1, 3, "новий воркер"))
+        restarted = state.worker is not first_worker
+        await asyncio.sleep(0.2)
+        return kept, restarted
+
+    kept, restarted = asyncio.run(scenario())
+    assert kept and restarted
+    assert calls == [2, 3]
+    assert ai.chat_actions.acquired == ai.chat_actions.released == 3
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from bot.services.ai_rate_limiter import AIRateLimiter, TokenBucketStore
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = _Clock()
+    store = TokenBucketStore(rate_per_min=60, burst=2, clock=clock)
+    assert store.take(1) and store.take(1)
+    assert not store.take(1)
+    clock.now = 1.0
+    assert store.take(1)
+    assert not store.take(1)
+
+
+def test_full_buckets_are_evicted_and_store_is_bounded():
+    clock = _Clock()
+    store = TokenBucketStore(rate_per_min=60, burst=2, max_keys=3, clock=clock)
+    for key in range(5):
+        store.take(key)
+    assert len(store) == 3
+
+    # Через burst/rate секунд відро повне — запис не потрібен
+    clock.now = 2.0
+    store.take("fresh")
+    assert len(store) == 1
+
+
+def test_chat_budget_limits_many_users_without_charging_them():
+    clock = _Clock()
+    limiter = AIRateLimiter(user_per_min=6, user_burst=2, chat_per_min=6, chat_burst=3, clock=clock)
+    results = [limiter.check(user_id, -100) for user_id in (1, 2, 3, 4)]
+    assert results == [None, None, None, AIRateLimiter.CHAT]
+    # Відмова по чату не списала токен у користувача 4
+    assert limiter.check(4, -200) is None
+    assert limiter.check(4, -200) is None
+    assert limiter.check(4, -200) == AIRateLimiter.USER
+    assert limiter.stats()["throttled_chat"] == 1
+
+
+def test_direct_replies_skip_user_budget_and_zero_rate_disables():
+    clock = _Clock()
+    limiter = AIRateLimiter(user_per_min=6, user_burst=1, chat_per_min=0, chat_burst=1, clock=clock)
+    assert limiter.check(1, -100) is None
+    assert limiter.check(1, -100) == AIRateLimiter.USER
+    assert limiter.check(1, -100, charge_user=False) is None
+    assert limiter.settings()["chat_per_min"] == 0
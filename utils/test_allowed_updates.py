@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from telegram import Update
+from telegram.ext import (
+    ApplicationBuilder,
+    CallbackQueryHandler,
+    ChatMemberHandler,
+    CommandHandler,
+    ConversationHandler,
+    MessageHandler,
+    TypeHandler,
+    filters,
+)
+
+from bot.services.allowed_updates import UpdateTrafficStats, compute_allowed_updates
+
+
+async def _noop(update, context):
+    return None
+
+
+def _app():
+    return ApplicationBuilder().token("1:test").build()
+
+
+def test_message_handlers_do_not_pull_in_edits_or_channel_posts():
+    app = _app()
+    app.add_handler(MessageHandler(filters.ALL, _noop), group=10)
+    app.add_handler(CommandHandler("start", _noop))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.UpdateType.EDITED, _noop))
+    app.add_handler(TypeHandler(Update, _noop), group=-1000)
+    assert compute_allowed_updates(app) == [Update.MESSAGE]
+
+
+def test_explicit_update_type_filters_and_conversation_states_count():
+    app = _app()
+    app.add_handler(MessageHandler(filters.TEXT & filters.UpdateType.EDITED_MESSAGE, _noop))
+    app.add_handler(
+        ConversationHandler(
+            entry_points=[CommandHandler("go", _noop)],
+            states={0: [CallbackQueryHandler(_noop)]},
+            fallbacks=[],
+        )
+    )
+    app.add_handler(ChatMemberHandler(_noop, ChatMemberHandler.MY_CHAT_MEMBER))
+    assert compute_allowed_updates(app) == [
+        Update.MESSAGE,
+        Update.EDITED_MESSAGE,
+        Update.CALLBACK_QUERY,
+        Update.MY_CHAT_MEMBER,
+    ]
+
+
+def test_traffic_stats_count_updates_outside_allowed_set():
+    stats = UpdateTrafficStats([Update.MESSAGE])
+    for payload in (
+        {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}}},
+        {"update_id": 2, "edited_message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}}},
+    ):
+        stats.observe(Update.de_json(payload, None))
+    summary = stats.summary()
+    assert summary["total"] == 2
+    assert summary["outside_by_type"] == {"edited_message": 1}
+    assert summary["outside_share"] == 0.5
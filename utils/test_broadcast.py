@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import Forbidden
+
+
+class _FakeBot:
+    def __init__(self, blocked=()):
+        self.blocked = set(blocked)
+        self.copied = []
+        self.edits = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.copied.append(chat_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return SimpleNamespace(chat_id=chat_id, message_id=1)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.edits.append(text)
+
+
+async def _seed(db, chat_ids, user_ids):
+    await db.init_db()
+    for chat_id in chat_ids:
+        await db.upsert_chat_info(chat_id, "group", f"chat {chat_id}")
+    for user_id in user_ids:
+        await db.ensure_user_data(user_id, None, f"user {user_id}", None)
+
+
+async def _wait(engine):
+    await asyncio.gather(*list(engine._tasks.values()))
+
+
+def test_broadcast_marks_dead_chats_and_skips_them_next_time(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.broadcast import BroadcastEngine
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+
+    async def scenario():
+        await _seed(db, [-100, -200], [1, 2, 3])
+        engine = BroadcastEngine(concurrency=4, page_size=2)
+        bot = _FakeBot(blocked={2})
+
+        job = await engine.start(bot, owner_id=1, from_chat_id=1, message_id=10)
+        await _wait(engine)
+        first = sorted(bot.copied)
+        counts = await db.get_broadcast_counts(job["job_id"])
+
+        bot.copied.clear()
+        job2 = await engine.start(bot, owner_id=1, from_chat_id=1, message_id=11)
+        await _wait(engine)
+        return first, counts, job2["total"], sorted(bot.copied), bot.edits[-1]
+
+    first, counts, second_total, second, last_edit = asyncio.run(scenario())
+    assert first == [-200, -100, 3]
+    assert counts == {"sent": 3, "dead": 1}
+    assert second_total == 3 and second == [-200, -100, 3]
+    assert "завершено" in last_edit
+
+
+def test_broadcast_resumes_from_cursor_without_resending(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.broadcast import BroadcastEngine
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+
+    async def scenario():
+        await _seed(db, [-100], [1, 2, 3])
+        job = await db.create_broadcast_job(owner_id=1, from_chat_id=1, message_id=10)
+        # Імітуємо рестарт після першої сторінки: -100 і 2 вже отримали повідомлення
+        await db.set_broadcast_target_status(job["job_id"], -100, "sent")
+        await db.set_broadcast_target_status(job["job_id"], 2, "sent")
+        await db.update_broadcast_job(job["job_id"], cursor=2)
+
+        engine = BroadcastEngine()
+        bot = _FakeBot()
+        resumed = await engine.resume(bot)
+        await _wait(engine)
+        jobs_left = await db.get_running_broadcast_jobs()
+        return resumed, bot.copied, jobs_left
+
+    resumed, copied, jobs_left = asyncio.run(scenario())
+    assert resumed == 1
+    assert copied == [3]
+    assert jobs_left == []
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from bot.services.chat_actions import ChatActionScheduler
+
+
+class _FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def send_chat_action(self, chat_id, action):
+        self.calls.append((chat_id, action))
+
+
+def test_concurrent_operations_share_one_indicator():
+    async def scenario():
+        bot = _FakeBot()
+        sched = ChatActionScheduler(interval=0.05)
+
+        async def op():
+            async with sched.action(bot, 1):
+                await asyncio.sleep(0.12)
+
+        await asyncio.gather(op(), op(), op())
+        await asyncio.sleep(0.1)
+        return bot.calls, sched.active()
+
+    calls, active = asyncio.run(scenario())
+    # Три паралельні операції ≈ 0.12 с з інтервалом 0.05 — це 3 виклики, а не 9
+    assert 2 <= len(calls) <= 4
+    assert set(calls) == {(1, "typing")}
+    assert active == 0
+
+
+def test_no_actions_after_release():
+    async def scenario():
+        bot = _FakeBot()
+        sched = ChatActionScheduler(interval=0.02)
+        sched.acquire(bot, 7)
+        await asyncio.sleep(0)
+        sched.release(7)
+        before = len(bot.calls)
+        await asyncio.sleep(0.1)
+        return before, len(bot.calls)
+
+    before, after = asyncio.run(scenario())
+    assert before == after == 1
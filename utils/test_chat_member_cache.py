@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import datetime
+
+from telegram import (
+    Chat,
+    ChatMemberAdministrator,
+    ChatMemberMember,
+    ChatMemberOwner,
+    ChatMemberUpdated,
+    User,
+)
+
+from bot.services.chat_member_cache import ChatMemberCache
+
+CHAT = -100
+
+
+def _user(user_id):
+    return User(id=user_id, first_name=f"u{user_id}", is_bot=False)
+
+
+def _admin(user_id, can_restrict=False):
+    return ChatMemberAdministrator(
+        user=_user(user_id),
+        can_be_edited=False,
+        is_anonymous=False,
+        can_manage_chat=True,
+        can_delete_messages=True,
+        can_manage_video_chats=False,
+        can_restrict_members=can_restrict,
+        can_promote_members=False,
+        can_change_info=False,
+        can_invite_users=True,
+        can_post_stories=False,
+        can_edit_stories=False,
+        can_delete_stories=False,
+    )
+
+
+class _FakeBot:
+    def __init__(self):
+        self.admins = [ChatMemberOwner(user=_user(1), is_anonymous=False), _admin(2)]
+        self.calls = []
+
+    async def get_chat_administrators(self, chat_id):
+        self.calls.append("getChatAdministrators")
+        await asyncio.sleep(0)
+        return tuple(self.admins)
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append("getChatMember")
+        return ChatMemberMember(user=_user(user_id))
+
+
+def test_admin_list_answers_every_member_with_one_call():
+    bot = _FakeBot()
+    cache = ChatMemberCache()
+
+    async def scenario():
+        checks = await asyncio.gather(*(cache.is_admin(bot, CHAT, uid) for uid in (1, 2, 3, 4, 5)))
+        again = [await cache.is_admin(bot, CHAT, uid) for uid in range(6, 50)]
+        ban = await cache.is_admin(bot, CHAT, 2, needs_ban_right=True)
+        return checks, again, ban
+
+    checks, again, ban = asyncio.run(scenario())
+    assert checks == [True, True, False, False, False]
+    assert not any(again)
+    assert ban is False
+    assert bot.calls == ["getChatAdministrators"]
+
+
+def test_chat_member_updates_promote_and_demote_without_api_calls():
+    bot = _FakeBot()
+    cache = ChatMemberCache()
+
+    def change(new_member, old_member):
+        return ChatMemberUpdated(
+            chat=Chat(id=CHAT, type=Chat.SUPERGROUP),
+            from_user=_user(1),
+            date=datetime.now(),
+            old_chat_member=old_member,
+            new_chat_member=new_member,
+        )
+
+    async def scenario():
+        assert not await cache.is_admin(bot, CHAT, 7)
+        cache.apply_update(change(_admin(7, can_restrict=True), ChatMemberMember(user=_user(7))))
+        promoted = await cache.is_admin(bot, CHAT, 7, needs_ban_right=True)
+        cache.apply_update(change(ChatMemberMember(user=_user(2)), _admin(2)))
+        demoted = await cache.is_admin(bot, CHAT, 2)
+        member = await cache.get_member(bot, CHAT, 7)
+        return promoted, demoted, member
+
+    promoted, demoted, member = asyncio.run(scenario())
+    assert promoted is True and demoted is False
+    assert member.status == "administrator"
+    assert bot.calls == ["getChatAdministrators"]
+
+
+def test_member_ttl_expires():
+    bot = _FakeBot()
+    now = [0.0]
+    cache = ChatMemberCache(ttl=10, clock=lambda: now[0])
+
+    async def scenario():
+        await cache.get_member(bot, CHAT, 5)
+        await cache.get_member(bot, CHAT, 5)
+        now[0] = 11
+        await cache.get_member(bot, CHAT, 5)
+
+    asyncio.run(scenario())
+    assert bot.calls == ["getChatMember", "getChatMember"]
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+
+def test_summary_replaces_only_the_covered_rows_and_reaches_the_prompt(tmp_path, monkeypatch):
+    import bot.core.database as db
+    import bot.handlers.ai_handlers as ai
+    from bot.services.conversation_summarizer import ConversationSummarizer
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    seen = []
+
+    async def summarize(chat_id, previous, messages):
+        seen.append((previous, [m["content"] for m in messages]))
+        # Користувач пише, поки модель підсумовує: ця репліка новіша за межу й має вижити
+        await db.save_message(1, -1, "user", "написано під час підсумку")
+        return f"підсумок №{len(seen)}"
+
+    prompts = []
+
+    def capture(messages):
+        prompts.append(messages)
+        return 0
+
+    async def closed_breaker():
+        return False
+
+    # Зупиняємося перед HTTP-запитом, забравши вже зібраний промпт
+    monkeypatch.setattr(ai, "estimate_messages_tokens", capture)
+    monkeypatch.setattr(ai, "_breaker_wait_and_allow", closed_breaker)
+
+    async def scenario():
+        await db.init_db()
+        for i in range(8):
+            await db.save_message(1, -1, "user" if i % 2 == 0 else "assistant", f"репліка {i}")
+        await db.save_message(2, -1, "user", "чужий діалог")
+
+        summarizer = ConversationSummarizer(
+            summarize=summarize, is_busy=lambda: False, trigger_tokens=1, keep_messages=3
+        )
+        first = await summarizer.summarize_if_needed(1, -1)
+        after_first = [m["content"] for m in await db.get_conversation_messages(1, -1)]
+        stored = await db.get_conversation_summary(1, -1)
+
+        second = await summarizer.summarize_if_needed(1, -1)
+        after_second = [m["content"] for m in await db.get_conversation_messages(1, -1)]
+        other = [m["content"] for m in await db.get_conversation_messages(2, -1)]
+
+        reply = await ai.get_ai_response(1, -1, "що ти пам'ятаєш?", None, "charismatic")
+        return first, second, after_first, after_second, stored, other, reply
+
+    first, second, after_first, after_second, stored, other, reply = asyncio.run(scenario())
+
+    assert first and second
+    assert seen[0] == (None, [f"репліка {i}" for i in range(5)])
+    assert after_first == ["репліка 5", "репліка 6", "репліка 7", "написано під час підсумку"]
+    assert stored["summary"] == "підсумок №1"
+
+    # Другий прохід отримує попередній підсумок і лишає останні keep_messages + нову репліку
+    assert seen[1] == ("підсумок №1", ["репліка 5"])
+    assert after_second == [
+        "репліка 6", "репліка 7", "написано під час підсумку", "написано під час підсумку",
+    ]
+    assert other == ["чужий діалог"]
+
+    assert reply == ai.AI_OVERLOADED_REPLY
+    history = [m["content"] for m in prompts[-1][1:-1]]
+    assert history[0].endswith("підсумок №2")
+    assert "репліка 7" in history and "репліка 5" not in history
+    assert prompts[-1][-1] == {"role": "user", "content": "що ти пам'ятаєш?"}
+
+
+def test_nothing_is_deleted_when_the_model_returns_no_summary(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.conversation_summarizer import ConversationSummarizer
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+
+    async def no_summary(chat_id, previous, messages):
+        return None
+
+    async def scenario():
+        await db.init_db()
+        for i in range(6):
+            await db.save_message(1, -1, "user", f"репліка {i}")
+        summarizer = ConversationSummarizer(
+            summarize=no_summary, is_busy=lambda: False, trigger_tokens=1, keep_messages=2
+        )
+        done = await summarizer.summarize_if_needed(1, -1)
+        left = await db.get_conversation_messages(1, -1)
+        return done, len(left), await db.get_conversation_summary(1, -1), summarizer.skipped
+
+    assert asyncio.run(scenario()) == (False, 6, None, 1)
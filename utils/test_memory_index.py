@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from bot.services.memory_index import MemoryIndex, tokenize
+
+
+def _index(rows, scope=("chat", 1)):
+    idx = MemoryIndex()
+    idx.begin_load(*scope)
+    assert idx.finish_load(*scope, rows) is True
+    return idx
+
+
+def test_tokenize_normalizes_case_apostrophes_and_endings():
+    assert tokenize("Пʼятниця") == tokenize("п'ятницю")
+    assert tokenize("котику, що робиш?") == ["робиш"]
+
+
+def test_selects_only_relevant_facts_within_k():
+    rows = [
+        {"key": "улюблений колір", "value": "синій"},
+        {"key": "собака", "value": "звуть Бакс, порода такса"},
+        {"key": "місто", "value": "живе у Львові"},
+        {"key": "робота", "value": "програміст у банку"},
+    ]
+    idx = _index(rows)
+    picked = idx.select([("chat", 1)], "як там твоя собака бакс?", k=2)
+    assert [m["key"] for m in picked[("chat", 1)]] == ["собака"]
+
+
+def test_incremental_updates_and_token_cap():
+    idx = _index([{"key": "кава", "value": "п'є каву без цукру"}])
+    idx.upsert("chat", 1, "чай", "любить зелений чай з м'ятою")
+    assert idx.select([("chat", 1)], "зелений чай")[("chat", 1)][0]["key"] == "чай"
+
+    idx.remove("chat", 1, "чай")
+    assert idx.select([("chat", 1)], "зелений чай") == {}
+
+    assert idx.select([("chat", 1)], "кава каву", token_cap=1) == {}
+
+
+def test_write_during_load_is_not_lost():
+    idx = MemoryIndex()
+    idx.begin_load("user", 5)
+    idx.upsert("user", 5, "ім'я", "Оля")  # запис між читанням з БД і побудовою
+    assert idx.finish_load("user", 5, []) is False
+    assert idx.is_loaded("user", 5) is False
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from telegram.error import BadRequest
+
+
+class _FakeBot:
+    def __init__(self, undeletable=()):
+        self.undeletable = set(undeletable)
+        self.batches = []
+        self.single = []
+        self.edits = []
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.batches.append((chat_id, sorted(message_ids)))
+        return True
+
+    async def delete_message(self, chat_id, message_id):
+        if message_id in self.undeletable:
+            raise BadRequest("Message can't be deleted")
+        self.single.append((chat_id, message_id))
+        return True
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        self.edits.append((chat_id, message_id, text))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 10_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_due_messages_are_batched_per_chat_and_cancel_works(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.message_deleter import MessageDeleter
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    clock = _Clock()
+
+    async def scenario():
+        await db.init_db()
+        deleter = MessageDeleter(tick=1.0, wheel_size=8, batch_size=2, clock=clock)
+        bot = _FakeBot(undeletable={50})
+        for message_id in (1, 2, 3):
+            deleter.schedule(-100, message_id, 5)
+        deleter.schedule(-200, 7, 5)
+        deleter.schedule(-200, 8, 20)  # більше за оберт колеса
+        deleter.schedule(-200, 9, 5)
+        deleter.cancel(-200, 9)
+        deleter.schedule(-300, 50, 5, fallback_text="Закрито")
+
+        early = await deleter.run_due(bot, now=clock.now + 4)
+        on_time = await deleter.run_due(bot, now=clock.now + 6)
+        single_on_time = sorted(bot.single)
+        stored_after_first = await db.get_scheduled_deletions()
+        late = await deleter.run_due(bot, now=clock.now + 21)
+        return bot, early, on_time, single_on_time, late, stored_after_first, await db.get_scheduled_deletions()
+
+    bot, early, on_time, single_on_time, late, stored_after_first, stored = asyncio.run(scenario())
+    assert early == 0
+    assert on_time == 5
+    assert bot.batches == [(-100, [1, 2])]
+    # 3 — залишок пачки з одного id, 7 — єдиний у своєму чаті
+    assert single_on_time == [(-200, 7), (-100, 3)]
+    assert bot.edits == [(-300, 50, "Закрито")]
+    assert [(r["chat_id"], r["message_id"]) for r in stored_after_first] == [(-200, 8)]
+    assert late == 1
+    assert (-200, 8) in bot.single
+    assert stored == []
+
+
+def test_schedule_survives_restart(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.message_deleter import MessageDeleter
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    clock = _Clock()
+
+    async def scenario():
+        await db.init_db()
+        before = MessageDeleter(clock=clock)
+        before.schedule(-100, 1, 60)
+        before.schedule(-100, 2, 60)
+        await before.flush()
+
+        clock.now += 3600  # бот лежав годину
+        after = MessageDeleter(clock=clock)
+        loaded = await after.load()
+        bot = _FakeBot()
+        done = await after.run_due(bot, now=clock.now + 1)
+        return loaded, done, bot.batches
+
+    loaded, done, batches = asyncio.run(scenario())
+    assert loaded == 2
+    assert done == 2
+    assert batches == [(-100, [1, 2])]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.services.outbound_replies import OutboundReplies, reply_key
+
+
+def test_same_key_is_sent_once():
+    async def scenario():
+        outbox = OutboundReplies()
+        calls = []
+
+        async def send():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return [42]
+
+        key = reply_key(1, 10, "text")
+        results = await asyncio.gather(*(outbox.send_once(key, send) for _ in range(3)))
+        results.append(await outbox.send_once(key, send))
+        return calls, results, outbox
+
+    calls, results, outbox = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [[42]] * 4
+    assert outbox.deduplicated == 3
+
+
+def test_failed_send_can_be_retried_and_keys_expire():
+    now = [0.0]
+
+    async def scenario():
+        outbox = OutboundReplies(ttl=10, clock=lambda: now[0])
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await outbox.send_once("k", flaky)
+        assert await outbox.send_once("k", flaky) == "ok"
+        assert outbox.was_sent("k")
+        now[0] = 11
+        assert not outbox.was_sent("k")
+        return calls
+
+    assert len(asyncio.run(scenario())) == 2
+
+
+class _CountingBot:
+    def __init__(self):
+        self.calls = []
+        self._next_id = 1000
+
+    async def _sent(self, method):
+        self.calls.append(method)
+        self._next_id += 1
+        return SimpleNamespace(message_id=self._next_id)
+
+    async def send_message(self, **kwargs):
+        return await self._sent("sendMessage")
+
+    async def send_sticker(self, **kwargs):
+        return await self._sent("sendSticker")
+
+
+def test_ai_turn_makes_exactly_one_call_per_reply(monkeypatch):
+    # Імпорт тут: модуль тягне telegram і налаштування бота
+    import bot.handlers.ai_handlers as ai
+
+    async def fake_ai_response(*args, **kwargs):
+        return "Мур, тримай відповідь [[sticker: кава]]"
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def no_settings(chat_id):
+        return {}
+
+    monkeypatch.setattr(ai, "get_ai_response", fake_ai_response)
+    monkeypatch.setattr(ai, "save_message", noop)
+    monkeypatch.setattr(ai, "get_chat_settings", no_settings)
+    monkeypatch.setattr(ai.conversation_summarizer, "schedule", lambda *a: None)
+    monkeypatch.setattr(ai, "outbound_replies", OutboundReplies())
+
+    bot = _CountingBot()
+    application = SimpleNamespace(
+        bot_data={"all_stickers_cache": [{"keyword": "кава", "file_unique_id": "sticker-1"}]},
+        job_queue=None,
+    )
+
+    async def turn():
+        await ai.process_ai_response(
+            user_id=1, chat_id=-100, user_input="котик, кави?", bot=bot,
+            application=application, mode="default", message_to_reply_id=7,
+        )
+
+    asyncio.run(turn())
+    assert sorted(bot.calls) == ["sendMessage", "sendSticker"]
+
+    # Повторна обробка того ж апдейту не відправляє нічого вдруге
+    asyncio.run(turn())
+    assert len(bot.calls) == 2
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import datetime, timezone
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def test_only_the_horizon_is_loaded_and_each_reminder_fires_once(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.reminder_engine import ReminderEngine
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    now = 1_800_000_000.0
+    delivered = []
+
+    async def deliver(rows):
+        delivered.extend((row["id"], row["missed_at"]) for row in rows)
+        await db.finish_reminders([row["id"] for row in rows], [], [])
+
+    async def scenario():
+        await db.init_db()
+        missed = await db.add_reminder(1, 1, "вчора", _iso(now - 600), None)
+        soon = await db.add_reminder(1, 1, "за хвилину", _iso(now + 60), None)
+        later = await db.add_reminder(1, 1, "за дві години", _iso(now + 7200), None)
+        snoozed = await db.add_reminder(1, 1, "відкладене", _iso(now + 3 * 3600), None)
+
+        engine = ReminderEngine(horizon=3600, refill_interval=300, deliver=deliver)
+        await engine.refill(now)
+        queued_at_start = engine.stats()["queued"]
+
+        # Нове в межах горизонту — одразу в купу, поза ним — чекає доповнення
+        fresh = await db.add_reminder(1, 1, "нове", _iso(now + 120), None)
+        in_heap = engine.schedule(fresh, _iso(now + 120))
+        outside = engine.schedule(snoozed, _iso(now + 3 * 3600))
+        await db.remove_reminder(soon)
+        engine.cancel(soon)
+
+        await engine.run_due(now + 150)
+        await engine.refill(now + 300)
+        await engine.run_due(now + 300)
+        await engine.refill(now + 7000)
+        await engine.run_due(now + 7210)
+        return missed, later, fresh, queued_at_start, in_heap, outside, engine.stats()
+
+    missed, later, fresh, queued_at_start, in_heap, outside, stats = asyncio.run(scenario())
+    assert queued_at_start == 2
+    assert in_heap is True and outside is False
+    assert delivered[0] == (missed, _iso(now - 600))
+    assert delivered[1:] == [(fresh, None), (later, None)]
+    assert stats["batches"] == 2
+
+
+def test_claimed_reminders_are_not_fired_twice_and_return_after_restart(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.reminder_engine import ReminderEngine
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    now = 1_800_000_000.0
+    batches = []
+
+    async def crashing_deliver(rows):
+        batches.append([row["id"] for row in rows])
+        raise RuntimeError("бот упав посеред доставки")
+
+    async def scenario():
+        await db.init_db()
+        ids = [await db.add_reminder(1, -100, f"№{i}", _iso(now - 5), None) for i in range(3)]
+        engine = ReminderEngine(batch_limit=2, deliver=crashing_deliver)
+        await engine.refill(now)
+        await engine.run_due(now)
+        # Повторне доповнення не бачить забраних (FIRING) рядків
+        await engine.refill(now + 1)
+        again = await engine.run_due(now + 1)
+        released = await db.release_claimed_reminders()
+        return ids, again, released
+
+    ids, again, released = asyncio.run(scenario())
+    assert batches == [ids[:2], ids[2:]]
+    assert again == 0
+    assert released == 3
+
+
+def test_due_batch_is_grouped_by_chat_and_written_back_once(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.handlers import reminder_handlers
+    from bot.services.reminder_engine import ReminderEngine
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    monkeypatch.setattr(reminder_handlers, "reminder_engine", ReminderEngine())
+    now = datetime.now(timezone.utc).timestamp()
+    sent = []
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            sent.append(chat_id)
+
+        async def get_chat_member(self, chat_id, user_id):
+            raise RuntimeError("немає мережі")
+
+    async def scenario():
+        await db.init_db()
+        await db.set_module_status(-200, "reminders_enabled", False)
+        private = await db.add_reminder(7, 7, "особисте", _iso(now - 5), None)
+        daily = await db.add_reminder(7, -100, "щодня", _iso(now - 5), None, recur_interval="daily")
+        group = await db.add_reminder(8, -100, "в групу", _iso(now - 5), None)
+        muted = await db.add_reminder(9, -200, "тиша", _iso(now - 5), None)
+
+        rows = await db.claim_due_reminders(_iso(now))
+        await reminder_handlers.deliver_due_reminders(FakeBot(), rows)
+        left = {r["id"]: r for r in [await db.get_reminder(i) for i in (private, daily, group, muted)] if r}
+        return daily, muted, left
+
+    daily, muted, left = asyncio.run(scenario())
+    assert sorted(sent) == [-100, -100, 7]
+    assert set(left) == {daily, muted}
+    assert left[daily]["status"] == "ACTIVE"
+    assert left[daily]["reminder_time"] == _iso(now - 5 + 86400)
+    assert left[muted]["status"] == "SUPPRESSED"
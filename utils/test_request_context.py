@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+
+def _update(update_id=1, chat_id=-100, user_id=7):
+    return SimpleNamespace(
+        update_id=update_id, effective_chat=SimpleNamespace(id=chat_id), effective_user=SimpleNamespace(id=user_id)
+    )
+
+
+def test_lookups_are_memoized_within_one_update_and_invalidated_by_writes(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services import request_context
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    stats = request_context.RequestStats()
+    monkeypatch.setattr(request_context, "request_stats", stats)
+
+    async def handle_update():
+        request = request_context.begin_request(_update())
+        first = await db.get_chat_settings(-100)
+        first["max_warns"] = 99  # копія, кеш не псується
+        second = await db.get_chat_settings(-100)
+        calls_after_reads = request.db_calls
+
+        await db.set_max_warns(-100, 5)
+        third = await db.get_chat_settings(-100)
+
+        await db.get_user_profile(7)
+        await db.get_user_profile(7)
+        await db.update_user_balance(7, 10)
+        profile = await db.get_user_profile(7)
+        request_context.finish_request()
+        return request, second, calls_after_reads, third, profile
+
+    async def outside_update():
+        before = await db.get_chat_settings(-100)
+        return before, request_context.current_request()
+
+    async def scenario():
+        await db.init_db()
+        inside = await asyncio.create_task(handle_update())
+        outside = await outside_update()
+        return inside, outside
+
+    (request, second, calls_after_reads, third, profile), (outside, leaked) = asyncio.run(scenario())
+    assert second["max_warns"] == 3
+    assert calls_after_reads == 1
+    assert third["max_warns"] == 5
+    assert profile["balance"] == 10
+    assert request.memo_hits == 2
+    assert stats.stats()["updates"] == 1
+    assert stats.stats()["max_db_calls"] == request.db_calls
+    assert outside["max_warns"] == 5
+    assert leaked is None
+
+
+def test_theme_snapshot_is_stable_for_the_update(monkeypatch):
+    from bot.services import request_context
+    from bot.utils import utils
+
+    monkeypatch.setattr(utils, "_current_theme_cache", {"name": "a"})
+
+    async def scenario():
+        request_context.begin_request(_update())
+        first = await utils.get_current_theme()
+        utils._current_theme_cache = {"name": "b"}  # фонове оновлення теми
+        second = await utils.get_current_theme()
+        request_context.finish_request()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+
+
+def test_tasks_outliving_the_update_stop_using_its_context():
+    import contextvars
+
+    from bot.services import request_context
+
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return len(loads)
+
+    async def scenario():
+        request = request_context.begin_request(_update())
+        step = asyncio.Event()
+        results = []
+
+        async def child():
+            # Успадкований контекст: поки оновлення триває — мемоізація працює
+            results.append(await request_context.memoized("chat_settings", -100, loader))
+            results.append(await request_context.memoized("chat_settings", -100, loader))
+            await step.wait()
+            results.append(await request_context.memoized("chat_settings", -100, loader))
+            request_context.note_db_call()
+
+        async def fresh_worker():
+            return request_context.current_request()
+
+        task = asyncio.create_task(child())
+        await asyncio.sleep(0)
+        worker_sees = await asyncio.create_task(fresh_worker(), context=contextvars.Context())
+        request_context.finish_request()
+        db_calls_at_finish = request.db_calls
+        step.set()
+        await task
+        return results, request, db_calls_at_finish, worker_sees
+
+    results, request, db_calls_at_finish, worker_sees = asyncio.run(scenario())
+    assert results == [1, 1, 2]
+    assert request.closed
+    assert request.db_calls == db_calls_at_finish
+    assert worker_sees is None
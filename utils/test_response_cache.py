@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from bot.services.response_cache import FastReplies, ResponseCache, normalize_prompt
+
+
+def test_normalize_strips_invocation_case_and_punctuation():
+    assert normalize_prompt("Котик, ПРИВІТ!!!") == "привіт"
+    assert normalize_prompt("@cat_bot котику що робиш?") == "що робиш"
+    assert normalize_prompt("Пʼятниця") == normalize_prompt("п'ятниця")
+
+
+def test_fast_replies_match_whole_prompt_only():
+    fast = FastReplies()
+    fast.load([
+        {"trigger": "привіт", "responses": "Привіт! 🐾\nМур! 😼"},
+        {"trigger": "hi", "responses": "Hi!"},
+    ])
+    assert fast.match(normalize_prompt("котик привіт")) in ("Привіт! 🐾", "Мур! 😼")
+    # Колишня підрядкова перевірка спрацьовувала на "hi" всередині слова
+    assert fast.match(normalize_prompt("котик, this is a test")) is None
+    assert fast.match(normalize_prompt("привіт, розкажи анекдот")) is None
+    assert fast.hits == 1
+
+
+def test_cache_key_depends_on_mode_theme_and_length():
+    cache = ResponseCache(max_words=3)
+    key = cache.key_for("що робиш", "default", "winter")
+    assert key == cache.key_for(normalize_prompt("Котик, що робиш?"), "default", "winter")
+    assert key != cache.key_for("що робиш", "default", "default")
+    assert key != cache.key_for("що робиш", "humor", "winter")
+    assert cache.key_for("розкажи дуже довгу історію", "default", "default") is None
+    assert cache.key_for("", "default", "default") is None
+
+
+def test_cache_ttl_lru_and_hit_rate():
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    a, b, c = (("a", "m", "t"), ("b", "m", "t"), ("c", "m", "t"))
+
+    assert cache.get(a) is None
+    cache.put(a, "A")
+    cache.put(b, "B")
+    assert cache.get(a) == "A"
+    cache.put(c, "C")  # витісняє b — найдавніше використаний
+    assert cache.get(b) is None
+    assert cache.get(c) == "C"
+
+    now[0] = 11
+    assert cache.get(a) is None
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 3, "hit_rate": 0.4}
+
+
+def test_fast_replies_seeded_once(tmp_path, monkeypatch):
+    import bot.core.database as db
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+
+    async def scenario():
+        await db.init_db()
+        triggers = {row["trigger"] for row in await db.get_fast_replies()}
+        assert "привіт" in triggers
+        assert await db.remove_fast_reply("привіт") is True
+        await db.init_db()
+        return {row["trigger"] for row in await db.get_fast_replies()}
+
+    assert "привіт" not in asyncio.run(scenario())
+
+
+def test_cached_reply_is_shared_but_not_used_for_replies(monkeypatch):
+    from types import SimpleNamespace
+
+    import bot.handlers.ai_handlers as ai
+
+    cache = ResponseCache()
+    fast = FastReplies()
+    fast.load([])
+    enqueued = []
+    replies = []
+
+    async def theme_name():
+        return "default"
+
+    async def ai_enabled(chat_id):
+        return True
+
+    async def add_task(chat_id, bot, task_data):
+        enqueued.append((task_data["user_id"], task_data["cache_key"]))
+
+    monkeypatch.setattr(ai, "response_cache", cache)
+    monkeypatch.setattr(ai, "fast_replies", fast)
+    monkeypatch.setattr(ai, "get_current_theme_name", theme_name)
+    monkeypatch.setattr(ai, "is_ai_enabled_for_chat", ai_enabled)
+    monkeypatch.setattr(ai.ai_rate_limiter, "configured", True)
+    monkeypatch.setattr(ai.ai_rate_limiter, "check", lambda *a, **kw: None)
+    monkeypatch.setattr(ai.ai_queue_manager, "add_task", add_task)
+
+    def update_from(user_id, reply_to=None):
+        async def reply_text(text, **kwargs):
+            replies.append((user_id, text))
+
+        user = SimpleNamespace(id=user_id, first_name=f"U{user_id}")
+        chat = SimpleNamespace(id=user_id, type="private")
+        message = SimpleNamespace(
+            message_id=1, chat_id=user_id, edit_date=None, text="котик що робиш", caption=None,
+            chat=chat, from_user=user, reply_to_message=reply_to, reply_text=reply_text,
+        )
+        update = SimpleNamespace(effective_user=user, effective_chat=chat, message=message)
+        context = SimpleNamespace(
+            chat_data={}, user_data={}, bot=None, application=SimpleNamespace(bot_data={"bot_id": 1})
+        )
+        return update, context
+
+    async def scenario():
+        key = cache.key_for(normalize_prompt("котик що робиш"), ai.DEFAULT_BOT_MODE, "default")
+        cache.put(key, "Сплю на клавіатурі 😺")
+        await ai.handle_message(*update_from(7))
+        await ai.handle_message(*update_from(8))
+        # Відповідь на чуже повідомлення має контекст — лише повний промпт
+        quoted = SimpleNamespace(text="що?", caption=None, from_user=SimpleNamespace(id=9))
+        await ai.handle_message(*update_from(9, reply_to=quoted))
+
+    asyncio.run(scenario())
+    assert replies == [(7, "Сплю на клавіатурі 😺"), (8, "Сплю на клавіатурі 😺")]
+    assert enqueued == [(9, None)]
+
+
+def test_cacheable_reply_is_built_without_personal_context(tmp_path, monkeypatch):
+    import bot.core.database as db
+    import bot.handlers.ai_handlers as ai
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    prompts = []
+
+    def capture(messages):
+        prompts.append(messages)
+        return 0
+
+    async def closed_breaker():
+        return False
+
+    async def memories(user_id, chat_id, query):
+        return [{"key": "улюблена їжа", "value": "риба"}], []
+
+    # Зупиняємося перед HTTP-запитом, забравши вже зібраний промпт
+    monkeypatch.setattr(ai, "estimate_messages_tokens", capture)
+    monkeypatch.setattr(ai, "_breaker_wait_and_allow", closed_breaker)
+    monkeypatch.setattr(ai, "_select_memories", memories)
+
+    async def scenario():
+        await db.init_db()
+        await db.ensure_user_data(7, "olya", "Оля", None)
+        await db.save_message(7, -1, "user", "мене звати Оля")
+        await db.save_conversation_summary(7, -1, "Оля любить котів", "0000")
+        key = ai.response_cache.key_for("що робиш", ai.DEFAULT_BOT_MODE, "default")
+        await ai.get_ai_response(7, -1, "котик що робиш", None, ai.DEFAULT_BOT_MODE, cache_key=key)
+        await ai.get_ai_response(7, -1, "котик що робиш", None, ai.DEFAULT_BOT_MODE)
+
+    asyncio.run(scenario())
+    shared, personal = ["\n".join(m["content"] for m in p) for p in prompts]
+    for personal_bit in ("Оля", "olya", "риба", "Оля любить котів", "мене звати"):
+        assert personal_bit not in shared
+        assert personal_bit in personal
+    assert len(prompts[0]) == 2
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import pickle
+
+
+def test_only_changed_rows_are_written_and_chats_load_lazily(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.sqlite_persistence import SQLitePersistence
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+
+    async def scenario():
+        first = SQLitePersistence(eager_chat_keys=("mandarin_duels",))
+        await first.get_bot_data()
+        await first.get_chat_data()
+        await asyncio.gather(
+            first.update_chat_data(-1, {"games": {"g1": {"turn": 1}}}),
+            first.update_chat_data(-2, {"mandarin_duels": {"d1": {"status": "active"}}}),
+            first.update_user_data(7, {"ai_mode": "academic"}),
+            first.update_bot_data({"recent_update_ids": [1, 2], "all_stickers_cache": ["s"]}),
+        )
+        written_first = first.rows_written
+
+        # Повторний прохід без змін нічого не пише; змінився лише один ключ bot_data
+        await asyncio.gather(
+            first.update_chat_data(-1, {"games": {"g1": {"turn": 1}}}),
+            first.update_bot_data({"recent_update_ids": [1, 2, 3], "all_stickers_cache": ["s"]}),
+        )
+        written_second = first.rows_written - written_first
+        await first.flush()
+
+        second = SQLitePersistence(eager_chat_keys=("mandarin_duels",))
+        eager = await second.get_chat_data()
+        users = await second.get_user_data()
+        bot_data = await second.get_bot_data()
+        chat_data = {"fresh": True}
+        await second.refresh_chat_data(-1, chat_data)
+        user_data = {}
+        await second.refresh_user_data(7, user_data)
+        return written_first, written_second, eager, users, bot_data, chat_data, user_data, second.stats()
+
+    written_first, written_second, eager, users, bot_data, chat_data, user_data, stats = asyncio.run(scenario())
+    assert written_first == 5
+    assert written_second == 1
+    assert list(eager) == [-2]
+    assert users == {}
+    assert bot_data == {"recent_update_ids": [1, 2, 3], "all_stickers_cache": ["s"]}
+    assert chat_data == {"fresh": True, "games": {"g1": {"turn": 1}}}
+    assert user_data == {"ai_mode": "academic"}
+    assert stats["lazy_loads"] == 2
+
+
+def test_update_of_unloaded_chat_keeps_stored_keys_and_drop_removes(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.sqlite_persistence import SQLitePersistence
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+
+    async def scenario():
+        first = SQLitePersistence()
+        await first.get_chat_data()
+        await first.update_chat_data(-1, {"games": {"g1": 1}})
+        await first.update_chat_data(-3, {"x": 1})
+
+        second = SQLitePersistence()
+        await second.get_chat_data()
+        await second.update_chat_data(-1, {"weather": "sunny"})
+        await second.drop_chat_data(-3)
+
+        third = SQLitePersistence()
+        await third.get_chat_data()
+        merged, dropped = {}, {}
+        await third.refresh_chat_data(-1, merged)
+        await third.refresh_chat_data(-3, dropped)
+        return merged, dropped
+
+    merged, dropped = asyncio.run(scenario())
+    assert merged == {"games": {"g1": 1}, "weather": "sunny"}
+    assert dropped == {}
+
+
+def test_pickle_file_is_migrated_once(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.sqlite_persistence import SQLitePersistence
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    legacy = tmp_path / "bot_data.pkl"
+    with open(legacy, "wb") as f:
+        pickle.dump(
+            {
+                "user_data": {7: {"ai_mode": "academic"}},
+                "chat_data": {-1: {"games": {}}},
+                "bot_data": {"recent_update_ids": [5]},
+                "conversations": {},
+                "callback_data": None,
+            },
+            f,
+        )
+
+    async def scenario():
+        persistence = SQLitePersistence(migrate_from=str(legacy))
+        bot_data = await persistence.get_bot_data()
+        user_data = {}
+        await persistence.refresh_user_data(7, user_data)
+        return bot_data, user_data
+
+    bot_data, user_data = asyncio.run(scenario())
+    assert bot_data == {"recent_update_ids": [5]}
+    assert user_data == {"ai_mode": "academic"}
+    assert not legacy.exists()
+    assert os.path.exists(f"{legacy}.migrated")
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import datetime, timedelta
+
+
+def test_compact_uses_stamps_prefixes_and_first_seen():
+    from bot.services.state_gc import StateCollector
+
+    clock = [1_000_000.0]
+    collector = StateCollector(clock=lambda: clock[0])
+    collector.register("chat", "games", 3600, items=True, stamp=lambda game: game.get("updated_at"))
+    collector.register("user", "casino_last_played_", 2, prefix=True, stamp=lambda played_at: played_at)
+    collector.register("chat", "_auto_close_payloads", 60, items=True)
+
+    now = clock[0]
+    chat = {
+        "games": {"old": {"updated_at": now - 7200}, "live": {"updated_at": now - 10}},
+        "_auto_close_payloads": {"menu": {"chat_id": 1}},
+        "unrelated": {"keep": True},
+    }
+    user = {
+        "casino_last_played_slots": datetime.fromtimestamp(now) - timedelta(seconds=30),
+        "casino_last_played_dice": datetime.fromtimestamp(now),
+    }
+
+    removed, reclaimed = collector.compact("chat", -1, chat)
+    assert removed == 1 and reclaimed > 0
+    assert list(chat["games"]) == ["live"]
+    assert "_auto_close_payloads" in chat  # без мітки — відлік від першого бачення
+
+    removed, _ = collector.compact("user", 7, user)
+    assert removed == 1
+    assert list(user) == ["casino_last_played_dice"]
+
+    clock[0] += 120
+    removed, _ = collector.compact("chat", -1, chat)
+    assert removed == 1
+    assert "_auto_close_payloads" not in chat
+    assert chat["unrelated"] == {"keep": True}
+
+
+def test_gc_prunes_rows_persistence_has_not_loaded(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.sqlite_persistence import SQLitePersistence
+    from bot.services.state_gc import StateCollector
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    collector = StateCollector()
+    collector.register("chat", "games", 3600, items=True, stamp=lambda game: game.get("updated_at"))
+
+    async def scenario():
+        first = SQLitePersistence()
+        await first.get_chat_data()
+        stale = datetime.now().timestamp() - 7200
+        await first.update_chat_data(-1, {"games": {"g1": {"updated_at": stale}}, "weather": "sunny"})
+        await first.update_chat_data(-2, {"weather": "rain"})
+        await first.flush()
+
+        second = SQLitePersistence()
+        await second.get_chat_data()
+        rows, removed, reclaimed = await second.compact_stored(
+            "chat",
+            lambda owner_id, data: collector.compact("chat", owner_id, data),
+            lambda keys: collector.wants("chat", keys),
+        )
+        await second.flush()
+
+        third = SQLitePersistence()
+        await third.get_chat_data()
+        data = {}
+        await third.refresh_chat_data(-1, data)
+        return rows, removed, reclaimed, data
+
+    rows, removed, reclaimed, data = asyncio.run(scenario())
+    assert (rows, removed) == (1, 1)
+    assert reclaimed > 0
+    assert data == {"weather": "sunny"}
+
+
+def test_auto_close_entries_age_from_their_last_update(monkeypatch):
+    from types import SimpleNamespace
+
+    from bot.services.message_deleter import message_deleter
+    from bot.services.state_gc import state_collector
+    from bot.utils import utils
+
+    clock = [1_000_000.0]
+    monkeypatch.setattr(utils, "time", SimpleNamespace(time=lambda: clock[0]))
+    context = SimpleNamespace(chat_data={})
+
+    utils.set_auto_close_payload(context, "menu", chat_id=-5, message_id=1)
+    utils.start_auto_close(context, "menu")
+    state_collector.compact("chat", -5, context.chat_data, now=clock[0])
+
+    # Той самий екран через 23 год знову відкрили — слот переписано на місці
+    clock[0] += 23 * 3600
+    utils.set_auto_close_payload(context, "menu", chat_id=-5, message_id=2)
+    utils.start_auto_close(context, "menu")
+    removed, _ = state_collector.compact("chat", -5, context.chat_data, now=clock[0] + 2 * 3600)
+    assert removed == 0
+    assert context.chat_data["_auto_close_scheduled"]["menu"]["message_id"] == 2
+
+    utils.cancel_auto_close(context, "menu")
+    assert message_deleter.cancel(-5, 2) is False
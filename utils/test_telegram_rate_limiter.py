@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+from bot.services.telegram_rate_limiter import OutboundRateLimiter, bulk_priority
+
+
+def _send(limiter, chat_id, log, label, endpoint="sendMessage"):
+    async def callback():
+        log.append(label)
+        return True
+
+    return limiter.process_request(callback, (), {}, endpoint, {"chat_id": chat_id}, None)
+
+
+def test_per_chat_bucket_spaces_messages_but_not_other_chats():
+    async def scenario():
+        limiter = OutboundRateLimiter(global_per_sec=100, private_per_sec=20, private_burst=1)
+        log = []
+        started = time.monotonic()
+        await asyncio.gather(*(_send(limiter, 1, log, n) for n in range(3)))
+        same_chat = time.monotonic() - started
+
+        started = time.monotonic()
+        await asyncio.gather(*(_send(limiter, 100 + n, log, n) for n in range(3)))
+        other_chats = time.monotonic() - started
+        return same_chat, other_chats
+
+    same_chat, other_chats = asyncio.run(scenario())
+    assert same_chat >= 0.09  # 3 повідомлення при 20/с і сплеску 1
+    assert other_chats < 0.05
+
+
+def test_interactive_overtakes_bulk_when_global_budget_is_low():
+    async def scenario():
+        limiter = OutboundRateLimiter(global_per_sec=10, bulk_reserve=0.5)
+        log = []
+
+        async def bulk(n):
+            with bulk_priority():
+                await _send(limiter, 1000 + n, log, f"bulk{n}")
+
+        # Масові беруть лише токени понад резерв (5 з 10)
+        await asyncio.gather(*(bulk(n) for n in range(5)))
+        late_bulk = asyncio.create_task(bulk(5))
+        await asyncio.sleep(0)
+        await _send(limiter, 1, log, "reply")
+        await late_bulk
+        return log
+
+    log = asyncio.run(scenario())
+    assert log.index("reply") < log.index("bulk5")
+
+
+def test_retry_after_pauses_and_retries():
+    async def scenario():
+        limiter = OutboundRateLimiter()
+        calls = []
+
+        async def flaky():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return "ok"
+
+        result = await limiter.process_request(flaky, (), {}, "sendMessage", {"chat_id": 5}, None)
+        return result, calls, limiter.stats()
+
+    result, calls, stats = asyncio.run(scenario())
+    assert result == "ok"
+    assert len(calls) == 2
+    assert stats["retry_after"] == 1
+
+
+def test_edits_do_not_spend_the_group_chat_budget():
+    async def scenario():
+        limiter = OutboundRateLimiter(global_per_sec=100, group_per_min=20, group_burst=1)
+        log = []
+        await _send(limiter, -100, log, "send")
+        started = time.monotonic()
+        await asyncio.gather(*(_send(limiter, -100, log, n, endpoint="editMessageText") for n in range(5)))
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 0.1
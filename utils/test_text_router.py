@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextvars
+from types import SimpleNamespace
+
+
+def _message(text, message_id=1, chat_id=-100):
+    return SimpleNamespace(chat_id=chat_id, message_id=message_id, edit_date=None, text=text, caption=None)
+
+
+def _router():
+    from bot.services.text_router import TextRouter
+
+    router = TextRouter()
+    router.add_prefixes("reminder", ("котик, нагадай", "котик нагадай"))
+    router.add_prefixes("action", ("мур", "обійняти"))
+    router.add_keywords("ai_keyword", ("котик", "котику", "кіт"))
+    router.add_keywords("remember", ("запам'ятай",))
+    return router
+
+
+def test_normalization_unifies_apostrophes_and_invisible_chars():
+    from bot.services.text_router import normalize_for_routing
+
+    assert normalize_for_routing("ЗАПАМ’ЯТАЙ це​") == "запам'ятай це"
+
+
+def test_prefix_and_keyword_routes_in_one_pass():
+    router = _router()
+
+    def scenario():
+        routed = {}
+        for n, text in enumerate(
+            ("Котик, нагадай завтра", "  мур @murka", "мурчу котику", "обійнятись", "Запамʼятай: я кіт"), 1
+        ):
+            routed[text] = contextvars.copy_context().run(router.route, _message(text, message_id=n)).routes
+        return routed
+
+    routed = scenario()
+    # Префікс не «з'їдає» слово на тій самій позиції
+    assert routed["Котик, нагадай завтра"] == {"reminder": "котик, нагадай", "ai_keyword": "котик"}
+    assert routed["  мур @murka"] == {"action": "мур"}
+    # «мурчу» — не дія, «котику» — довше слово виграє у «котик»
+    assert routed["мурчу котику"] == {"ai_keyword": "котику"}
+    assert routed["обійнятись"] == {}
+    assert routed["Запамʼятай: я кіт"] == {"remember": "запам'ятай", "ai_keyword": "кіт"}
+
+
+def test_route_is_parsed_once_per_update_and_filter_reuses_it():
+    router = _router()
+
+    async def scenario():
+        message = _message("котику, привіт")
+        first = router.route(message)
+        again = router.route(message)
+        matched = router.filter("ai_keyword").filter(message)
+        other = router.route(_message("мур", message_id=2))
+        return first, again, matched, other
+
+    first, again, matched, other = asyncio.run(scenario())
+    assert again is first
+    assert matched
+    assert other.routes == {"action": "мур"}
+    assert router.stats()["messages"] == 2
+
+
+def test_dynamic_automaton_is_cached_per_word_list():
+    router = _router()
+    words = ["Єресь", "бан слово"]
+    automaton = router.automaton("word_filter:-100", words)
+
+    assert router.automaton("word_filter:-100", list(reversed(words))) is automaton
+    assert router.automaton("word_filter:-100", words + ["нове"]) is not automaton
+
+    routed = contextvars.copy_context().run(router.route, _message("тут ЄРЕСЬ!"))
+    assert router.match_dynamic(routed, automaton) == "єресь"
+    routed = contextvars.copy_context().run(router.route, _message("безєресі", message_id=2))
+    assert router.match_dynamic(routed, automaton) is None
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from bot.services.token_estimator import (
+    MESSAGE_OVERHEAD_TOKENS,
+    estimate_messages_tokens,
+    estimate_tokens,
+)
+
+
+def test_cyrillic_costs_more_than_latin_per_char():
+    uk = "котик що робиш сьогодні"
+    en = "kitty what are you doing"
+    assert len(uk) == len(en) - 1
+    assert estimate_tokens(uk) > estimate_tokens(en)
+
+
+def test_empty_and_overhead():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("а") == 1
+    msgs = [{"role": "user", "content": ""}, {"role": "assistant", "content": ""}]
+    assert estimate_messages_tokens(msgs) == 2 * MESSAGE_OVERHEAD_TOKENS
+
+
+def test_apostrophe_counts_as_part_of_word():
+    # Апостроф усередині слова не рахується як окремий символ пунктуації
+    assert estimate_tokens("пʼять") < estimate_tokens("п!ять")
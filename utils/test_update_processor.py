@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from telegram import Update
+
+from bot.services.update_processor import OrderedUpdateProcessor
+
+
+def _update(update_id, chat_id, user_id):
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "group" if chat_id < 0 else "private", "title": "t"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+                "text": "hi",
+            },
+        },
+        None,
+    )
+
+
+def _run(processor, updates, delays):
+    log = []
+
+    async def handle(update):
+        log.append(("start", update.update_id))
+        await asyncio.sleep(delays.get(update.update_id, 0.01))
+        log.append(("end", update.update_id))
+
+    async def scenario():
+        await asyncio.gather(*(processor.process_update(u, handle(u)) for u in updates))
+
+    asyncio.run(scenario())
+    return log
+
+
+def test_same_chat_is_ordered_while_other_chats_run_concurrently():
+    processor = OrderedUpdateProcessor(max_concurrent_updates=4)
+    updates = [_update(1, -100, 1), _update(2, -100, 2), _update(3, -200, 3)]
+    log = _run(processor, updates, {1: 0.05})
+
+    # 2 з того ж чату стартує лише після завершення 1, а 3 з іншого чату — не чекає
+    assert log.index(("end", 1)) < log.index(("start", 2))
+    assert log.index(("start", 3)) < log.index(("end", 1))
+    assert processor.stats()["tracked_keys"] == 0
+
+
+def test_same_user_is_ordered_across_chats():
+    processor = OrderedUpdateProcessor(max_concurrent_updates=4)
+    updates = [_update(1, -100, 7), _update(2, -200, 7)]
+    log = _run(processor, updates, {1: 0.05})
+    assert log.index(("end", 1)) < log.index(("start", 2))
+
+
+def test_hot_chat_does_not_hold_concurrency_slots():
+    processor = OrderedUpdateProcessor(max_concurrent_updates=2)
+    hot = [_update(n, -100, n) for n in range(1, 6)]
+    other = _update(99, -200, 99)
+    log = _run(processor, hot + [other], {n: 0.03 for n in range(1, 6)})
+    # Поки гарячий чат виконує перше оновлення, інший чат отримує вільний слот
+    assert log.index(("start", 99)) < log.index(("end", 1))
+    assert processor.stats()["max_running"] <= 2
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+
+class _FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def get_chat(self, chat_id):
+        self.calls.append(chat_id)
+        return SimpleNamespace(
+            id=chat_id, type="private", first_name="Нове", last_name=None, username=f"new{chat_id}"
+        )
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_names_come_from_memory_and_db_without_api(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.user_directory import UserDirectory
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+
+    async def scenario():
+        await db.init_db()
+        await db.ensure_user_data(1, "murka", "Мурка", None)
+        directory = UserDirectory()
+        directory.observe(SimpleNamespace(id=2, is_bot=False, first_name="Барсик", last_name="Кіт", username=None))
+
+        found = await directory.get_many([1, 2, 3])
+        by_name = await directory.find_by_username("@MURKA")
+        mention = await directory.mention_html(3)
+        return found, by_name, mention, directory.stats()
+
+    found, by_name, mention, stats = asyncio.run(scenario())
+    assert found[1].full_name == "Мурка"
+    assert found[2].mention_html() == '<a href="tg://user?id=2">Барсик Кіт</a>'
+    assert 3 not in found
+    assert by_name.id == 1
+    assert "tg://user?id=3" in mention
+    assert stats["hits"] >= 2
+
+
+def test_stale_entries_refresh_in_background_once(tmp_path, monkeypatch):
+    import bot.core.database as db
+    from bot.services.user_directory import UserDirectory
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memory.db"))
+    clock = _Clock()
+
+    async def scenario():
+        await db.init_db()
+        await db.ensure_user_data(5, "old", "Старе", None)
+        directory = UserDirectory(stale_after=60, clock=clock)
+        bot = _FakeBot()
+        directory.observe(SimpleNamespace(id=6, is_bot=False, first_name="Свіже", last_name=None, username=None))
+
+        # Відповідь одразу зі старим ім'ям, оновлення — у фоні
+        first = await directory.get(5, bot=bot)
+        await directory.get(6, bot=bot)
+        await asyncio.gather(*directory._tasks)
+        second = await directory.get(5, bot=bot)
+        await asyncio.gather(*directory._tasks)
+        row = await db.get_user_names([5])
+        return first.first_name, second.first_name, bot.calls, row[5]["username"]
+
+    first, second, calls, stored = asyncio.run(scenario())
+    assert first == "Старе"
+    assert second == "Нове"
+    assert calls == [5]  # свіжий 6 не запитувався, 5 — лише один раз
+    assert stored == "new5"
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from telegram import Update
+
+from bot.services.webhook_ingress import WebhookIngress
+from bot.tools.webhook_client import DEFAULT_FILE, load_updates, post_updates
+
+
+def _serve(queue, scenario, **kwargs):
+    async def run():
+        ingress = await WebhookIngress(queue, None, secret_token="s3cret", port=0, **kwargs).start()
+        try:
+            url = f"http://127.0.0.1:{ingress.port}/telegram"
+            return await scenario(url), ingress.stats()
+        finally:
+            await ingress.stop()
+
+    return asyncio.run(run())
+
+
+def test_recorded_updates_reach_update_queue():
+    queue = asyncio.Queue(maxsize=100)
+    updates = load_updates(DEFAULT_FILE)
+
+    report, stats = _serve(queue, lambda url: post_updates(url, "s3cret", updates, repeat=3))
+    assert report["statuses"] == {200: 3 * len(updates)}
+    assert stats["accepted"] == 3 * len(updates)
+    queued = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert all(isinstance(u, Update) for u in queued)
+    assert len({u.update_id for u in queued}) == len(queued)
+
+
+def test_wrong_secret_is_rejected():
+    queue = asyncio.Queue()
+    updates = load_updates(DEFAULT_FILE)
+
+    report, stats = _serve(queue, lambda url: post_updates(url, "wrong", updates))
+    assert report["statuses"] == {403: len(updates)}
+    assert queue.empty() and stats["rejected_secret"] == len(updates)
+
+
+def test_full_queue_answers_503_for_redelivery():
+    queue = asyncio.Queue(maxsize=2)
+    updates = load_updates(DEFAULT_FILE)
+
+    report, stats = _serve(
+        queue, lambda url: post_updates(url, "s3cret", updates, concurrency=1), put_timeout=0.05
+    )
+    assert report["statuses"] == {200: 2, 503: len(updates) - 2}
+    assert stats["rejected_busy"] == len(updates) - 2
+
+
+def test_malformed_content_length_answers_400():
+    queue = asyncio.Queue()
+
+    async def scenario(url):
+        port = int(url.split(":")[2].split("/")[0])
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            b"POST /telegram HTTP/1.1\r\nX-Telegram-Bot-Api-Secret-Token: s3cret\r\n"
+            b"Content-Length: abc\r\n\r\n"
+        )
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    response, stats = _serve(queue, scenario)
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Connection: close" in response
+    assert queue.empty() and stats["bad_requests"] == 1
@@ -4,19 +4,44 @@
 import os
 import logging
 import html
-import asyncio
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import timedelta
 
 from telegram import User, Update
-from telegram.constants import ChatAction
 from telegram.ext import ContextTypes
 
+from bot.services import request_context
+from bot.services.state_gc import state_collector
+
 logger = logging.getLogger(__name__)
 
 # === Автозакриття інтерактивних меню ===
-_AUTO_CLOSE_JOBS_KEY = "_auto_close_job_names"
+_AUTO_CLOSE_JOBS_KEY = "_auto_close_scheduled"
 _AUTO_CLOSE_PAYLOADS_KEY = "_auto_close_payloads"
+# Записи, які message_deleter так і не закрив (екран не запускали, колесо їх
+# втратило), прибирає state_gc — через добу після останнього оновлення
+_AUTO_CLOSE_TTL_SECONDS = 24 * 3600
+
+
+def _auto_close_stamp(entry: Any) -> Any:
+    # Старі записи розкладу — кортеж (chat_id, message_id) без мітки часу
+    return entry.get("scheduled_at") if isinstance(entry, dict) else None
+
+
+state_collector.register(
+    "chat", _AUTO_CLOSE_JOBS_KEY, _AUTO_CLOSE_TTL_SECONDS, items=True, stamp=_auto_close_stamp
+)
+state_collector.register(
+    "chat", _AUTO_CLOSE_PAYLOADS_KEY, _AUTO_CLOSE_TTL_SECONDS, items=True, stamp=_auto_close_stamp
+)
+
+
+def _scheduled_target(entry: Any) -> Optional[Tuple[int, int]]:
+    """(chat_id, message_id) із запису розкладу (dict або старий кортеж)."""
+    if isinstance(entry, dict):
+        return entry.get("chat_id"), entry.get("message_id")
+    return tuple(entry) if entry else None
 
 
 def set_auto_close_payload(
@@ -34,20 +59,20 @@ def set_auto_close_payload(
             "chat_id": chat_id,
             "message_id": message_id,
             "fallback_text": fallback_text or "Екран закрито.",
+            "scheduled_at": time.time(),
         }
     except Exception:
         logger.exception("Не вдалося зберегти payload автозакриття")
 
 
 def cancel_auto_close(context: ContextTypes.DEFAULT_TYPE, key: str) -> None:
-    """Cancel scheduled auto-close job for a specific key."""
+    """Cancel scheduled auto-close for a specific key."""
+    from bot.services.message_deleter import message_deleter
+
     try:
-        job_queue = context.application.job_queue if context and context.application else None
-        job_names = context.chat_data.get(_AUTO_CLOSE_JOBS_KEY, {})
-        job_name = job_names.pop(key, None)
-        if job_queue and job_name:
-            for j in job_queue.get_jobs_by_name(job_name):
-                j.schedule_removal()
+        scheduled = _scheduled_target(context.chat_data.get(_AUTO_CLOSE_JOBS_KEY, {}).pop(key, None))
+        if scheduled:
+            message_deleter.cancel(*scheduled)
     except Exception:
         logger.debug("Помилка скасування авто-закриття", exc_info=True)
 
@@ -58,70 +83,33 @@ def cancel_auto_close(context: ContextTypes.DEFAULT_TYPE, key: str) -> None:
         logger.debug("Не вдалося прибрати payload автозакриття", exc_info=True)
 
 
-async def _auto_close_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job = getattr(context, "job", None)
-    data = getattr(job, "data", {}) if job else {}
-    key = data.get("key")
-
-    payloads = context.chat_data.get(_AUTO_CLOSE_PAYLOADS_KEY, {})
-    payload = payloads.pop(key, None)
-
-    try:
-        jobs = context.chat_data.get(_AUTO_CLOSE_JOBS_KEY, {})
-        jobs.pop(key, None)
-    except Exception:
-        pass
-
-    if not payload:
-        return
-
-    chat_id = payload.get("chat_id")
-    message_id = payload.get("message_id")
-    fallback_text = payload.get("fallback_text") or "Екран закрито."
-
-    if not chat_id or not message_id:
-        return
-
-    try:
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-        return
-    except Exception:
-        try:
-            await context.bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=fallback_text,
-            )
-        except Exception:
-            logger.debug("Не вдалося автозакрити екран", exc_info=True)
-
-
 def start_auto_close(context: ContextTypes.DEFAULT_TYPE, key: str, timeout: int = 60) -> None:
-    """Schedule auto-close for a stored payload. Safe if payload/job missing."""
-    try:
-        job_queue = context.application.job_queue if context and context.application else None
-        if not job_queue:
-            return
+    """Schedule auto-close for a stored payload. Safe if payload missing."""
+    from bot.services.message_deleter import message_deleter
 
-        payloads = context.chat_data.get(_AUTO_CLOSE_PAYLOADS_KEY, {})
-        payload = payloads.get(key)
+    try:
+        payload = context.chat_data.get(_AUTO_CLOSE_PAYLOADS_KEY, {}).get(key)
         if not payload:
             return
-
-        cancel_auto_close(context, key)
-
         chat_id = payload.get("chat_id")
-        job_name = f"auto_close:{key}:{chat_id}"
-        job_queue.run_once(
-            _auto_close_job,
+        message_id = payload.get("message_id")
+        if not chat_id or not message_id:
+            return
+
+        scheduled = context.chat_data.setdefault(_AUTO_CLOSE_JOBS_KEY, {})
+        previous = _scheduled_target(scheduled.get(key))
+        if previous and previous != (chat_id, message_id):
+            message_deleter.cancel(*previous)
+        # Видалення (або заміну на fallback_text) виконує спільне колесо таймерів
+        message_deleter.schedule(
+            chat_id,
+            message_id,
             timeout,
-            data={"key": key},
-            name=job_name,
-            chat_id=chat_id,
+            fallback_text=payload.get("fallback_text") or "Екран закрито.",
         )
-
-        job_names = context.chat_data.setdefault(_AUTO_CLOSE_JOBS_KEY, {})
-        job_names[key] = job_name
+        now = time.time()
+        payload["scheduled_at"] = now
+        scheduled[key] = {"chat_id": chat_id, "message_id": message_id, "scheduled_at": now}
     except Exception:
         logger.debug("Не вдалося запустити автозакриття", exc_info=True)
 
@@ -154,6 +142,65 @@ AI_RETRIES = int(os.environ.get("AI_RETRIES", "4"))
 AI_BACKOFF_BASE_SEC = float(os.environ.get("AI_BACKOFF_BASE_SEC", "1.6"))
 AI_BACKOFF_MAX_SEC = float(os.environ.get("AI_BACKOFF_MAX_SEC", "10"))
 AI_MAX_TOKENS = int(os.environ.get("AI_MAX_TOKENS", "900"))
+# Бюджет історії діалогу в (оціночних) токенах; тема може перевизначити ключем ai_max_history_tokens
+AI_MAX_HISTORY_TOKENS = int(os.environ.get("AI_MAX_HISTORY_TOKENS", "1100"))
+# Пам'ять у промпті: top-k релевантних фактів, жорсткий ліміт токенів, скільки реплік історії брати в запит
+AI_MEMORY_TOP_K = int(os.environ.get("AI_MEMORY_TOP_K", "8"))
+AI_MEMORY_TOKEN_CAP = int(os.environ.get("AI_MEMORY_TOKEN_CAP", "300"))
+AI_MEMORY_QUERY_TURNS = int(os.environ.get("AI_MEMORY_QUERY_TURNS", "3"))
+# Фонові підсумки діалогу: поріг (оцінка токенів), скільки останніх реплік лишати сирими, розмір підсумку
+AI_SUMMARY_TRIGGER_TOKENS = int(os.environ.get("AI_SUMMARY_TRIGGER_TOKENS", "900"))
+AI_SUMMARY_KEEP_MESSAGES = int(os.environ.get("AI_SUMMARY_KEEP_MESSAGES", "6"))
+AI_SUMMARY_MAX_TOKENS = int(os.environ.get("AI_SUMMARY_MAX_TOKENS", "300"))
+# Кеш відповідей на короткі запити: TTL, кількість записів, макс. слів у нормалізованому запиті
+AI_RESPONSE_CACHE_TTL_SEC = float(os.environ.get("AI_RESPONSE_CACHE_TTL_SEC", "600"))
+AI_RESPONSE_CACHE_MAX = int(os.environ.get("AI_RESPONSE_CACHE_MAX", "1000"))
+AI_RESPONSE_CACHE_MAX_WORDS = int(os.environ.get("AI_RESPONSE_CACHE_MAX_WORDS", "4"))
+# Вихідні запити до Telegram: глобальний ліміт, ліміти на приватний чат і групу
+TG_GLOBAL_PER_SEC = float(os.environ.get("TG_GLOBAL_PER_SEC", "30"))
+TG_PRIVATE_PER_SEC = float(os.environ.get("TG_PRIVATE_PER_SEC", "1"))
+TG_GROUP_PER_MIN = float(os.environ.get("TG_GROUP_PER_MIN", "20"))
+# Розсилки: скільки відправок одночасно (темп однаково задає rate limiter)
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "8"))
+# Режим отримання оновлень: "polling" або "webhook"; розмір черги оновлень (для обох режимів)
+BOT_RUN_MODE = os.environ.get("BOT_RUN_MODE", "polling").strip().lower()
+UPDATE_QUEUE_SIZE = int(os.environ.get("UPDATE_QUEUE_SIZE", "1000"))
+# Паралельна обробка оновлень (порядок у межах чату/користувача зберігається)
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "16"))
+# Які типи оновлень просити в Telegram: "auto" — лише ті, що обробляють хендлери; "all" — усі
+ALLOWED_UPDATES_MODE = os.environ.get("ALLOWED_UPDATES", "auto").strip().lower()
+# Webhook: локальна адреса сервера, публічний URL (порожній — не реєструвати), секрет і ліміти
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_QUEUE_PUT_TIMEOUT_SEC = float(os.environ.get("WEBHOOK_QUEUE_PUT_TIMEOUT_SEC", "5"))
+
+# Як часто прибирати прострочені записи в chat_data/user_data (services/state_gc)
+STATE_GC_INTERVAL_SEC = float(os.environ.get("STATE_GC_INTERVAL_SEC", "21600"))
+# Ліміти AI-запитів (token bucket): запитів на хвилину і розмір сплеску; власник може змінити в панелі
+AI_USER_RATE_PER_MIN = float(os.environ.get("AI_USER_RATE_PER_MIN", "6"))
+AI_USER_BURST = int(os.environ.get("AI_USER_BURST", "3"))
+AI_CHAT_RATE_PER_MIN = float(os.environ.get("AI_CHAT_RATE_PER_MIN", "20"))
+AI_CHAT_BURST = int(os.environ.get("AI_CHAT_BURST", "8"))
+
+# Circuit breaker для DeepSeek (спільний для всіх воркерів)
+AI_BREAKER_WINDOW_SEC = float(os.environ.get("AI_BREAKER_WINDOW_SEC", "60"))
+AI_BREAKER_MIN_REQUESTS = int(os.environ.get("AI_BREAKER_MIN_REQUESTS", "8"))
+AI_BREAKER_ERROR_RATE = float(os.environ.get("AI_BREAKER_ERROR_RATE", "0.5"))
+AI_BREAKER_MAX_429 = int(os.environ.get("AI_BREAKER_MAX_429", "3"))
+AI_BREAKER_OPEN_SEC = float(os.environ.get("AI_BREAKER_OPEN_SEC", "30"))
+AI_BREAKER_PROBES = int(os.environ.get("AI_BREAKER_PROBES", "1"))
+# Якщо глобальний Retry-After довший за це значення — відмовляємо одразу, а не чекаємо
+AI_BREAKER_MAX_WAIT_SEC = float(os.environ.get("AI_BREAKER_MAX_WAIT_SEC", "5"))
+
+# Коалесценція сплесків: повідомлення з одного чату в межах вікна йдуть одним запитом (0 — вимкнено)
+AI_COALESCE_WINDOW_MS = int(os.environ.get("AI_COALESCE_WINDOW_MS", "0"))
+AI_COALESCE_MAX_BATCH = int(os.environ.get("AI_COALESCE_MAX_BATCH", "5"))
+# Воркер черги чату, що простояв без задач стільки секунд, завершується
+AI_WORKER_IDLE_SEC = float(os.environ.get("AI_WORKER_IDLE_SEC", "120"))
 try:
         OWNER_ID = int(_env_or_default("OWNER_ID", "1064174112"))
 except (ValueError, TypeError):
@@ -176,19 +223,25 @@ async def get_current_theme() -> Dict[str, Any]:
     """
     (АСИНХРОННА) Отримує повний словник налаштувань для поточної теми.
     """
-    global _current_theme_cache
-    if not _current_theme_cache:
-        await refresh_theme_cache()
-    return _current_theme_cache
+    return (await _theme_snapshot())[1]
 
 async def get_current_theme_name() -> str:
     """
     (АСИНХРОННА) Отримує лише назву поточної теми (напр., 'winter').
     """
-    global _current_theme_name_cache
+    return (await _theme_snapshot())[0]
+
+async def _load_theme_snapshot() -> Tuple[str, Dict[str, Any]]:
     if not _current_theme_cache:
         await refresh_theme_cache()
-    return _current_theme_name_cache
+    return _current_theme_name_cache, _current_theme_cache
+
+async def _theme_snapshot() -> Tuple[str, Dict[str, Any]]:
+    """
+    (назва, словник) теми. Усі хендлери одного оновлення бачать ту саму тему,
+    навіть якщо її перемкнули посеред обробки.
+    """
+    return await request_context.memoized("theme", None, _load_theme_snapshot)
 
 async def refresh_theme_cache() -> None:
     """
@@ -216,6 +269,8 @@ async def refresh_theme_cache() -> None:
     _current_theme_name_cache = theme_name
     _current_theme_cache = THEME_CONFIG.get(theme_name, THEME_CONFIG[BotTheme.DEFAULT])
     logger.info(f"🎨 Тему оновлено. Поточний режим: {theme_name}")
+    # Тему перемкнули в цьому ж оновленні — далі хендлер має бачити вже нову
+    request_context.forget("theme")
 
 # =============================================================================
 # РОЗДІЛ 2: ТЕКСТИ ТА НАЛАШТУВАННЯ (ПРОМПТИ)
@@ -694,21 +749,15 @@ def format_target_mention(user: User) -> str:
 
 
 async def get_user_from_username(context: ContextTypes.DEFAULT_TYPE, username: str) -> Optional[User]:
+    """Користувач за @username з локального довідника (без get_chat). None, якщо бот його не бачив."""
+    from bot.services.user_directory import user_directory
+
     try:
-        chat_obj = await context.bot.get_chat(f"@{username.lstrip('@')}")
-        if chat_obj.type == "private":
-            return User(
-                id=chat_obj.id,
-                first_name=chat_obj.first_name,
-                is_bot=chat_obj.is_bot,
-                username=chat_obj.username,
-                last_name=chat_obj.last_name,
-                language_code=chat_obj.language_code,
-            )
-        return None
+        entry = await user_directory.find_by_username(username)
     except Exception as e:
         logger.warning(f"User resolve error @{username}: {e}")
         return None
+    return entry.to_user() if entry else None
 
 
 def sanitize_reply(text: str) -> str:
@@ -727,17 +776,6 @@ async def safe_reply(update: Update, text: str):
             logger.error(f"Error in safe_reply: {e}")
 
 
-async def send_typing_periodically(bot, chat_id, interval: float = 4.0):
-    try:
-        while True:
-            await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
-            await asyncio.sleep(interval)
-    except asyncio.CancelledError:
-        pass
-    except Exception as e:
-        logger.debug(f"Typing error: {e}")
-
-
 def format_time(remaining: timedelta) -> str:
     minutes, seconds = divmod(int(remaining.total_seconds()), 60)
     return f"{minutes} хв {seconds} сек"